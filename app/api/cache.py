@@ -0,0 +1,469 @@
+"""
+Response Cache
+
+This module contains the ASGI middleware caching the responses of the read
+endpoints in memory. Identical GET requests, i.e. the same path and the
+same query parameters in any order, are answered from the cache without
+running the endpoint.
+
+Each cached route has a ``CacheRule``: how long its responses stay fresh
+(``ttl``), how long after that they may still be served while they are
+recomputed in the background (``stale``, stale-while-revalidate), and the
+invalidation tags naming what they are read from: a collection
+(``"listings"``) or the record of a collection whose ID is a path parameter
+(``"listings:{listing_id}"``). A response is stored with the versions of
+its tags (see ``InMemoryDatabase.collection_version`` and
+``record_version``) read before it was computed, and is only served while
+they are unchanged: a write makes every response it may have changed a miss
+for the very next request, whatever its TTL. TTLs bound what versions do
+not track, such as approximate counts.
+
+Responses are kept within a byte budget, least recently used first out,
+with TinyLFU admission: once the cache is full, a new response only
+displaces the least recently used ones if its key was requested at least as
+often (as estimated by a ``FrequencySketch``), so one-off requests such as
+deep cursor pages do not flush popular pages.
+
+Only ``200`` responses are stored, and not those marked ``no-store`` or
+``private`` or setting cookies. Requests sending ``Cache-Control:
+no-cache`` skip the stored response; a conditional request matching the
+``ETag`` of a stored response gets a ``304``. Responses say how they were
+answered in an ``X-Cache`` header: ``HIT``, ``STALE`` or ``MISS``.
+
+Given a ``ResponseCompression``, the cache sends stored responses in the
+encoding each request negotiates, and keeps every encoding of a response
+once compressed with it: compression is paid once per version of a
+response and encoding, not once per request.
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .compression import ResponseCompression, encoded_headers
+from .responses import encoded_etag, matches_etag, not_modified
+
+
+# Bytes an entry is counted for on top of its body and headers
+_ENTRY_OVERHEAD = 256
+
+
+class CacheRule:
+    """Caching policy of the responses of one route."""
+    
+    def __init__(self, path: str, ttl: float, stale: float = 0.0, tags: Iterable[str] = ()):
+        """
+        Initialize the rule.
+        
+        Args:
+            path: Path of the route, with ``{name}`` path parameters
+            ttl: Seconds a response stays fresh; 0 to never cache the route
+            stale: Seconds after ``ttl`` a response is still served while it
+                is recomputed in the background
+            tags: Collections, or ``"collection:{parameter}"`` records of a
+                collection whose ID is the path parameter ``parameter``,
+                the responses are read from
+        """
+        self.path = path
+        self.ttl = ttl
+        self.stale = stale
+        self.tags: List[Tuple[str, Optional[str]]] = []
+        for tag in tags:
+            collection, _, parameter = tag.partition(":")
+            self.tags.append((collection, parameter.strip("{}") or None))
+        self._pattern = re.compile(
+            re.sub(r"\\\{(\w+)\\\}", r"(?P<\1>[^/]+)", re.escape(path))
+        )
+    
+    def match(self, path: str) -> Optional[Dict[str, str]]:
+        """Get the path parameters of ``path``, or None if the rule is not for it."""
+        match = self._pattern.fullmatch(path)
+        return None if match is None else match.groupdict()
+
+
+class FrequencySketch:
+    """
+    Count-min sketch estimating how often keys were seen lately.
+    
+    Each key counts in one 4-bit counter of each of ``DEPTH`` rows, and its
+    estimate is the smallest of them. Once ``10 * width`` keys were counted,
+    every counter is halved, so past popularity fades.
+    """
+    
+    DEPTH = 4
+    
+    # Largest value of a counter
+    LIMIT = 15
+    
+    def __init__(self, width: int = 4096):
+        """
+        Initialize a sketch with every count at 0.
+        
+        Args:
+            width: Counters per row, rounded up to a power of two; about the
+                number of keys told apart
+        """
+        width = 1 << max(width - 1, 1).bit_length()
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(self.DEPTH)]
+        self._sample = 10 * width
+        self._counted = 0
+    
+    def _slots(self, key: Any) -> List[int]:
+        """Get the counter of ``key`` in each row."""
+        mask = self._mask
+        return [hash((row, key)) & mask for row in range(self.DEPTH)]
+    
+    def increment(self, key: Any):
+        """Count one more occurrence of ``key``."""
+        for row, slot in zip(self._rows, self._slots(key)):
+            if row[slot] < self.LIMIT:
+                row[slot] += 1
+        self._counted += 1
+        if self._counted >= self._sample:
+            self._rows = [bytearray(count >> 1 for count in row) for row in self._rows]
+            self._counted //= 2
+    
+    def estimate(self, key: Any) -> int:
+        """Estimate how often ``key`` was counted lately."""
+        return min(row[slot] for row, slot in zip(self._rows, self._slots(key)))
+
+
+class CachedResponse:
+    """Response stored by the cache, with what it was computed from."""
+    
+    __slots__ = ("status", "headers", "body", "versions", "stored_at", "size", "etag", "variants")
+    
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, versions: Tuple[Any, ...]):
+        """
+        Initialize the entry.
+        
+        Args:
+            status: Status code of the response
+            headers: Raw headers of the response
+            body: Body of the response
+            versions: Database instance and versions of the tags of the rule
+                the response was computed under
+        """
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.versions = versions
+        self.stored_at = time.monotonic()
+        self.size = len(body) + sum(len(name) + len(value) for name, value in headers) + _ENTRY_OVERHEAD
+        self.etag = next((value.decode("latin-1") for name, value in headers if name == b"etag"), None)
+        # Body compressed with each encoding it was sent in
+        self.variants: Dict[str, bytes] = {}
+
+
+class ResponseCache:
+    """
+    Byte-bounded store of ``CachedResponse`` entries.
+    
+    Least recently used entries are evicted first, and only for a new entry
+    whose key was requested at least as often as theirs (TinyLFU
+    admission). Used from the event loop only, so it takes no lock.
+    """
+    
+    def __init__(self, budget: int, max_entry: Optional[int] = None):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            budget: Bytes the entries are kept within
+            max_entry: Bytes above which an entry is never stored. Defaults
+                to an eighth of ``budget``.
+        """
+        self.budget = budget
+        self.max_entry = budget // 8 if max_entry is None else max_entry
+        self.size = 0
+        self.sketch = FrequencySketch()
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return len(self._entries)
+    
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Get the entry of ``key``, counting the request for admission."""
+        self.sketch.increment(key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+    
+    def put(self, key: str, entry: CachedResponse) -> bool:
+        """
+        Store ``entry`` under ``key``, replacing any entry already there.
+        
+        Returns:
+            Whether the entry was stored; it is not if it is too large, or
+            would displace entries requested more often
+        """
+        if entry.size > self.max_entry:
+            return False
+        entries = self._entries
+        replaced = entries.pop(key, None)
+        if replaced is not None:
+            self.size -= replaced.size
+        else:
+            # Only admitted if it beats every entry it displaces
+            frequency, victims, freed = self.sketch.estimate(key), 0, 0
+            for victim_key, victim in entries.items():
+                if self.size - freed + entry.size <= self.budget:
+                    break
+                if self.sketch.estimate(victim_key) > frequency:
+                    return False
+                victims += 1
+                freed += victim.size
+            for _ in range(victims):
+                self.size -= entries.popitem(last=False)[1].size
+        while entries and self.size + entry.size > self.budget:
+            self.size -= entries.popitem(last=False)[1].size
+        entries[key] = entry
+        self.size += entry.size
+        return True
+    
+    def add_variant(self, key: str, entry: CachedResponse, encoding: str, body: bytes):
+        """
+        Keep the body of ``entry`` compressed with ``encoding``, if it is still the entry of ``key``.
+        
+        Least recently used entries are evicted to make room.
+        """
+        if self._entries.get(key) is not entry:
+            return
+        entry.variants[encoding] = body
+        entry.size += len(body)
+        self.size += len(body)
+        entries = self._entries
+        while self.size > self.budget and len(entries) > 1:
+            self.size -= entries.popitem(last=False)[1].size
+    
+    def discard(self, key: str):
+        """Remove the entry of ``key``, if any."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+    
+    def clear(self):
+        """Remove every entry."""
+        self._entries.clear()
+        self.size = 0
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware answering GET requests of the routes of ``rules`` from a ``ResponseCache``."""
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        database: Any,
+        rules: Iterable[CacheRule],
+        budget: int,
+        max_entry: Optional[int] = None,
+        compression: Optional[ResponseCompression] = None
+    ):
+        """
+        Initialize the middleware.
+        
+        Args:
+            app: Application to cache the responses of
+            database: ``AsyncInMemoryDatabase`` the tags are versioned by
+            rules: Rules of the cached routes; the first matching a path
+                applies
+            budget: Bytes of responses cached; 0 disables the cache
+            max_entry: Bytes above which a response is never cached, see
+                ``ResponseCache``
+            compression: Compression stored responses are sent with; they
+                are sent as they are by default
+        """
+        self.app = app
+        self.database = database
+        self.rules = list(rules)
+        self.cache = ResponseCache(budget, max_entry)
+        self.compression = compression
+        # Background recomputations of stale entries, by key
+        self._revalidating: Dict[str, "asyncio.Task[None]"] = {}
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """Answer a request from the cache, or pass it on and cache the response."""
+        if scope["type"] != "http" or scope["method"] != "GET" or self.cache.budget <= 0:
+            await self.app(scope, receive, send)
+            return
+        rule, params = self._rule(scope["path"])
+        if rule is None or rule.ttl <= 0:
+            await self.app(scope, receive, send)
+            return
+        
+        # Other workers' writes to shared collections must be loaded for
+        # the versions to see them
+        await self.database.refresh()
+        key = self._key(scope)
+        versions = self._versions(rule, params)
+        headers = Headers(scope=scope)
+        if "no-cache" not in headers.get("cache-control", ""):
+            entry = self.cache.get(key)
+            if entry is not None and entry.versions == versions:
+                age = time.monotonic() - entry.stored_at
+                if age < rule.ttl:
+                    await self._send_entry(key, entry, scope, receive, send, b"HIT")
+                    return
+                if age < rule.ttl + rule.stale:
+                    self._revalidate(key, scope, versions)
+                    await self._send_entry(key, entry, scope, receive, send, b"STALE")
+                    return
+        await self._fetch(key, scope, receive, send, versions)
+    
+    def _rule(self, path: str) -> Tuple[Optional[CacheRule], Dict[str, str]]:
+        """Get the rule applying to ``path``, and its path parameters."""
+        for rule in self.rules:
+            params = rule.match(path)
+            if params is not None:
+                return rule, params
+        return None, {}
+    
+    @staticmethod
+    def _key(scope: Scope) -> str:
+        """Get the cache key of a request: its path and its sorted query parameters."""
+        query = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        return scope["path"] + "?" + urlencode(sorted(query))
+    
+    def _versions(self, rule: CacheRule, params: Dict[str, str]) -> Tuple[Any, ...]:
+        """Get the database instance and the current versions of the tags of ``rule``."""
+        database = self.database
+        versions: List[Any] = [database.instance_id]
+        for collection, parameter in rule.tags:
+            if parameter is None:
+                versions.append(database.collection_version(collection))
+            else:
+                versions.append(database.record_version(collection, params[parameter]))
+        return tuple(versions)
+    
+    async def _send_entry(
+        self,
+        key: str,
+        entry: CachedResponse,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        state: bytes
+    ):
+        """
+        Send a stored response, or a 304 if the request's ``If-None-Match`` matches its tag.
+        
+        The body is sent in the encoding the request negotiates, compressed
+        only if the entry does not hold it in that encoding yet, and tagged
+        as that representation (see ``encoded_etag``).
+        """
+        headers, body = entry.headers, entry.body
+        compression = self.compression
+        compressible = compression is not None and compression.compressible(headers, len(body))
+        encoding = compression.negotiate(Headers(scope=scope)) if compressible else None
+        if entry.etag is not None and matches_etag(Request(scope), entry.etag):
+            tag = entry.etag if encoding is None else encoded_etag(entry.etag, encoding)
+            await not_modified(tag)(scope, receive, send)
+            return
+        if compressible:
+            if encoding is not None:
+                body = entry.variants.get(encoding)
+                if body is None:
+                    body = compression.compress(entry.body, encoding)
+                    self.cache.add_variant(key, entry, encoding, body)
+            headers = encoded_headers(headers, encoding, len(body))
+        await send({"type": "http.response.start", "status": entry.status, "headers": [
+            *headers, (b"x-cache", state)
+        ]})
+        await send({"type": "http.response.body", "body": body})
+    
+    async def _fetch(self, key: str, scope: Scope, receive: Receive, send: Send, versions: Tuple[Any, ...]):
+        """
+        Pass a request on to the application, storing its response if cacheable.
+        
+        Args:
+            key: Cache key of the request
+            scope: Scope of the request
+            receive: Channel of the request body
+            send: Channel the response is sent on
+            versions: Versions of the tags, read before the response is
+                computed so that a write meanwhile makes it stale
+        """
+        start: Optional[Message] = None
+        streamed = False
+        chunks: Optional[List[bytes]] = []
+        size = 0
+        
+        async def capture(message: Message):
+            nonlocal start, streamed, chunks, size
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if message["status"] == 200 and _cacheable(headers):
+                    # Held until the first body message tells whether it is streamed
+                    start = {**message, "headers": headers}
+                    return
+                message = {**message, "headers": [*headers, (b"x-cache", b"MISS")]}
+            elif message["type"] == "http.response.body" and start is not None:
+                body, more_body = message.get("body", b""), message.get("more_body", False)
+                if not streamed and not more_body:
+                    # Sent as stored, i.e. compressed once for the entry
+                    entry = CachedResponse(start["status"], start["headers"], body, versions)
+                    self.cache.put(key, entry)
+                    await self._send_entry(key, entry, scope, receive, send, b"MISS")
+                    return
+                if not streamed:
+                    streamed = True
+                    await send({**start, "headers": [*start["headers"], (b"x-cache", b"MISS")]})
+                if chunks is not None:
+                    size += len(body)
+                    if size > self.cache.max_entry:
+                        chunks = None
+                    else:
+                        chunks.append(body)
+                        if not more_body:
+                            entry = CachedResponse(start["status"], start["headers"], b"".join(chunks), versions)
+                            self.cache.put(key, entry)
+            await send(message)
+        
+        await self.app(scope, receive, capture)
+    
+    def _revalidate(self, key: str, scope: Scope, versions: Tuple[Any, ...]):
+        """Recompute the stale entry of ``key`` in the background, unless already underway."""
+        if key in self._revalidating:
+            return
+        # Ask for the full response, whatever the client had
+        scope = {**scope, "headers": [
+            (name, value) for name, value in scope["headers"] if name not in (b"if-none-match", b"cache-control")
+        ]}
+        
+        async def receive() -> Message:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        
+        async def send(message: Message):
+            pass
+        
+        async def revalidate():
+            try:
+                await self._fetch(key, scope, receive, send, versions)
+            except Exception:
+                # Served fresh again once the entry expires
+                self.cache.discard(key)
+            finally:
+                del self._revalidating[key]
+        
+        self._revalidating[key] = asyncio.get_running_loop().create_task(revalidate())
+
+
+def _cacheable(headers: List[Tuple[bytes, bytes]]) -> bool:
+    """Check whether a response with ``headers`` may be stored."""
+    for name, value in headers:
+        if name == b"set-cookie":
+            return False
+        if name == b"cache-control" and re.search(rb"no-store|private", value):
+            return False
+    return True
@@ -0,0 +1,249 @@
+"""
+Response Compression
+
+This module contains the negotiated compression of responses. Listing
+pages are mostly long, repetitive photo URLs and compress several times
+over, so the bandwidth saved outweighs the CPU spent by far.
+
+``ResponseCompression`` picks the encoding of a response from the client's
+``Accept-Encoding`` (``br``, ``zstd`` or ``gzip``, in the server's order of
+preference among those the client accepts) and compresses bodies with it.
+Brotli and Zstandard are optional dependencies; without them only the
+encodings installed are offered. Only textual responses (JSON, NDJSON,
+text) of at least ``min_size`` bytes are compressed.
+
+``CompressionMiddleware`` compresses the responses of the application as
+they are sent, streamed ones included. Responses already carrying a
+``Content-Encoding`` pass through it unchanged, which is how the response
+cache (see ``app.api.cache``) serves bodies it compressed once per version
+rather than once per request.
+"""
+
+import gzip
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .responses import encoded_etag
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - exercised without brotli installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised without zstandard installed
+    zstandard = None
+
+
+# Encodings compression is offered in, best first
+ENCODINGS = ("br", "zstd", "gzip")
+
+# Encodings whose library is installed
+AVAILABLE_ENCODINGS = tuple(
+    encoding for encoding in ENCODINGS
+    if encoding == "gzip" or (encoding == "br" and brotli is not None) or (encoding == "zstd" and zstandard is not None)
+)
+
+
+class _BrotliStream:
+    """Incremental Brotli compressor with the ``compress``/``flush`` interface of zlib's."""
+    
+    def __init__(self, level: int):
+        """Initialize a compressor of quality ``level``."""
+        self._compressor = brotli.Compressor(quality=level)
+    
+    def compress(self, data: bytes) -> bytes:
+        """Compress ``data``, returning the output available so far."""
+        return self._compressor.process(data)
+    
+    def flush(self) -> bytes:
+        """Finish the stream, returning the rest of the output."""
+        return self._compressor.finish()
+
+
+class ResponseCompression:
+    """Content negotiation and compression of response bodies."""
+    
+    def __init__(
+        self,
+        encodings: Iterable[str] = ENCODINGS,
+        levels: Optional[Dict[str, int]] = None,
+        min_size: int = 1024
+    ):
+        """
+        Initialize the compression.
+        
+        Args:
+            encodings: Encodings to offer, best first; those not installed
+                are left out
+            levels: Compression level of each encoding. Defaults to 4 for
+                ``br``, 3 for ``zstd`` and 6 for ``gzip``.
+            min_size: Bytes below which a body is sent as it is
+        """
+        self.encodings = [encoding for encoding in encodings if encoding in AVAILABLE_ENCODINGS]
+        self.levels = {"br": 4, "zstd": 3, "gzip": 6, **(levels or {})}
+        self.min_size = min_size
+    
+    def negotiate(self, headers: Headers) -> Optional[str]:
+        """
+        Pick the encoding of the response to a request with ``headers``.
+        
+        Returns:
+            The best offered encoding the ``Accept-Encoding`` header accepts
+            (with a non-zero ``q``, by name or as ``*``), or None to send
+            the body as it is
+        """
+        header = headers.get("accept-encoding")
+        if not header or not self.encodings:
+            return None
+        accepted: Dict[str, float] = {}
+        for item in header.split(","):
+            name, _, parameters = item.partition(";")
+            quality = 1.0
+            for parameter in parameters.split(";"):
+                key, _, value = parameter.partition("=")
+                if key.strip() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            accepted[name.strip().lower()] = quality
+        default = accepted.get("*", 0.0)
+        for encoding in self.encodings:
+            if accepted.get(encoding, default) > 0:
+                return encoding
+        return None
+    
+    def compressible(self, headers: List[Tuple[bytes, bytes]], size: Optional[int] = None) -> bool:
+        """
+        Check whether a response with raw ``headers`` may be compressed.
+        
+        Args:
+            headers: Raw headers of the response
+            size: Bytes of the body, if known; a streamed body counts as
+                large enough
+        """
+        if size is not None and size < self.min_size:
+            return False
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+        return content_type.startswith(b"text/") or b"json" in content_type or b"javascript" in content_type
+    
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        """Compress a whole body with ``encoding``."""
+        level = self.levels[encoding]
+        if encoding == "br":
+            return brotli.compress(data, quality=level)
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=level).compress(data)
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    
+    def stream(self, encoding: str) -> Any:
+        """Get an incremental compressor with ``compress`` and ``flush`` methods for ``encoding``."""
+        level = self.levels[encoding]
+        if encoding == "br":
+            return _BrotliStream(level)
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=level).compressobj()
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def encoded_headers(
+    headers: List[Tuple[bytes, bytes]],
+    encoding: Optional[str],
+    size: Optional[int]
+) -> List[Tuple[bytes, bytes]]:
+    """
+    Get the raw headers of a response once negotiated.
+    
+    Args:
+        headers: Raw headers of the response as the application sent it
+        encoding: Encoding the body was compressed with; None if it is sent
+            as it is. The ``ETag`` of a compressed body gets the encoding
+            appended, as it tags another representation.
+        size: Bytes of the body as sent, or None if it is streamed
+    """
+    headers = [
+        (name, value) for name, value in headers
+        if name != b"content-length" and not (name == b"vary" and value.lower() == b"accept-encoding")
+    ]
+    if encoding is not None:
+        headers = [
+            (name, encoded_etag(value.decode("latin-1"), encoding).encode("latin-1") if name == b"etag" else value)
+            for name, value in headers
+        ]
+    if size is not None:
+        headers.append((b"content-length", str(size).encode("latin-1")))
+    if encoding is not None:
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+    headers.append((b"vary", b"accept-encoding"))
+    return headers
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses with the encoding negotiated by a ``ResponseCompression``."""
+    
+    def __init__(self, app: ASGIApp, compression: ResponseCompression):
+        """
+        Initialize the middleware.
+        
+        Args:
+            app: Application to compress the responses of
+            compression: Negotiation and compression settings
+        """
+        self.app = app
+        self.compression = compression
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """Pass a request on to the application, compressing its response."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.compression.negotiate(Headers(scope=scope))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        compression = self.compression
+        start: Optional[Message] = None
+        stream: Any = None
+        
+        async def compress(message: Message):
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                # Held until the first body message tells whether it is streamed
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            headers = list(start.get("headers", []))
+            if stream is None:
+                if not compression.compressible(headers, None if more_body else len(body)):
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                if not more_body:
+                    body = compression.compress(body, encoding)
+                    await send({**start, "headers": encoded_headers(headers, encoding, len(body))})
+                    await send({**message, "body": body})
+                    return
+                stream = compression.stream(encoding)
+                await send({**start, "headers": encoded_headers(headers, encoding, None)})
+            output = stream.compress(body)
+            if not more_body:
+                output += stream.flush()
+            if output or not more_body:
+                await send({"type": "http.response.body", "body": output, "more_body": more_body})
+        
+        await self.app(scope, receive, compress)
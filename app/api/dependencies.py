@@ -5,10 +5,12 @@ This module contains FastAPI dependencies used throughout the application
 for dependency injection, shared resources, and common functionality.
 """
 
-from typing import Generator
+import re
+from typing import Any, AsyncGenerator, Optional, Tuple
 from fastapi import Depends, HTTPException, status
-from .config.settings import get_settings, Settings
-from .services.database import get_database, InMemoryDatabase
+from ..config.settings import get_settings, Settings
+from ..services.async_database import get_async_database, AsyncInMemoryDatabase
+from ..services.listings import decode_position, encode_position
 
 
 def get_settings_dependency() -> Settings:
@@ -21,14 +23,20 @@ def get_settings_dependency() -> Settings:
     return get_settings()
 
 
-def get_database_dependency() -> InMemoryDatabase:
+async def get_database_dependency() -> AsyncInMemoryDatabase:
     """
-    Dependency to get database instance.
+    Dependency to get the asyncio database facade.
+    
+    Handlers await its methods, so scans and writes run off the event
+    loop and never stall other requests. Shared collections that other
+    worker processes have written are reloaded first.
     
     Returns:
-        InMemoryDatabase: Database instance
+        AsyncInMemoryDatabase: Database facade over the global instance
     """
-    return get_database()
+    database = get_async_database()
+    await database.refresh()
+    return database
 
 
 def verify_api_key(api_key: str = None) -> bool:
@@ -115,21 +123,55 @@ def validate_collection_name(collection: str) -> str:
 
 def get_pagination_params(
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: str = "id"
 ) -> dict:
     """
     Get pagination parameters with validation.
     
+    Pages are addressed either by offset (``skip``) or by the opaque cursor
+    returned with the previous page (see ``next_page_cursor``). Cursor
+    pages resume after the sort value and ID of the last record seen, as
+    ``InMemoryDatabase.get_page`` does, so they cost the same however deep
+    they are and do not shift when records are inserted meanwhile. A cursor
+    is bound to the order it was issued for, as listing search cursors are
+    (see ``app.services.listings.encode_position``).
+    
     Args:
         skip: Number of records to skip
         limit: Maximum number of records to return
+        cursor: Cursor returned with the previous page
+        sort: Field to order records by, prefixed with '-' for descending
         
     Returns:
-        Dictionary with pagination parameters
+        Dictionary with pagination parameters; ``order_by`` and
+        ``descending`` give the order, and ``after`` the ``(sort value,
+        id)`` position decoded from the cursor, or None
         
     Raises:
-        HTTPException: If pagination parameters are invalid
+        HTTPException: If pagination parameters are invalid, or the cursor
+            was issued for another order
     """
+    if not re.fullmatch(r"-?\w+", sort):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Sort parameter must be a field name, optionally prefixed with '-'"
+        )
+    
+    after = None
+    if cursor is not None:
+        if skip:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Skip parameter cannot be combined with a cursor"
+            )
+        try:
+            values, record_id = decode_position(cursor, sort, 1)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+        after = values[0], record_id
+    
     if skip < 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -142,11 +184,35 @@ def get_pagination_params(
             detail="Limit parameter must be between 1 and 1000"
         )
     
-    return {"skip": skip, "limit": limit}
+    return {
+        "skip": skip,
+        "limit": limit,
+        "sort": sort,
+        "order_by": sort.lstrip("-"),
+        "descending": sort.startswith("-"),
+        "after": after,
+    }
+
+
+def next_page_cursor(pagination: dict, position: Optional[Tuple[Any, str]]) -> Optional[str]:
+    """
+    Get the cursor of the page after the one fetched with ``pagination``.
+    
+    Args:
+        pagination: Parameters from ``get_pagination_params``
+        position: Position returned with the page by ``get_page``
+        
+    Returns:
+        Cursor string, or None if no records follow
+    """
+    if position is None:
+        return None
+    value, record_id = position
+    return encode_position(pagination["sort"], [value], record_id)
 
 
 # Common dependency combinations
-def get_app_dependencies() -> Generator[tuple, None, None]:
+async def get_app_dependencies() -> AsyncGenerator[tuple, None]:
     """
     Get common application dependencies.
     
@@ -154,5 +220,5 @@ def get_app_dependencies() -> Generator[tuple, None, None]:
         Tuple of (settings, database) dependencies
     """
     settings = get_settings_dependency()
-    database = get_database_dependency()
+    database = await get_database_dependency()
     yield settings, database 
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+API Responses
+
+This module contains the JSON response classes of the application.
+
+For a handler returning a plain value, FastAPI validates it against the
+route's ``response_model``, converts it to JSON-compatible values and only
+then has the response class encode it; for listing pages the validation and
+conversion cost more than the search itself. ``FastJSONResponse`` encodes
+content straight to bytes with ``encode_json`` (orjson when it is
+installed), and is the default response class of the application.
+
+Handlers whose output is trusted, i.e. already-validated models or values
+built from stored records in the ``response_model`` shape (such as
+``to_listing``), return a ``FastJSONResponse`` themselves: FastAPI passes a
+returned response through as it is, so the output skips validation and
+conversion. The ``response_model`` of the route still documents it.
+
+Handlers holding parts of the body already encoded, such as the cached
+listing fragments, join them with ``json_array`` and ``json_object`` and
+return an ``EncodedJSONResponse``.
+
+Handlers of cacheable resources tag their responses with a strong ``etag``
+built from database versions, and answer a conditional GET whose
+``If-None-Match`` still matches (``matches_etag``) with ``not_modified``,
+before reading or encoding anything. A compressed body is another
+representation, so it is tagged with its encoding appended
+(``encoded_etag``); ``matches_etag`` accepts the tag of any encoding.
+"""
+
+from typing import Any, Iterable, Tuple
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+from ..utils.helpers import encode_json
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` encoding its content with ``encode_json``."""
+    
+    def render(self, content: Any) -> bytes:
+        """Encode ``content`` as the response body."""
+        return encode_json(content)
+
+
+class EncodedJSONResponse(Response):
+    """Response whose content is an already-encoded JSON document."""
+    
+    media_type = "application/json"
+
+
+# Content codings an entity tag may carry, see ``encoded_etag``
+CONTENT_CODINGS = ("br", "zstd", "gzip", "deflate")
+
+
+def etag(*parts: Any) -> str:
+    """Build a strong entity tag from ``parts``, e.g. a database instance ID and version."""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def encoded_etag(tag: str, encoding: str) -> str:
+    """Get the entity tag of the body tagged ``tag`` compressed with ``encoding``, e.g. ``"x-br"``."""
+    return f'{tag[:-1]}-{encoding}"'
+
+
+def matches_etag(request: Request, tag: str) -> bool:
+    """
+    Check whether the ``If-None-Match`` header of ``request`` matches ``tag``, in any encoding.
+    
+    As the header asks for, tags are compared weakly: ``W/"x"`` matches
+    ``"x"``. The tags of the compressed bodies (``encoded_etag``) match as
+    well, since they hold the same content.
+    """
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag, *(encoded_etag(tag, encoding) for encoding in CONTENT_CODINGS)}
+    return any(candidate.strip().removeprefix("W/") in tags for candidate in header.split(","))
+
+
+def not_modified(tag: str) -> Response:
+    """Get the 304 response to a conditional GET whose ``If-None-Match`` matched ``tag``."""
+    return Response(status_code=304, headers={"ETag": tag})
+
+
+def json_array(items: Iterable[bytes]) -> bytes:
+    """Join encoded JSON values into an encoded array."""
+    return b"[" + b",".join(items) + b"]"
+
+
+def json_object(members: Iterable[Tuple[str, bytes]]) -> bytes:
+    """Join names and encoded JSON values into an encoded object, in order."""
+    return b"{" + b",".join(encode_json(name) + b":" + value for name, value in members) + b"}"
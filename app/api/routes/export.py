@@ -0,0 +1,49 @@
+"""
+Export API Routes
+
+This module contains the data export endpoint, which streams collections
+as newline-delimited JSON.
+"""
+
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from ..dependencies import get_database_dependency, verify_api_key
+from ...services.async_database import AsyncInMemoryDatabase
+
+# Create router for export endpoints
+router = APIRouter()
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    summary="Export Data",
+    description="Stream collections as newline-delimited JSON, one record per line",
+    tags=["Export"],
+    dependencies=[Depends(verify_api_key)]
+)
+async def export_data(
+    collection: Optional[List[str]] = Query(None, description="Collections to export, all by default"),
+    database: AsyncInMemoryDatabase = Depends(get_database_dependency)
+) -> StreamingResponse:
+    """
+    Export collections.
+    
+    Each line is ``{"collection": ..., "record": ...}``, or ``{"collection":
+    ..., "value": ...}`` for collections that do not hold records. The
+    export is read from one snapshot without holding any lock, and sent
+    with chunked encoding as it is encoded, so it runs in constant memory
+    whatever its size.
+    
+    Returns:
+        StreamingResponse: The export, as ``application/x-ndjson``
+        
+    Raises:
+        HTTPException: If a collection doesn't exist
+    """
+    try:
+        chunks = database.export_ndjson(collection)
+    except KeyError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=exc.args[0])
+    return StreamingResponse(chunks, media_type="application/x-ndjson")
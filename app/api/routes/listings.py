@@ -0,0 +1,276 @@
+"""
+Listings API Routes
+
+This module contains the property listing endpoints: an indexed search with
+filters, multi-key sorting and cursor pagination, lookup by ID, bulk
+writes, streaming imports and a feed of listing changes.
+
+Responses are built from stored listings by ``to_listing`` in the shape of
+their ``response_model`` and returned as ``FastJSONResponse``, so FastAPI
+does not validate them again (see ``app.api.responses``). Listings found by
+search or ID are taken encoded from the database's listings cache.
+
+Searches and listings are tagged with strong ETags built from the version
+of the listings collection and of the listing respectively, and conditional
+GETs that still match are answered with 304 without searching.
+"""
+
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from ..dependencies import get_database_dependency, verify_api_key
+from ..responses import (
+    EncodedJSONResponse, FastJSONResponse, etag, json_array, json_object, matches_etag, not_modified
+)
+from ...models.schemas import (
+    BulkListingRequest, BulkWriteResponse, ImportResponse, ListingChanges, ListingFeedPage, ListingPage, ListingRecord,
+    PhotoMode, PropertyType, Region
+)
+from ...services.async_database import AsyncInMemoryDatabase
+from ...services.importer import import_listings_async
+from ...services.listings import DEFAULT_SORT, SORT_FIELDS, encode_listings, search_encoded_listings, to_listing
+from ...services.seed import stored_listing, stored_photos
+from ...utils.helpers import encode_json
+
+# Create router for listing endpoints
+router = APIRouter()
+
+
+def _stored_changes(changes: ListingChanges) -> Dict[str, Any]:
+    """Map listing changes to stored fields, storing photos the way ``stored_listing`` does."""
+    stored = changes.model_dump(by_alias=True, exclude_unset=True, mode="json")
+    if "photos" in stored:
+        stored["photos"] = stored_photos(stored["photos"])
+    return stored
+
+
+@router.get(
+    "/listings",
+    response_model=ListingPage,
+    summary="Search Listings",
+    description="Search listings with filters, multi-key sorting and cursor pagination",
+    tags=["Listings"]
+)
+async def list_listings(
+    request: Request,
+    region: Optional[Region] = Query(None, description="Only listings in this region"),
+    property_type: Optional[PropertyType] = Query(None, description="Only listings of this property type"),
+    bedrooms: Optional[int] = Query(None, ge=0, description="Exact number of bedrooms"),
+    min_price_in_cents: Optional[int] = Query(None, ge=0, description="Minimum price in cents"),
+    max_price_in_cents: Optional[int] = Query(None, ge=0, description="Maximum price in cents"),
+    min_gross_yield: Optional[float] = Query(None, description="Minimum gross yield"),
+    max_gross_yield: Optional[float] = Query(None, description="Maximum gross yield"),
+    sort: str = Query(
+        DEFAULT_SORT,
+        description=f"Comma-separated sort fields, prefixed with '-' for descending. One of: {', '.join(SORT_FIELDS)}"
+    ),
+    cursor: Optional[str] = Query(None, description="Cursor returned with the previous page"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of listings to return"),
+    photos: PhotoMode = Query(PhotoMode.ALL, description="Photo URLs to return; 'thumbnails' for list views"),
+    database: AsyncInMemoryDatabase = Depends(get_database_dependency)
+) -> ListingPage:
+    """
+    Search listings.
+    
+    Equality filters are answered from hash indexes and ranges from sorted
+    indexes; the first sort field walks its index from the cursor position,
+    so every page costs the same regardless of depth or collection size.
+    The search and the encoding of listings not yet cached run off the
+    event loop.
+    
+    The page is tagged with the version of the listings collection and the
+    approximate count it carries, which may change under the same version;
+    while neither changes, a request with a matching ``If-None-Match`` is
+    answered with 304 before searching.
+    
+    Returns:
+        ListingPage: Matching listings, the cursor of the next page and
+            a cached, approximate count of all matches
+            
+    Raises:
+        HTTPException: If the sort specification or the cursor is invalid
+    """
+    filters = {}
+    if region is not None:
+        filters["region"] = region.value
+    if property_type is not None:
+        filters["property_type"] = property_type.value
+    if bedrooms is not None:
+        filters["bedrooms"] = bedrooms
+    
+    ranges = {}
+    if min_price_in_cents is not None or max_price_in_cents is not None:
+        ranges["price_in_cents"] = (min_price_in_cents, max_price_in_cents)
+    if min_gross_yield is not None or max_gross_yield is not None:
+        ranges["gross_yield"] = (min_gross_yield, max_gross_yield)
+    
+    # The version is read first, so a write while counting makes the tag older, not newer
+    version = database.collection_version("listings")
+    total = await database.count("listings", filters, ranges, approximate=True)
+    tag = etag(database.instance_id, version, total)
+    if matches_etag(request, tag):
+        return not_modified(tag)
+    
+    try:
+        items, next_cursor = await database.run(
+            search_encoded_listings, filters, ranges, sort, limit, cursor, photos is PhotoMode.THUMBNAILS
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    
+    return EncodedJSONResponse(json_object([
+        ("items", json_array(items)),
+        ("nextCursor", encode_json(next_cursor)),
+        ("approximateTotal", encode_json(total)),
+    ]), headers={"ETag": tag})
+
+
+@router.get(
+    "/listings/changes",
+    response_model=ListingFeedPage,
+    summary="Listing Changes",
+    description="Get the listings created, updated and deleted since a sequence number",
+    tags=["Listings"]
+)
+async def listing_changes(
+    since: Optional[int] = Query(
+        None, ge=0, description="Sequence number returned by the previous call; omit to get the current one"
+    ),
+    database: AsyncInMemoryDatabase = Depends(get_database_dependency)
+) -> ListingFeedPage:
+    """
+    Get the listing changes since a sequence number.
+    
+    Lets clients keep a copy of the listings up to date at the cost of what
+    changed rather than of reading every listing again: get the current
+    sequence number (no ``since``), read the listings, then poll with the
+    ``seq`` of each response. Changes read twice are harmless, as every
+    change carries the whole listing.
+    
+    Returns:
+        ListingFeedPage: Changes since ``since``, and the sequence number
+            to poll from next
+            
+    Raises:
+        HTTPException: 410 if the changes since ``since`` are no longer kept
+            or the listings were replaced; the client has to read the
+            listings again, starting over
+    """
+    if since is None:
+        return FastJSONResponse({"changes": [], "seq": database.snapshot().version})
+    changes, seq = await database.changes_since(since, "listings")
+    if changes is None or any(change["type"] == "reset" for change in changes):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Changes no longer kept; read the listings again")
+    return FastJSONResponse({
+        "changes": [
+            {
+                "seq": change["seq"],
+                "type": change["type"],
+                "id": change["id"],
+                "listing": to_listing(change["record"]) if change["type"] == "put" else None,
+            }
+            for change in changes
+        ],
+        "seq": seq,
+    })
+
+
+@router.get(
+    "/listings/{listing_id}",
+    response_model=ListingRecord,
+    summary="Get Listing",
+    description="Get a single listing by its ID",
+    tags=["Listings"]
+)
+async def get_listing(
+    listing_id: str,
+    request: Request,
+    database: AsyncInMemoryDatabase = Depends(get_database_dependency)
+) -> ListingRecord:
+    """
+    Get a listing by ID.
+    
+    The listing is tagged with its version; a request with a matching
+    ``If-None-Match`` is answered with 304 before reading it.
+    
+    Returns:
+        ListingRecord: The listing
+        
+    Raises:
+        HTTPException: If no listing has this ID
+    """
+    version = database.record_version("listings", listing_id)
+    if version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
+    tag = etag(database.instance_id, version)
+    if matches_etag(request, tag):
+        return not_modified(tag)
+    
+    cache = database.fragment_cache("listings")
+    token = 0 if cache is None else cache.token()
+    record = await database.get_by_id("listings", listing_id, view=True)
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
+    return EncodedJSONResponse(encode_listings([record], cache=cache, token=token)[0], headers={"ETag": tag})
+
+
+@router.post(
+    "/listings/bulk",
+    response_model=BulkWriteResponse,
+    summary="Bulk Write Listings",
+    description="Create, update and delete many listings in a single write",
+    tags=["Listings"],
+    dependencies=[Depends(verify_api_key)]
+)
+async def bulk_write_listings(
+    request: BulkListingRequest,
+    database: AsyncInMemoryDatabase = Depends(get_database_dependency)
+) -> BulkWriteResponse:
+    """
+    Apply a batch of listing writes.
+    
+    The whole batch takes the database writer lock once, off the event
+    loop, and is published as one snapshot, so searches see all of it or
+    none of it. Listings to create are stored in the shape ``seed_listings``
+    uses, and only the fields in ``ListingChanges`` can be updated.
+    
+    Returns:
+        BulkWriteResponse: Per-item results, in request order
+    """
+    results = await database.bulk_write(
+        "listings",
+        create=[stored_listing(listing.model_dump(by_alias=True, mode="json")) for listing in request.create],
+        update=[(item.id, _stored_changes(item.changes)) for item in request.update],
+        delete=request.delete
+    )
+    return FastJSONResponse({
+        "created": [record["id"] for record in results["created"]],
+        "updated": [record is not None for record in results["updated"]],
+        "deleted": results["deleted"],
+    })
+
+
+@router.post(
+    "/listings/import",
+    response_model=ImportResponse,
+    summary="Import Listings",
+    description="Upsert listings from a newline-delimited JSON or JSON array body, committed in chunks",
+    tags=["Listings"],
+    dependencies=[Depends(verify_api_key)]
+)
+async def import_listings(
+    request: Request,
+    database: AsyncInMemoryDatabase = Depends(get_database_dependency)
+) -> ImportResponse:
+    """
+    Import a listing feed.
+    
+    The body holds listings in the camelCase seed shape. It is parsed as it
+    arrives and committed in chunks, so a feed of any size is imported in
+    bounded memory, and searches keep running between chunks. Invalid
+    listings are skipped and reported.
+    
+    Returns:
+        ImportResponse: Counts and the first skipped listings
+    """
+    report = await import_listings_async(database, request.stream())
+    return FastJSONResponse(report.to_dict())
@@ -6,6 +6,7 @@ This module contains the ping endpoint for health checks and connectivity testin
 
 from datetime import datetime
 from fastapi import APIRouter, Depends
+from ..responses import FastJSONResponse
 from ...models.schemas import PingResponse
 from ...utils.helpers import format_timestamp
 
@@ -29,10 +30,10 @@ async def ping() -> PingResponse:
     Returns:
         PingResponse: Health check response with message and timestamp
     """
-    return PingResponse(
+    return FastJSONResponse(PingResponse(
         message="pong",
         timestamp=format_timestamp()
-    )
+    ))
 
 
 @router.get(
@@ -59,7 +60,7 @@ async def health_check() -> PingResponse:
     # - System resources
     # - Configuration validity
     
-    return PingResponse(
+    return FastJSONResponse(PingResponse(
         message="healthy",
         timestamp=format_timestamp()
-    ) 
\ No newline at end of file
+    )) 
\ No newline at end of file
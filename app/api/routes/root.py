@@ -39,6 +39,8 @@ async def root():
         "endpoints": {
             "health_check": f"{settings.api_prefix}/ping",
             "detailed_health": f"{settings.api_prefix}/health",
+            "listings": f"{settings.api_prefix}/listings",
+            "export": f"{settings.api_prefix}/export",
             "documentation": settings.docs_url,
             "redoc": settings.redoc_url
         }
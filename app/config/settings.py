@@ -49,6 +49,37 @@ class Settings(BaseSettings):
     # Database settings (for future use)
     database_url: Optional[str] = None
     
+    # Directory for the database write-ahead log and snapshots; the
+    # database is kept in memory only when unset
+    data_dir: Optional[str] = None
+    # Make every write wait until its log entry is fsynced
+    data_fsync: bool = True
+    # Seconds between background database snapshots
+    checkpoint_interval: float = 300.0
+    # Directory through which worker processes share one copy of the
+    # listings; each worker keeps its own copy when unset
+    shared_dir: Optional[str] = None
+    
+    # Base URL of listing photos; a photo's URLs are this followed by its
+    # ID, with ``_standard`` or ``_thumbnail`` appended for the smaller sizes
+    photo_base_url: str = "https://storage.googleapis.com/assets-terranova-qa-module-core/listings/"
+    # File the converted seed listings are kept in (see ``app.services.seed``);
+    # ``listings-api/listings.snap`` in the user cache directory when unset
+    seed_artifact_path: Optional[str] = None
+    
+    # Bytes of responses the response cache keeps in memory; 0 disables it
+    response_cache_bytes: int = 64 * 1024 * 1024
+    
+    # Encodings responses are compressed with, best first, among those the
+    # client accepts; compression is off when empty
+    compression_encodings: List[str] = ["br", "zstd", "gzip"]
+    # Smallest body compressed, in bytes
+    compression_min_size: int = 1024
+    # Compression level of each encoding
+    brotli_level: int = 4
+    zstd_level: int = 3
+    gzip_level: int = 6
+    
     @field_validator("environment")
     def validate_environment(cls, v: str) -> str:
         """Validate environment setting."""
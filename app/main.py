@@ -12,12 +12,18 @@ This module contains the main FastAPI application setup including:
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from .config.settings import get_settings
-from .api.routes import ping, root
+from .api.cache import CacheRule, ResponseCacheMiddleware
+from .api.compression import CompressionMiddleware, ResponseCompression
+from .api.responses import FastJSONResponse
+from .api.routes import export, listings, ping, root
+from .services.async_database import get_async_database
+from .services.database import get_database
+from .services.persistence import Persistence
+from .services.shared import SharedCollection
 from .utils.helpers import create_error_response
 
 
@@ -37,10 +43,35 @@ async def lifespan(app: FastAPI):
     print(f"🔧 Debug mode: {get_settings().debug}")
     print(f"🌐 Server will run on: http://{get_settings().host}:{get_settings().port}")
     
+    settings = get_settings()
+    database = get_database()
+    if settings.data_dir:
+        # Restore the data written before the last shutdown or crash
+        database.attach(Persistence(
+            settings.data_dir,
+            fsync=settings.data_fsync,
+            checkpoint_interval=settings.checkpoint_interval
+        ))
+        print(f"💾 Database restored from {settings.data_dir} (version {database.snapshot().version})")
+    
+    def seed():
+        # Seed sample listings so the listings API has data to serve,
+        # keeping restored listings
+        if not settings.data_dir or not database.count("listings"):
+            database.seed_listings()
+    
+    if settings.shared_dir:
+        # Only the first worker seeds; the others map what it published
+        database.share(SharedCollection(settings.shared_dir, "listings"), initialize=seed)
+        print(f"🔗 Listings shared through {settings.shared_dir}")
+    else:
+        seed()
+    
     yield
     
     # Shutdown events
     print("🛑 Shutting down FastAPI Backend...")
+    database.close()
 
 
 def create_app() -> FastAPI:
@@ -60,9 +91,38 @@ def create_app() -> FastAPI:
         docs_url=settings.docs_url,
         redoc_url=settings.redoc_url,
         debug=settings.debug,
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse
     )
     
+    compression = ResponseCompression(
+        settings.compression_encodings,
+        levels={"br": settings.brotli_level, "zstd": settings.zstd_level, "gzip": settings.gzip_level},
+        min_size=settings.compression_min_size
+    )
+    
+    # Cache the responses of the read endpoints, compressed once per version;
+    # added before CORS so that CORS headers are set per request rather
+    # than cached
+    app.add_middleware(
+        ResponseCacheMiddleware,
+        database=get_async_database(),
+        budget=settings.response_cache_bytes,
+        compression=compression,
+        rules=[
+            CacheRule(app.openapi_url, ttl=3600),
+            CacheRule(f"{settings.api_prefix}/listings", ttl=30, stale=30, tags=["listings"]),
+            # Changes are read from the feed, which tags do not version
+            CacheRule(f"{settings.api_prefix}/listings/changes", ttl=0),
+            CacheRule(
+                f"{settings.api_prefix}/listings/{{listing_id}}", ttl=300, stale=60, tags=["listings:{listing_id}"]
+            ),
+        ]
+    )
+    
+    # Compress the responses the cache did not
+    app.add_middleware(CompressionMiddleware, compression=compression)
+    
     # Configure CORS middleware
     app.add_middleware(
         CORSMiddleware,
@@ -79,6 +139,18 @@ def create_app() -> FastAPI:
         tags=["API"]
     )
     
+    app.include_router(
+        listings.router,
+        prefix=settings.api_prefix,
+        tags=["API"]
+    )
+    
+    app.include_router(
+        export.router,
+        prefix=settings.api_prefix,
+        tags=["API"]
+    )
+    
     # Include root router (no prefix for root endpoints)
     app.include_router(
         root.router,
@@ -89,7 +161,7 @@ def create_app() -> FastAPI:
     @app.exception_handler(StarletteHTTPException)
     async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         """Handle HTTP exceptions."""
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=exc.status_code,
             content=create_error_response(
                 message=str(exc.detail),
@@ -100,7 +172,7 @@ def create_app() -> FastAPI:
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
         """Handle request validation errors."""
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=422,
             content=create_error_response(
                 message="Request validation error",
@@ -112,7 +184,7 @@ def create_app() -> FastAPI:
     @app.exception_handler(Exception)
     async def general_exception_handler(request: Request, exc: Exception):
         """Handle general exceptions."""
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content=create_error_response(
                 message="Internal server error",
@@ -8,7 +8,8 @@ data serialization, and API documentation.
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Union
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
+from pydantic_core import PydanticCustomError
 
 
 class PingResponse(BaseModel):
@@ -171,6 +172,14 @@ class PropertyType(str, Enum):
     END_TERRACE = "end-terrace"
 
 
+class PhotoMode(str, Enum):
+    """
+    Photo payload enumeration for listing searches.
+    """
+    ALL = "all"
+    THUMBNAILS = "thumbnails"
+
+
 class Photo(BaseModel):
     """
     Photo model for listing images.
@@ -195,6 +204,19 @@ class Photo(BaseModel):
         }
 
 
+class PhotoThumbnail(BaseModel):
+    """
+    Photo model for list views, with only the thumbnail URL.
+    """
+    thumbnail_url: str = Field(..., alias="thumbnailURL", description="Thumbnail image URL")
+    mime_type: str = Field(..., alias="mimeType", description="Image MIME type")
+    
+    class Config:
+        """Pydantic configuration."""
+        allow_population_by_field_name = True
+        extra = "forbid"
+
+
 class AddressDetails(BaseModel):
     """
     Address details model for property locations.
@@ -308,6 +330,210 @@ class ListingRecord(BaseModel):
         }
 
 
+class ListingSummary(ListingRecord):
+    """
+    Listing model for list views, with only the thumbnail of each photo.
+    """
+    photos: List[PhotoThumbnail] = Field(..., description="Property photo thumbnails")
+
+
+class ListingPage(BaseModel):
+    """
+    Listing search response model.
+    
+    Contains one page of listings, the cursor of the next page and an
+    approximate count of all matching listings. Listings are
+    ``ListingSummary`` items when only photo thumbnails were requested.
+    """
+    items: List[Union[ListingRecord, ListingSummary]] = Field(..., description="Listings on this page")
+    next_cursor: Optional[str] = Field(None, alias="nextCursor", description="Cursor of the next page, null on the last page")
+    approximate_total: int = Field(
+        ..., alias="approximateTotal", description="Number of matching listings; may be a few seconds stale"
+    )
+    
+    class Config:
+        """Pydantic configuration."""
+        allow_population_by_field_name = True
+        schema_extra = {
+            "example": {
+                "items": [],
+                "nextCursor": "eyJzb3J0IjoicHJpY2VfaW5fY2VudHMiLCJrZXkiOlsxMjUwMDAwMF0sImlkIjoiMTg3In0",
+                "approximateTotal": 24
+            }
+        }
+
+
+class ListingChanges(BaseModel):
+    """
+    Changes to a stored listing.
+    
+    Contains the stored (snake_case) listing fields that may be changed;
+    fields left out are kept, and only the fields sent are applied. IDs
+    and timestamps cannot be changed, and fields other than
+    ``made_visible_at`` cannot be cleared: an explicit null is rejected.
+    """
+    development_name: Optional[str] = Field(None, description="Development name")
+    address_line1: Optional[str] = Field(None, description="First line of address")
+    address_line2: Optional[str] = Field(None, description="Second line of address")
+    post_town: Optional[str] = Field(None, description="City name")
+    post_code: Optional[str] = Field(None, description="Full postcode")
+    shortened_post_code: Optional[str] = Field(None, description="Shortened postcode")
+    country: Optional[str] = Field(None, description="Country name")
+    region: Optional[Region] = Field(None, description="Region")
+    property_type: Optional[PropertyType] = Field(None, description="Property type")
+    bedrooms: Optional[int] = Field(None, description="Number of bedrooms")
+    bathrooms: Optional[int] = Field(None, description="Number of bathrooms")
+    size_sq_ft: Optional[int] = Field(None, description="Property size in square feet")
+    price_in_cents: Optional[int] = Field(None, description="Property price in cents")
+    minimum_deposit_in_cents: Optional[int] = Field(None, description="The minimum deposit required to secure the property")
+    estimated_deposit_in_cents: Optional[int] = Field(None, description="The estimated deposit required after fees")
+    rental_income_in_cents: Optional[int] = Field(None, description="Monthly rental income in cents")
+    is_tenanted: Optional[bool] = Field(None, description="Whether the property is rented out")
+    is_cash_only: Optional[bool] = Field(None, description="Whether property is cash only")
+    is_new_build: Optional[bool] = Field(None, description="Whether the property is under construction")
+    is_share_sale: Optional[bool] = Field(None, description="Whether a share of the property is sold")
+    is_getground_company: Optional[bool] = Field(None, description="Whether the listing is sold as part of a company")
+    is_featured: Optional[bool] = Field(None, description="Whether the listing is featured")
+    description: Optional[str] = Field(None, description="Property description")
+    photos: Optional[List[Photo]] = Field(None, description="Property photos")
+    gross_yield: Optional[float] = Field(None, description="Annual rental income divided by the purchase price")
+    made_visible_at: Optional[str] = Field(None, description="ISO format visibility timestamp")
+    
+    @field_validator("*", mode="before")
+    def reject_null(cls, v: Any, info: ValidationInfo) -> Any:
+        """Reject explicit nulls for fields that cannot be cleared."""
+        if v is None and info.field_name != "made_visible_at":
+            raise PydanticCustomError("null_value", "{field} cannot be null", {"field": info.field_name})
+        return v
+    
+    class Config:
+        """Pydantic configuration."""
+        extra = "forbid"
+
+
+class BulkListingUpdate(BaseModel):
+    """
+    One listing update in a bulk write.
+    
+    Contains the stored ID of the listing and the fields to change.
+    """
+    id: str = Field(..., description="Stored ID of the listing to update")
+    changes: ListingChanges = Field(..., description="Stored listing fields to set")
+
+
+class BulkListingRequest(BaseModel):
+    """
+    Request model for a bulk listing write.
+    
+    Contains listings to create, update and delete, all applied as a single
+    write. Listings to create use the ``ListingRecord`` shape, as returned by
+    the search; they are stored under new IDs, keeping theirs as
+    ``listing_id``. Updates and deletes use the stored IDs and field names.
+    """
+    create: List[ListingRecord] = Field(default_factory=list, description="Listings to create")
+    update: List[BulkListingUpdate] = Field(default_factory=list, description="Listings to update")
+    delete: List[str] = Field(default_factory=list, description="Stored IDs of listings to delete")
+    
+    class Config:
+        """Pydantic configuration."""
+        schema_extra = {
+            "example": {
+                "create": [ListingRecord.Config.schema_extra["example"]],
+                "update": [{"id": "187", "changes": {"price_in_cents": 12000000}}],
+                "delete": ["185"]
+            }
+        }
+
+
+class BulkWriteResponse(BaseModel):
+    """
+    Bulk write response model.
+    
+    Contains one result per requested item, in request order.
+    """
+    created: List[str] = Field(..., description="Stored IDs of the created listings")
+    updated: List[bool] = Field(..., description="Whether each listing to update was found")
+    deleted: List[bool] = Field(..., description="Whether each listing to delete was found")
+    
+    class Config:
+        """Pydantic configuration."""
+        schema_extra = {
+            "example": {
+                "created": ["2f1c7a52-5be4-4c57-9c6e-1f4d3f5e8a90"],
+                "updated": [True],
+                "deleted": [False]
+            }
+        }
+
+
+class ImportFailure(BaseModel):
+    """
+    One listing skipped by an import.
+    
+    Contains the listing's position in the feed, its ID if it had one, and
+    why it was skipped.
+    """
+    position: int = Field(..., description="1-based position of the listing in the feed")
+    id: Optional[Any] = Field(None, description="ID of the listing, if it had one")
+    error: str = Field(..., description="Why the listing was skipped")
+
+
+class ImportResponse(BaseModel):
+    """
+    Listing import response model.
+    
+    Contains the outcome of an import and the first listings it skipped.
+    """
+    read: int = Field(..., description="Listings read from the feed, valid or not")
+    imported: int = Field(..., description="Listings created or replaced")
+    failed: int = Field(..., description="Listings skipped as invalid")
+    errors: List[ImportFailure] = Field(..., description="The first skipped listings, in feed order")
+    
+    class Config:
+        """Pydantic configuration."""
+        schema_extra = {
+            "example": {
+                "read": 3,
+                "imported": 2,
+                "failed": 1,
+                "errors": [{"position": 2, "id": 187, "error": "bedrooms: Field required"}]
+            }
+        }
+
+
+class ListingFeedChange(BaseModel):
+    """
+    One listing change in the change feed.
+    
+    Contains the sequence number of the write, the stored ID of the listing
+    and, unless it was deleted, the listing as written.
+    """
+    seq: int = Field(..., description="Sequence number of the write")
+    type: str = Field(..., description="'put' for a created or replaced listing, 'delete' for a deleted one")
+    id: str = Field(..., description="Stored ID of the listing")
+    listing: Optional[ListingRecord] = Field(None, description="The listing, null when deleted")
+
+
+class ListingFeedPage(BaseModel):
+    """
+    Listing change feed response model.
+    
+    Contains the listing changes written after the requested sequence
+    number, oldest first, and the sequence number to ask from next.
+    """
+    changes: List[ListingFeedChange] = Field(..., description="Listing changes, oldest first")
+    seq: int = Field(..., description="Sequence number to ask for the next changes from")
+    
+    class Config:
+        """Pydantic configuration."""
+        schema_extra = {
+            "example": {
+                "changes": [{"seq": 42, "type": "delete", "id": "187", "listing": None}],
+                "seq": 42
+            }
+        }
+
+
 class CreateUserRequest(BaseModel):
     """
     Request model for creating a new user.
@@ -0,0 +1,369 @@
+"""
+Async Database Service
+
+This module provides an asyncio-native facade over the in-memory database
+for use from ``async def`` request handlers.
+
+``InMemoryDatabase`` reads are lock-free, but scans still run for as long as
+the collection is large, and writers serialize on a ``threading.Lock``.
+Called directly from a coroutine, either one stalls the event loop and every
+other request on the worker. The facade therefore:
+
+- serves point reads (by ID, cached counts) inline, since they are O(1) or
+  O(log n);
+- runs scans, aggregates, exports and imports on a small thread pool;
+- queues writers on an ``asyncio.Lock`` before they reach the thread pool,
+  so waiting writers hold neither a thread nor the event loop;
+- offers ``scan``, an async iterator over a snapshot that hands control
+  back to the event loop every ``SCAN_BATCH`` records, and ``export_ndjson``,
+  which encodes an export in batches of ``EXPORT_BATCH`` records on the
+  thread pool;
+- serves the change feed (``changes_since``, ``subscribe``) inline, as it
+  costs the number of changes rather than the size of the data.
+"""
+
+import asyncio
+import json
+from concurrent.futures import Executor, ThreadPoolExecutor
+from weakref import WeakKeyDictionary
+from functools import partial
+from itertools import islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from app.services.changes import ChangeSubscription
+from app.services.database import DatabaseSnapshot, InMemoryDatabase, get_database
+from app.services.fragments import FragmentCache
+
+
+def _encode_lines(entries: Iterator[Dict[str, Any]], count: int) -> bytes:
+    """Encode up to ``count`` entries from ``entries`` as newline-delimited JSON."""
+    return "".join(
+        json.dumps(entry, separators=(",", ":")) + "\n" for entry in islice(entries, count)
+    ).encode("utf-8")
+
+
+class AsyncInMemoryDatabase:
+    """
+    Asyncio facade over an ``InMemoryDatabase``.
+    
+    Methods mirror the database's, as coroutines. The wrapped database can
+    still be used directly (e.g. by synchronous code and tests); both see
+    the same data.
+    """
+    
+    # Records read between two yields to the event loop in ``scan``
+    SCAN_BATCH = 1024
+    
+    # Threads running offloaded database calls
+    WORKERS = 4
+    
+    # Records encoded per chunk of ``export_ndjson``
+    EXPORT_BATCH = 1024
+    
+    def __init__(self, database: InMemoryDatabase, executor: Optional[Executor] = None):
+        """
+        Initialize the facade.
+        
+        Args:
+            database: Database to wrap
+            executor: Executor for offloaded calls. Defaults to a private
+                pool of ``WORKERS`` threads, created on first use.
+        """
+        self.database = database
+        self._executor = executor
+        # One write queue per event loop, created on first use
+        self._write_locks: "WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = WeakKeyDictionary()
+    
+    def _get_executor(self) -> Executor:
+        """Get the executor for offloaded calls, creating the default pool if needed."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.WORKERS, thread_name_prefix="database")
+        return self._executor
+    
+    async def _offload(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``func(*args, **kwargs)`` in the executor without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), partial(func, *args, **kwargs))
+    
+    async def _write(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Queue on the asyncio write lock, then run a write in the executor."""
+        loop = asyncio.get_running_loop()
+        lock = self._write_locks.get(loop)
+        if lock is None:
+            lock = self._write_locks[loop] = asyncio.Lock()
+        async with lock:
+            return await self._offload(func, *args, **kwargs)
+    
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run ``func(database, *args, **kwargs)`` in the executor.
+        
+        For service functions that take the synchronous database and may
+        scan, such as the listing search.
+        
+        Args:
+            func: Function taking the wrapped database first
+            
+        Returns:
+            The result of ``func``
+        """
+        return await self._offload(func, self.database, *args, **kwargs)
+    
+    def snapshot(self) -> DatabaseSnapshot:
+        """
+        Get a consistent, read-only view of the current database state.
+        
+        Returns:
+            DatabaseSnapshot: Current snapshot; unaffected by later writes
+        """
+        return self.database.snapshot()
+    
+    @property
+    def instance_id(self) -> str:
+        """ID of the wrapped database instance. See ``InMemoryDatabase.instance_id``."""
+        return self.database.instance_id
+    
+    def collection_version(self, collection: str) -> int:
+        """Get the version that last wrote a collection. See ``InMemoryDatabase.collection_version``."""
+        return self.database.collection_version(collection)
+    
+    def record_version(self, collection: str, record_id: str) -> Optional[int]:
+        """Get the version that last wrote a record. See ``InMemoryDatabase.record_version``."""
+        return self.database.record_version(collection, record_id)
+    
+    async def get_by_id(self, collection: str, record_id: str, view: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get a record by ID from a collection, without leaving the event loop.
+        
+        See ``InMemoryDatabase.get_by_id``.
+        """
+        return self.database.get_by_id(collection, record_id, view)
+    
+    async def count(
+        self,
+        collection: str,
+        filters: Optional[Dict[str, Any]] = None,
+        ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        approximate: bool = False
+    ) -> int:
+        """
+        Count the records matching equality and range filters.
+        
+        Unfiltered counts are answered inline; filtered ones may scan and
+        run in the executor. See ``InMemoryDatabase.count``.
+        """
+        if not filters and not ranges:
+            return self.database.count(collection)
+        return await self._offload(self.database.count, collection, filters, ranges, approximate)
+    
+    async def get_all(self, collection: str, view: bool = False) -> Any:
+        """Get all records from a collection. See ``InMemoryDatabase.get_all``."""
+        if view:
+            # Views are built in O(1) and read lazily
+            return self.database.get_all(collection, view=True)
+        return await self._offload(self.database.get_all, collection)
+    
+    async def find(self, collection: str, filters: Dict[str, Any], view: bool = False) -> List[Dict[str, Any]]:
+        """Find records matching filters. See ``InMemoryDatabase.find``."""
+        return await self._offload(self.database.find, collection, filters, view)
+    
+    async def find_range(
+        self,
+        collection: str,
+        ranges: Dict[str, Tuple[Any, Any]],
+        filters: Optional[Dict[str, Any]] = None,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        view: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Find records matching range and equality filters. See ``InMemoryDatabase.find_range``."""
+        return await self._offload(
+            self.database.find_range, collection, ranges, filters, order_by, descending, limit, view
+        )
+    
+    async def get_page(
+        self,
+        collection: str,
+        limit: int,
+        order_by: str = "id",
+        descending: bool = False,
+        after: Optional[Tuple[Any, str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        view: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, str]]]:
+        """Get one page of records using keyset pagination. See ``InMemoryDatabase.get_page``."""
+        return await self._offload(
+            self.database.get_page, collection, limit, order_by, descending, after, filters, view
+        )
+    
+    async def aggregate(
+        self,
+        collection: str,
+        field: str,
+        func: str = "count",
+        filters: Optional[Dict[str, Any]] = None,
+        ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        group_by: Optional[str] = None
+    ) -> Any:
+        """Aggregate a field over matching records. See ``InMemoryDatabase.aggregate``."""
+        return await self._offload(self.database.aggregate, collection, field, func, filters, ranges, group_by)
+    
+    async def export_data(self) -> Dict[str, Any]:
+        """Export all data. See ``InMemoryDatabase.export_data``."""
+        return await self._offload(self.database.export_data)
+    
+    async def scan(
+        self,
+        collection: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        """
+        Iterate read-only views of the records matching ``filters``.
+        
+        The scan reads one snapshot, so it is consistent however many
+        writes happen meanwhile, and yields to the event loop after every
+        ``SCAN_BATCH`` records so other requests keep being served.
+        
+        Args:
+            collection: Name of the collection to scan
+            filters: Dictionary of field-value pairs to match
+            
+        Yields:
+            Read-only record views, in collection order
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        records = self.snapshot().get_all(collection, view=True)
+        filters = list((filters or {}).items())
+        for start in range(0, len(records), self.SCAN_BATCH):
+            for record in records[start:start + self.SCAN_BATCH]:
+                if all(record.get(key) == value for key, value in filters):
+                    yield record
+            await asyncio.sleep(0)
+    
+    def export_ndjson(self, collections: Optional[Iterable[str]] = None) -> AsyncIterator[bytes]:
+        """
+        Stream an export of one snapshot as newline-delimited JSON.
+        
+        Every line is an entry of ``InMemoryDatabase.iter_export``. Entries
+        are encoded ``EXPORT_BATCH`` at a time on the thread pool, and the
+        next batch only once the previous chunk was consumed, so a slow
+        client holds one chunk in memory rather than the whole export.
+        
+        Args:
+            collections: Names of the collections to export. Defaults to all
+                of them.
+                
+        Returns:
+            Async iterator of UTF-8 encoded chunks of whole lines
+            
+        Raises:
+            KeyError: If a collection doesn't exist, raised before streaming
+        """
+        entries = self.database.iter_export(collections)
+        
+        async def chunks() -> AsyncIterator[bytes]:
+            while True:
+                chunk = await self._offload(_encode_lines, entries, self.EXPORT_BATCH)
+                if not chunk:
+                    return
+                yield chunk
+        
+        return chunks()
+    
+    async def changes_since(
+        self,
+        seq: int,
+        collection: Optional[str] = None
+    ) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+        """Get the changes written after sequence number ``seq``. See ``InMemoryDatabase.changes_since``."""
+        return self.database.changes_since(seq, collection)
+    
+    def subscribe(
+        self,
+        since: Optional[int] = None,
+        collection: Optional[str] = None,
+        maxsize: Optional[int] = None
+    ) -> ChangeSubscription:
+        """Subscribe to the changes written from now on. See ``InMemoryDatabase.subscribe``."""
+        return self.database.subscribe(since, collection, maxsize)
+    
+    def fragment_cache(self, collection: str) -> Optional[FragmentCache]:
+        """Get the cache of serialized records of a collection. See ``InMemoryDatabase.fragment_cache``."""
+        return self.database.fragment_cache(collection)
+    
+    async def create(self, collection: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new record. See ``InMemoryDatabase.create``."""
+        return await self._write(self.database.create, collection, data)
+    
+    async def update(self, collection: str, record_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update an existing record. See ``InMemoryDatabase.update``."""
+        return await self._write(self.database.update, collection, record_id, data)
+    
+    async def delete(self, collection: str, record_id: str) -> bool:
+        """Delete a record. See ``InMemoryDatabase.delete``."""
+        return await self._write(self.database.delete, collection, record_id)
+    
+    async def create_many(self, collection: str, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create several records in one write. See ``InMemoryDatabase.create_many``."""
+        return await self._write(self.database.create_many, collection, list(items))
+    
+    async def update_many(
+        self,
+        collection: str,
+        updates: Iterable[Tuple[str, Dict[str, Any]]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Update several records in one write. See ``InMemoryDatabase.update_many``."""
+        return await self._write(self.database.update_many, collection, list(updates))
+    
+    async def delete_many(self, collection: str, record_ids: Iterable[str]) -> List[bool]:
+        """Delete several records in one write. See ``InMemoryDatabase.delete_many``."""
+        return await self._write(self.database.delete_many, collection, list(record_ids))
+    
+    async def bulk_write(
+        self,
+        collection: str,
+        create: Iterable[Dict[str, Any]] = (),
+        update: Iterable[Tuple[str, Dict[str, Any]]] = (),
+        delete: Iterable[str] = (),
+        upsert: Iterable[Dict[str, Any]] = ()
+    ) -> Dict[str, List[Any]]:
+        """Apply a batch of writes as a single write. See ``InMemoryDatabase.bulk_write``."""
+        return await self._write(
+            self.database.bulk_write, collection, list(create), list(update), list(delete), list(upsert)
+        )
+    
+    async def refresh(self):
+        """
+        Load the shared collections other processes have written, off the event loop.
+        
+        Whether anything is new is checked on the event loop, which costs
+        one memory read per shared collection; loading it is queued as a
+        write. See ``InMemoryDatabase.refresh``.
+        """
+        if self.database.is_stale():
+            await self._write(self.database.refresh)
+    
+    async def import_data(self, data: Dict[str, Any]):
+        """Import data from dictionary. See ``InMemoryDatabase.import_data``."""
+        await self._write(self.database.import_data, data)
+    
+    async def reset(self):
+        """Reset database to initial state. See ``InMemoryDatabase.reset``."""
+        await self._write(self.database.reset)
+
+
+# Facade over the global database instance
+async_database = AsyncInMemoryDatabase(get_database())
+
+
+def get_async_database() -> AsyncInMemoryDatabase:
+    """
+    Get the asyncio facade over the global database instance.
+    
+    Returns:
+        AsyncInMemoryDatabase: Database facade
+    """
+    return async_database
@@ -0,0 +1,388 @@
+"""
+Binary Snapshot Format
+
+This module contains the on-disk format of database snapshots: a single
+file holding every collection column by column, which is memory-mapped on
+load and decoded lazily.
+
+Layout (all integers in native byte order, sections 8-byte aligned)::
+
+    magic  b"IMDBSNP1"
+    u64    header size
+    header JSON: version, raw (non-record) collections, declared indexes,
+           and per record collection its row count and field sections
+    data   fixed-width field sections, then the string table
+    
+Each field of a collection is stored in one of these kinds:
+
+- ``int``: int64 values
+- ``float``: float64 values
+- ``bool``: one byte per value
+- ``str``: uint32 positions in the string table
+- ``json``: uint32 positions in the string table of JSON texts, for lists,
+  dictionaries and fields mixing types
+  
+A field missing from some records, or None in some, also has a presence
+section with one byte per row: ``ABSENT``, ``NULL`` or ``PRESENT``. The string
+table is shared by all collections and stores each distinct string once,
+as uint64 end offsets followed by the UTF-8 bytes.
+
+Loading a snapshot only parses the header. Records are decoded from the
+mapping when they are first read, so a large snapshot is ready to serve at
+once and records that are never read take no heap memory.
+"""
+
+import json
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+
+MAGIC = b"IMDBSNP1"
+
+# Presence of a field in a record
+ABSENT, NULL, PRESENT = 0, 1, 2
+
+# Array typecode of each field kind
+_TYPECODES = {"int": "q", "float": "d", "bool": "B", "str": "I", "json": "I"}
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+# Exact value type to the field kind storing it
+_KINDS = {bool: "bool", int: "int", float: "float", str: "str"}
+
+# Marks a field a record does not have
+_MISSING = object()
+
+
+def _kind_of(values: List[Any]) -> str:
+    """Get the narrowest field kind that stores every value (bar None and missing) exactly."""
+    # Collecting the exact types runs in C, unlike checking value by value
+    types = set(map(type, values))
+    types.discard(type(None))
+    types.discard(object)
+    if len(types) != 1:
+        return "json"
+    kind = _KINDS.get(types.pop(), "json")
+    if kind == "int":
+        present = [value for value in values if type(value) is int]
+        if min(present) < _INT64_MIN or max(present) > _INT64_MAX:
+            return "json"
+    return kind
+
+
+def _align(size: int) -> int:
+    """Round ``size`` up to a multiple of 8."""
+    return (size + 7) & ~7
+
+
+class _Writer:
+    """Collects the sections of a snapshot file and its string table."""
+    
+    def __init__(self):
+        """Initialize an empty data area."""
+        self.sections: List[bytes] = []
+        self.size = 0
+        self.strings: Dict[str, int] = {}
+    
+    def add(self, data: bytes) -> int:
+        """Append a section and return its offset in the data area."""
+        offset = self.size
+        self.sections.append(data)
+        padding = _align(len(data)) - len(data)
+        if padding:
+            self.sections.append(bytes(padding))
+        self.size += len(data) + padding
+        return offset
+    
+    def intern(self, text: str) -> int:
+        """Get the position of ``text`` in the string table, adding it if new."""
+        position = self.strings.get(text)
+        if position is None:
+            position = self.strings[text] = len(self.strings)
+        return position
+    
+    def add_field(self, values: List[Any]) -> Dict[str, Any]:
+        """Add the sections of one field and return its header entry."""
+        presence = bytes(
+            ABSENT if value is _MISSING else NULL if value is None else PRESENT
+            for value in values
+        )
+        kind = _kind_of(values)
+        if kind in ("str", "json"):
+            encode = self.intern if kind == "str" else (
+                lambda value: self.intern(json.dumps(value, separators=(",", ":")))
+            )
+            stored = [0 if value is None or value is _MISSING else encode(value) for value in values]
+        else:
+            stored = [0 if value is None or value is _MISSING else value for value in values]
+        
+        entry = {"kind": kind, "offset": self.add(array(_TYPECODES[kind], stored).tobytes()), "presence": None}
+        if presence.count(PRESENT) != len(values):
+            entry["presence"] = self.add(presence)
+        return entry
+    
+    def add_strings(self) -> Dict[str, int]:
+        """Add the string table and return its header entry."""
+        encoded = [text.encode("utf-8") for text in self.strings]
+        ends = array("Q")
+        end = 0
+        for data in encoded:
+            end += len(data)
+            ends.append(end)
+        return {
+            "count": len(encoded),
+            "ends": self.add(ends.tobytes()),
+            "data": self.add(b"".join(encoded)),
+        }
+
+
+def write_snapshot(
+    path: Path,
+    version: int,
+    collections: Mapping[str, Iterable[Mapping[str, Any]]],
+    values: Optional[Dict[str, Any]] = None,
+    indexes: Optional[Dict[str, Any]] = None
+):
+    """
+    Write a snapshot file.
+    
+    The file is written and fsynced under a temporary name, then renamed
+    to ``path``, so readers only ever see complete snapshots.
+    
+    Args:
+        path: File to write
+        version: Database version the snapshot holds
+        collections: Record collection name to its records, in slot order;
+            each is iterated once
+        values: Collections that do not hold records, as JSON-serializable
+            values
+        indexes: JSON-serializable index declarations to store alongside
+    """
+    writer = _Writer()
+    tables = {}
+    for name, records in collections.items():
+        # Split the records into columns in a single pass
+        columns: Dict[str, List[Any]] = {}
+        rows = 0
+        for record in records:
+            for field, value in record.items():
+                column = columns.get(field)
+                if column is None:
+                    column = columns[field] = [_MISSING] * rows
+                column.append(value)
+            rows += 1
+            if len(record) != len(columns):
+                for column in columns.values():
+                    if len(column) < rows:
+                        column.append(_MISSING)
+        tables[name] = {
+            "rows": rows,
+            "fields": {field: writer.add_field(column) for field, column in columns.items()},
+        }
+    header = json.dumps({
+        "version": version,
+        "byteorder": sys.byteorder,
+        "values": values or {},
+        "indexes": indexes or {},
+        "collections": tables,
+        "strings": writer.add_strings(),
+    }).encode("utf-8")
+    header += b" " * (_align(len(header)) - len(header))
+    
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "wb") as file:
+        file.write(MAGIC)
+        file.write(len(header).to_bytes(8, sys.byteorder))
+        file.write(header)
+        for section in writer.sections:
+            file.write(section)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class SnapshotFile:
+    """
+    Memory-mapped snapshot file.
+    
+    Only the header is parsed on open. The mapping stays open for as long
+    as the file or one of its tables is referenced, and stays readable if
+    the file is deleted meanwhile.
+    """
+    
+    def __init__(self, path: Path):
+        """
+        Open and map a snapshot file.
+        
+        Args:
+            path: File to open
+            
+        Raises:
+            ValueError: If the file is not a snapshot written on a machine
+                with the same byte order
+        """
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a database snapshot")
+        size = int.from_bytes(self._map[8:16], sys.byteorder)
+        header = json.loads(self._map[16:16 + size])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written with {header['byteorder']}-endian byte order")
+        self._data = memoryview(self._map)[16 + size:]
+        
+        self.version: int = header["version"]
+        self.values: Dict[str, Any] = header["values"]
+        self.indexes: Dict[str, Any] = header["indexes"]
+        strings = header["strings"]
+        self._string_ends = self._section(strings["ends"], "Q", strings["count"])
+        self._string_data = strings["data"]
+        # Decoded strings, filled in as they are read
+        self._strings: List[Optional[str]] = [None] * strings["count"]
+        self.tables = {
+            name: MappedTable(self, table["rows"], table["fields"])
+            for name, table in header["collections"].items()
+        }
+    
+    def _section(self, offset: int, typecode: str, count: int) -> memoryview:
+        """Get ``count`` values of ``typecode`` at ``offset`` of the data area."""
+        size = array(typecode).itemsize
+        return self._data[offset:offset + count * size].cast(typecode)
+    
+    def string(self, position: int) -> str:
+        """Get the string at ``position`` of the string table."""
+        text = self._strings[position]
+        if text is None:
+            start = self._string_ends[position - 1] if position else 0
+            end = self._string_ends[position]
+            data = self._string_data
+            text = self._strings[position] = str(self._data[data + start:data + end], "utf-8")
+        return text
+
+
+class MappedTable:
+    """
+    Read-only, lazily decoded record collection of a ``SnapshotFile``.
+    
+    Values of a field are decoded a range of rows at a time; ``rows``
+    builds plain record dictionaries and ``column`` a list of one field's
+    values.
+    """
+    
+    def __init__(self, snapshot: SnapshotFile, size: int, fields: Dict[str, Dict[str, Any]]):
+        """
+        Initialize the table.
+        
+        Args:
+            snapshot: File holding the table
+            size: Number of rows
+            fields: Field name to its header entry
+        """
+        self._snapshot = snapshot
+        self._size = size
+        self.fields = list(fields)
+        self._fields = fields
+        self._sparse = any(entry["presence"] is not None for entry in fields.values())
+    
+    def __len__(self) -> int:
+        """Return the number of rows."""
+        return self._size
+    
+    def _presence(self, field: str, start: int, stop: int) -> Optional[memoryview]:
+        """Get the presence bytes of ``field`` for rows ``start`` to ``stop``, if stored."""
+        offset = self._fields[field]["presence"]
+        if offset is None:
+            return None
+        return self._snapshot._section(offset, "B", self._size)[start:stop]
+    
+    def _values(self, field: str, start: int, stop: int, absent: Any) -> List[Any]:
+        """Decode ``field`` for rows ``start`` to ``stop``, with ``absent`` for missing fields."""
+        entry = self._fields[field]
+        kind = entry["kind"]
+        values = self._snapshot._section(entry["offset"], _TYPECODES[kind], self._size)[start:stop].tolist()
+        presence = self._presence(field, start, stop)
+        if presence is not None:
+            values = [
+                value if state == PRESENT else None if state == NULL else absent
+                for value, state in zip(values, presence)
+            ]
+        
+        if kind in ("str", "json"):
+            string = self._snapshot.string
+            decode = string if kind == "str" else lambda position: json.loads(string(position))
+            if presence is None:
+                return [decode(value) for value in values]
+            return [
+                decode(value) if state == PRESENT else value
+                for value, state in zip(values, presence)
+            ]
+        if kind == "bool":
+            return [value if value is None or value is absent else value == 1 for value in values]
+        return values
+    
+    def column(self, field: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """
+        Get the values of ``field`` for rows ``start`` to ``stop``.
+        
+        Args:
+            field: Field to read
+            start: First row (inclusive)
+            stop: Last row (exclusive), the end of the table by default
+            
+        Returns:
+            The values, None where a record does not have the field
+        """
+        stop = self._size if stop is None else stop
+        if field not in self._fields:
+            return [None] * (stop - start)
+        return self._values(field, start, stop, None)
+    
+    def numeric(self, field: str) -> Optional[Tuple[str, memoryview, Optional[memoryview]]]:
+        """
+        Get the stored form of a numeric or boolean field, without decoding it.
+        
+        Returns:
+            Tuple of the field kind (``int``, ``float`` or ``bool``), its
+            values (0 where not present) and its presence bytes (None if the
+            field is present in every row), or None for other fields
+        """
+        entry = self._fields.get(field)
+        if entry is None or entry["kind"] not in ("int", "float", "bool"):
+            return None
+        values = self._snapshot._section(entry["offset"], _TYPECODES[entry["kind"]], self._size)
+        return entry["kind"], values, self._presence(field, 0, self._size)
+    
+    def rows(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        """
+        Decode the records at rows ``start`` to ``stop``.
+        
+        Returns:
+            New record dictionaries, with their fields in stored order
+        """
+        fields = self.fields
+        columns = [self._values(field, start, stop, _MISSING) for field in fields]
+        if not self._sparse:
+            return [dict(zip(fields, values)) for values in zip(*columns)]
+        return [
+            {field: value for field, value in zip(fields, values) if value is not _MISSING}
+            for values in zip(*columns)
+        ]
+    
+    def project(self, fields: Sequence[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate records holding only ``fields``, without decoding the others.
+        
+        Fields a record does not have are None, as ``record.get`` would
+        return. Meant for building indexes over a table.
+        """
+        columns = [self.column(field) for field in fields]
+        return (dict(zip(fields, values)) for values in zip(*columns))
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate all records, decoding them a block at a time."""
+        for start in range(0, self._size, 1024):
+            yield from self.rows(start, min(start + 1024, self._size))
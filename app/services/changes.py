@@ -0,0 +1,295 @@
+"""
+Change Feed
+
+This module provides the change feed of the in-memory database. Every write
+is recorded under the version of the snapshot it published, which serves as
+its sequence number and only ever increases, as one change per record it
+wrote:
+
+- ``{"seq": ..., "collection": ..., "type": "put", "id": ..., "record": ...}``
+  for a created or replaced record, with a read-only view of it;
+- ``{"seq": ..., "collection": ..., "type": "delete", "id": ...}`` for a
+  deleted record;
+- ``{"seq": ..., "collection": ..., "type": "reset"}`` when the whole
+  collection was replaced (``import_data``, ``reset``, ``seed_listings``).
+  
+Pollers ask for the changes since the last sequence number they saw
+(``changes_since``) and get only those, so polling costs what changed
+rather than the size of the collection. Subscribers get changes pushed into
+a bounded asyncio queue (``subscribe``).
+
+Only the last ``RETENTION`` changes are kept. A poller further behind, or a
+subscriber whose queue fills up, has missed changes and must resync: read
+the collection again, then follow the feed from the version it was read at.
+A ``reset`` change calls for the same.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from types import MappingProxyType
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def _changes(seq: int, operations: Iterable[List[Any]]) -> List[Dict[str, Any]]:
+    """Get the changes of the write logged as ``operations`` (see ``InMemoryDatabase._replay``)."""
+    changes = []
+    for kind, *arguments in operations:
+        if kind == "put":
+            collection, record = arguments
+            changes.append({
+                "seq": seq, "collection": collection, "type": "put", "id": record["id"],
+                "record": MappingProxyType(record),
+            })
+        elif kind == "del":
+            collection, record_id = arguments
+            changes.append({"seq": seq, "collection": collection, "type": "delete", "id": record_id})
+        elif kind == "replace":
+            changes.append({"seq": seq, "collection": arguments[0], "type": "reset"})
+        elif kind == "load":
+            changes.extend(
+                {"seq": seq, "collection": collection, "type": "reset"}
+                for collection, records in arguments[0].items() if isinstance(records, list)
+            )
+    return changes
+
+
+class ChangeSubscription:
+    """
+    Bounded asyncio queue of the changes published after a sequence number.
+    
+    Made by ``ChangeFeed.subscribe``, and used from the event loop it was
+    made on. Iterating the subscription waits for the next change. A
+    subscriber too slow to keep its queue from filling up is dropped: its
+    queued changes are discarded and it gets a single
+    ``{"seq": ..., "type": "resync"}`` change, after which iteration ends.
+    """
+    
+    def __init__(
+        self,
+        feed: "ChangeFeed",
+        loop: asyncio.AbstractEventLoop,
+        seq: int,
+        collection: Optional[str],
+        maxsize: int
+    ):
+        """
+        Initialize the subscription.
+        
+        Args:
+            feed: Feed publishing to the subscription
+            loop: Event loop the subscription is used from
+            seq: Sequence number the subscription follows the feed from;
+                then that of the last change queued
+            collection: Only changes to this collection are queued; all by
+                default
+            maxsize: Changes the queue holds before the subscriber is dropped
+        """
+        self.seq = seq
+        self.collection = collection
+        self.dropped = False
+        self._feed = feed
+        self._loop = loop
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize)
+    
+    def _deliver(self, changes: List[Dict[str, Any]]):
+        """Queue ``changes``, dropping the subscriber if they do not fit. Runs on the event loop."""
+        if self.dropped:
+            return
+        for change in changes:
+            if self.collection is not None and change["collection"] != self.collection:
+                continue
+            if self._queue.full():
+                self._drop()
+                return
+            self._queue.put_nowait(change)
+            self.seq = change["seq"]
+    
+    def _drop(self):
+        """Discard the queued changes and queue the resync change. Runs on the event loop."""
+        self.close()
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait({"seq": self.seq, "type": "resync"})
+    
+    def close(self):
+        """Stop receiving changes; those already queued can still be read."""
+        self.dropped = True
+        self._feed._unsubscribe(self)
+    
+    async def get(self) -> Dict[str, Any]:
+        """Wait for the next change."""
+        return await self._queue.get()
+    
+    def __aiter__(self) -> "ChangeSubscription":
+        """Iterate the changes as they are published."""
+        return self
+    
+    async def __anext__(self) -> Dict[str, Any]:
+        """Wait for the next change, until the subscriber is dropped or closed."""
+        if self.dropped and self._queue.empty():
+            raise StopAsyncIteration
+        return await self._queue.get()
+
+
+class ChangeFeed:
+    """
+    Sequence-numbered log of the latest changes, published to subscribers.
+    
+    Writes are recorded with ``publish`` by the database, holding its writer
+    lock, so they arrive in sequence order. Reading the log takes a lock of
+    its own for as long as it takes to copy the changes asked for.
+    """
+    
+    # Changes kept for ``changes_since``
+    RETENTION = 10_000
+    
+    # Changes a subscriber's queue holds before it is dropped
+    QUEUE_SIZE = 1_000
+    
+    def __init__(self, seq: int = 0, retention: Optional[int] = None):
+        """
+        Initialize an empty feed.
+        
+        Args:
+            seq: Sequence number of the current state
+            retention: Changes kept for ``changes_since``. Defaults to
+                ``RETENTION``.
+        """
+        self._log: Deque[Dict[str, Any]] = deque(maxlen=retention or self.RETENTION)
+        self._seq = seq
+        # Oldest sequence number ``changes_since`` can follow the feed from
+        self._floor = seq
+        self._subscribers: Set[ChangeSubscription] = set()
+        self._lock = threading.Lock()
+    
+    @property
+    def seq(self) -> int:
+        """Sequence number of the latest write."""
+        return self._seq
+    
+    def publish(self, seq: int, operations: Iterable[List[Any]]):
+        """
+        Record the write that published version ``seq``, and pass it on to subscribers.
+        
+        Args:
+            seq: Version of the snapshot the write published
+            operations: The write as logged operations, see
+                ``InMemoryDatabase._replay``
+        """
+        changes = _changes(seq, operations)
+        with self._lock:
+            self._seq = seq
+            log = self._log
+            for change in changes:
+                if len(log) == log.maxlen:
+                    self._floor = log[0]["seq"]
+                log.append(change)
+            subscribers = list(self._subscribers) if changes else []
+        for subscriber in subscribers:
+            try:
+                subscriber._loop.call_soon_threadsafe(subscriber._deliver, changes)
+            except RuntimeError:
+                # Its event loop is closed
+                self._unsubscribe(subscriber)
+    
+    def reset(self, seq: int):
+        """
+        Forget every change, continuing from ``seq``.
+        
+        For a database restored to a state the log knows nothing of; every
+        poller and subscriber has to resync.
+        """
+        with self._lock:
+            self._log.clear()
+            self._seq = self._floor = seq
+            subscribers, self._subscribers = self._subscribers, set()
+        for subscriber in subscribers:
+            try:
+                subscriber._loop.call_soon_threadsafe(subscriber._drop)
+            except RuntimeError:
+                pass
+    
+    def changes_since(
+        self,
+        seq: int,
+        collection: Optional[str] = None
+    ) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+        """
+        Get the changes published after sequence number ``seq``.
+        
+        Costs the number of changes since ``seq``, whatever the size of the
+        collections.
+        
+        Args:
+            seq: Sequence number of the last change seen, or the version of
+                the snapshot the caller last read
+            collection: Only changes to this collection are returned; all by
+                default
+                
+        Returns:
+            Tuple of the changes, oldest first, and the sequence number to
+            ask from next. The changes are None when the caller has to
+            resync, as some were no longer kept or ``seq`` is ahead of the
+            feed (e.g. the database was restarted).
+        """
+        with self._lock:
+            latest = self._seq
+            if seq < self._floor or seq > latest:
+                return None, latest
+            changes = []
+            for change in reversed(self._log):
+                if change["seq"] <= seq:
+                    break
+                changes.append(change)
+        changes.reverse()
+        if collection is not None:
+            changes = [change for change in changes if change["collection"] == collection]
+        return changes, latest
+    
+    def subscribe(
+        self,
+        since: Optional[int] = None,
+        collection: Optional[str] = None,
+        maxsize: Optional[int] = None
+    ) -> ChangeSubscription:
+        """
+        Subscribe the running event loop to the changes published from now on.
+        
+        Args:
+            since: Also queue the kept changes published after this sequence
+                number, e.g. the version of a snapshot just read, so none
+                are missed in between
+            collection: Only queue changes to this collection
+            maxsize: Changes the queue holds before the subscriber is
+                dropped. Defaults to ``QUEUE_SIZE``.
+                
+        Returns:
+            The subscription; already dropped if the changes since ``since``
+            are no longer kept or do not fit its queue
+            
+        Raises:
+            RuntimeError: If no event loop is running
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            backlog: Optional[List[Dict[str, Any]]] = []
+            if since is not None:
+                if since < self._floor or since > self._seq:
+                    backlog = None
+                else:
+                    backlog = [change for change in self._log if change["seq"] > since]
+            start = self._seq if since is None else since
+            subscription = ChangeSubscription(self, loop, start, collection, maxsize or self.QUEUE_SIZE)
+            if backlog is not None:
+                self._subscribers.add(subscription)
+        if backlog is None:
+            subscription._drop()
+        elif backlog:
+            subscription._deliver(backlog)
+        return subscription
+    
+    def _unsubscribe(self, subscription: ChangeSubscription):
+        """Stop publishing to ``subscription``."""
+        with self._lock:
+            self._subscribers.discard(subscription)
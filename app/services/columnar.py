@@ -0,0 +1,473 @@
+"""
+Columnar Store
+
+This module contains an optional column-oriented copy of a record collection
+that the in-memory database uses to evaluate filters and aggregates as
+vectorized NumPy mask operations instead of per-record Python work.
+
+Numbers and booleans are stored as float64 arrays, other hashable values
+(regions, property types, ...) as integer codes into a category list. Only
+equality filters, numeric ranges and numeric aggregates are vectorized;
+anything a column cannot answer exactly is reported back to the caller,
+which checks it against the records as before.
+
+NumPy is an optional dependency. Without it ``NUMPY_AVAILABLE`` is False and
+the database answers every query from its row store.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from app.services.binary_snapshot import PRESENT, MappedTable
+from app.services.structures import ChunkedList
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+NUMPY_AVAILABLE = np is not None
+
+# Integers beyond this magnitude are not exact as float64
+_MAX_EXACT_INT = 2 ** 53
+
+
+def _is_number(value: Any) -> bool:
+    """Check whether ``value`` is a bool, float or float64-exact integer."""
+    if isinstance(value, float):
+        return True
+    return isinstance(value, int) and -_MAX_EXACT_INT <= value <= _MAX_EXACT_INT
+
+
+class NumericColumn:
+    """
+    Column of numbers and booleans stored as float64.
+    
+    Missing (None) values are tracked in a separate ``present`` mask.
+    """
+    
+    def __init__(self, values: "np.ndarray", present: "np.ndarray", integral: bool):
+        """
+        Initialize the column.
+        
+        Args:
+            values: Column values, 0 where missing
+            present: Mask of rows holding a value
+            integral: Whether every present value is an int or bool
+        """
+        self.values = values
+        self.present = present
+        self.integral = integral
+    
+    @classmethod
+    def encode(cls, values: Sequence[Any]) -> Optional["NumericColumn"]:
+        """
+        Encode ``values`` if they are all numbers or None.
+        
+        Returns:
+            The column, or None if some value is not a number
+        """
+        integral = True
+        for value in values:
+            if value is None:
+                continue
+            if not _is_number(value):
+                return None
+            integral = integral and not isinstance(value, float)
+        return cls(
+            np.array([0 if value is None else value for value in values], dtype=np.float64),
+            np.array([value is not None for value in values], dtype=bool),
+            integral
+        )
+    
+    def patched(self, values: Dict[int, Any], size: int) -> Optional["NumericColumn"]:
+        """
+        Get a copy resized to ``size`` rows with ``values`` written at their slots.
+        
+        Returns:
+            The new column, or None if some value is not a number
+        """
+        if not all(value is None or _is_number(value) for value in values.values()):
+            return None
+        numbers = np.zeros(size, dtype=np.float64)
+        present = np.zeros(size, dtype=bool)
+        kept = min(size, len(self.values))
+        numbers[:kept] = self.values[:kept]
+        present[:kept] = self.present[:kept]
+        integral = self.integral
+        for slot, value in values.items():
+            numbers[slot] = 0 if value is None else value
+            present[slot] = value is not None
+            integral = integral and not isinstance(value, float)
+        return NumericColumn(numbers, present, integral)
+    
+    def equals(self, value: Any) -> Optional["np.ndarray"]:
+        """Get the mask of rows equal to ``value``, or None if it cannot be computed."""
+        if value is None:
+            return ~self.present
+        if _is_number(value):
+            return self.present & (self.values == value)
+        if isinstance(value, int):
+            return None
+        # Numbers never equal strings or other objects
+        return np.zeros(len(self.values), dtype=bool)
+    
+    def between(self, low: Any, high: Any) -> Optional["np.ndarray"]:
+        """Get the mask of rows with ``low <= value <= high``, or None if it cannot be computed."""
+        if not all(bound is None or _is_number(bound) for bound in (low, high)):
+            return None
+        mask = self.present.copy()
+        if low is not None:
+            mask &= self.values >= low
+        if high is not None:
+            mask &= self.values <= high
+        return mask
+    
+    def aggregate(self, func: str, mask: Optional["np.ndarray"] = None) -> Any:
+        """
+        Aggregate the present values selected by ``mask``.
+        
+        Args:
+            func: One of ``count``, ``sum``, ``min``, ``max`` or ``mean``
+            mask: Rows to aggregate, or None for all rows
+            
+        Returns:
+            The aggregate; None for ``min``/``max``/``mean`` of no values
+        """
+        selected = self.values[self.present if mask is None else mask & self.present]
+        if func == "count":
+            return int(selected.size)
+        if func == "sum":
+            total = selected.sum()
+            return int(total) if self.integral else float(total)
+        if not selected.size:
+            return None
+        if func == "mean":
+            return float(selected.mean())
+        result = selected.min() if func == "min" else selected.max()
+        return int(result) if self.integral else float(result)
+    
+    def aggregate_groups(
+        self,
+        func: str,
+        groups: "CategoricalColumn",
+        mask: Optional["np.ndarray"] = None
+    ) -> Dict[Any, Any]:
+        """
+        Aggregate the present values selected by ``mask`` per category of ``groups``.
+        
+        Args:
+            func: One of ``count``, ``sum``, ``min``, ``max`` or ``mean``
+            groups: Column of the same rows to group by
+            mask: Rows to aggregate, or None for all rows
+            
+        Returns:
+            Category value to aggregate, for the categories with values
+            
+        Raises:
+            TypeError: If a category holding values is unhashable
+        """
+        rows = self.present if mask is None else mask & self.present
+        codes, values = groups.codes[rows], self.values[rows]
+        size = len(groups.categories)
+        counts = np.bincount(codes, minlength=size)
+        if func == "count":
+            results = counts
+        elif func in ("sum", "mean"):
+            results = np.bincount(codes, weights=values, minlength=size)
+            if func == "mean":
+                results = results / np.maximum(counts, 1)
+        else:
+            results = np.full(size, np.inf if func == "min" else -np.inf)
+            (np.minimum if func == "min" else np.maximum).at(results, codes, values)
+        convert = int if func == "count" or (self.integral and func != "mean") else float
+        return {groups.categories[code]: convert(results[code]) for code in counts.nonzero()[0].tolist()}
+
+
+class CategoricalColumn:
+    """
+    Column of hashable values stored as integer codes into ``categories``.
+    
+    Values that compare equal share a code, so matching a code is the same
+    as an ``==`` comparison on the records.
+    """
+    
+    def __init__(self, codes: "np.ndarray", categories: List[Any], lookup: Dict[Any, int]):
+        """
+        Initialize the column.
+        
+        Args:
+            codes: Category code of each row
+            categories: Category values, by code
+            lookup: Category value to code
+        """
+        self.codes = codes
+        self.categories = categories
+        self.lookup = lookup
+    
+    @classmethod
+    def from_dictionary(cls, codes: Sequence[int], dictionary: Any) -> "CategoricalColumn":
+        """
+        Build the column from the codes of a dictionary-encoded field, without hashing values.
+        
+        Args:
+            codes: Code of each row in ``dictionary``
+            dictionary: ``ValueDictionary`` the codes belong to
+            
+        Returns:
+            The column, sharing the dictionary's codes
+        """
+        return cls(np.array(codes, dtype=np.int32), list(dictionary.values), dict(dictionary.codes))
+    
+    @classmethod
+    def encode(cls, values: Sequence[Any]) -> Optional["CategoricalColumn"]:
+        """
+        Encode ``values`` if they are all hashable.
+        
+        Returns:
+            The column, or None if some value is unhashable
+        """
+        lookup: Dict[Any, int] = {}
+        try:
+            codes = [lookup.setdefault(value, len(lookup)) for value in values]
+        except TypeError:
+            return None
+        return cls(np.array(codes, dtype=np.int32), list(lookup), lookup)
+    
+    def patched(self, values: Dict[int, Any], size: int) -> Optional["CategoricalColumn"]:
+        """
+        Get a copy resized to ``size`` rows with ``values`` written at their slots.
+        
+        Returns:
+            The new column, or None if some value is unhashable
+        """
+        codes = np.zeros(size, dtype=np.int32)
+        kept = min(size, len(self.codes))
+        codes[:kept] = self.codes[:kept]
+        categories, lookup = self.categories, self.lookup
+        for slot, value in values.items():
+            try:
+                code = lookup.get(value)
+            except TypeError:
+                return None
+            if code is None:
+                if lookup is self.lookup:
+                    categories, lookup = categories.copy(), lookup.copy()
+                code = lookup[value] = len(categories)
+                categories.append(value)
+            codes[slot] = code
+        return CategoricalColumn(codes, categories, lookup)
+    
+    def equals(self, value: Any) -> Optional["np.ndarray"]:
+        """Get the mask of rows equal to ``value``, or None if it cannot be computed."""
+        try:
+            code = self.lookup.get(value)
+        except TypeError:
+            return None
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+    
+    def between(self, low: Any, high: Any) -> None:
+        """Ranges over categories are left to the row store."""
+        return None
+
+
+Column = Union[NumericColumn, CategoricalColumn]
+
+
+def encode_column(values: Sequence[Any]) -> Optional[Column]:
+    """
+    Encode a column of record values.
+    
+    Args:
+        values: The value of the field in each record (None if missing)
+        
+    Returns:
+        A numeric or categorical column, or None if the values cannot be
+        stored column-wise (e.g. lists)
+    """
+    return NumericColumn.encode(values) or CategoricalColumn.encode(values)
+
+
+class ColumnarTable:
+    """
+    Column-wise copy of selected fields of a collection version.
+    
+    Row ``i`` of every column describes the record at slot ``i`` of the
+    collection. Fields whose values cannot be encoded are left out.
+    """
+    
+    def __init__(self, columns: Dict[str, Column], size: int):
+        """
+        Initialize the table.
+        
+        Args:
+            columns: Field name to encoded column
+            size: Number of rows
+        """
+        self.columns = columns
+        self.size = size
+    
+    @classmethod
+    def build(
+        cls,
+        records: Sequence[Dict[str, Any]],
+        fields: Iterable[str],
+        dictionary: Callable[[str], Optional[Any]] = lambda field: None
+    ) -> "ColumnarTable":
+        """
+        Encode ``fields`` of ``records``.
+        
+        Args:
+            records: Records of the collection, by slot
+            fields: Fields to store column-wise
+            dictionary: Function returning the ``ValueDictionary`` a field
+                of the (compact) records is encoded with, if any; such
+                fields become categorical columns of the records' codes
+                
+        Returns:
+            The table
+        """
+        fields = list(fields)
+        encoded = [field for field in fields if dictionary(field) is not None]
+        table = cls.from_columns(
+            [field for field in fields if field not in encoded],
+            lambda field: [record.get(field) for record in records],
+            len(records)
+        )
+        for field in encoded:
+            table.columns[field] = CategoricalColumn.from_dictionary(
+                [record.code(field) for record in records], dictionary(field)
+            )
+        return table
+    
+    @classmethod
+    def from_columns(
+        cls,
+        fields: Iterable[str],
+        values: Callable[[str], Sequence[Any]],
+        size: int
+    ) -> "ColumnarTable":
+        """
+        Encode ``fields`` from column-wise values, without reading records.
+        
+        Args:
+            fields: Fields to store column-wise
+            values: Function returning the values of a field, by slot (None
+                if missing)
+            size: Number of rows
+            
+        Returns:
+            The table
+        """
+        columns = {}
+        for field in fields:
+            column = encode_column(values(field))
+            if column is not None:
+                columns[field] = column
+        return cls(columns, size)
+    
+    @classmethod
+    def from_table(cls, table: MappedTable, fields: Iterable[str]) -> "ColumnarTable":
+        """
+        Encode ``fields`` of a memory-mapped snapshot table.
+        
+        Numeric and boolean fields are converted from the file's arrays
+        directly, without decoding their values one by one.
+        
+        Args:
+            table: Snapshot table
+            fields: Fields to store column-wise
+            
+        Returns:
+            The table
+        """
+        columns = {}
+        for field in fields:
+            stored = table.numeric(field)
+            column = None
+            if stored is not None:
+                kind, values, presence = stored
+                numbers = np.frombuffer(values, dtype=values.format).astype(np.float64)
+                present = np.ones(len(table), dtype=bool)
+                if presence is not None:
+                    present = np.frombuffer(presence, dtype=np.uint8) == PRESENT
+                if kind != "int" or not len(numbers) or np.abs(numbers).max() <= _MAX_EXACT_INT:
+                    column = NumericColumn(numbers, present, kind != "float")
+            if column is None:
+                column = encode_column(table.column(field))
+            if column is not None:
+                columns[field] = column
+        return cls(columns, len(table))
+    
+    def patched(
+        self,
+        records: ChunkedList,
+        fields: Iterable[str],
+        slots: Iterable[int]
+    ) -> "ColumnarTable":
+        """
+        Get a table for a later version of the collection.
+        
+        Args:
+            records: Records of the later version, by slot
+            fields: Fields to store column-wise
+            slots: Slots written since this table was built; slots past the
+                end of ``records`` are ignored
+                
+        Returns:
+            The updated table; this one is left unchanged
+        """
+        size = len(records)
+        changed = sorted({slot for slot in slots if slot < size} | set(range(self.size, size)))
+        rows = dict(zip(changed, records.take(changed)))
+        
+        columns = {}
+        for field in fields:
+            column = self.columns.get(field)
+            if column is not None:
+                column = column.patched({slot: record.get(field) for slot, record in rows.items()}, size)
+            if column is None:
+                column = encode_column([record.get(field) for record in records])
+            if column is not None:
+                columns[field] = column
+        return ColumnarTable(columns, size)
+    
+    def mask(
+        self,
+        filters: Dict[str, Any],
+        ranges: Dict[str, Tuple[Any, Any]]
+    ) -> Tuple[Optional["np.ndarray"], Dict[str, Any], Dict[str, Tuple[Any, Any]]]:
+        """
+        Evaluate whatever part of a query the columns can answer.
+        
+        Args:
+            filters: Field to value equality filters
+            ranges: Field to ``(low, high)`` inclusive bounds
+            
+        Returns:
+            Tuple of the mask of rows passing the evaluated predicates (None
+            if none could be evaluated), and the equality filters and ranges
+            still to be checked against the records
+        """
+        mask = None
+        remaining_filters: Dict[str, Any] = {}
+        remaining_ranges: Dict[str, Tuple[Any, Any]] = {}
+        
+        for field, value in filters.items():
+            column = self.columns.get(field)
+            selected = None if column is None else column.equals(value)
+            if selected is None:
+                remaining_filters[field] = value
+            else:
+                mask = selected if mask is None else mask & selected
+        for field, (low, high) in ranges.items():
+            column = self.columns.get(field)
+            selected = None if column is None else column.between(low, high)
+            if selected is None:
+                remaining_ranges[field] = (low, high)
+            else:
+                mask = selected if mask is None else mask & selected
+        
+        return mask, remaining_filters, remaining_ranges
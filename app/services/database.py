@@ -3,120 +3,1766 @@ In-Memory Database Service
 
 This module provides an in-memory database service with JSON-like structure
 and CRUD operations. It simulates a real database for development purposes.
+
+Reads never take a lock. The database state is an immutable
+``DatabaseSnapshot``; writers serialize on a lock, build the next version
+from copy-on-write copies of the collections they change, and publish it by
+swapping a single reference. Readers use whichever version was current when
+they started, so long scans and exports see a consistent point-in-time view.
+
+Declared numeric and categorical fields of a collection can additionally be
+kept column-wise in NumPy arrays (see ``app.services.columnar``), so filters
+that no hash index narrows down, and aggregates, run as vectorized masks.
+The column copy of a version is built on first use and patched from the
+previous version's copy when only a few records changed.
+
+Stored records are never modified once published (updates replace them), so
+read methods can hand out read-only views of them instead of copies when
+called with ``view=True``.
+
+With a ``Persistence`` attached (see ``app.services.persistence``) every
+write is logged before it is published and returns once the log is on
+disk, and the database is restored from the newest snapshot and the log.
+
+Every published write is also recorded in a change feed (see
+``app.services.changes``) under its snapshot version, so clients can follow
+the changes since the version they last read (``changes_since``) or
+subscribe to them, rather than reading whole collections again.
+
+Collections can also keep a cache of their records' serialized bytes (see
+``app.services.fragments``), which writes invalidate as they publish.
 """
 
+import heapq
 import json
 import threading
+import time
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from functools import partial
+from itertools import islice
+from math import prod
+from types import MappingProxyType
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
 from uuid import uuid4
 
-from app.data.seed_data import LISTING_SEED_DATA
+from app.services.binary_snapshot import MappedTable
+from app.services.changes import ChangeFeed, ChangeSubscription
+from app.services.columnar import NUMPY_AVAILABLE, CategoricalColumn, ColumnarTable, NumericColumn
+from app.services.fragments import FragmentCache
+from app.services.indexes import HashIndex, LazyIndexes, SortedIndex
+from app.services.records import CompactRecord, ListingRow, ValueDictionary
+from app.services.seed import load_seed_listings
+from app.services.structures import ChunkedList, ShardedDict
+
+
+# Secondary hash indexes declared for each collection by default
+DEFAULT_INDEXES: Dict[str, List[str]] = {
+    "listings": ["region", "property_type", "bedrooms", "post_town", "shortened_post_code"],
+}
+
+# Sorted range indexes declared for each collection by default
+DEFAULT_RANGE_INDEXES: Dict[str, List[str]] = {
+    "listings": ["price_in_cents", "gross_yield", "minimum_deposit_in_cents", "size_sq_ft", "bedrooms"],
+}
+
+# Fields kept column-wise for vectorized filters and aggregates (needs NumPy)
+DEFAULT_COLUMNS: Dict[str, List[str]] = {
+    "listings": [
+        "price_in_cents", "gross_yield", "bedrooms", "bathrooms", "size_sq_ft",
+        "minimum_deposit_in_cents", "estimated_deposit_in_cents", "rental_income_in_cents",
+        "is_tenanted", "is_cash_only", "is_featured", "is_share_sale",
+        "region", "property_type", "post_town",
+    ],
+}
+
+# Compact record type the records of each collection are stored as
+DEFAULT_RECORD_TYPES: Dict[str, type] = {
+    "listings": ListingRow,
+}
+
+# Byte budget of the serialized record cache kept for each collection
+DEFAULT_FRAGMENT_CACHES: Dict[str, int] = {
+    "listings": 32 * 1024 * 1024,
+}
+
+# Functions accepted by ``aggregate``
+AGGREGATES = ("count", "sum", "min", "max", "mean")
+
+
+def _copy(record: Mapping[str, Any]) -> Dict[str, Any]:
+    """Copy a stored record (a dictionary or a compact record) to a new dictionary."""
+    return record.copy()
+
+
+def _plain(record: Mapping[str, Any]) -> Dict[str, Any]:
+    """Get a stored record as a dictionary, copying it only if it is a compact record."""
+    return record.copy() if isinstance(record, CompactRecord) else record
+
+
+def _aggregate_values(values: List[Any], func: str) -> Any:
+    """Aggregate ``values`` (none of them None) with ``func``, see ``DatabaseSnapshot.aggregate``."""
+    if func == "count":
+        return len(values)
+    if func == "sum":
+        return sum(values)
+    if not values:
+        return None
+    if func == "mean":
+        return sum(values) / len(values)
+    return min(values) if func == "min" else max(values)
+
+
+def _in_range(value: Any, low: Any, high: Any) -> bool:
+    """Check ``low <= value <= high`` where None bounds are unbounded."""
+    if value is None:
+        return False
+    try:
+        return (low is None or value >= low) and (high is None or value <= high)
+    except TypeError:
+        return False
+
+
+def _matches(record: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Check that a record equals every field-value pair in ``filters``."""
+    for key, value in filters.items():
+        if not record.get(key) == value:
+            return False
+    return True
+
+
+def _select(
+    records: Iterable[Dict[str, Any]],
+    filters: Dict[str, Any],
+    ranges: Dict[str, Tuple[Any, Any]]
+) -> Iterator[Dict[str, Any]]:
+    """Iterate the records matching equality ``filters`` and inclusive ``ranges``."""
+    for record in records:
+        if not _matches(record, filters):
+            continue
+        if not all(_in_range(record.get(field), low, high) for field, (low, high) in ranges.items()):
+            continue
+        yield record
+
+
+class RecordsView(Sequence):
+    """
+    Read-only, zero-copy view over the records of a collection version.
+    
+    Records are exposed as ``MappingProxyType`` views, created on access.
+    Nested values such as photo lists are shared, exactly as they are with
+    the shallow copies returned by default.
+    """
+    
+    def __init__(self, records: Sequence[Dict[str, Any]]):
+        """
+        Initialize the view.
+        
+        Args:
+            records: Stored records of a published collection state
+        """
+        self._records = records
+    
+    def __len__(self) -> int:
+        """Return the number of records."""
+        return len(self._records)
+    
+    def __iter__(self) -> Iterator[Mapping[str, Any]]:
+        """Iterate read-only views of the records."""
+        return map(MappingProxyType, self._records)
+    
+    def __getitem__(self, position):
+        """Get a read-only view of the record at ``position`` (or a list for slices)."""
+        if isinstance(position, slice):
+            return [MappingProxyType(record) for record in self._records[position]]
+        return MappingProxyType(self._records[position])
+
+
+class CollectionState:
+    """
+    One version of a record collection together with its indexes.
+    
+    A state may only be changed until it is published in a snapshot. Writers
+    take a ``copy()`` of the published state, change the copy and publish
+    it; the copy shares every unchanged chunk with the original.
+    
+    The columnar copy of ``column_fields`` is built lazily by ``columns()``.
+    A copy remembers the last built table and the slots written since, so
+    the next table can be patched instead of rebuilt.
+    
+    A state loaded from a snapshot file (``from_table``) decodes its records
+    from the file on first access, and builds its indexes and columnar
+    table from the file's columns without decoding whole records.
+    
+    With a ``record_type`` (see ``app.services.records``) records are
+    stored as compact records of that type instead of dictionaries.
+    
+    A published state knows the snapshot version that last wrote the
+    collection and each of its records (see ``stamp``). Records written
+    since the state was built have their version in ``record_versions``;
+    the others share ``base_version``.
+    """
+    
+    # Rebuild the columnar table instead of patching past this many writes
+    COLUMN_PATCH_LIMIT = 4096
+    
+    # Use the columnar table over a hash bucket holding more than 1/N of rows
+    COLUMN_SCAN_RATIO = 16
+    
+    # Reading an ID from an index costs about 1/N of checking a record
+    INTERSECT_RATIO = 20
+    
+    def __init__(
+        self,
+        records: Iterable[Dict[str, Any]] = (),
+        hash_fields: Iterable[str] = (),
+        range_fields: Iterable[str] = (),
+        column_fields: Iterable[str] = (),
+        record_type: Optional[type] = None
+    ):
+        """
+        Build a state holding ``records`` and the requested indexes.
+        
+        Args:
+            records: Records of the collection, in order
+            hash_fields: Fields to build hash indexes over
+            range_fields: Fields to build sorted range indexes over
+            column_fields: Fields to keep column-wise when NumPy is available
+            record_type: ``CompactRecord`` type to store records as
+        """
+        self.record_type = record_type
+        self.records = ChunkedList(records if record_type is None else map(self._compact, records))
+        # Primary-key index: record id -> slot in ``records``
+        self.id_index = ShardedDict(
+            (record.get("id"), slot) for slot, record in enumerate(self.records)
+        )
+        self.hash_indexes = {field: HashIndex(field, self.records, self._dictionary(field)) for field in hash_fields}
+        self.range_indexes = {field: SortedIndex(field, self.records) for field in range_fields}
+        self.column_fields = list(column_fields) if NUMPY_AVAILABLE else []
+        self._columns: Optional[ColumnarTable] = None
+        # Last built table of an earlier version, and the slots written since
+        self._base_columns: Optional[ColumnarTable] = None
+        self._dirty_slots: set = set()
+        # Snapshot table the records were loaded from, if no table was built since
+        self._table: Optional[MappedTable] = None
+        # Versions, set by ``stamp`` when published
+        self.version = 0
+        self.base_version = 0
+        self.record_versions = ShardedDict()
+        # IDs of the records written since ``copy()``; None for a new state
+        self._written: Optional[set] = None
+    
+    @classmethod
+    def from_table(
+        cls,
+        table: MappedTable,
+        hash_fields: Iterable[str] = (),
+        range_fields: Iterable[str] = (),
+        column_fields: Iterable[str] = (),
+        record_type: Optional[type] = None
+    ) -> "CollectionState":
+        """
+        Build a state over the records of a memory-mapped snapshot table.
+        
+        Args:
+            table: Table holding the records, in slot order
+            hash_fields: Fields to build hash indexes over
+            range_fields: Fields to build sorted range indexes over
+            column_fields: Fields to keep column-wise when NumPy is available
+            record_type: ``CompactRecord`` type to store records as
+            
+        Returns:
+            The state; records are decoded a chunk at a time when first
+            read, and secondary indexes are built when first used
+        """
+        state = cls(column_fields=column_fields, record_type=record_type)
+        record_ids = table.column("id")
+        
+        def rows(start: int, stop: int) -> List[Any]:
+            records = table.rows(start, stop)
+            return records if record_type is None else list(map(record_type, records))
+        
+        state.records = ChunkedList.lazy(len(table), rows)
+        state.id_index = ShardedDict(zip(record_ids, range(len(record_ids))))
+        
+        def builder(index_class: type, field: str, **options: Any) -> Callable[[], Any]:
+            return lambda: index_class.from_columns(field, table.column(field), record_ids, **options)
+        
+        state.hash_indexes = LazyIndexes({
+            field: builder(HashIndex, field, dictionary=state._dictionary(field)) for field in hash_fields
+        })
+        state.range_indexes = LazyIndexes({field: builder(SortedIndex, field) for field in range_fields})
+        state._table = table
+        return state
+    
+    def copy(self) -> "CollectionState":
+        """Return a copy that can be changed without affecting this state."""
+        clone = CollectionState.__new__(CollectionState)
+        clone.record_type = self.record_type
+        clone.records = self.records.copy()
+        clone.id_index = self.id_index.copy()
+        clone.hash_indexes = {field: index.copy() for field, index in self.hash_indexes.items()}
+        clone.range_indexes = {field: index.copy() for field, index in self.range_indexes.items()}
+        clone.column_fields = self.column_fields
+        clone._columns = None
+        clone.version = self.version
+        clone.base_version = self.base_version
+        clone.record_versions = self.record_versions.copy()
+        clone._written = set()
+        # Readers may build ``_columns`` concurrently; the base and dirty
+        # slots of a published state never change
+        columns = self._columns
+        if columns is not None:
+            clone._base_columns, clone._dirty_slots, clone._table = columns, set(), None
+        else:
+            clone._base_columns, clone._dirty_slots = self._base_columns, set(self._dirty_slots)
+            clone._table = self._table
+        return clone
+    
+    def _dictionary(self, field: str) -> Optional[ValueDictionary]:
+        """Get the dictionary ``field`` is encoded with in the stored records, if any."""
+        return None if self.record_type is None else self.record_type.dictionary(field)
+    
+    def _compact(self, record: Mapping[str, Any]) -> Mapping[str, Any]:
+        """Get ``record`` as stored: as a ``record_type`` record, if the state has one."""
+        record_type = self.record_type
+        if record_type is None or type(record) is record_type:
+            return record
+        return record_type(record)
+    
+    def stamp(self, version: int):
+        """
+        Set the version of the collection, and of the records written since ``copy()``, to ``version``.
+        
+        Called once, when the state is published as part of snapshot
+        ``version``; a new state gives every record that version.
+        """
+        self.version = version
+        if self._written is None:
+            self.base_version, self.record_versions = version, ShardedDict()
+        else:
+            for record_id in self._written:
+                if record_id in self.id_index:
+                    self.record_versions[record_id] = version
+                else:
+                    self.record_versions.pop(record_id, None)
+        self._written = set()
+    
+    def record_version(self, record_id: str) -> Optional[int]:
+        """Get the version that last wrote the record with ``record_id``, or None if there is none."""
+        if record_id not in self.id_index:
+            return None
+        return self.record_versions.get(record_id, self.base_version)
+    
+    def _written_id(self, record_id: Any):
+        """Record that the record with ``record_id`` was written since ``copy()``."""
+        if self._written is not None:
+            self._written.add(record_id)
+    
+    def _touch(self, slot: int):
+        """Record that ``slot`` was written since the base columnar table."""
+        if self._base_columns is None and self._table is None:
+            return
+        if len(self._dirty_slots) >= self.COLUMN_PATCH_LIMIT:
+            self._base_columns, self._dirty_slots, self._table = None, set(), None
+        else:
+            self._dirty_slots.add(slot)
+    
+    def columns(self) -> Optional[ColumnarTable]:
+        """
+        Get the columnar table of this version, building it on first use.
+        
+        Returns:
+            The table, or None if NumPy is unavailable or no fields are declared
+        """
+        if not self.column_fields:
+            return None
+        columns = self._columns
+        if columns is None:
+            base = self._base_columns
+            if base is None and self._table is not None:
+                # Decode the snapshot's columns rather than its records
+                base = ColumnarTable.from_table(self._table, self.column_fields)
+            if base is None:
+                columns = ColumnarTable.build(self.records, self.column_fields, self._dictionary)
+            elif self._dirty_slots or base.size != len(self.records):
+                columns = base.patched(self.records, self.column_fields, self._dirty_slots)
+            else:
+                columns = base
+            self._columns = columns
+        return columns
+    
+    def _secondary_indexes(self) -> List[Union[HashIndex, SortedIndex]]:
+        """Get every secondary index of the collection."""
+        return [*self.hash_indexes.values(), *self.range_indexes.values()]
+    
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """Get the stored record with ``record_id``, if any."""
+        slot = self.id_index.get(record_id)
+        return None if slot is None else self.records[slot]
+    
+    def append(self, record: Dict[str, Any]):
+        """Add a record to the end of the collection."""
+        record = self._compact(record)
+        self.records.append(record)
+        self.id_index[record.get("id")] = len(self.records) - 1
+        self._written_id(record.get("id"))
+        for index in self._secondary_indexes():
+            index.add(record)
+        self._touch(len(self.records) - 1)
+    
+    def replace(self, slot: int, record: Dict[str, Any]):
+        """
+        Replace the record at ``slot``.
+        
+        Only the indexes whose field changed are touched.
+        """
+        old = self.records[slot]
+        record = self._compact(record)
+        self.records[slot] = record
+        self._touch(slot)
+        
+        same_id = old.get("id") == record.get("id")
+        if not same_id:
+            del self.id_index[old.get("id")]
+            self.id_index[record.get("id")] = slot
+            self._written_id(old.get("id"))
+        self._written_id(record.get("id"))
+        for index in self._secondary_indexes():
+            if same_id and old.get(index.field) == record.get(index.field):
+                continue
+            index.remove(old)
+            index.add(record)
+    
+    def remove(self, slot: int):
+        """
+        Remove the record at ``slot`` in O(1) by moving the last record into it.
+        
+        This does not preserve insertion order for the moved record.
+        """
+        record = self.records[slot]
+        for index in self._secondary_indexes():
+            index.remove(record)
+        del self.id_index[record.get("id")]
+        self._written_id(record.get("id"))
+        
+        last = self.records.pop()
+        if slot < len(self.records):
+            self.records[slot] = last
+            self.id_index[last.get("id")] = slot
+            self._touch(slot)
+    
+    def add_hash_index(self, field: str):
+        """Build a hash index over ``field`` if there is none yet."""
+        if field not in self.hash_indexes:
+            self.hash_indexes[field] = HashIndex(field, self.records, self._dictionary(field))
+    
+    def add_range_index(self, field: str):
+        """Build a sorted range index over ``field`` if there is none yet."""
+        if field not in self.range_indexes:
+            self.range_indexes[field] = SortedIndex(field, self.records)
+    
+    def _buckets(self, filters: Dict[str, Any]) -> Dict[str, Collection[Any]]:
+        """Get the hash index bucket of each indexed field in ``filters``."""
+        buckets = {}
+        for key, value in filters.items():
+            index = self.hash_indexes.get(key)
+            if index is None:
+                continue
+            try:
+                buckets[key] = index.lookup(value)
+            except TypeError:
+                # Unhashable filter values can only be matched by scanning
+                continue
+        return buckets
+    
+    def _smallest_bucket(self, filters: Dict[str, Any]) -> Optional[Collection[Any]]:
+        """Get the smallest hash index bucket for ``filters``, or None if no filter is indexed."""
+        return min(self._buckets(filters).values(), key=len, default=None)
+    
+    def candidate_slots(self, filters: Dict[str, Any]) -> Optional[List[int]]:
+        """
+        Narrow ``filters`` to candidate slots using the hash indexes.
+        
+        The buckets of all indexed filters are compared and the smallest one
+        becomes the candidate set. The intersection with the other buckets
+        happens when candidates are checked against all filters, which costs
+        less than probing each sorted bucket for every candidate.
+        
+        Args:
+            filters: Dictionary of field-value pairs to match
+            
+        Returns:
+            Sorted candidate slots, or None if no filter can use an index
+        """
+        smallest = self._smallest_bucket(filters)
+        if smallest is None:
+            return None
+        return sorted(self.id_index.get_many(smallest))
+    
+    def _scan_columns(
+        self,
+        filters: Dict[str, Any],
+        ranges: Dict[str, Tuple[Any, Any]]
+    ) -> Optional[Tuple[Any, Dict[str, Any], Dict[str, Tuple[Any, Any]]]]:
+        """
+        Evaluate a query on the columnar table if no hash bucket narrows it enough.
+        
+        Returns:
+            The mask of matching slots and the filters and ranges still to
+            check per record, or None to use the indexes and row store
+        """
+        bucket = self._smallest_bucket(filters)
+        if bucket is not None and len(bucket) * self.COLUMN_SCAN_RATIO <= len(self.records):
+            return None
+        table = self.columns()
+        if table is None:
+            return None
+        mask, filters, ranges = table.mask(filters, ranges)
+        if mask is None:
+            return None
+        return mask, filters, ranges
+    
+    def find(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Get the stored records matching ``filters``, in collection order."""
+        scan = self._scan_columns(filters, {})
+        if scan is not None:
+            mask, filters, _ = scan
+            rows = self.records.take(mask.nonzero()[0].tolist())
+        else:
+            candidates = self.candidate_slots(filters)
+            rows = self.records if candidates is None else self.records.take(candidates)
+        return [record for record in rows if _matches(record, filters)]
+    
+    def aggregate(
+        self,
+        field: str,
+        func: str,
+        filters: Dict[str, Any],
+        ranges: Dict[str, Tuple[Any, Any]],
+        group_by: Optional[str] = None
+    ) -> Any:
+        """
+        Aggregate ``field`` over the stored records matching a query.
+        
+        See ``DatabaseSnapshot.aggregate``; ``func`` must already be known
+        to be valid.
+        """
+        if group_by is not None:
+            try:
+                return self._aggregate_groups(field, func, filters, ranges, group_by)
+            except TypeError:
+                raise ValueError(f"Cannot group by '{group_by}': values are not hashable")
+        
+        table = self.columns()
+        column = None if table is None else table.columns.get(field)
+        if isinstance(column, NumericColumn):
+            mask, remaining_filters, remaining_ranges = table.mask(filters, ranges)
+            if not remaining_filters and not remaining_ranges:
+                return column.aggregate(func, mask)
+        
+        values = [
+            record.get(field)
+            for record in self.find_range(ranges, filters)
+            if record.get(field) is not None
+        ]
+        return _aggregate_values(values, func)
+    
+    def _aggregate_groups(
+        self,
+        field: str,
+        func: str,
+        filters: Dict[str, Any],
+        ranges: Dict[str, Tuple[Any, Any]],
+        group_by: str
+    ) -> Dict[Any, Any]:
+        """
+        Aggregate ``field`` per value of ``group_by``, see ``aggregate``.
+        
+        Groups are formed from the category codes of the columnar table
+        when it answers the whole query, and otherwise from the records'
+        dictionary codes when ``group_by`` is dictionary-encoded.
+        
+        Raises:
+            TypeError: If a ``group_by`` value is unhashable
+        """
+        table = self.columns()
+        if table is not None:
+            column, groups = table.columns.get(field), table.columns.get(group_by)
+            if isinstance(column, NumericColumn) and isinstance(groups, CategoricalColumn):
+                mask, remaining_filters, remaining_ranges = table.mask(filters, ranges)
+                if not remaining_filters and not remaining_ranges:
+                    return column.aggregate_groups(func, groups, mask)
+        
+        dictionary = self._dictionary(group_by)
+        grouped: Dict[Any, List[Any]] = {}
+        for record in self.find_range(ranges, filters):
+            value = record.get(field)
+            if value is not None:
+                group = record.get(group_by) if dictionary is None else record.code(group_by)
+                grouped.setdefault(group, []).append(value)
+        
+        if dictionary is not None:
+            grouped = {dictionary.decode(code): values for code, values in grouped.items()}
+        return {group: _aggregate_values(values, func) for group, values in grouped.items()}
+    
+    def count(self, filters: Dict[str, Any], ranges: Dict[str, Tuple[Any, Any]]) -> int:
+        """Count the stored records matching a query, from the columns when possible."""
+        if not filters and not ranges:
+            return len(self.records)
+        table = self.columns()
+        if table is not None:
+            mask, remaining_filters, remaining_ranges = table.mask(filters, ranges)
+            if mask is not None and not remaining_filters and not remaining_ranges:
+                return int(mask.sum())
+        if not ranges:
+            return len(self.find(filters))
+        return sum(1 for _ in self.find_range(ranges, filters))
+    
+    def find_range(
+        self,
+        ranges: Dict[str, Tuple[Any, Any]],
+        filters: Dict[str, Any],
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        limit: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate the stored records matching range and equality filters.
+        
+        See ``DatabaseSnapshot.find_range``; ``order_by`` must already be
+        known to be range-indexed. ``limit`` is only a hint of how many
+        records the caller will consume, used to pick the cheapest plan.
+        """
+        indexes = self.range_indexes
+        
+        # Drive the scan from the ordering index, or else the narrowest range
+        driver = order_by
+        if driver is None:
+            indexed = [field for field in ranges if field in indexes]
+            if indexed:
+                driver = min(indexed, key=lambda field: indexes[field].count(*ranges[field]))
+        
+        # Unordered queries no range index narrows down may scan the columns
+        scan = None
+        if order_by is None and (
+            driver is None
+            or indexes[driver].count(*ranges[driver]) * self.COLUMN_SCAN_RATIO > len(self.records)
+        ):
+            scan = self._scan_columns(filters, ranges)
+        
+        candidates = None
+        if scan is None:
+            candidates = self._plan_candidates(ranges, filters, driver, limit)
+        
+        if scan is not None:
+            mask, filters, ranges = scan
+            rows = self.records.take(mask.nonzero()[0].tolist())
+        elif candidates is not None:
+            rows = self.records.take(sorted(self.id_index.get_many(candidates)))
+            if order_by is not None:
+                rows = sorted(
+                    (record for record in _select(rows, filters, ranges) if record.get(order_by) is not None),
+                    key=lambda record: (record.get(order_by), record.get("id")),
+                    reverse=descending
+                )
+                filters, ranges = {}, {}
+        elif driver is None:
+            rows = self.records
+        else:
+            low, high = ranges.get(driver, (None, None))
+            rows = (
+                self.records[self.id_index[record_id]]
+                for record_id in indexes[driver].range(low, high, descending)
+            )
+        
+        return _select(rows, filters, ranges)
+    
+    def _plan_candidates(
+        self,
+        ranges: Dict[str, Tuple[Any, Any]],
+        filters: Dict[str, Any],
+        driver: Optional[str],
+        limit: Optional[int]
+    ) -> Optional[Collection[Any]]:
+        """
+        Get candidate record IDs from the indexes, unless walking ``driver`` is cheaper.
+        
+        The hash buckets of the filters and the ranges over indexed fields
+        other than the driver are intersected, smallest first, for as long
+        as reading the next one costs less than checking the records it
+        would rule out. Walking the driver index instead visits about
+        ``limit / selectivity`` entries, taking predicates as independent.
+        
+        Returns:
+            Candidate record IDs, or None to walk the driver index (or scan
+            every record if there is no driver)
+        """
+        indexes = self.range_indexes
+        total = max(len(self.records), 1)
+        sources = [
+            (len(bucket), field, bucket)
+            for field, bucket in self._buckets(filters).items() if field != driver
+        ]
+        sources += [
+            (indexes[field].count(*bounds), field, None)
+            for field, bounds in ranges.items() if field != driver and field in indexes
+        ]
+        if not sources:
+            return None
+        sources.sort(key=lambda source: source[0])
+        
+        chosen = []
+        cost, estimate = 0.0, float(total)
+        fields: Dict[str, int] = {}
+        for size, field, bucket in sources:
+            if chosen and size / self.INTERSECT_RATIO >= estimate:
+                break
+            chosen.append(indexes[field].range(*ranges[field]) if bucket is None else bucket)
+            cost += size / self.INTERSECT_RATIO
+            if field not in fields:
+                estimate *= size / total
+            fields.setdefault(field, size)
+        cost += estimate
+        
+        if driver is not None:
+            walk = indexes[driver].count(*ranges.get(driver, (None, None)))
+            # A field both filtered and ranged counts once, at its narrowest
+            for size, field, _ in sources:
+                fields.setdefault(field, size)
+            selectivity = prod(size / total for size in fields.values())
+            if limit is not None and selectivity:
+                walk = min(walk, limit / selectivity)
+            if cost >= walk:
+                return None
+        
+        if len(chosen) == 1:
+            candidates = chosen[0]
+            return candidates if isinstance(candidates, Collection) else list(candidates)
+        candidates = set(chosen[0])
+        for source in chosen[1:]:
+            candidates.intersection_update(source)
+        return candidates
+
+
+
+class DatabaseSnapshot:
+    """
+    Immutable point-in-time view of the database.
+    
+    Every read through the same snapshot sees the same data, however many
+    writes are published meanwhile. Reads never take a lock.
+    """
+    
+    def __init__(self, collections: Dict[str, Any], version: int = 0):
+        """
+        Initialize the snapshot.
+        
+        Args:
+            collections: Collection name to ``CollectionState`` (or raw
+                value for collections that do not hold records)
+            version: Version number, increased by every published write
+        """
+        self._collections = collections
+        self.version = version
+    
+    def _state(self, collection: str) -> CollectionState:
+        """
+        Get the state of a record collection.
+        
+        Raises:
+            KeyError: If collection doesn't exist
+            TypeError: If the collection does not hold records
+        """
+        if collection not in self._collections:
+            raise KeyError(f"Collection '{collection}' not found")
+        state = self._collections[collection]
+        if not isinstance(state, CollectionState):
+            raise TypeError(f"Collection '{collection}' does not hold records")
+        return state
+    
+    def get_all(self, collection: str, view: bool = False) -> Union[List[Dict[str, Any]], Dict[str, Any], RecordsView]:
+        """
+        Get all records from a collection.
+        
+        Args:
+            collection: Name of the collection to retrieve
+            view: Return a zero-copy, read-only ``RecordsView`` instead of
+                a new list
+                
+        Returns:
+            List of all records in the collection
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        if collection not in self._collections:
+            raise KeyError(f"Collection '{collection}' not found")
+        state = self._collections[collection]
+        if isinstance(state, CollectionState):
+            return RecordsView(state.records) if view else list(map(_plain, state.records))
+        return MappingProxyType(state) if view else state.copy()
+    
+    def get_by_id(self, collection: str, record_id: str, view: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get a record by ID from a collection.
+        
+        Args:
+            collection: Name of the collection to search
+            record_id: ID of the record to retrieve
+            view: Return a read-only view of the record instead of a copy
+            
+        Returns:
+            Record if found, None otherwise
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        record = self._state(collection).get(record_id)
+        if record is None:
+            return None
+        return MappingProxyType(record) if view else record.copy()
+    
+    def collection_version(self, collection: str) -> int:
+        """Get the version that last wrote ``collection``, see ``CollectionState.stamp``."""
+        return self._state(collection).version
+    
+    def record_version(self, collection: str, record_id: str) -> Optional[int]:
+        """Get the version that last wrote a record, or None if there is no such record."""
+        return self._state(collection).record_version(record_id)
+    
+    def find(self, collection: str, filters: Dict[str, Any], view: bool = False) -> List[Dict[str, Any]]:
+        """
+        Find records in a collection matching filters.
+        
+        Args:
+            collection: Name of the collection to search
+            filters: Dictionary of field-value pairs to match
+            view: Return read-only views of the records instead of copies
+            
+        Returns:
+            List of matching records
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        records = self._state(collection).find(filters)
+        wrap = MappingProxyType if view else _copy
+        return [wrap(record) for record in records]
+    
+    def find_range(
+        self,
+        collection: str,
+        ranges: Dict[str, Tuple[Any, Any]],
+        filters: Optional[Dict[str, Any]] = None,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        view: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Find records in a collection matching range and equality filters.
+        
+        The most selective range index drives the scan, so a query costs
+        O(log n + k) where k is the number of records in the driving range.
+        When equality filters narrow the candidates further than any range,
+        the hash indexes are used instead. Records with a missing (None)
+        value for a ranged or ordering field never match.
+        
+        Args:
+            collection: Name of the collection to search
+            ranges: Field to ``(low, high)`` inclusive bounds; either bound
+                may be None for an open-ended range
+            filters: Dictionary of field-value pairs to match
+            order_by: Range-indexed field to order results by
+            descending: Order results from the highest value down
+            limit: Maximum number of records to return
+            view: Return read-only views of the records instead of copies
+            
+        Returns:
+            List of matching records, in ``(order_by, id)`` order if
+            ``order_by`` is given
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``order_by`` is not range-indexed
+        """
+        state = self._state(collection)
+        if order_by is not None and order_by not in state.range_indexes:
+            raise ValueError(f"Field '{order_by}' has no range index in collection '{collection}'")
+        
+        rows = state.find_range(ranges, filters or {}, order_by, descending, limit)
+        wrap = MappingProxyType if view else _copy
+        return [wrap(record) for record in islice(rows, limit)]
+    
+    def iter_range(
+        self,
+        collection: str,
+        ranges: Dict[str, Tuple[Any, Any]],
+        filters: Optional[Dict[str, Any]] = None,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        limit_hint: Optional[int] = None
+    ) -> Iterator[Mapping[str, Any]]:
+        """
+        Lazily iterate read-only views of the records ``find_range`` would return.
+        
+        Records are only read as the iterator is consumed, so callers that
+        stop early (e.g. once a page is full) do not pay for the rest.
+        
+        Args:
+            collection: Name of the collection to search
+            ranges: Field to ``(low, high)`` inclusive bounds
+            filters: Dictionary of field-value pairs to match
+            order_by: Range-indexed field to order results by
+            descending: Order results from the highest value down
+            limit_hint: Expected number of records to be consumed, used to
+                choose between walking an index and sorting candidates
+                
+        Returns:
+            Iterator of read-only record views
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``order_by`` is not range-indexed
+        """
+        state = self._state(collection)
+        if order_by is not None and order_by not in state.range_indexes:
+            raise ValueError(f"Field '{order_by}' has no range index in collection '{collection}'")
+        return map(MappingProxyType, state.find_range(ranges, filters or {}, order_by, descending, limit_hint))
+    
+    def distinct(
+        self,
+        collection: str,
+        field: str,
+        low: Any = None,
+        high: Any = None,
+        descending: bool = False
+    ) -> Iterator[Any]:
+        """
+        Lazily iterate the distinct values of a range-indexed field in order.
+        
+        Args:
+            collection: Name of the collection
+            field: Range-indexed field
+            low: Inclusive lower bound, or None for unbounded
+            high: Inclusive upper bound, or None for unbounded
+            descending: Iterate from the highest value down
+            
+        Returns:
+            Iterator of distinct values held by at least one record
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``field`` is not range-indexed
+        """
+        return self._range_index(collection, field).values(low, high, descending)
+    
+    def count_range(self, collection: str, field: str, low: Any = None, high: Any = None) -> int:
+        """
+        Count the records with ``low <= field <= high`` in O(log n).
+        
+        Args:
+            collection: Name of the collection
+            field: Range-indexed field
+            low: Inclusive lower bound, or None for unbounded
+            high: Inclusive upper bound, or None for unbounded
+            
+        Returns:
+            Number of records in the range
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``field`` is not range-indexed
+        """
+        return self._range_index(collection, field).count(low, high)
+    
+    def _range_index(self, collection: str, field: str) -> SortedIndex:
+        """
+        Get the range index over ``field``.
+        
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``field`` is not range-indexed
+        """
+        index = self._state(collection).range_indexes.get(field)
+        if index is None:
+            raise ValueError(f"Field '{field}' has no range index in collection '{collection}'")
+        return index
+    
+    def aggregate(
+        self,
+        collection: str,
+        field: str,
+        func: str = "count",
+        filters: Optional[Dict[str, Any]] = None,
+        ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        group_by: Optional[str] = None
+    ) -> Any:
+        """
+        Aggregate a field over the records matching equality and range filters.
+        
+        Only records with a value (not None) for ``field`` are aggregated.
+        Numeric fields kept column-wise are aggregated with vectorized masks
+        and no record is materialized; other queries read the records.
+        With ``group_by``, records are grouped by their value of that field,
+        using its category or dictionary codes rather than comparing values.
+        
+        Args:
+            collection: Name of the collection to aggregate
+            field: Field to aggregate
+            func: One of ``count``, ``sum``, ``min``, ``max`` or ``mean``
+            filters: Dictionary of field-value pairs to match
+            ranges: Field to ``(low, high)`` inclusive bounds
+            group_by: Field to aggregate per value of
+            
+        Returns:
+            The aggregate; None for ``min``, ``max`` and ``mean`` when no
+            record has a value. With ``group_by``, a dictionary of each
+            ``group_by`` value (None for records without one) to the
+            aggregate of its records, for the groups with a value
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``func`` is not supported, or a ``group_by``
+                value is unhashable
+        """
+        if func not in AGGREGATES:
+            raise ValueError(f"Unsupported aggregate '{func}', expected one of {', '.join(AGGREGATES)}")
+        return self._state(collection).aggregate(field, func, filters or {}, ranges or {}, group_by)
+    
+    def count(
+        self,
+        collection: str,
+        filters: Optional[Dict[str, Any]] = None,
+        ranges: Optional[Dict[str, Tuple[Any, Any]]] = None
+    ) -> int:
+        """
+        Count the records matching equality and range filters.
+        
+        Args:
+            collection: Name of the collection to count
+            filters: Dictionary of field-value pairs to match
+            ranges: Field to ``(low, high)`` inclusive bounds
+            
+        Returns:
+            Number of matching records
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        return self._state(collection).count(filters or {}, ranges or {})
+    
+    def get_page(
+        self,
+        collection: str,
+        limit: int,
+        order_by: str = "id",
+        descending: bool = False,
+        after: Optional[Tuple[Any, str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        view: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, str]]]:
+        """
+        Get one page of records in ``(order_by, id)`` order using keyset pagination.
+        
+        A page starts strictly after the ``(value, id)`` position of the last
+        record of the previous page, so records inserted or deleted meanwhile
+        never shift later pages and deep pages cost no more than the first.
+        With a range index over ``order_by`` the page seeks straight to the
+        position; otherwise the matching records are scanned once, keeping
+        the ``limit`` lowest keys. Records without a value for ``order_by``
+        are not paged.
+        
+        Args:
+            collection: Name of the collection to page through
+            limit: Maximum number of records to return
+            order_by: Field to order records by; IDs break ties
+            descending: Order records from the highest value down
+            after: Position returned with the previous page, if any
+            filters: Dictionary of field-value pairs to match
+            view: Return read-only views of the records instead of copies
+            
+        Returns:
+            Tuple of the records and the position of the last one, or None
+            if no records follow
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``after`` does not compare with the values of
+                ``order_by``
+        """
+        state = self._state(collection)
+        filters = filters or {}
+        index = state.range_indexes.get(order_by)
+        
+        def key(record: Dict[str, Any]) -> Tuple[Any, Any]:
+            return record.get(order_by), record.get("id")
+        
+        try:
+            if index is not None:
+                record_ids = index.range(descending=descending, after=after)
+                records = _select((state.records[state.id_index[record_id]] for record_id in record_ids), filters, {})
+                rows = list(islice(records, limit + 1))
+            else:
+                records = (record for record in state.find(filters) if record.get(order_by) is not None)
+                if after is not None:
+                    after = tuple(after)
+                    records = (
+                        record for record in records
+                        if (key(record) < after if descending else key(record) > after)
+                    )
+                select = heapq.nlargest if descending else heapq.nsmallest
+                rows = select(limit + 1, records, key=key)
+        except TypeError:
+            raise ValueError(f"Cannot page '{collection}' by '{order_by}' from {after!r}: values are not comparable")
+        
+        position = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            position = key(rows[-1])
+        wrap = MappingProxyType if view else _copy
+        return [wrap(record) for record in rows], position
+    
+    def get_collection_names(self) -> List[str]:
+        """
+        Get list of all collection names.
+        
+        Returns:
+            List of collection names
+        """
+        return list(self._collections.keys())
+    
+    def export_data(self) -> Dict[str, Any]:
+        """
+        Export all data as JSON-serializable dictionary.
+        
+        Returns:
+            Dictionary containing all database data
+        """
+        return {
+            name: list(map(_plain, state.records)) if isinstance(state, CollectionState) else state.copy()
+            for name, state in self._collections.items()
+        }
+    
+    def iter_export(self, collections: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily iterate the entries of an export, one per record.
+        
+        Each record is yielded as ``{"collection": name, "record": record}``
+        and each collection that does not hold records as ``{"collection":
+        name, "value": value}``. Nothing is copied and records of a mapped
+        snapshot are decoded a chunk at a time without being kept, so the
+        memory used stays constant however large the export.
+        
+        Args:
+            collections: Names of the collections to export, in order.
+                Defaults to all of them.
+                
+        Returns:
+            Iterator of read-only export entries
+            
+        Raises:
+            KeyError: If a collection doesn't exist
+        """
+        names = self.get_collection_names() if collections is None else list(collections)
+        for name in names:
+            if name not in self._collections:
+                raise KeyError(f"Collection '{name}' not found")
+        return self._iter_export(names)
+    
+    def _iter_export(self, names: List[str]) -> Iterator[Dict[str, Any]]:
+        """Iterate the export entries of the collections ``names``."""
+        for name in names:
+            state = self._collections[name]
+            if isinstance(state, CollectionState):
+                for record in state.records.iter_unloaded():
+                    yield {"collection": name, "record": _plain(record)}
+            else:
+                yield {"collection": name, "value": state}
 
 
 class InMemoryDatabase:
     """
     In-memory database service with thread-safe operations.
     
-    Provides CRUD operations for a JSON-like data structure with
-    automatic ID generation and timestamp tracking.
-    """
+    Provides CRUD operations for a JSON-like data structure with
+    automatic ID generation and timestamp tracking. Equality filters on
+    declared fields are answered from secondary hash indexes, and range
+    queries from sorted indexes. Reads run lock-free against the current
+    snapshot; writes are serialized and publish a new snapshot.
+    """
+    
+    # Seconds an approximate count may be reused for
+    COUNT_CACHE_TTL = 5.0
+    
+    # Cached counts kept before the cache is cleared
+    COUNT_CACHE_SIZE = 1024
+    
+    def __init__(
+        self,
+        indexes: Optional[Dict[str, List[str]]] = None,
+        range_indexes: Optional[Dict[str, List[str]]] = None,
+        columns: Optional[Dict[str, List[str]]] = None,
+        record_types: Optional[Dict[str, type]] = None,
+        persistence: Optional[Any] = None,
+        fragment_caches: Optional[Dict[str, int]] = None
+    ):
+        """
+        Initialize the in-memory database with default structure.
+        
+        Args:
+            indexes: Fields to hash-index per collection. Defaults to
+                ``DEFAULT_INDEXES``.
+            range_indexes: Fields to range-index per collection. Defaults to
+                ``DEFAULT_RANGE_INDEXES``.
+            columns: Fields to keep column-wise per collection when NumPy is
+                installed. Defaults to ``DEFAULT_COLUMNS``.
+            record_types: ``CompactRecord`` type to store the records of
+                each collection as; others are stored as dictionaries.
+                Defaults to ``DEFAULT_RECORD_TYPES``.
+            persistence: ``Persistence`` to restore from and log writes to,
+                see ``attach``
+            fragment_caches: Byte budget of the serialized record cache of
+                each collection keeping one (see ``fragment_cache``).
+                Defaults to ``DEFAULT_FRAGMENT_CACHES``.
+        """
+        self._index_fields: Dict[str, List[str]] = {
+            collection: list(fields)
+            for collection, fields in (DEFAULT_INDEXES if indexes is None else indexes).items()
+        }
+        self._range_index_fields: Dict[str, List[str]] = {
+            collection: list(fields)
+            for collection, fields in (DEFAULT_RANGE_INDEXES if range_indexes is None else range_indexes).items()
+        }
+        self._column_fields: Dict[str, List[str]] = {
+            collection: list(fields)
+            for collection, fields in (DEFAULT_COLUMNS if columns is None else columns).items()
+        }
+        self._record_types: Dict[str, type] = dict(
+            DEFAULT_RECORD_TYPES if record_types is None else record_types
+        )
+        self._fragments: Dict[str, FragmentCache] = {
+            collection: FragmentCache(budget)
+            for collection, budget in (DEFAULT_FRAGMENT_CACHES if fragment_caches is None else fragment_caches).items()
+        }
+        # Serializes writers only; readers use the published snapshot
+        self._lock = threading.Lock()
+        # Query key -> (count, snapshot version, time counted)
+        self._counts: Dict[Any, Tuple[int, int, float]] = {}
+        self._snapshot = DatabaseSnapshot(self._build_collections(self._initial_data()))
+        self._changes = ChangeFeed(self._snapshot.version)
+        # Versions are only comparable within one instance (see ``collection_version``)
+        self.instance_id = uuid4().hex[:12]
+        self._persistence = None
+        # Collection name -> ``SharedCollection`` it is kept in step with
+        self._shared: Dict[str, Any] = {}
+        if persistence is not None:
+            self.attach(persistence)
+    
+    @staticmethod
+    def _initial_data() -> Dict[str, Any]:
+        """Get the default database structure."""
+        return {
+            "users": [],
+            "sessions": [],
+            "listings": [],
+            "data": {}
+        }
+    
+    def _generate_id(self) -> str:
+        """Generate a unique ID for new records."""
+        return str(uuid4())
+    
+    def _add_timestamp(self, record: Dict[str, Any], now: Optional[str] = None) -> Dict[str, Any]:
+        """Add timestamp to a record, ``now`` (ISO format) by default."""
+        now = now or datetime.utcnow().isoformat()
+        record["created_at"] = now
+        record["updated_at"] = now
+        return record
+    
+    def _update_timestamp(self, record: Dict[str, Any], now: Optional[str] = None) -> Dict[str, Any]:
+        """Update timestamp for an existing record, to ``now`` (ISO format) by default."""
+        record["updated_at"] = now or datetime.utcnow().isoformat()
+        return record
+    
+    def _build_state(self, collection: str, records: Iterable[Dict[str, Any]]) -> CollectionState:
+        """Build an indexed state for ``collection`` holding ``records`` (or a snapshot table)."""
+        if isinstance(records, MappedTable):
+            return CollectionState.from_table(
+                records,
+                hash_fields=self._index_fields.get(collection, []),
+                range_fields=self._range_index_fields.get(collection, []),
+                column_fields=self._column_fields.get(collection, []),
+                record_type=self._record_types.get(collection)
+            )
+        return CollectionState(
+            records,
+            hash_fields=self._index_fields.get(collection, []),
+            range_fields=self._range_index_fields.get(collection, []),
+            column_fields=self._column_fields.get(collection, []),
+            record_type=self._record_types.get(collection)
+        )
+    
+    def _build_collections(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build indexed collection states from a plain ``{collection: records}`` dictionary."""
+        return {
+            name: self._build_state(name, value) if isinstance(value, (list, MappedTable)) else value
+            for name, value in data.items()
+        }
+    
+    def _writable(self, collection: str) -> CollectionState:
+        """
+        Get a private copy of a collection's current state to change.
+        
+        Must be called with the lock held.
+        
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        return self._snapshot._state(collection).copy()
+    
+    def _publish(
+        self,
+        changes: Dict[str, Any],
+        operations: List[List[Any]],
+        feed: Optional[List[List[Any]]] = None
+    ) -> int:
+        """
+        Log and publish a new snapshot with ``changes`` applied to the current one.
+        
+        Must be called with the lock held. The write is logged first, so a
+        write that cannot be logged is never published.
+        
+        Args:
+            changes: Collection name to its new state
+            operations: The write as logged operations, see ``_replay``
+            feed: The write as operations for the change feed, when they
+                differ from those logged
+                
+        Returns:
+            Version of the new snapshot
+        """
+        collections = dict(self._snapshot._collections)
+        collections.update(changes)
+        return self._install(collections, operations, feed)
+    
+    def _install(
+        self,
+        collections: Dict[str, Any],
+        operations: List[List[Any]],
+        feed: Optional[List[List[Any]]] = None
+    ) -> int:
+        """Log ``operations``, publish ``collections`` as the next snapshot and record the change."""
+        version = self._snapshot.version + 1
+        if self._persistence is not None:
+            self._persistence.record(version, operations)
+        published = self._snapshot._collections
+        for name, state in collections.items():
+            if isinstance(state, CollectionState) and state is not published.get(name):
+                state.stamp(version)
+        feed = operations if feed is None else feed
+        # Serialized records are dropped before the new version is visible,
+        # and none stored until it is, see ``FragmentCache.hold``
+        held = self._drop_fragments(feed)
+        try:
+            self._snapshot = DatabaseSnapshot(collections, version)
+        finally:
+            for cache in held:
+                cache.release()
+        self._changes.publish(version, feed)
+        return version
+    
+    def _drop_fragments(self, operations: List[List[Any]]) -> List[FragmentCache]:
+        """
+        Hold the caches of the collections ``operations`` write (see ``_replay``) and drop what they wrote.
+        
+        Returns:
+            The caches held, to ``release`` once the write is published
+        """
+        written: Dict[str, List[Any]] = {}
+        cleared: Dict[str, FragmentCache] = {}
+        for kind, *arguments in operations:
+            if kind in ("put", "del"):
+                record_id = arguments[1]["id"] if kind == "put" else arguments[1]
+                written.setdefault(arguments[0], []).append(record_id)
+            elif kind == "replace" and arguments[0] in self._fragments:
+                cleared[arguments[0]] = self._fragments[arguments[0]]
+            elif kind == "load":
+                cleared.update(self._fragments)
+        held = []
+        for collection, cache in self._fragments.items():
+            if collection in cleared or collection in written:
+                cache.hold()
+                held.append(cache)
+                if collection in cleared:
+                    cache.clear()
+                else:
+                    cache.discard(written[collection])
+        return held
+    
+    def _wait_durable(self, version: int):
+        """Wait until the write that produced ``version`` is on disk, if persistent."""
+        persistence = self._persistence
+        if persistence is not None:
+            persistence.wait(version)
+    
+    def _replay(self, collections: Dict[str, Any], owned: set, operations: Iterable[List[Any]]):
+        """
+        Apply logged operations to ``collections``, in place.
+        
+        Must be called with the lock held. A collection is copied on its
+        first write and its name added to ``owned``; owned states are then
+        changed in place, so a long log replays without a copy per entry.
+        The operations are:
+        
+        - ``["put", collection, record]``: store a record, replacing the
+          one with the same ID
+        - ``["del", collection, record_id]``: delete a record
+        - ``["replace", collection, records]``: replace all records
+        - ``["load", data]``: replace all collections, as ``import_data``
+        - ``["index", collection, field]`` and ``["range_index", ...]``:
+          declare an index
+        """
+        def writable(collection: str) -> CollectionState:
+            if collection not in owned:
+                collections[collection] = collections[collection].copy()
+                owned.add(collection)
+            return collections[collection]
+        
+        for kind, *arguments in operations:
+            if kind == "load":
+                collections.clear()
+                collections.update(self._build_collections(arguments[0]))
+                owned.update(collections)
+            elif kind == "replace":
+                collection, records = arguments
+                collections[collection] = self._build_state(collection, records)
+                owned.add(collection)
+            elif kind == "put":
+                collection, record = arguments
+                state = writable(collection)
+                slot = state.id_index.get(record["id"])
+                if slot is None:
+                    state.append(record)
+                else:
+                    state.replace(slot, record)
+            elif kind == "del":
+                collection, record_id = arguments
+                state = writable(collection)
+                slot = state.id_index.get(record_id)
+                if slot is not None:
+                    state.remove(slot)
+            elif kind in ("index", "range_index"):
+                collection, field = arguments
+                declared = self._index_fields if kind == "index" else self._range_index_fields
+                fields = declared.setdefault(collection, [])
+                if field not in fields:
+                    fields.append(field)
+                state = writable(collection)
+                state.add_hash_index(field) if kind == "index" else state.add_range_index(field)
+            else:
+                raise ValueError(f"Unknown logged operation '{kind}'")
+    
+    def attach(self, persistence: Any):
+        """
+        Restore the database from ``persistence`` and make it durable.
+        
+        The current contents are replaced by the newest snapshot with the
+        log written after it replayed on top. If the directory holds no
+        snapshot yet, the current contents are written as the first one.
+        From then on every write is logged, and snapshots are taken in the
+        background (see ``checkpoint``).
+        
+        Args:
+            persistence: ``Persistence`` to restore from and log to
+            
+        Raises:
+            RuntimeError: If a persistence is already attached
+        """
+        with self._lock:
+            if self._persistence is not None:
+                raise RuntimeError("Database already has persistence attached")
+            
+            version, data, indexes = persistence.load_snapshot()
+            if data is None:
+                persistence.write_snapshot(self._snapshot)
+            else:
+                for collection, fields in indexes.items():
+                    for declared, kind in ((self._index_fields, "hash"), (self._range_index_fields, "range")):
+                        known = declared.setdefault(collection, [])
+                        known.extend(field for field in fields[kind] if field not in known)
+                self._snapshot = DatabaseSnapshot(self._build_collections(data), version)
+            
+            collections = dict(self._snapshot._collections)
+            owned: set = set()
+            version = self._snapshot.version
+            for state in collections.values():
+                if isinstance(state, CollectionState):
+                    state.stamp(version)
+            for version, operations in persistence.log.read(version):
+                self._replay(collections, owned, operations)
+            for collection in owned:
+                if isinstance(collections.get(collection), CollectionState):
+                    collections[collection].stamp(version)
+            caches = list(self._fragments.values())
+            for cache in caches:
+                cache.hold()
+                cache.clear()
+            try:
+                self._snapshot = DatabaseSnapshot(collections, version)
+                self.instance_id = uuid4().hex[:12]
+            finally:
+                for cache in caches:
+                    cache.release()
+            
+            self._counts.clear()
+            # Restored versions are not those the feed was following
+            self._changes.reset(self._snapshot.version)
+            persistence.start(self, self._snapshot.version)
+            self._persistence = persistence
+    
+    def share(self, shared: Any, initialize: Optional[Callable[[], None]] = None):
+        """
+        Keep a collection in step with the other worker processes sharing it.
+        
+        The first process to share the collection calls ``initialize`` (e.g.
+        ``seed_listings``) and publishes the result; the others map the
+        published records instead, and skip ``initialize``. From then on
+        ``bulk_write`` and the writes built on it are logged to the shared
+        directory, and ``refresh`` applies the writes other processes logged.
+        Writes applied from the shared directory are not logged again to
+        ``persistence``, as the directory already holds them.
+        
+        Args:
+            shared: ``SharedCollection`` to keep in step with
+            initialize: Callable filling the collection when nothing has
+                been published yet
+                
+        Raises:
+            RuntimeError: If the collection is already shared
+        """
+        collection = shared.collection
+        if collection in self._shared:
+            raise RuntimeError(f"Collection '{collection}' is already shared")
+        with shared.exclusive():
+            if shared.generation == 0:
+                if initialize is not None:
+                    initialize()
+                shared.publish(self._snapshot._state(collection).records.iter_unloaded())
+            else:
+                self._sync_shared(shared)
+            self._shared[collection] = shared
     
-    def __init__(self):
-        """Initialize the in-memory database with default structure."""
-        self._data = {
-            "users": [],
-            "sessions": [],
-            "listings": [],
-            "data": {}
-        }
-        self._lock = threading.Lock()
+    def _sync_shared(self, shared: Any):
+        """Catch up with the newest generation of a shared collection."""
+        shared.sync(partial(self._load_shared, shared.collection), self._apply_shared)
     
-    def _generate_id(self) -> str:
-        """Generate a unique ID for new records."""
-        return str(uuid4())
+    def _load_shared(self, collection: str, table: MappedTable):
+        """Replace ``collection`` with the records of a mapped shared base."""
+        state = self._build_state(collection, table)
+        with self._lock:
+            self._publish({collection: state}, [], [["replace", collection, table]])
     
-    def _add_timestamp(self, record: Dict[str, Any]) -> Dict[str, Any]:
-        """Add timestamp to a record."""
-        now = datetime.utcnow().isoformat()
-        record["created_at"] = now
-        record["updated_at"] = now
-        return record
+    def _apply_shared(self, operations: List[List[Any]]):
+        """Apply writes another process logged to a shared collection."""
+        with self._lock:
+            collections = dict(self._snapshot._collections)
+            self._replay(collections, set(), operations)
+            self._install(collections, [], operations)
     
-    def _update_timestamp(self, record: Dict[str, Any]) -> Dict[str, Any]:
-        """Update timestamp for an existing record."""
-        record["updated_at"] = datetime.utcnow().isoformat()
-        return record
+    def refresh(self):
+        """
+        Load the shared collections other processes have written since last loaded.
+        
+        Checking costs one read of each mapped generation counter, so this
+        can run before every request. Does nothing without shared collections.
+        """
+        for shared in self._shared.values():
+            if shared.is_stale():
+                self._sync_shared(shared)
     
-    def seed_listings(self):
-        """Seed the listings collection with sample data."""
+    def is_stale(self) -> bool:
+        """Check whether other processes wrote a shared collection since it was last loaded."""
+        return any(shared.is_stale() for shared in self._shared.values())
+    
+    @contextmanager
+    def _shared_write(self, collection: str) -> Iterator[Optional[Any]]:
+        """
+        Hold the directory of ``collection`` while writing it, if it is shared.
+        
+        The newest generation is loaded first, so the write applies on top
+        of it, and no other process can write before the write is logged.
+        Yields the ``SharedCollection`` to log the write to, or None.
+        """
+        shared = self._shared.get(collection)
+        if shared is None:
+            yield None
+            return
+        with shared.exclusive():
+            self._sync_shared(shared)
+            yield shared
+    
+    @contextmanager
+    def _shared_replace(self, collections: Iterable[str]) -> Iterator[None]:
+        """
+        Hold the directories of the shared ``collections`` while replacing them.
+        
+        A replaced collection is published as a new base once the
+        replacement is, rather than logged record by record.
+        """
+        shared = [self._shared[collection] for collection in collections if collection in self._shared]
+        with ExitStack() as stack:
+            for collection in shared:
+                stack.enter_context(collection.exclusive())
+            yield
+            for collection in shared:
+                collection.publish(self._snapshot._state(collection.collection).records.iter_unloaded())
+    
+    def checkpoint(self):
+        """
+        Write the current state as a snapshot and drop the log it replaces.
+        
+        Only switching to a new log segment holds the writer lock; the
+        snapshot is written from the published, immutable state while writes
+        continue. Does nothing without persistence.
+        """
+        persistence = self._persistence
+        if persistence is None:
+            return
         with self._lock:
-            if "listings" not in self._data:
-                self._data["listings"] = []
-            
-            # Clear existing listings
-            self._data["listings"] = []
-            
-            # Add seed data with proper formatting
-            for listing_data in LISTING_SEED_DATA:
-                # Convert the listing data to match our schema
-                listing_record = {
-                    "id": str(listing_data["id"]),  # Convert to string for consistency
-                    "listing_id": listing_data["id"],
-                    "development_name": listing_data.get("developmentName", ""),
-                    "post_town": listing_data["addressDetails"]["city"],
-                    "shortened_post_code": listing_data["addressDetails"]["shortenedPostcode"],
-                    "region": listing_data["addressDetails"]["region"],
-                    "property_type": listing_data["propertyType"],
-                    "bedrooms": listing_data["bedrooms"],
-                    "bathrooms": listing_data["bathrooms"],
-                    "size_sq_ft": listing_data["sizeSqFt"],
-                    "price_in_cents": listing_data["priceInCents"],
-                    "minimum_deposit_in_cents": listing_data["minimumDepositInCents"],
-                    "estimated_deposit_in_cents": listing_data["estimatedDepositInCents"],
-                    "rental_income_in_cents": listing_data["monthlyRentalIncomeInCents"],
-                    "is_tenanted": listing_data.get("isTenanted", False),
-                    "is_cash_only": listing_data.get("isCashOnly", False),
-                    "description": listing_data.get("description", ""),
-                    "photos": listing_data.get("photos", []),
-                    "is_featured": listing_data.get("isFeatured", False),
-                    "gross_yield": listing_data.get("grossYield", 0),
-                    "has_user_requested_contact": listing_data.get("hasUserRequestedContact", False),
-                    "has_user_saved_listing": listing_data.get("hasUserSavedListing", False),
-                    "is_share_sale": listing_data.get("isShareSale", False),
-                    "is_getground_company": listing_data.get("isCompany", False),
-                    "made_visible_at": listing_data.get("madeVisibleAt"),
-                }
+            snapshot = self._snapshot
+            persistence.rotate(snapshot.version)
+        persistence.write_snapshot(snapshot)
+    
+    def close(self):
+        """Flush the log and stop background checkpoints, detaching persistence."""
+        with self._lock:
+            persistence, self._persistence = self._persistence, None
+        if persistence is not None:
+            persistence.close()
+    
+    def snapshot(self) -> DatabaseSnapshot:
+        """
+        Get a consistent, read-only view of the current database state.
+        
+        Returns:
+            DatabaseSnapshot: Current snapshot; unaffected by later writes
+        """
+        return self._snapshot
+    
+    def changes_since(
+        self,
+        seq: int,
+        collection: Optional[str] = None
+    ) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+        """
+        Get the changes written after sequence number ``seq``.
+        
+        Sequence numbers are snapshot versions: start from the ``version``
+        of the snapshot a collection was read from, then from the sequence
+        number returned by the previous call. Costs the number of changes
+        returned, whatever the size of the collections. No lock is held
+        while the records are read; ``put`` changes hold read-only views of
+        the records as written.
+        
+        Args:
+            seq: Sequence number to follow the changes from
+            collection: Only changes to this collection are returned; all by
+                default
                 
-                # Add timestamps
-                listing_record = self._add_timestamp(listing_record)
-                self._data["listings"].append(listing_record)
+        Returns:
+            Tuple of the changes, oldest first (see ``app.services.changes``),
+            and the sequence number to ask from next. The changes are None
+            when the caller has to resync: read the collection again, as
+            changes since ``seq`` are no longer kept.
+        """
+        return self._changes.changes_since(seq, collection)
+    
+    def subscribe(
+        self,
+        since: Optional[int] = None,
+        collection: Optional[str] = None,
+        maxsize: Optional[int] = None
+    ) -> ChangeSubscription:
+        """
+        Subscribe the running event loop to the changes written from now on.
+        
+        Changes are pushed into a bounded asyncio queue; a subscriber that
+        lets it fill up is dropped and told to resync. See
+        ``ChangeFeed.subscribe``.
+        
+        Args:
+            since: Also queue the changes written after this sequence number
+            collection: Only queue changes to this collection
+            maxsize: Changes the queue holds before the subscriber is dropped
+            
+        Returns:
+            The subscription, an async iterator of changes
+            
+        Raises:
+            RuntimeError: If no event loop is running
+        """
+        return self._changes.subscribe(since, collection, maxsize)
+    
+    def fragment_cache(self, collection: str) -> Optional[FragmentCache]:
+        """
+        Get the cache of serialized records of a collection, if it keeps one.
+        
+        Callers encode records themselves and store the bytes by record ID
+        and variant; writes drop the entries of the records they write.
+        Take a ``token`` before reading the records to encode.
+        
+        Args:
+            collection: Name of the collection
+            
+        Returns:
+            The cache, or None if the collection keeps none
+        """
+        return self._fragments.get(collection)
     
-    def get_all(self, collection: str) -> List[Dict[str, Any]]:
+    def seed_listings(self):
+        """
+        Seed the listings collection with sample data.
+        
+        The listings are mapped from the seed artifact (see
+        ``app.services.seed``), and decoded when first read.
+        """
+        listings = load_seed_listings()
+        
+        # Replace existing listings
+        state = self._build_state("listings", listings)
+        with self._shared_replace(["listings"]), self._lock:
+            # Mapped listings are only decoded to be logged
+            logged = listings if self._persistence is None else list(listings)
+            version = self._publish({"listings": state}, [["replace", "listings", logged]])
+        self._wait_durable(version)
+    
+    def get_all(self, collection: str, view: bool = False) -> List[Dict[str, Any]]:
         """
         Get all records from a collection.
         
         Args:
             collection: Name of the collection to retrieve
-            
+            view: Return a zero-copy, read-only ``RecordsView`` instead of
+                a new list
+                
         Returns:
             List of all records in the collection
             
         Raises:
             KeyError: If collection doesn't exist
         """
-        with self._lock:
-            if collection not in self._data:
-                raise KeyError(f"Collection '{collection}' not found")
-            return self._data[collection].copy()
+        return self._snapshot.get_all(collection, view)
     
-    def get_by_id(self, collection: str, record_id: str) -> Optional[Dict[str, Any]]:
+    def get_by_id(self, collection: str, record_id: str, view: bool = False) -> Optional[Dict[str, Any]]:
         """
         Get a record by ID from a collection.
         
         Args:
             collection: Name of the collection to search
             record_id: ID of the record to retrieve
+            view: Return a read-only view of the record instead of a copy
             
         Returns:
             Record if found, None otherwise
@@ -124,14 +1770,34 @@ class InMemoryDatabase:
         Raises:
             KeyError: If collection doesn't exist
         """
-        with self._lock:
-            if collection not in self._data:
-                raise KeyError(f"Collection '{collection}' not found")
+        return self._snapshot.get_by_id(collection, record_id, view)
+    
+    def collection_version(self, collection: str) -> int:
+        """
+        Get the version of the snapshot that last wrote a collection.
+        
+        Every write to the collection increases it. Versions are only
+        comparable within one ``instance_id``.
+        
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        return self._snapshot.collection_version(collection)
+    
+    def record_version(self, collection: str, record_id: str) -> Optional[int]:
+        """
+        Get the version of the snapshot that last wrote a record.
+        
+        Every write to the record increases it. Versions are only comparable
+        within one ``instance_id``.
+        
+        Returns:
+            The version, or None if the collection has no such record
             
-            for record in self._data[collection]:
-                if record.get("id") == record_id:
-                    return record.copy()
-            return None
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        return self._snapshot.record_version(collection, record_id)
     
     def create(self, collection: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -147,18 +1813,7 @@ class InMemoryDatabase:
         Raises:
             KeyError: If collection doesn't exist
         """
-        with self._lock:
-            if collection not in self._data:
-                raise KeyError(f"Collection '{collection}' not found")
-            
-            # Generate ID and add timestamps
-            record = data.copy()
-            record["id"] = self._generate_id()
-            record = self._add_timestamp(record)
-            
-            # Add to collection
-            self._data[collection].append(record)
-            return record.copy()
+        return self.create_many(collection, [data])[0]
     
     def update(self, collection: str, record_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -174,23 +1829,9 @@ class InMemoryDatabase:
             
         Raises:
             KeyError: If collection doesn't exist
+            ValueError: If ``data`` changes the ``id`` of the record
         """
-        with self._lock:
-            if collection not in self._data:
-                raise KeyError(f"Collection '{collection}' not found")
-            
-            for i, record in enumerate(self._data[collection]):
-                if record.get("id") == record_id:
-                    # Update record with new data
-                    updated_record = record.copy()
-                    updated_record.update(data)
-                    updated_record = self._update_timestamp(updated_record)
-                    
-                    # Replace in collection
-                    self._data[collection][i] = updated_record
-                    return updated_record.copy()
-            
-            return None
+        return self.update_many(collection, [(record_id, data)])[0]
     
     def delete(self, collection: str, record_id: str) -> bool:
         """
@@ -206,24 +1847,190 @@ class InMemoryDatabase:
         Raises:
             KeyError: If collection doesn't exist
         """
+        return self.delete_many(collection, [record_id])[0]
+    
+    def create_many(self, collection: str, items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Create several records in one write.
+        
+        Args:
+            collection: Name of the collection to add to
+            items: Record data to create
+            
+        Returns:
+            Created records with IDs and timestamps, in the order of ``items``
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        return self.bulk_write(collection, create=items)["created"]
+    
+    def update_many(
+        self,
+        collection: str,
+        updates: Iterable[Tuple[str, Dict[str, Any]]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Update several records in one write.
+        
+        Args:
+            collection: Name of the collection to update
+            updates: ``(record_id, data)`` pairs, applied in order
+            
+        Returns:
+            For each pair, the updated record, or None if it was not found
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If an update changes the ``id`` of its record
+        """
+        return self.bulk_write(collection, update=updates)["updated"]
+    
+    def delete_many(self, collection: str, record_ids: Iterable[str]) -> List[bool]:
+        """
+        Delete several records in one write.
+        
+        Args:
+            collection: Name of the collection to delete from
+            record_ids: IDs of the records to delete
+            
+        Returns:
+            For each ID, True if the record was deleted, False if not found
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        return self.bulk_write(collection, delete=record_ids)["deleted"]
+    
+    def bulk_write(
+        self,
+        collection: str,
+        create: Iterable[Dict[str, Any]] = (),
+        update: Iterable[Tuple[str, Dict[str, Any]]] = (),
+        delete: Iterable[str] = (),
+        upsert: Iterable[Dict[str, Any]] = ()
+    ) -> Dict[str, List[Any]]:
+        """
+        Apply a batch of creates, upserts, updates and deletes as a single write.
+        
+        The batch takes the writer lock once and is published as one
+        snapshot, so readers see all of it or none of it. Every record it
+        writes gets the same timestamp, and indexes are updated per record
+        rather than rebuilt. Creates are applied first, then upserts, then
+        updates, then deletes, each in the given order.
+        
+        Args:
+            collection: Name of the collection to write to
+            create: Record data to create
+            update: ``(record_id, data)`` pairs to update
+            delete: IDs of the records to delete
+            upsert: Records to store under their own ``id``, replacing any
+                record with that ID (whose creation time is kept)
+                
+        Returns:
+            Dictionary with the ``created`` records, the ``upserted`` flags
+            (True where a record was replaced), the ``updated`` records (None
+            where not found) and the ``deleted`` flags (False where not
+            found), each in the order of its input
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If a record to upsert has no ``id``, or an update
+                changes the ``id`` of its record
+        """
+        now = datetime.utcnow().isoformat()
+        created = []
+        for data in create:
+            record = data.copy()
+            record["id"] = self._generate_id()
+            created.append(self._add_timestamp(record, now))
+        upserts = []
+        for data in upsert:
+            if "id" not in data:
+                raise ValueError("Records to upsert must have an 'id'")
+            upserts.append(data.copy())
+        update, delete = list(update), list(delete)
+        for record_id, data in update:
+            # Records are logged and invalidated by ID, which must not change
+            if data.get("id", record_id) != record_id:
+                raise ValueError("Updates cannot change the 'id' of a record")
+        
+        with self._shared_write(collection) as shared:
+            result = self._bulk_write(collection, created, upserts, update, delete, now, shared)
+            if shared is not None and shared.needs_compaction():
+                shared.publish(self._snapshot._state(collection).records.iter_unloaded())
+            return result
+    
+    def _bulk_write(
+        self,
+        collection: str,
+        created: List[Dict[str, Any]],
+        upserts: List[Dict[str, Any]],
+        update: List[Tuple[str, Dict[str, Any]]],
+        delete: List[str],
+        now: str,
+        shared: Optional[Any]
+    ) -> Dict[str, List[Any]]:
+        """Apply a prepared batch for ``bulk_write``, logging it to ``shared`` if given."""
+        replaced: List[bool] = []
+        updated: List[Optional[Dict[str, Any]]] = []
+        deleted: List[bool] = []
+        operations = [["put", collection, record] for record in created + upserts]
+        version = None
         with self._lock:
-            if collection not in self._data:
-                raise KeyError(f"Collection '{collection}' not found")
+            state = self._writable(collection)
+            for record in created:
+                state.append(record)
             
-            for i, record in enumerate(self._data[collection]):
-                if record.get("id") == record_id:
-                    del self._data[collection][i]
-                    return True
+            for record in upserts:
+                slot = state.id_index.get(record["id"])
+                if slot is None:
+                    state.append(self._add_timestamp(record, now))
+                else:
+                    record["created_at"] = state.records[slot].get("created_at", now)
+                    state.replace(slot, self._update_timestamp(record, now))
+                replaced.append(slot is not None)
             
-            return False
+            for record_id, data in update:
+                slot = state.id_index.get(record_id)
+                if slot is None:
+                    updated.append(None)
+                    continue
+                record = state.records[slot].copy()
+                record.update(data)
+                state.replace(slot, self._update_timestamp(record, now))
+                updated.append(record)
+                operations.append(["put", collection, record])
+            
+            for record_id in delete:
+                slot = state.id_index.get(record_id)
+                if slot is not None:
+                    state.remove(slot)
+                    operations.append(["del", collection, record_id])
+                deleted.append(slot is not None)
+            
+            if operations:
+                if shared is not None:
+                    shared.append(operations)
+                version = self._publish({collection: state}, operations)
+        if version is not None:
+            self._wait_durable(version)
+        
+        return {
+            "created": [record.copy() for record in created],
+            "upserted": replaced,
+            "updated": [None if record is None else record.copy() for record in updated],
+            "deleted": deleted,
+        }
     
-    def find(self, collection: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def find(self, collection: str, filters: Dict[str, Any], view: bool = False) -> List[Dict[str, Any]]:
         """
         Find records in a collection matching filters.
         
         Args:
             collection: Name of the collection to search
             filters: Dictionary of field-value pairs to match
+            view: Return read-only views of the records instead of copies
             
         Returns:
             List of matching records
@@ -231,16 +2038,217 @@ class InMemoryDatabase:
         Raises:
             KeyError: If collection doesn't exist
         """
-        with self._lock:
-            if collection not in self._data:
-                raise KeyError(f"Collection '{collection}' not found")
+        return self._snapshot.find(collection, filters, view)
+    
+    def find_range(
+        self,
+        collection: str,
+        ranges: Dict[str, Tuple[Any, Any]],
+        filters: Optional[Dict[str, Any]] = None,
+        order_by: Optional[str] = None,
+        descending: bool = False,
+        limit: Optional[int] = None,
+        view: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Find records in a collection matching range and equality filters.
+        
+        See ``DatabaseSnapshot.find_range``; answers queries such as "price
+        between X and Y, yield >= Z" in O(log n + k).
+        
+        Args:
+            collection: Name of the collection to search
+            ranges: Field to ``(low, high)`` inclusive bounds; either bound
+                may be None for an open-ended range
+            filters: Dictionary of field-value pairs to match
+            order_by: Range-indexed field to order results by
+            descending: Order results from the highest value down
+            limit: Maximum number of records to return
+            view: Return read-only views of the records instead of copies
+            
+        Returns:
+            List of matching records, in ``(order_by, id)`` order if
+            ``order_by`` is given
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``order_by`` is not range-indexed
+        """
+        return self._snapshot.find_range(collection, ranges, filters, order_by, descending, limit, view)
+    
+    def aggregate(
+        self,
+        collection: str,
+        field: str,
+        func: str = "count",
+        filters: Optional[Dict[str, Any]] = None,
+        ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        group_by: Optional[str] = None
+    ) -> Any:
+        """
+        Aggregate a field over the records matching equality and range filters.
+        
+        See ``DatabaseSnapshot.aggregate``.
+        
+        Args:
+            collection: Name of the collection to aggregate
+            field: Field to aggregate
+            func: One of ``count``, ``sum``, ``min``, ``max`` or ``mean``
+            filters: Dictionary of field-value pairs to match
+            ranges: Field to ``(low, high)`` inclusive bounds
+            group_by: Field to aggregate per value of
+            
+        Returns:
+            The aggregate, or a dictionary of aggregates per ``group_by``
+            value
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``func`` is not supported, or a ``group_by``
+                value is unhashable
+        """
+        return self._snapshot.aggregate(collection, field, func, filters, ranges, group_by)
+    
+    def count(
+        self,
+        collection: str,
+        filters: Optional[Dict[str, Any]] = None,
+        ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+        approximate: bool = False
+    ) -> int:
+        """
+        Count the records matching equality and range filters.
+        
+        Filtered counts are cached. An exact count is reused only while no
+        write has been published since; an approximate count is reused for
+        up to ``COUNT_CACHE_TTL`` seconds whatever the writes, so paged
+        listings do not pay for a full count on every request.
+        
+        Args:
+            collection: Name of the collection to count
+            filters: Dictionary of field-value pairs to match
+            ranges: Field to ``(low, high)`` inclusive bounds
+            approximate: Accept a count up to ``COUNT_CACHE_TTL`` seconds old
+            
+        Returns:
+            Number of matching records
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        snapshot = self._snapshot
+        if not filters and not ranges:
+            return snapshot.count(collection)
+        try:
+            key = (collection, frozenset((filters or {}).items()), frozenset((ranges or {}).items()))
+            cached = self._counts.get(key)
+        except TypeError:
+            # Unhashable filter values cannot be cached
+            return snapshot.count(collection, filters, ranges)
+        
+        now = time.monotonic()
+        if cached is not None:
+            count, version, counted_at = cached
+            if version == snapshot.version or (approximate and now - counted_at < self.COUNT_CACHE_TTL):
+                return count
+        
+        count = snapshot.count(collection, filters, ranges)
+        if len(self._counts) >= self.COUNT_CACHE_SIZE:
+            self._counts.clear()
+        self._counts[key] = (count, snapshot.version, now)
+        return count
+    
+    def get_page(
+        self,
+        collection: str,
+        limit: int,
+        order_by: str = "id",
+        descending: bool = False,
+        after: Optional[Tuple[Any, str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        view: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, str]]]:
+        """
+        Get one page of records in ``(order_by, id)`` order using keyset pagination.
+        
+        See ``DatabaseSnapshot.get_page``; range-indexed ``order_by`` fields
+        seek to the page in O(log n).
+        
+        Args:
+            collection: Name of the collection to page through
+            limit: Maximum number of records to return
+            order_by: Field to order records by; IDs break ties
+            descending: Order records from the highest value down
+            after: Position returned with the previous page, if any
+            filters: Dictionary of field-value pairs to match
+            view: Return read-only views of the records instead of copies
+            
+        Returns:
+            Tuple of the records and the position of the last one, or None
+            if no records follow
+            
+        Raises:
+            KeyError: If collection doesn't exist
+            ValueError: If ``after`` does not compare with the values of
+                ``order_by``
+        """
+        return self._snapshot.get_page(collection, limit, order_by, descending, after, filters, view)
+    
+    def create_index(self, collection: str, field: str):
+        """
+        Declare a secondary hash index on a collection field.
+        
+        The index is built immediately and maintained by every write and
+        bulk load from then on. Declaring an existing index is a no-op.
+        
+        Args:
+            collection: Name of the collection to index
+            field: Name of the field to index
+            
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        with self._shared_write(collection) as shared, self._lock:
+            state = self._writable(collection)
+            fields = self._index_fields.setdefault(collection, [])
+            if field in fields:
+                return
+            fields.append(field)
+            
+            state.add_hash_index(field)
+            operations = [["index", collection, field]]
+            if shared is not None:
+                shared.append(operations)
+            version = self._publish({collection: state}, operations)
+        self._wait_durable(version)
+    
+    def create_range_index(self, collection: str, field: str):
+        """
+        Declare a sorted range index on a collection field.
+        
+        The index is built immediately and maintained by every write and
+        bulk load from then on. Declaring an existing index is a no-op.
+        
+        Args:
+            collection: Name of the collection to index
+            field: Name of the field to index
             
-            matches = []
-            for record in self._data[collection]:
-                if all(record.get(key) == value for key, value in filters.items()):
-                    matches.append(record.copy())
+        Raises:
+            KeyError: If collection doesn't exist
+        """
+        with self._shared_write(collection) as shared, self._lock:
+            state = self._writable(collection)
+            fields = self._range_index_fields.setdefault(collection, [])
+            if field in fields:
+                return
+            fields.append(field)
             
-            return matches
+            state.add_range_index(field)
+            operations = [["range_index", collection, field]]
+            if shared is not None:
+                shared.append(operations)
+            version = self._publish({collection: state}, operations)
+        self._wait_durable(version)
     
     def get_collection_names(self) -> List[str]:
         """
@@ -249,38 +2257,69 @@ class InMemoryDatabase:
         Returns:
             List of collection names
         """
-        with self._lock:
-            return list(self._data.keys())
+        return self._snapshot.get_collection_names()
     
     def reset(self):
-        """Reset database to initial state."""
-        with self._lock:
-            self._data = {
-                "users": [],
-                "sessions": [],
-                "listings": [],
-                "data": {}
-            }
+        """Reset database to initial state, publishing shared collections as new bases."""
+        data = self._initial_data()
+        collections = self._build_collections(data)
+        with self._shared_replace(collections), self._lock:
+            version = self._install(collections, [["load", data]])
+            self._counts.clear()
+        self._wait_durable(version)
     
     def export_data(self) -> Dict[str, Any]:
         """
         Export all data as JSON-serializable dictionary.
         
+        The export is taken from a single snapshot, so it is consistent even
+        if writes happen while it is being built.
+        
         Returns:
             Dictionary containing all database data
         """
-        with self._lock:
-            return self._data.copy()
+        return self._snapshot.export_data()
+    
+    def iter_export(self, collections: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily iterate the entries of an export of one snapshot.
+        
+        No lock is held while iterating. See ``DatabaseSnapshot.iter_export``.
+        
+        Args:
+            collections: Names of the collections to export. Defaults to all
+                of them.
+                
+        Returns:
+            Iterator of read-only export entries
+            
+        Raises:
+            KeyError: If a collection doesn't exist
+        """
+        return self._snapshot.iter_export(collections)
     
     def import_data(self, data: Dict[str, Any]):
         """
         Import data from dictionary.
         
+        Shared collections are published as new bases.
+        
         Args:
             data: Dictionary containing data to import
+            
+        Raises:
+            ValueError: If ``data`` lacks a shared collection
         """
-        with self._lock:
-            self._data = data.copy()
+        # Indexes are built before taking the lock to keep writers unblocked
+        collections = self._build_collections(data)
+        for collection in self._shared:
+            if collection not in collections:
+                raise ValueError(f"Import lacks shared collection '{collection}'")
+        with self._shared_replace(collections), self._lock:
+            version = self._install(collections, [["load", data]])
+            # Approximate counts of the replaced data would be meaningless
+            self._counts.clear()
+        self._wait_durable(version)
 
 
 # Create global database instance
@@ -294,4 +2333,4 @@ def get_database() -> InMemoryDatabase:
     Returns:
         InMemoryDatabase: Database instance
     """
-    return database 
\ No newline at end of file
+    return database
@@ -0,0 +1,161 @@
+"""
+Serialized Record Cache
+
+This module provides the cache of serialized records that the in-memory
+database keeps for the collections declaring one (see
+``DEFAULT_FRAGMENT_CACHES``). Stored listings change rarely but are read
+constantly, and serving one (mapping it to the API shape, then encoding it)
+costs far more than copying its bytes. The cache keeps the encoded bytes of
+each record, per variant of the encoding (e.g. with photo thumbnails only),
+so responses can be assembled by joining cached fragments.
+
+Entries are built lazily, when a record is first served, and held in LRU
+order within a byte budget. Writers ``hold`` the cache and drop the entries
+of the records they write before the new snapshot is published, and
+``release`` it once it is, so a reader seeing the new version (e.g. to tag
+a response with it) never gets bytes of a replaced record. A reader may
+have read its records from the snapshot before that write, so it takes a
+``token`` before reading, and the entries it builds are only stored if the
+cache was neither held nor written since: bytes of a replaced record never
+outlive the write.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Set, Tuple
+
+
+class FragmentCache:
+    """
+    LRU cache of encoded records by record ID and variant, bounded in bytes.
+    
+    Safe to use from several threads.
+    """
+    
+    def __init__(self, budget: int):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            budget: Bytes of encoded records the cache holds at most
+        """
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[Any, Hashable], bytes]" = OrderedDict()
+        # Variants ever stored, to drop every variant of a record
+        self._variants: Set[Hashable] = set()
+        # Bumped whenever entries are dropped or a hold ends, see ``token``
+        self._generation = 0
+        # Writes holding the cache, see ``hold``
+        self._holds = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return len(self._entries)
+    
+    def token(self) -> int:
+        """
+        Get the token to store entries built from records read after this call.
+        
+        Returns:
+            Token for ``put`` and ``fetch``
+        """
+        return self._generation
+    
+    def get(self, record_id: Any, variant: Hashable) -> Optional[bytes]:
+        """Get the encoded record, or None if it is not cached."""
+        key = (record_id, variant)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+    
+    def put(self, record_id: Any, variant: Hashable, data: bytes, token: int):
+        """
+        Store an encoded record, evicting the least recently used ones beyond the budget.
+        
+        Nothing is stored if entries were dropped or the cache held since
+        ``token`` was taken, as the record may have been replaced meanwhile,
+        while the cache is held, or if ``data`` alone exceeds the budget.
+        
+        Args:
+            record_id: ID of the record
+            variant: Variant of the encoding
+            data: Encoded record
+            token: Token taken before the record was read
+        """
+        if len(data) > self.budget:
+            return
+        key = (record_id, variant)
+        with self._lock:
+            if token != self._generation or self._holds:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = data
+            self._variants.add(variant)
+            self.size += len(data)
+            while self.size > self.budget:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+    
+    def fetch(self, record_id: Any, variant: Hashable, token: int, build: Callable[[], bytes]) -> bytes:
+        """
+        Get the encoded record, building and storing it on a miss.
+        
+        Args:
+            record_id: ID of the record
+            variant: Variant of the encoding
+            token: Token taken before the record was read
+            build: Encodes the record
+            
+        Returns:
+            The encoded record
+        """
+        data = self.get(record_id, variant)
+        if data is None:
+            data = build()
+            self.put(record_id, variant, data, token)
+        return data
+    
+    def hold(self):
+        """
+        Stop storing entries until ``release``, for a write about to be published.
+        
+        Until the write is published, readers may still read the records it
+        replaces, so nothing they build can be stored.
+        """
+        with self._lock:
+            self._holds += 1
+            self._generation += 1
+    
+    def release(self):
+        """End a ``hold`` once the write is published; tokens taken meanwhile stay stale."""
+        with self._lock:
+            self._holds -= 1
+            self._generation += 1
+    
+    def discard(self, record_ids: Iterable[Any]):
+        """Drop every variant of the records with these IDs."""
+        with self._lock:
+            self._generation += 1
+            for record_id in record_ids:
+                for variant in self._variants:
+                    data = self._entries.pop((record_id, variant), None)
+                    if data is not None:
+                        self.size -= len(data)
+    
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.size = 0
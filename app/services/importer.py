@@ -0,0 +1,341 @@
+"""
+Listing Import
+
+This module loads listing feeds too large to parse in one go. A feed is
+newline-delimited JSON, or a JSON array, of listings in the camelCase shape
+of ``LISTING_SEED_DATA``, received as chunks of bytes. ``ListingImporter``
+parses the chunks as they arrive, validates every listing against
+``ListingRecord`` and maps it to the stored shape (see ``stored_listing``);
+``import_listings`` and ``import_listings_async`` drive it from a file or a
+request body and commit every ``CHUNK_SIZE`` listings as one upsert, so the
+writer lock is only ever held for one chunk.
+
+A listing that is not valid JSON or fails validation is reported with its
+position in the feed and skipped, and the rest of the feed is imported. In
+a JSON array malformed JSON cannot be skipped over, so it ends the import
+at that point.
+"""
+
+import codecs
+import json
+import re
+from typing import Any, AsyncIterable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.models.schemas import ListingRecord
+from app.services.async_database import AsyncInMemoryDatabase
+from app.services.database import InMemoryDatabase
+from app.services.seed import stored_listing
+
+
+# Listings committed per write
+CHUNK_SIZE = 500
+
+# Longest listing of a JSON array feed, in characters, waited for before
+# giving up on it as malformed
+MAX_LISTING_SIZE = 1 << 20
+
+# Errors listed in a report; further ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+_WHITESPACE = re.compile(r"\s*")
+
+# What can follow a complete number or literal in an array
+_SCALAR_END = re.compile(r"[\s,\]]")
+
+_DECODER = json.JSONDecoder()
+
+
+class ImportReport:
+    """Progress and outcome of a listing import."""
+    
+    def __init__(self):
+        """Initialize an empty report."""
+        # Listings read from the feed, valid or not
+        self.read = 0
+        # Listings committed to the database
+        self.imported = 0
+        # Listings skipped as invalid
+        self.failed = 0
+        # The first ``MAX_REPORTED_ERRORS`` failures, in feed order
+        self.errors: List[Dict[str, Any]] = []
+    
+    def add_error(self, position: int, listing_id: Any, message: str):
+        """
+        Record that a listing was skipped.
+        
+        Args:
+            position: 1-based position of the listing in the feed
+            listing_id: ``id`` of the listing, if it has one
+            message: Why the listing was skipped
+        """
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"position": position, "id": listing_id, "error": message})
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the report as a JSON-serializable dictionary."""
+        return {"read": self.read, "imported": self.imported, "failed": self.failed, "errors": self.errors}
+
+
+def _describe(error: ValidationError) -> str:
+    """Get a one-line description of a listing's validation errors."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+    )
+
+
+class _FeedParser:
+    """
+    Incremental parser of a feed, fed one chunk of bytes at a time.
+    
+    The first non-blank character tells the format: ``[`` starts a JSON
+    array, anything else newline-delimited JSON.
+    """
+    
+    def __init__(self):
+        """Initialize the parser before the first chunk."""
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        # None until the format is known
+        self._array: Optional[bool] = None
+        # A ',' or ']' comes next in an array
+        self._separator = False
+        self._ended = False
+        self.position = 0
+    
+    def feed(self, data: bytes, final: bool = False) -> List[Tuple[int, Any]]:
+        """
+        Parse the listings ``data`` completes.
+        
+        Args:
+            data: Next chunk of the feed
+            final: Whether this is the end of the feed
+            
+        Returns:
+            ``(position, value)`` pairs, where value is the parsed JSON or
+            a ``ValueError`` if the listing could not be parsed
+        """
+        if self._ended:
+            return []
+        self._buffer += self._decoder.decode(data, final)
+        if self._array is None:
+            self._buffer = self._buffer.lstrip()
+            if not self._buffer:
+                return []
+            self._array = self._buffer.startswith("[")
+            if self._array:
+                self._buffer = self._buffer[1:]
+        return self._parse_array(final) if self._array else self._parse_lines(final)
+    
+    def _parse_lines(self, final: bool) -> List[Tuple[int, Any]]:
+        """Parse the complete lines of a newline-delimited feed."""
+        lines = self._buffer.split("\n")
+        self._buffer = "" if final else lines.pop()
+        values = []
+        for line in lines:
+            if not line.strip():
+                continue
+            self.position += 1
+            try:
+                values.append((self.position, json.loads(line)))
+            except json.JSONDecodeError as exc:
+                values.append((self.position, ValueError(f"Invalid JSON: {exc.msg}")))
+        return values
+    
+    def _parse_array(self, final: bool) -> List[Tuple[int, Any]]:
+        """Parse the complete elements of a JSON array feed."""
+        buffer, index = self._buffer, 0
+        values = []
+        while not self._ended:
+            index = _WHITESPACE.match(buffer, index).end()
+            if index == len(buffer):
+                if final:
+                    self._ended = True
+                    values.append((self.position + 1, ValueError("Feed ends before the closing ']'")))
+                break
+            
+            if self._separator or buffer[index] == "]":
+                if buffer[index] == "]":
+                    self._ended = True
+                elif buffer[index] == ",":
+                    self._separator = False
+                    index += 1
+                else:
+                    self._ended = True
+                    values.append((self.position + 1, ValueError("Expected ',' or ']' after a listing")))
+                continue
+            
+            try:
+                value, end = _DECODER.raw_decode(buffer, index)
+            except json.JSONDecodeError as exc:
+                if not final and len(buffer) - index <= MAX_LISTING_SIZE:
+                    # Most likely the rest of the listing is yet to come
+                    break
+                self._ended = True
+                values.append((self.position + 1, ValueError(f"Invalid JSON: {exc.msg}")))
+                continue
+            if not final and not isinstance(value, (dict, list, str)) and not _SCALAR_END.match(buffer, end):
+                # A number could go on in the next chunk
+                break
+            self.position += 1
+            values.append((self.position, value))
+            self._separator = True
+            index = end
+        
+        self._buffer = buffer[index:]
+        return values
+
+
+class ListingImporter:
+    """
+    Turns the chunks of a listing feed into batches of stored listings.
+    
+    Feed it the chunks in order, then close it; commit every batch it
+    returns and count it with ``committed``.
+    """
+    
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        """
+        Initialize the importer.
+        
+        Args:
+            chunk_size: Listings per batch
+        """
+        self.chunk_size = chunk_size
+        self.report = ImportReport()
+        self._parser = _FeedParser()
+        self._pending: List[Dict[str, Any]] = []
+    
+    def feed(self, data: bytes) -> List[List[Dict[str, Any]]]:
+        """
+        Parse and validate the next chunk of the feed.
+        
+        Args:
+            data: Next chunk of the feed
+            
+        Returns:
+            Batches of stored listings now complete
+        """
+        return self._collect(self._parser.feed(data))
+    
+    def close(self) -> List[List[Dict[str, Any]]]:
+        """
+        Finish the feed.
+        
+        Returns:
+            The remaining batches of stored listings
+        """
+        batches = self._collect(self._parser.feed(b"", final=True))
+        if self._pending:
+            batches.append(self._pending)
+            self._pending = []
+        return batches
+    
+    def committed(self, batch: List[Dict[str, Any]]):
+        """Count a batch as imported."""
+        self.report.imported += len(batch)
+    
+    def _collect(self, values: List[Tuple[int, Any]]) -> List[List[Dict[str, Any]]]:
+        """Validate parsed listings into the pending batch, returning the full batches."""
+        batches = []
+        for position, value in values:
+            self.report.read += 1
+            listing = self._validate(position, value)
+            if listing is None:
+                continue
+            self._pending.append(listing)
+            if len(self._pending) >= self.chunk_size:
+                batches.append(self._pending)
+                self._pending = []
+        return batches
+    
+    def _validate(self, position: int, value: Any) -> Optional[Dict[str, Any]]:
+        """Get the stored shape of a parsed listing, or None after reporting why it is invalid."""
+        if isinstance(value, ValueError):
+            self.report.add_error(position, None, str(value))
+            return None
+        if not isinstance(value, dict):
+            self.report.add_error(position, None, "Expected a JSON object")
+            return None
+        try:
+            listing = ListingRecord.model_validate(value)
+        except ValidationError as exc:
+            self.report.add_error(position, value.get("id"), _describe(exc))
+            return None
+        # Validated values are stored as coerced; fields the schema does not
+        # describe (e.g. ``isFeatured``) are kept as given
+        return stored_listing({**value, **listing.model_dump(by_alias=True, mode="json")})
+
+
+def import_listings(
+    database: InMemoryDatabase,
+    source: Iterable[bytes],
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[ImportReport], None]] = None
+) -> ImportReport:
+    """
+    Import a listing feed, upserting listings by ID.
+    
+    For a file, pass ``iter(partial(file.read, 65536), b"")`` as ``source``.
+    
+    Args:
+        database: Database to import into
+        source: Chunks of the feed, in order
+        chunk_size: Listings committed per write
+        progress: Called with the report after every committed batch
+        
+    Returns:
+        ImportReport: Counts and per-listing errors
+    """
+    importer = ListingImporter(chunk_size)
+    
+    def commit(batches: List[List[Dict[str, Any]]]):
+        for batch in batches:
+            database.bulk_write("listings", upsert=batch)
+            importer.committed(batch)
+            if progress is not None:
+                progress(importer.report)
+    
+    for data in source:
+        commit(importer.feed(data))
+    commit(importer.close())
+    return importer.report
+
+
+async def import_listings_async(
+    database: AsyncInMemoryDatabase,
+    source: AsyncIterable[bytes],
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[ImportReport], None]] = None
+) -> ImportReport:
+    """
+    Import a listing feed arriving asynchronously, such as a request body.
+    
+    Chunks are parsed and validated on the event loop as they arrive, which
+    costs about as much as receiving them; batches are committed off it.
+    See ``import_listings``.
+    
+    Args:
+        database: Database facade to import into
+        source: Chunks of the feed, in order
+        chunk_size: Listings committed per write
+        progress: Called with the report after every committed batch
+        
+    Returns:
+        ImportReport: Counts and per-listing errors
+    """
+    importer = ListingImporter(chunk_size)
+    
+    async def commit(batches: List[List[Dict[str, Any]]]):
+        for batch in batches:
+            await database.bulk_write("listings", upsert=batch)
+            importer.committed(batch)
+            if progress is not None:
+                progress(importer.report)
+    
+    async for data in source:
+        await commit(importer.feed(data))
+    await commit(importer.close())
+    return importer.report
@@ -0,0 +1,400 @@
+"""
+Database Indexes
+
+This module contains the secondary index structures used by the in-memory
+database service to answer queries without scanning whole collections.
+
+Indexes are built on the copy-on-write containers in
+``app.services.structures``: ``copy()`` is cheap and a copy can be updated
+without affecting the original, so each database snapshot owns its indexes.
+"""
+
+from operator import itemgetter
+from typing import Any, Callable, Collection, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from app.services.structures import SortedChunks
+
+
+_value_of = itemgetter(0)
+_id_of = itemgetter(1)
+
+
+class HashIndex:
+    """
+    Equality index mapping a field value to the IDs of records holding it.
+    
+    Records that cannot be bucketed (unhashable field value, or an ID that
+    does not sort with the others) are kept aside and returned as candidates
+    for every lookup, so callers re-checking the filter still get correct
+    results.
+    
+    Over a dictionary-encoded field of compact records (see
+    ``app.services.records``) buckets are keyed by the records' value codes
+    instead of the values.
+    """
+    
+    def __init__(self, field: str, records: Iterable[Dict[str, Any]] = (), dictionary: Optional[Any] = None):
+        """
+        Initialize the index over ``field``.
+        
+        Args:
+            field: Name of the record field to index
+            records: Records to index
+            dictionary: ``ValueDictionary`` the field of the records is
+                encoded with, to key buckets by code
+        """
+        self.field = field
+        self._dictionary = dictionary
+        self._buckets: Dict[Hashable, SortedChunks] = {}
+        self._unindexed: Set[Any] = set()
+        # Values whose bucket only this index references
+        self._owned: Set[Hashable] = set()
+        self._fill((self._key_of(record), record.get("id")) for record in records)
+    
+    @classmethod
+    def from_columns(
+        cls,
+        field: str,
+        values: Iterable[Any],
+        record_ids: Iterable[Any],
+        dictionary: Optional[Any] = None
+    ) -> "HashIndex":
+        """
+        Build the index from column-wise data instead of records.
+        
+        Args:
+            field: Name of the indexed field
+            values: Value of the field in each record (None if missing)
+            record_ids: ID of each record, in the same order
+            dictionary: ``ValueDictionary`` to key buckets by code with
+            
+        Returns:
+            The index
+        """
+        index = cls(field, dictionary=dictionary)
+        index._fill(zip(values if dictionary is None else map(dictionary.encode, values), record_ids))
+        return index
+    
+    def _key_of(self, record: Dict[str, Any]) -> Any:
+        """Get the bucket key of ``record``: its value, or the code of its value."""
+        if self._dictionary is None:
+            return record.get(self.field)
+        return record.code(self.field)
+    
+    def _fill(self, entries: Iterable[Tuple[Any, Any]]):
+        """Index ``(value, record_id)`` pairs into an empty index."""
+        groups: Dict[Hashable, list] = {}
+        for value, record_id in entries:
+            try:
+                groups.setdefault(value, []).append(record_id)
+            except TypeError:
+                self._unindexed.add(record_id)
+        for value, record_ids in groups.items():
+            try:
+                self._buckets[value] = SortedChunks(record_ids)
+            except TypeError:
+                self._unindexed.update(record_ids)
+    
+    def copy(self) -> "HashIndex":
+        """Return a copy that can be updated independently."""
+        clone = HashIndex.__new__(HashIndex)
+        clone.field = self.field
+        clone._dictionary = self._dictionary
+        clone._buckets = self._buckets.copy()
+        clone._unindexed = self._unindexed
+        clone._owned = set()
+        self._owned = set()
+        return clone
+    
+    def _bucket(self, value: Hashable) -> Optional[SortedChunks]:
+        """
+        Get the bucket of ``value`` to write to, copied first unless this index owns it.
+        
+        Raises:
+            TypeError: If ``value`` is unhashable
+        """
+        bucket = self._buckets.get(value)
+        if bucket is not None and value not in self._owned:
+            bucket = bucket.copy()
+            self._buckets[value] = bucket
+            self._owned.add(value)
+        return bucket
+    
+    def add(self, record: Dict[str, Any]):
+        """
+        Add a record to the index.
+        
+        Args:
+            record: Record to index
+        """
+        value, record_id = self._key_of(record), record.get("id")
+        try:
+            bucket = self._bucket(value)
+            if bucket is None:
+                bucket = SortedChunks()
+            bucket.add(record_id)
+        except TypeError:
+            self._unindexed = self._unindexed | {record_id}
+            return
+        if value not in self._buckets:
+            self._buckets[value] = bucket
+            self._owned.add(value)
+    
+    def remove(self, record: Dict[str, Any]):
+        """
+        Remove a record from the index.
+        
+        Args:
+            record: Record to remove, as it was when it was added
+        """
+        value, record_id = self._key_of(record), record.get("id")
+        if record_id in self._unindexed:
+            self._unindexed = self._unindexed - {record_id}
+            return
+        try:
+            bucket = self._bucket(value)
+        except TypeError:
+            return
+        if bucket is None:
+            return
+        
+        if bucket.discard(record_id) and not bucket:
+            del self._buckets[value]
+    
+    def lookup(self, value: Any) -> Collection[Any]:
+        """
+        Get the IDs of candidate records whose field equals ``value``.
+        
+        Args:
+            value: Value to look up (must be hashable)
+            
+        Returns:
+            Candidate record IDs; supports ``len``, ``in`` and iteration
+        """
+        if self._dictionary is not None:
+            value = self._dictionary.code(value)
+        bucket = self._buckets.get(value)
+        if self._unindexed:
+            return set(bucket or ()) | self._unindexed
+        return bucket if bucket is not None else ()
+
+
+class SortedIndex:
+    """
+    Ordered index over a field, for range queries and ordered iteration.
+    
+    Entries are ``(value, id)`` pairs kept sorted, so ties are broken by ID
+    and any entry can be located in O(log n). Records whose value is None or
+    not comparable with the other values are left out, since they can never
+    satisfy a range predicate.
+    """
+    
+    def __init__(self, field: str, records: Iterable[Dict[str, Any]] = ()):
+        """
+        Initialize the index over ``field``.
+        
+        Args:
+            field: Name of the record field to index
+            records: Records to index
+        """
+        self.field = field
+        self._fill((record.get(field), record.get("id")) for record in records)
+    
+    @classmethod
+    def from_columns(cls, field: str, values: Iterable[Any], record_ids: Iterable[Any]) -> "SortedIndex":
+        """
+        Build the index from column-wise data instead of records.
+        
+        Args:
+            field: Name of the indexed field
+            values: Value of the field in each record (None if missing)
+            record_ids: ID of each record, in the same order
+            
+        Returns:
+            The index
+        """
+        index = cls(field)
+        index._fill(zip(values, record_ids))
+        return index
+    
+    def _fill(self, entries: Iterable[Tuple[Any, Any]]):
+        """Index ``(value, record_id)`` pairs into an empty index."""
+        field = self.field
+        entries = [entry for entry in entries if entry[0] is not None]
+        try:
+            self._entries = SortedChunks(entries)
+        except TypeError:
+            # Mixed types: insert one by one, skipping strays
+            self._entries = SortedChunks()
+            for value, record_id in entries:
+                self.add({field: value, "id": record_id})
+    
+    def copy(self) -> "SortedIndex":
+        """Return a copy that can be updated independently."""
+        clone = SortedIndex.__new__(SortedIndex)
+        clone.field = self.field
+        clone._entries = self._entries.copy()
+        return clone
+    
+    def __len__(self) -> int:
+        """Return the number of indexed records."""
+        return len(self._entries)
+    
+    def add(self, record: Dict[str, Any]):
+        """
+        Add a record to the index.
+        
+        Args:
+            record: Record to index
+        """
+        value = record.get(self.field)
+        if value is None:
+            return
+        try:
+            self._entries.add((value, record.get("id")))
+        except TypeError:
+            pass
+    
+    def remove(self, record: Dict[str, Any]):
+        """
+        Remove a record from the index.
+        
+        Args:
+            record: Record to remove, as it was when it was added
+        """
+        value = record.get(self.field)
+        if value is None:
+            return
+        try:
+            self._entries.discard((value, record.get("id")))
+        except TypeError:
+            pass
+    
+    def _bounds(self, low: Any = None, high: Any = None) -> Tuple[int, int]:
+        """Get the entry positions covering ``low <= value <= high``."""
+        start = 0 if low is None else self._entries.bisect_left(low, key=_value_of)
+        stop = len(self._entries) if high is None else self._entries.bisect_right(high, key=_value_of)
+        return start, max(start, stop)
+    
+    def count(self, low: Any = None, high: Any = None) -> int:
+        """
+        Count the records with ``low <= value <= high`` in O(log n).
+        
+        Args:
+            low: Inclusive lower bound, or None for unbounded
+            high: Inclusive upper bound, or None for unbounded
+            
+        Returns:
+            Number of matching records
+        """
+        start, stop = self._bounds(low, high)
+        return stop - start
+    
+    def range(
+        self,
+        low: Any = None,
+        high: Any = None,
+        descending: bool = False,
+        after: Optional[Tuple[Any, Any]] = None
+    ) -> Iterator[Any]:
+        """
+        Iterate the IDs of records with ``low <= value <= high`` in index order.
+        
+        Args:
+            low: Inclusive lower bound, or None for unbounded
+            high: Inclusive upper bound, or None for unbounded
+            descending: Iterate from the highest value down
+            after: ``(value, id)`` entry to start strictly after, in the
+                direction of iteration; found by bisection
+                
+        Returns:
+            Iterator of record IDs ordered by ``(value, id)``
+            
+        Raises:
+            TypeError: If ``after`` does not compare with the indexed entries
+        """
+        start, stop = self._bounds(low, high)
+        if after is not None:
+            if descending:
+                stop = min(stop, self._entries.bisect_left(tuple(after)))
+            else:
+                start = max(start, self._entries.bisect_right(tuple(after)))
+        return map(_id_of, self._entries.islice(start, stop, reverse=descending))
+    
+    def values(self, low: Any = None, high: Any = None, descending: bool = False) -> Iterator[Any]:
+        """
+        Iterate the distinct values with ``low <= value <= high`` in order.
+        
+        Each value is found with a bisection, so the cost depends on the
+        number of distinct values visited, not on the number of records.
+        
+        Args:
+            low: Inclusive lower bound, or None for unbounded
+            high: Inclusive upper bound, or None for unbounded
+            descending: Iterate from the highest value down
+            
+        Yields:
+            Distinct indexed values
+        """
+        start, stop = self._bounds(low, high)
+        while start < stop:
+            if descending:
+                value, _ = next(self._entries.islice(stop - 1, stop))
+                stop = self._entries.bisect_left(value, key=_value_of)
+            else:
+                value, _ = next(self._entries.islice(start, start + 1))
+                start = self._entries.bisect_right(value, key=_value_of)
+            yield value
+
+
+class _Pending:
+    """Placeholder for an index that is built when first read."""
+    
+    __slots__ = ("build",)
+    
+    def __init__(self, build: Callable[[], Union[HashIndex, SortedIndex]]):
+        self.build = build
+
+
+class LazyIndexes(dict):
+    """
+    Field to index dictionary whose indexes are built when first read.
+    
+    Reading an index by key, ``get``, ``values`` or ``items`` builds it and
+    keeps it. Membership tests and key iteration never build. Two readers
+    may build the same index concurrently; both get an equal index, and
+    one of them is kept.
+    """
+    
+    def __init__(self, builders: Dict[str, Callable[[], Union[HashIndex, SortedIndex]]]):
+        """
+        Initialize the dictionary.
+        
+        Args:
+            builders: Field to a function building its index
+        """
+        super().__init__({field: _Pending(build) for field, build in builders.items()})
+    
+    def _resolve(self, field: str, index: Any) -> Any:
+        """Build ``index`` if it is still pending."""
+        if isinstance(index, _Pending):
+            index = index.build()
+            dict.__setitem__(self, field, index)
+        return index
+    
+    def __getitem__(self, field: str) -> Union[HashIndex, SortedIndex]:
+        """Get the index of ``field``, building it if needed."""
+        return self._resolve(field, dict.__getitem__(self, field))
+    
+    def get(self, field: str, default: Any = None) -> Any:
+        """Get the index of ``field``, building it if needed, or ``default``."""
+        index = dict.get(self, field, default)
+        return default if index is default else self._resolve(field, index)
+    
+    def values(self) -> List[Union[HashIndex, SortedIndex]]:
+        """Get every index, building the pending ones."""
+        return [self[field] for field in list(self)]
+    
+    def items(self) -> List[Tuple[str, Union[HashIndex, SortedIndex]]]:
+        """Get every ``(field, index)`` pair, building the pending indexes."""
+        return [(field, self[field]) for field in list(self)]
@@ -0,0 +1,435 @@
+"""
+Listings Service
+
+This module contains the listing search behind the listings API. Searches
+are answered from the database indexes: equality filters use the hash
+indexes, price and yield ranges and the primary sort key use the sorted
+range indexes, and pages are fetched with keyset (cursor) pagination so a
+page costs the same however deep it is.
+
+Listings are served encoded as JSON from the database's cache of serialized
+listings (``encode_listings``), so a listing is mapped and encoded once
+after each write rather than on every read.
+"""
+
+from functools import partial
+from itertools import groupby, islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from app.config.settings import get_settings
+from app.services.database import DatabaseSnapshot, InMemoryDatabase
+from app.services.fragments import FragmentCache
+from app.utils.helpers import decode_cursor, encode_cursor, encode_json
+
+
+# Fields listings can be sorted by; each must be range-indexed
+SORT_FIELDS = ("price_in_cents", "gross_yield", "bedrooms", "size_sq_ft", "minimum_deposit_in_cents")
+
+DEFAULT_SORT = "price_in_cents"
+
+# Records tying on the first sort key are sorted in memory up to this many
+TIE_SORT_LIMIT = 256
+
+SortKeys = List[Tuple[str, bool]]
+
+
+def parse_sort(sort: str) -> SortKeys:
+    """
+    Parse a sort specification such as ``"-gross_yield,price_in_cents"``.
+    
+    Args:
+        sort: Comma-separated field names, each optionally prefixed with
+            ``-`` for descending order
+            
+    Returns:
+        List of ``(field, descending)`` pairs
+        
+    Raises:
+        ValueError: If a field is not sortable or repeated
+    """
+    keys: SortKeys = []
+    for part in sort.split(","):
+        part = part.strip()
+        field, descending = (part[1:], True) if part.startswith("-") else (part, False)
+        if field not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by '{field}', expected one of {', '.join(SORT_FIELDS)}")
+        if any(field == existing for existing, _ in keys):
+            raise ValueError(f"Sort field '{field}' is repeated")
+        keys.append((field, descending))
+    return keys
+
+
+def _sort_value(value: Any) -> Optional[float]:
+    """Get a sortable number, treating missing and non-numeric values as None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _order_key(values: Iterable[Any], keys: SortKeys) -> tuple:
+    """Get a key that sorts ascending in the requested order."""
+    return tuple(-value if descending else value for value, (_, descending) in zip(values, keys))
+
+
+def _record_key(record: Mapping[str, Any], keys: SortKeys) -> tuple:
+    """Get the ``_order_key`` of a record."""
+    return _order_key((record.get(field) for field, _ in keys), keys)
+
+
+def _sort_ties(records: Iterator[Mapping[str, Any]], keys: SortKeys) -> Iterator[Mapping[str, Any]]:
+    """
+    Order records arriving in first-key order by the remaining keys.
+    
+    Only one group of records sharing the first key is held at a time, and
+    records lacking a numeric value for one of the keys are dropped.
+    """
+    first, _ = keys[0]
+    descending = keys[-1][1]
+    for _, group in groupby(records, key=lambda record: record.get(first)):
+        group = [
+            record for record in group
+            if all(_sort_value(record.get(field)) is not None for field, _ in keys)
+        ]
+        group.sort(key=lambda record: record["id"], reverse=descending)
+        group.sort(key=lambda record: _record_key(record, keys))
+        yield from group
+
+
+def encode_position(sort: str, values: List[Any], record_id: str) -> str:
+    """
+    Encode the position of the last record of a page as an opaque cursor.
+    
+    The cursor is bound to the sort specification it was issued for, so
+    ``decode_position`` rejects it under any other order.
+    
+    Args:
+        sort: Sort specification of the page
+        values: Values of the sort keys of the record
+        record_id: ID of the record
+    """
+    return encode_cursor({"sort": sort, "key": list(values), "id": record_id})
+
+
+def decode_position(cursor: str, sort: str, size: int) -> Tuple[List[Any], str]:
+    """
+    Get the sort key values and record ID a cursor made by ``encode_position`` points at.
+    
+    Args:
+        cursor: Cursor returned with the previous page
+        sort: Sort specification of the page asked for
+        size: Number of sort keys of ``sort``
+        
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another sort
+    """
+    position = decode_cursor(cursor)
+    if position is None:
+        raise ValueError("Invalid cursor")
+    if position.get("sort") != sort:
+        raise ValueError("Invalid cursor: it was issued for another sort order")
+    values, record_id = position.get("key"), position.get("id")
+    if not isinstance(values, list) or len(values) != size or not isinstance(record_id, str):
+        raise ValueError("Invalid cursor")
+    return values, record_id
+
+
+def _decode_position(cursor: str, sort: str, keys: SortKeys) -> Tuple[List[Any], str]:
+    """
+    Get the sort key values and record ID a listing search cursor points at.
+    
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another sort
+    """
+    values, record_id = decode_position(cursor, sort, len(keys))
+    if any(_sort_value(value) is None for value in values):
+        raise ValueError("Invalid cursor")
+    return values, record_id
+
+
+def _seek(ranges: Dict[str, Tuple[Any, Any]], field: str, descending: bool, value: Any) -> Dict[str, Tuple[Any, Any]]:
+    """Get ``ranges`` with the range of ``field`` narrowed to start at ``value``."""
+    low, high = ranges.get(field, (None, None))
+    if descending:
+        high = value if high is None else min(high, value)
+    else:
+        low = value if low is None else max(low, value)
+    return {**ranges, field: (low, high)}
+
+
+def _ordered(
+    snapshot: DatabaseSnapshot,
+    filters: Dict[str, Any],
+    ranges: Dict[str, Tuple[Any, Any]],
+    keys: SortKeys,
+    position: Optional[Tuple[List[Any], str]],
+    limit: int
+) -> Iterator[Mapping[str, Any]]:
+    """
+    Iterate matching listings in sort order, starting near the cursor position.
+    
+    The first sort key walks its range index. Records tying on it are
+    sorted by the remaining keys in memory when at most ``TIE_SORT_LIMIT``
+    records hold the tied value; a larger group is instead read by walking
+    the second key's range index with the first key pinned to the tied
+    value, after which the first walk resumes past that value. Pages
+    therefore never sort more than a bounded number of records, whatever
+    the cardinality of the sort keys.
+    """
+    primary, primary_descending = keys[0]
+    if _sort_value(filters.get(primary)) is not None:
+        # An equality filter on the first key leaves a single value to visit
+        ranges = _seek(ranges, primary, False, filters[primary])
+        ranges = _seek(ranges, primary, True, filters[primary])
+    if position is not None:
+        ranges = _seek(ranges, primary, primary_descending, position[0][0])
+    
+    if len(keys) == 1:
+        yield from snapshot.iter_range(
+            "listings", ranges, filters, order_by=primary, descending=primary_descending, limit_hint=limit
+        )
+        return
+    
+    secondary, secondary_descending = keys[1]
+    low, high = ranges.get(primary, (None, None))
+    while True:
+        records = snapshot.iter_range(
+            "listings", {**ranges, primary: (low, high)}, filters,
+            order_by=primary, descending=primary_descending, limit_hint=limit
+        )
+        for value, group in groupby(records, key=lambda record: record.get(primary)):
+            if snapshot.count_range("listings", primary, value, value) <= TIE_SORT_LIMIT:
+                yield from _sort_ties(group, keys)
+                continue
+            
+            # Too many ties to sort: walk the second key's index instead
+            group_ranges = {**ranges, primary: (value, value)}
+            if position is not None and value == position[0][0]:
+                group_ranges = _seek(group_ranges, secondary, secondary_descending, position[0][1])
+            records = snapshot.iter_range(
+                "listings", group_ranges, filters,
+                order_by=secondary, descending=secondary_descending, limit_hint=limit
+            )
+            yield from _sort_ties(records, keys[1:]) if len(keys) > 2 else records
+            
+            # Resume the first walk past the tied value
+            bounds = (low, value) if primary_descending else (value, high)
+            following = snapshot.distinct("listings", primary, *bounds, primary_descending)
+            next(following)
+            value = next(following, None)
+            if value is None:
+                return
+            low, high = (low, value) if primary_descending else (value, high)
+            break
+        else:
+            return
+
+
+def _after_cursor(
+    records: Iterator[Mapping[str, Any]],
+    keys: SortKeys,
+    values: List[Any],
+    record_id: str
+) -> Iterator[Mapping[str, Any]]:
+    """Skip the records up to and including the cursor position."""
+    cursor_key = _order_key(values, keys)
+    descending = keys[-1][1]
+    records = iter(records)
+    for record in records:
+        key = _record_key(record, keys)
+        later_id = record["id"] < record_id if descending else record["id"] > record_id
+        if key > cursor_key or (key == cursor_key and later_id):
+            yield record
+            break
+    yield from records
+
+
+def photo_payload(photo: Mapping[str, Any], base_url: str, thumbnails: bool = False) -> Dict[str, Any]:
+    """
+    Map a stored photo to the ``Photo`` API shape, building its URLs from its ID.
+    
+    Args:
+        photo: Stored photo, see ``app.services.seed.stored_photos``
+        base_url: Base URL of photos
+        thumbnails: Map to the ``PhotoThumbnail`` shape instead
+        
+    Returns:
+        Dictionary using the ``Photo`` (or ``PhotoThumbnail``) field aliases
+    """
+    if "id" not in photo:
+        # Stored with its URLs
+        if thumbnails:
+            return {"thumbnailURL": photo.get("thumbnailURL"), "mimeType": photo.get("mimeType")}
+        return {
+            "originalURL": photo.get("originalURL"),
+            "standardURL": photo.get("standardURL"),
+            "thumbnailURL": photo.get("thumbnailURL"),
+            "mimeType": photo.get("mimeType"),
+        }
+    original = base_url + photo["id"]
+    if thumbnails:
+        return {"thumbnailURL": original + "_thumbnail", "mimeType": photo["mimeType"]}
+    return {
+        "originalURL": original,
+        "standardURL": original + "_standard",
+        "thumbnailURL": original + "_thumbnail",
+        "mimeType": photo["mimeType"],
+    }
+
+
+def to_listing(record: Mapping[str, Any], thumbnails: bool = False) -> Dict[str, Any]:
+    """
+    Map a stored listing record to the ``ListingRecord`` API shape.
+    
+    Keys are in the order of the model's fields, so handlers can return the
+    result without validating it against the model (see
+    ``app.api.responses``) and send what validation would have.
+    
+    Args:
+        record: Stored listing record
+        thumbnails: Give only the thumbnail of each photo, in the
+            ``ListingSummary`` shape
+            
+    Returns:
+        Dictionary using the ``ListingRecord`` field aliases
+    """
+    base_url = get_settings().photo_base_url
+    return {
+        "addressDetails": {
+            "addressLine1": record.get("address_line1", ""),
+            "addressLine2": record.get("address_line2", ""),
+            "city": record.get("post_town"),
+            "postcode": record.get("post_code", ""),
+            "shortenedPostcode": record.get("shortened_post_code"),
+            "country": record.get("country", ""),
+            "region": record.get("region"),
+        },
+        "bedrooms": record.get("bedrooms"),
+        "bathrooms": record.get("bathrooms"),
+        "description": record.get("description", ""),
+        "id": record.get("listing_id"),
+        "grossYield": record.get("gross_yield"),
+        "isCashOnly": record.get("is_cash_only", False),
+        "isCompany": record.get("is_getground_company", False),
+        "isNewBuild": record.get("is_new_build", False),
+        "isShareSale": record.get("is_share_sale", False),
+        "isTenanted": record.get("is_tenanted", False),
+        "madeVisibleAt": record.get("made_visible_at"),
+        "estimatedDepositInCents": record.get("estimated_deposit_in_cents"),
+        "minimumDepositInCents": record.get("minimum_deposit_in_cents"),
+        "photos": [photo_payload(photo, base_url, thumbnails) for photo in record.get("photos", [])],
+        "priceInCents": record.get("price_in_cents"),
+        "propertyType": record.get("property_type"),
+        "monthlyRentalIncomeInCents": record.get("rental_income_in_cents"),
+        "sizeSqFt": record.get("size_sq_ft"),
+    }
+
+
+def encode_listings(
+    records: Iterable[Mapping[str, Any]],
+    thumbnails: bool = False,
+    cache: Optional[FragmentCache] = None,
+    token: int = 0
+) -> List[bytes]:
+    """
+    Encode stored listings as ``to_listing`` JSON, reusing cached encodings.
+    
+    Args:
+        records: Stored listing records
+        thumbnails: Give only the thumbnail of each photo
+        cache: Cache of serialized listings to read and fill, if any
+        token: ``cache.token()``, taken before ``records`` were read
+        
+    Returns:
+        The encoded listings, in order
+    """
+    if cache is None:
+        return [_encode_listing(record, thumbnails) for record in records]
+    # Encodings depend on the photo base URL as well
+    variant = (thumbnails, get_settings().photo_base_url)
+    return [
+        cache.fetch(record["id"], variant, token, partial(_encode_listing, record, thumbnails))
+        for record in records
+    ]
+
+
+def _encode_listing(record: Mapping[str, Any], thumbnails: bool) -> bytes:
+    """Encode a stored listing as ``to_listing`` JSON."""
+    return encode_json(to_listing(record, thumbnails))
+
+
+def search_listings(
+    database: InMemoryDatabase,
+    filters: Dict[str, Any],
+    ranges: Dict[str, Tuple[Any, Any]],
+    sort: str = DEFAULT_SORT,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Tuple[List[Mapping[str, Any]], Optional[str]]:
+    """
+    Get one page of listings matching filters, in the requested order.
+    
+    Sort keys are walked in their range indexes from the cursor position,
+    and the walk stops as soon as the page is full, so a page costs about
+    the same however deep it is and however large the collection grows.
+    Ties on every sort key are broken by record ID, in the direction of the
+    last key. Listings without a value for one of the sort keys are not
+    returned.
+    
+    Args:
+        database: Database to search
+        filters: Dictionary of field-value pairs to match
+        ranges: Field to ``(low, high)`` inclusive bounds
+        sort: Sort specification, see ``parse_sort``
+        limit: Maximum number of listings to return
+        cursor: Cursor returned with the previous page, if any
+        
+    Returns:
+        Tuple of the listings (as read-only stored records) and the cursor
+        of the next page, or None if this is the last page
+        
+    Raises:
+        ValueError: If the sort specification or the cursor is invalid
+    """
+    keys = parse_sort(sort)
+    position = None if cursor is None else _decode_position(cursor, sort, keys)
+    
+    records = _ordered(database.snapshot(), filters, ranges, keys, position, limit + 1)
+    if position is not None:
+        records = _after_cursor(records, keys, *position)
+    
+    page = list(islice(records, limit + 1))
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = encode_position(sort, [last.get(field) for field, _ in keys], last["id"])
+    return page, next_cursor
+
+
+def search_encoded_listings(
+    database: InMemoryDatabase,
+    filters: Dict[str, Any],
+    ranges: Dict[str, Tuple[Any, Any]],
+    sort: str = DEFAULT_SORT,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    thumbnails: bool = False
+) -> Tuple[List[bytes], Optional[str]]:
+    """
+    Get one page of listings as ``search_listings`` does, encoded by ``encode_listings``.
+    
+    Args:
+        database: Database to search, whose listings cache is used
+        thumbnails: Give only the thumbnail of each photo
+        
+    Returns:
+        Tuple of the encoded listings and the cursor of the next page, or
+        None if this is the last page
+        
+    Raises:
+        ValueError: If the sort specification or the cursor is invalid
+    """
+    cache = database.fragment_cache("listings")
+    token = 0 if cache is None else cache.token()
+    records, next_cursor = search_listings(database, filters, ranges, sort, limit, cursor)
+    return encode_listings(records, thumbnails, cache, token), next_cursor
@@ -0,0 +1,385 @@
+"""
+Database Persistence
+
+This module makes the in-memory database durable with a write-ahead log and
+periodic snapshots.
+
+Every published write is appended to the log as one JSON line holding the
+snapshot version it produced (which doubles as its log sequence number) and
+its changes: full after-images of written records, IDs of deleted ones.
+Appends only reach the OS buffer; a flusher thread fsyncs them, and writers
+wait until their line is on disk. Lines appended while an fsync runs are
+covered by the next one, so concurrent writers share fsyncs (group commit).
+
+A checkpoint writes the records of one published snapshot to a snapshot
+file (atomically, via rename) and deletes the log segments it covers.
+Recovery maps the newest snapshot (see ``app.services.binary_snapshot``),
+whose records are decoded lazily, and replays the log lines with a higher
+version.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.services.binary_snapshot import SnapshotFile, write_snapshot
+from app.services.database import CollectionState, DatabaseSnapshot
+
+
+# A logged change, e.g. ``["put", "listings", record]``
+Operation = List[Any]
+
+# Collection name to its declared ``{"hash": fields, "range": fields}``
+IndexFields = Dict[str, Dict[str, List[str]]]
+
+_SEGMENT_PREFIX = "wal-"
+_SNAPSHOT_PREFIX = "snapshot-"
+
+
+def _numbered(directory: Path, prefix: str, suffix: str) -> List[Tuple[int, Path]]:
+    """Get the ``<prefix><number><suffix>`` files of ``directory``, by number."""
+    files = []
+    for path in directory.glob(f"{prefix}*{suffix}"):
+        number = path.name[len(prefix):-len(suffix)]
+        if number.isdigit():
+            files.append((int(number), path))
+    return sorted(files)
+
+
+def _fsync_directory(directory: Path):
+    """Make renames and deletions in ``directory`` durable."""
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class WriteAheadLog:
+    """
+    Append-only log of database writes, split into segment files.
+    
+    Segment ``wal-<n>.log`` holds the writes from version ``n`` until the
+    version the next segment starts at.
+    """
+    
+    def __init__(self, directory: Path, fsync: bool = True, flush_interval: float = 0.05):
+        """
+        Initialize the log.
+        
+        Args:
+            directory: Directory holding the segments
+            fsync: Make writers wait until their writes are fsynced. If
+                False, writes are flushed every ``flush_interval`` seconds
+                and the last moments of writes can be lost in a crash.
+            flush_interval: Seconds between flushes when ``fsync`` is False
+        """
+        self.directory = directory
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self._condition = threading.Condition()
+        self._file = None
+        # Last version appended, and last version on disk
+        self._written = 0
+        self._durable = 0
+        self._flushing = False
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+    
+    def open(self, version: int):
+        """
+        Start appending to a new segment, after the writes up to ``version``.
+        
+        Args:
+            version: Version of the database state being logged from
+        """
+        self._written = self._durable = version
+        self._file = self._create_segment(version + 1)
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="wal-flusher", daemon=True)
+        self._thread.start()
+    
+    def _create_segment(self, version: int):
+        """Create the segment starting at ``version`` and return it open for appending."""
+        file = open(self.directory / f"{_SEGMENT_PREFIX}{version:020d}.log", "a", encoding="utf-8")
+        _fsync_directory(self.directory)
+        return file
+    
+    def append(self, version: int, operations: List[Operation]):
+        """
+        Append the changes that produced ``version``.
+        
+        Must be called in version order, i.e. under the database writer lock.
+        
+        Args:
+            version: Version the changes produced
+            operations: Changes, as JSON-serializable lists
+        """
+        line = json.dumps({"v": version, "ops": operations}, separators=(",", ":"))
+        with self._condition:
+            self._file.write(line + "\n")
+            self._written = version
+            self._condition.notify_all()
+    
+    def wait(self, version: int):
+        """
+        Wait until the changes up to ``version`` are on disk.
+        
+        Returns at once when the log does not fsync.
+        """
+        if not self.fsync:
+            return
+        with self._condition:
+            while self._durable < version and not self._closing:
+                self._condition.wait()
+    
+    def _run(self):
+        """Flush (and fsync) appended lines until the log is closed."""
+        while True:
+            with self._condition:
+                while self._durable >= self._written and not self._closing:
+                    self._condition.wait()
+                if self._durable >= self._written:
+                    return
+                target, file = self._written, self._file
+                file.flush()
+                self._flushing = True
+            try:
+                if self.fsync:
+                    os.fsync(file.fileno())
+            finally:
+                with self._condition:
+                    self._flushing = False
+                    self._durable = max(self._durable, target)
+                    self._condition.notify_all()
+            if not self.fsync:
+                time.sleep(self.flush_interval)
+    
+    def rotate(self, version: int):
+        """
+        Start a new segment for the writes after ``version``.
+        
+        Must be called under the database writer lock, with ``version`` the
+        last version appended.
+        """
+        with self._condition:
+            while self._flushing:
+                self._condition.wait()
+            old = self._file
+            old.flush()
+            os.fsync(old.fileno())
+            old.close()
+            self._durable = max(self._durable, self._written)
+            self._file = self._create_segment(version + 1)
+            self._condition.notify_all()
+    
+    def truncate(self, version: int):
+        """Delete the segments holding only writes up to ``version``."""
+        segments = _numbered(self.directory, _SEGMENT_PREFIX, ".log")
+        for (_, path), (following, _) in zip(segments, segments[1:]):
+            if following - 1 <= version:
+                path.unlink()
+        _fsync_directory(self.directory)
+    
+    def read(self, after: int) -> Iterator[Tuple[int, List[Operation]]]:
+        """
+        Iterate the logged writes that produced versions above ``after``.
+        
+        A torn line, left by a crash in the middle of an append, ends its
+        segment: it is cut off the file, so that a segment appended to
+        after recovery does not continue it, and the reading goes on with
+        the next segment, written after the restart.
+        
+        Yields:
+            ``(version, operations)`` pairs in version order
+        """
+        for _, path in _numbered(self.directory, _SEGMENT_PREFIX, ".log"):
+            with open(path, "rb") as file:
+                offset = 0
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        self._cut(path, offset)
+                        break
+                    offset += len(line)
+                    if entry["v"] > after:
+                        yield entry["v"], entry["ops"]
+    
+    @staticmethod
+    def _cut(path: Path, size: int):
+        """Truncate the segment at ``path`` to its first ``size`` bytes, durably."""
+        with open(path, "r+b") as file:
+            file.truncate(size)
+            file.flush()
+            os.fsync(file.fileno())
+    
+    def close(self):
+        """Flush outstanding writes and stop the flusher."""
+        with self._condition:
+            if self._file is None:
+                return
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+        with self._condition:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._durable = self._written
+            self._condition.notify_all()
+
+
+class Persistence:
+    """
+    Write-ahead log plus periodic snapshots for an ``InMemoryDatabase``.
+    
+    Pass an instance to ``InMemoryDatabase(persistence=...)`` or
+    ``InMemoryDatabase.attach``. The database recovers from it, logs every
+    write to it and checkpoints through it; a background thread requests a
+    checkpoint every ``checkpoint_interval`` seconds or after
+    ``checkpoint_writes`` logged writes, whichever comes first.
+    """
+    
+    def __init__(
+        self,
+        directory: str,
+        fsync: bool = True,
+        checkpoint_interval: float = 300.0,
+        checkpoint_writes: int = 100_000
+    ):
+        """
+        Initialize persistence in ``directory``, creating it if needed.
+        
+        Args:
+            directory: Directory for the log segments and snapshots
+            fsync: Make every write wait until it is fsynced (group commit)
+            checkpoint_interval: Seconds between background checkpoints
+            checkpoint_writes: Logged writes that trigger an early checkpoint
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.log = WriteAheadLog(self.directory, fsync)
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_writes = checkpoint_writes
+        self._writes = 0
+        # Serializes snapshot writers (background and explicit checkpoints)
+        self._checkpoint_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def load_snapshot(self) -> Tuple[int, Optional[Dict[str, Any]], IndexFields]:
+        """
+        Load the newest snapshot.
+        
+        Returns:
+            Tuple of its version, its data (collection name to
+            ``MappedTable`` or value) and the index fields declared per
+            collection, or ``(0, None, {})`` if there is no snapshot
+        """
+        snapshots = _numbered(self.directory, _SNAPSHOT_PREFIX, ".snap")
+        if not snapshots:
+            return 0, None, {}
+        
+        snapshot = SnapshotFile(snapshots[-1][1])
+        return snapshot.version, {**snapshot.values, **snapshot.tables}, snapshot.indexes
+    
+    def write_snapshot(self, snapshot: DatabaseSnapshot):
+        """
+        Write ``snapshot`` to a new snapshot file and drop what it supersedes.
+        
+        The file is written under a temporary name, fsynced and renamed, so
+        a crash leaves either the old or the new snapshot. Older snapshots
+        and the log segments covered by this one are then deleted. Records
+        not loaded from the previous snapshot are read without loading them.
+        
+        Args:
+            snapshot: Snapshot to write
+        """
+        version = snapshot.version
+        path = self.directory / f"{_SNAPSHOT_PREFIX}{version:020d}.snap"
+        
+        states: Dict[str, CollectionState] = {}
+        values: Dict[str, Any] = {}
+        for name, state in snapshot._collections.items():
+            if isinstance(state, CollectionState):
+                states[name] = state
+            else:
+                values[name] = state
+        indexes = {
+            name: {"hash": list(state.hash_indexes), "range": list(state.range_indexes)}
+            for name, state in states.items()
+        }
+        
+        with self._checkpoint_lock:
+            records = {name: state.records.iter_unloaded() for name, state in states.items()}
+            write_snapshot(path, version, records, values, indexes)
+            _fsync_directory(self.directory)
+            
+            for older, older_path in _numbered(self.directory, _SNAPSHOT_PREFIX, ".snap"):
+                if older < version:
+                    older_path.unlink()
+            self.log.truncate(version)
+    
+    def start(self, database: Any, version: int):
+        """
+        Start logging writes after ``version`` and checkpointing ``database``.
+        
+        Args:
+            database: ``InMemoryDatabase`` to checkpoint
+            version: Version of the recovered database state
+        """
+        self.log.open(version)
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run_checkpoints, args=(database,), name="checkpointer", daemon=True
+        )
+        self._thread.start()
+    
+    def record(self, version: int, operations: List[Operation]):
+        """
+        Log the changes that produced ``version``.
+        
+        Must be called under the database writer lock.
+        """
+        self.log.append(version, operations)
+        self._writes += 1
+        if self._writes >= self.checkpoint_writes:
+            self._wake.set()
+    
+    def wait(self, version: int):
+        """Wait until the changes up to ``version`` are durable."""
+        self.log.wait(version)
+    
+    def _run_checkpoints(self, database: Any):
+        """Checkpoint ``database`` periodically until stopped."""
+        while not self._stopped.is_set():
+            self._wake.wait(self.checkpoint_interval)
+            if self._stopped.is_set():
+                return
+            self._wake.clear()
+            if self._writes:
+                database.checkpoint()
+    
+    def rotate(self, version: int):
+        """
+        Start a new log segment for the writes after ``version``.
+        
+        Must be called under the database writer lock.
+        """
+        self.log.rotate(version)
+        self._writes = 0
+    
+    def close(self):
+        """Stop checkpointing and flush the log."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.log.close()
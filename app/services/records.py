@@ -0,0 +1,307 @@
+"""
+Compact Records
+
+This module provides a compact stored-record type for collections whose
+records share one schema, such as listings. A dictionary record carries a
+hash table of its own keys, several hundred bytes per record before any
+value; a ``CompactRecord`` keeps its values in ``__slots__`` named after
+the fields of the schema, so a record costs one pointer per field.
+
+Compact records are read-only mappings offering what callers of ``find``
+and ``get_by_id`` use on stored records (``[]``, ``get``, ``in``,
+iteration, ``items`` and equality with dictionaries); ``copy()`` returns a
+plain dictionary, as it does for a dictionary record. A field missing from
+a record is absent from the mapping, and keys outside the schema are kept
+in a dictionary of their own.
+
+Fields repeating a few values verbatim in every record (regions, property
+types, ...) can be dictionary-encoded: a ``ValueDictionary`` keeps each
+distinct value once and records hold its integer code, which is decoded
+when the field is read. Equality indexes and group-by aggregates use the
+codes directly (see ``CompactRecord.code``). Listing photos are stored by a
+``PhotoCodec`` as their IDs and MIME type codes.
+"""
+
+import threading
+from collections.abc import Mapping
+from operator import attrgetter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Type
+
+
+# Value of the slot of a field the record does not have
+_MISSING = object()
+
+
+class ValueDictionary:
+    """
+    Dictionary encoding of a field: each distinct value with an integer code.
+    
+    Values that compare equal share a code, as in ``CategoricalColumn``, so
+    only fields whose equal values are interchangeable (such as strings)
+    should be encoded. Unhashable values get a new code every time they are
+    encoded. Codes are never reassigned, so the dictionary only grows; None
+    always has code 0.
+    """
+    
+    def __init__(self):
+        """Initialize the dictionary holding only None."""
+        # Values by code, and code by value
+        self.values: List[Any] = [None]
+        self.codes: Dict[Any, int] = {None: 0}
+        # Records are encoded by writers and by readers loading snapshot chunks
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        """Return the number of codes."""
+        return len(self.values)
+    
+    def encode(self, value: Any) -> int:
+        """Get the code of ``value``, adding it if it is new."""
+        try:
+            code = self.codes.get(value)
+        except TypeError:
+            code = None
+        if code is not None:
+            return code
+        with self._lock:
+            try:
+                code = self.codes.get(value)
+                if code is None:
+                    code = self.codes[value] = len(self.values)
+                    self.values.append(value)
+            except TypeError:
+                code = len(self.values)
+                self.values.append(value)
+        return code
+    
+    def decode(self, code: int) -> Any:
+        """Get the value of ``code``."""
+        return self.values[code]
+    
+    def code(self, value: Any) -> Optional[int]:
+        """
+        Get the code of ``value`` without adding it.
+        
+        Returns:
+            The code, or None if no record was ever encoded with ``value``
+            
+        Raises:
+            TypeError: If ``value`` is unhashable
+        """
+        return self.codes.get(value)
+
+
+class _Photos(tuple):
+    """Photo list as stored by ``PhotoCodec``: one tuple per photo."""
+    
+    __slots__ = ()
+
+
+class PhotoCodec:
+    """
+    Compact encoding of a listing's ``photos`` list.
+    
+    Photos in the stored shape, ``{"id": ..., "mimeType": ...}`` (see
+    ``app.services.seed.stored_photos``), are kept as a tuple of their ID
+    and the code of their MIME type. Lists holding any other photo are
+    stored as they are.
+    """
+    
+    def __init__(self):
+        """Initialize the codec with an empty MIME type dictionary."""
+        self.mime_types = ValueDictionary()
+    
+    def encode(self, photos: Any) -> Any:
+        """Get ``photos`` as stored."""
+        if not isinstance(photos, list):
+            return photos
+        encoded = []
+        for photo in photos:
+            if not isinstance(photo, dict) or len(photo) != 2:
+                return photos
+            photo_id, mime_type = photo.get("id"), photo.get("mimeType")
+            if not isinstance(photo_id, str) or not isinstance(mime_type, str):
+                return photos
+            encoded.append((photo_id, self.mime_types.encode(mime_type)))
+        return _Photos(encoded)
+    
+    def decode(self, stored: Any) -> Any:
+        """Get the photos stored as ``stored``, as a new list."""
+        if type(stored) is not _Photos:
+            return stored
+        mime_types = self.mime_types.values
+        return [{"id": photo_id, "mimeType": mime_types[mime_type]} for photo_id, mime_type in stored]
+
+
+class CompactRecord(Mapping):
+    """
+    Read-only mapping storing the fields of a schema in slots.
+    
+    Subclasses are made with ``compact_record_type``.
+    """
+    
+    __slots__ = ("_extra",)
+    
+    # Fields of the schema, in iteration order
+    FIELDS: Tuple[str, ...] = ()
+    _FIELD_SET: FrozenSet[str] = frozenset()
+    # Codec (``ValueDictionary`` or ``PhotoCodec``) of each encoded field
+    CODECS: Dict[str, Any] = {}
+    # Get the values of every slot, as a tuple
+    _get_fields: Callable[["CompactRecord"], Tuple[Any, ...]] = staticmethod(lambda record: ())
+    # Position in ``FIELDS`` and decoder of each encoded field
+    _DECODERS: Tuple[Tuple[int, Callable[[Any], Any]], ...] = ()
+    
+    def __init__(self, data: Mapping):
+        """
+        Build a record holding the items of ``data``.
+        
+        Args:
+            data: Record to store
+        """
+        get, codecs = data.get, self.CODECS
+        for field in self.FIELDS:
+            value = get(field, _MISSING)
+            if value is not _MISSING and field in codecs:
+                value = codecs[field].encode(value)
+            setattr(self, field, value)
+        fields = self._FIELD_SET
+        self._extra = None if fields.issuperset(data) else {
+            key: value for key, value in data.items() if key not in fields
+        }
+    
+    @classmethod
+    def dictionary(cls, field: str) -> Optional[ValueDictionary]:
+        """Get the dictionary ``field`` is encoded with, if it is dictionary-encoded."""
+        codec = cls.CODECS.get(field)
+        return codec if isinstance(codec, ValueDictionary) else None
+    
+    def code(self, field: str) -> int:
+        """
+        Get the code of the value of a dictionary-encoded field.
+        
+        A missing field has the code of None, which it reads as.
+        """
+        value = getattr(self, field)
+        return 0 if value is _MISSING else value
+    
+    def __getitem__(self, key: Any) -> Any:
+        """Get the value of ``key``."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+    
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Get the value of ``key``, or ``default`` if the record has none."""
+        if key in self._FIELD_SET:
+            value = getattr(self, key)
+            if value is _MISSING:
+                return default
+            codec = self.CODECS.get(key)
+            return value if codec is None else codec.decode(value)
+        extra = self._extra
+        return default if extra is None else extra.get(key, default)
+    
+    def __contains__(self, key: Any) -> bool:
+        """Check whether the record has ``key``."""
+        return self.get(key, _MISSING) is not _MISSING
+    
+    def __iter__(self) -> Iterator[str]:
+        """Iterate the keys of the record, schema fields first."""
+        for field, value in zip(self.FIELDS, self._get_fields(self)):
+            if value is not _MISSING:
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+    
+    def __len__(self) -> int:
+        """Return the number of keys."""
+        return sum(1 for _ in self)
+    
+    def copy(self) -> Dict[str, Any]:
+        """Return the record as a new dictionary, with its fields decoded."""
+        values = self._get_fields(self)
+        if self._DECODERS:
+            values = list(values)
+            for position, decode in self._DECODERS:
+                if values[position] is not _MISSING:
+                    values[position] = decode(values[position])
+        if _MISSING in values:
+            record = {field: value for field, value in zip(self.FIELDS, values) if value is not _MISSING}
+        else:
+            record = dict(zip(self.FIELDS, values))
+        if self._extra is not None:
+            record.update(self._extra)
+        return record
+    
+    def __repr__(self) -> str:
+        """Represent the record with its items."""
+        return f"{type(self).__name__}({self.copy()!r})"
+    
+    def __reduce__(self):
+        """Pickle the record as its items."""
+        return type(self), (self.copy(),)
+
+
+def compact_record_type(
+    name: str,
+    fields: Iterable[str],
+    codecs: Optional[Dict[str, Any]] = None
+) -> Type[CompactRecord]:
+    """
+    Make a ``CompactRecord`` type storing ``fields`` in slots.
+    
+    Args:
+        name: Name of the type
+        fields: Fields of the schema, in iteration order
+        codecs: Codec to store each of some of the fields with, such as a
+            ``ValueDictionary``; any object with ``encode`` and ``decode``
+            methods
+            
+    Returns:
+        The record type; its constructor takes a mapping
+        
+    Raises:
+        ValueError: If a field is not an identifier or clashes with an
+            attribute of ``CompactRecord``, or a codec is given for a field
+            outside the schema
+    """
+    fields = tuple(dict.fromkeys(fields))
+    codecs = dict(codecs or {})
+    invalid = [field for field in fields if not field.isidentifier() or hasattr(CompactRecord, field)]
+    invalid += [field for field in codecs if field not in fields]
+    if invalid:
+        raise ValueError(f"Fields cannot be stored in slots: {', '.join(invalid)}")
+    return type(name, (CompactRecord,), {
+        "__slots__": fields,
+        "__module__": __name__,
+        "FIELDS": fields,
+        "_FIELD_SET": frozenset(fields),
+        "CODECS": codecs,
+        "_get_fields": staticmethod(
+            attrgetter(*fields) if len(fields) > 1
+            # ``attrgetter`` of a single field returns a value rather than a tuple
+            else lambda record: tuple(getattr(record, field) for field in fields)
+        ),
+        "_DECODERS": tuple((fields.index(field), codec.decode) for field, codec in codecs.items()),
+    })
+
+
+# Fields of a stored listing (see ``app.services.seed.stored_listing``)
+LISTING_FIELDS = (
+    "id", "listing_id", "development_name", "address_line1", "address_line2", "post_town", "post_code",
+    "shortened_post_code", "country", "region", "property_type", "bedrooms", "bathrooms", "size_sq_ft",
+    "price_in_cents", "minimum_deposit_in_cents", "estimated_deposit_in_cents", "rental_income_in_cents",
+    "is_tenanted", "is_cash_only", "is_new_build", "description", "photos", "is_featured", "gross_yield",
+    "has_user_requested_contact", "has_user_saved_listing", "is_share_sale", "is_getground_company",
+    "made_visible_at", "created_at", "updated_at",
+)
+
+# Categorical listing fields stored dictionary-encoded
+LISTING_ENCODED_FIELDS = ("region", "property_type", "post_town", "shortened_post_code", "country")
+
+ListingRow = compact_record_type("ListingRow", LISTING_FIELDS, {
+    **{field: ValueDictionary() for field in LISTING_ENCODED_FIELDS},
+    "photos": PhotoCodec(),
+})
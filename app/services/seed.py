@@ -0,0 +1,238 @@
+"""
+Seed Listings
+
+This module provides the sample listings ``InMemoryDatabase.seed_listings``
+loads. They are written in ``app.data.seed_data`` as a large literal in the
+camelCase API shape, which every process seeding from it would have to
+compile, evaluate and convert to the stored shape. Instead the converted
+records are kept in an artifact in the binary snapshot format (see
+``app.services.binary_snapshot``), which seeding memory-maps: the literal
+is never imported, and records are decoded when the listings are first
+read.
+
+The artifact is kept outside the package, at ``artifact_path()``, and
+records the ``source_key`` it was built for: a hash of the seed data file,
+of the settings the conversion depends on (``photo_base_url``) and of
+``ARTIFACT_VERSION``. It is rebuilt by the first process to seed when it is
+missing or its key differs. To build it ahead, e.g. when building an image,
+run::
+
+    python -m app.services.seed [PATH]
+"""
+
+import hashlib
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Union
+
+from app.config.settings import get_settings
+from app.services.binary_snapshot import MappedTable, SnapshotFile, write_snapshot
+
+
+_DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+# Seed data the artifact is built from
+SEED_DATA_PATH = _DATA_DIR / "seed_data.py"
+
+# Version of the stored shape; bump it when ``stored_listing`` changes so
+# that existing artifacts are rebuilt
+ARTIFACT_VERSION = 2
+
+
+def artifact_path() -> Path:
+    """Get the artifact file: ``Settings.seed_artifact_path``, or ``listings.snap`` in the user cache directory."""
+    configured = get_settings().seed_artifact_path
+    if configured:
+        return Path(configured)
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_dir) / "listings-api" / "listings.snap"
+
+
+def source_key() -> str:
+    """
+    Get the key of what the artifact is built from.
+    
+    Hashes the seed data file, the settings the conversion depends on and
+    ``ARTIFACT_VERSION``, so an artifact is only reused for the very seed
+    data and settings it was built with, whatever the file times.
+    
+    Returns:
+        Hex digest of the sources
+        
+    Raises:
+        OSError: If the seed data cannot be read
+    """
+    digest = hashlib.sha256(f"{ARTIFACT_VERSION}\0{get_settings().photo_base_url}\0".encode("utf-8"))
+    digest.update(SEED_DATA_PATH.read_bytes())
+    return digest.hexdigest()
+
+
+def stored_photos(photos: Iterable[Mapping[str, Any]], base_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Map photos in the ``Photo`` shape to the stored shape.
+    
+    A photo whose original URL is ``base_url`` followed by its ID, and whose
+    standard and thumbnail URLs add ``_standard`` and ``_thumbnail`` to it,
+    is stored as ``{"id": ..., "mimeType": ...}``; its URLs are built again
+    when listings are served (see ``app.services.listings.photo_payload``).
+    Other photos are stored as they are.
+    
+    Args:
+        photos: Photos using the ``Photo`` field aliases
+        base_url: Base URL of photos; defaults to ``Settings.photo_base_url``
+        
+    Returns:
+        Stored photos
+    """
+    if base_url is None:
+        base_url = get_settings().photo_base_url
+    stored = []
+    for photo in photos:
+        original = photo.get("originalURL")
+        photo_id = original[len(base_url):] if isinstance(original, str) and original.startswith(base_url) else ""
+        if (
+            photo_id and "/" not in photo_id
+            and photo.get("standardURL") == original + "_standard"
+            and photo.get("thumbnailURL") == original + "_thumbnail"
+        ):
+            stored.append({"id": photo_id, "mimeType": photo.get("mimeType")})
+        else:
+            stored.append(dict(photo))
+    return stored
+
+
+def stored_listing(listing_data: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Map a listing in the camelCase ``LISTING_SEED_DATA`` shape to the stored shape.
+    
+    Args:
+        listing_data: Listing using the ``ListingRecord`` field aliases
+        
+    Returns:
+        Stored listing record, without timestamps
+    """
+    return {
+        "id": str(listing_data["id"]),  # Convert to string for consistency
+        "listing_id": listing_data["id"],
+        "development_name": listing_data.get("developmentName", ""),
+        "address_line1": listing_data["addressDetails"].get("addressLine1", ""),
+        "address_line2": listing_data["addressDetails"].get("addressLine2", ""),
+        "post_town": listing_data["addressDetails"]["city"],
+        "post_code": listing_data["addressDetails"].get("postcode", ""),
+        "shortened_post_code": listing_data["addressDetails"]["shortenedPostcode"],
+        "country": listing_data["addressDetails"].get("country", ""),
+        "region": listing_data["addressDetails"]["region"],
+        "property_type": listing_data["propertyType"],
+        "bedrooms": listing_data["bedrooms"],
+        "bathrooms": listing_data["bathrooms"],
+        "size_sq_ft": listing_data["sizeSqFt"],
+        "price_in_cents": listing_data["priceInCents"],
+        "minimum_deposit_in_cents": listing_data["minimumDepositInCents"],
+        "estimated_deposit_in_cents": listing_data["estimatedDepositInCents"],
+        "rental_income_in_cents": listing_data["monthlyRentalIncomeInCents"],
+        "is_tenanted": listing_data.get("isTenanted", False),
+        "is_cash_only": listing_data.get("isCashOnly", False),
+        "is_new_build": listing_data.get("isNewBuild", False),
+        "description": listing_data.get("description", ""),
+        "photos": stored_photos(listing_data.get("photos", [])),
+        "is_featured": listing_data.get("isFeatured", False),
+        "gross_yield": listing_data.get("grossYield", 0),
+        "has_user_requested_contact": listing_data.get("hasUserRequestedContact", False),
+        "has_user_saved_listing": listing_data.get("hasUserSavedListing", False),
+        "is_share_sale": listing_data.get("isShareSale", False),
+        "is_getground_company": listing_data.get("isCompany", False),
+        "made_visible_at": listing_data.get("madeVisibleAt"),
+    }
+
+
+def build_seed_listings() -> List[Dict[str, Any]]:
+    """
+    Convert ``LISTING_SEED_DATA`` to stored listing records, timestamped now.
+    
+    Returns:
+        List of stored listing records
+    """
+    # Imported here, as the literal is only needed to (re)build the artifact
+    from app.data.seed_data import LISTING_SEED_DATA
+    
+    now = datetime.utcnow().isoformat()
+    return [
+        {**stored_listing(listing_data), "created_at": now, "updated_at": now}
+        for listing_data in LISTING_SEED_DATA
+    ]
+
+
+def write_artifact(path: Optional[Path] = None, records: Optional[List[Dict[str, Any]]] = None) -> Path:
+    """
+    Write the seed listings artifact, creating its directory if needed.
+    
+    Args:
+        path: File to write; defaults to ``artifact_path()``
+        records: Stored seed listings; converted from the seed data if not
+            given
+            
+    Returns:
+        The written file
+        
+    Raises:
+        OSError: If the file cannot be written
+    """
+    if path is None:
+        path = artifact_path()
+    if records is None:
+        records = build_seed_listings()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written under a name of its own, so processes seeding at the same
+    # time never interleave their writes
+    temporary = path.with_name(f"{path.name}.{os.getpid()}")
+    write_snapshot(temporary, ARTIFACT_VERSION, {"listings": records}, values={"source": source_key()})
+    os.replace(temporary, path)
+    return path
+
+
+def _open_artifact(path: Path) -> Optional[MappedTable]:
+    """Map the listings of the artifact at ``path``, or None if it is missing or out of date."""
+    try:
+        snapshot = SnapshotFile(path)
+    except (OSError, ValueError):
+        # Missing, or written on a machine with another byte order
+        return None
+    if snapshot.values.get("source") != source_key() or "listings" not in snapshot.tables:
+        return None
+    return snapshot.tables["listings"]
+
+
+def load_seed_listings(path: Optional[Path] = None) -> Union[MappedTable, List[Dict[str, Any]]]:
+    """
+    Get the stored seed listings, from the artifact if it is up to date.
+    
+    Otherwise the listings are converted from the seed data and the artifact
+    is rebuilt for the next processes; if it cannot be written (e.g. in a
+    read-only installation without a writable cache directory), the
+    converted listings are still returned. Listings read from the artifact
+    carry the timestamps of when it was built.
+    
+    Args:
+        path: Artifact file; defaults to ``artifact_path()``
+        
+    Returns:
+        The mapped listings table, or the converted listings
+    """
+    if path is None:
+        path = artifact_path()
+    table = _open_artifact(path)
+    if table is not None:
+        return table
+    
+    records = build_seed_listings()
+    try:
+        write_artifact(path, records)
+    except OSError:
+        pass
+    return records
+
+
+if __name__ == "__main__":
+    print(f"Wrote {write_artifact(Path(sys.argv[1]) if len(sys.argv) > 1 else None)}")
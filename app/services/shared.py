@@ -0,0 +1,225 @@
+"""
+Shared Collections
+
+This module shares a read-mostly collection, such as listings, between the
+worker processes of one server (``uvicorn app.main:app --workers N``), so
+its records are held in memory once rather than once per worker.
+
+The collection is published as a binary snapshot file (see
+``app.services.binary_snapshot``) in a shared directory, the base. Every
+worker memory-maps the same base, so the operating system keeps a single
+copy of its pages however many workers read it, and a worker decodes
+records only as it reads them.
+
+Writes are appended to a log next to the base, one line per write in the
+format of the write-ahead log (see ``app.services.persistence``), rather
+than rewriting the whole collection. Every write increases a generation
+number, kept with the generation of the base in a memory-mapped counter
+file: a worker compares the counter with the generation it has loaded (one
+memory read) and, when they differ, replays the log lines it has not seen,
+or maps the newer base if the log was compacted into one meanwhile. The log
+is compacted into a new base once it holds ``COMPACT_ENTRIES`` writes.
+
+Writes take an exclusive lock on the directory, so workers write one at a
+time, each on top of the newest generation. File locking uses ``fcntl``, so
+sharing is available on POSIX systems only.
+"""
+
+import fcntl
+import json
+import mmap
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+from app.services.binary_snapshot import SnapshotFile, write_snapshot
+
+
+class SharedCollection:
+    """
+    One collection published for all worker processes using a directory.
+    
+    Register it with ``InMemoryDatabase.share``, which keeps the database's
+    copy of the collection in step with the published generations.
+    """
+    
+    # Logged writes after which the log is compacted into a new base
+    COMPACT_ENTRIES = 1000
+    
+    def __init__(self, directory: str, collection: str = "listings"):
+        """
+        Initialize the shared collection, creating the directory if needed.
+        
+        Args:
+            directory: Directory shared by the worker processes
+            collection: Name of the shared collection
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.collection = collection
+        self._lock_path = self.directory / f"{collection}.lock"
+        # Generation this process has loaded, the base it loaded it from,
+        # and how far into that base's log it has read
+        self.loaded = 0
+        self._base = 0
+        self._offset = 0
+        # Serializes loads and writes between the threads of this process
+        self._thread_lock = threading.RLock()
+        
+        counter_path = self.directory / f"{collection}.generation"
+        with self.exclusive():
+            with open(counter_path, "ab") as file:
+                if file.tell() < 16:
+                    file.write(bytes(16 - file.tell()))
+        with open(counter_path, "r+b") as file:
+            # Newest generation, then the generation of the newest base
+            self._counter = mmap.mmap(file.fileno(), 16)
+    
+    @property
+    def generation(self) -> int:
+        """Get the newest published generation, 0 if none was published."""
+        return int.from_bytes(self._counter[:8], sys.byteorder)
+    
+    def _newest_base(self) -> int:
+        """Get the generation of the newest base."""
+        return int.from_bytes(self._counter[8:16], sys.byteorder)
+    
+    def _set_generation(self, generation: int, base: int):
+        """Publish ``generation`` of the collection, logged on top of ``base``."""
+        # The base is written first, so a reader that sees the new
+        # generation also sees its base
+        self._counter[8:16] = base.to_bytes(8, sys.byteorder)
+        self._counter[:8] = generation.to_bytes(8, sys.byteorder)
+    
+    def _path(self, base: int, suffix: str) -> Path:
+        """Get the snapshot (``.snap``) or log (``.log``) file of ``base``."""
+        return self.directory / f"{self.collection}-{base:020d}{suffix}"
+    
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Hold the directory lock, excluding other threads and worker processes."""
+        with self._thread_lock:
+            with open(self._lock_path, "a+b") as file:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    
+    def is_stale(self) -> bool:
+        """Check whether a newer generation than the loaded one was published."""
+        return self.generation != self.loaded
+    
+    def _read_log(self) -> List[Tuple[int, List[List[Any]]]]:
+        """Read the complete log lines of the loaded base past the loaded generation."""
+        with open(self._path(self._base, ".log"), "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+        # A line still being appended is read on the next sync
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        entries = []
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            entries.append((entry["v"], entry["ops"]))
+        return entries
+    
+    def sync(self, load: Callable[[Any], None], apply: Callable[[List[List[Any]]], None]):
+        """
+        Catch up with the newest generation if it is not the one loaded.
+        
+        Threads of the same process catch up once between them.
+        
+        Args:
+            load: Callable given the mapped table of a base, replacing the
+                collection with it
+            apply: Callable given the operations of logged writes, in the
+                format of ``InMemoryDatabase._replay``
+        """
+        with self._thread_lock:
+            while self.is_stale():
+                base = self._newest_base()
+                try:
+                    if base != self._base:
+                        snapshot = SnapshotFile(self._path(base, ".snap"))
+                        load(snapshot.tables[self.collection])
+                        self.loaded = self._base = base
+                        self._offset = 0
+                    entries = self._read_log()
+                except FileNotFoundError:
+                    # Compacted into a newer base, and deleted, meanwhile
+                    if self._newest_base() == base:
+                        raise
+                    continue
+                
+                if not entries:
+                    break
+                operations = []
+                for generation, logged in entries:
+                    operations.extend(logged)
+                    self.loaded = generation
+                if operations:
+                    apply(operations)
+    
+    def append(self, operations: List[List[Any]]) -> int:
+        """
+        Log a write as the next generation.
+        
+        Must be called while holding ``exclusive()``, with the newest
+        generation loaded.
+        
+        Args:
+            operations: The write as operations, see ``sync``
+            
+        Returns:
+            The published generation
+        """
+        generation = self.generation + 1
+        line = json.dumps({"v": generation, "ops": operations}, separators=(",", ":")).encode("utf-8")
+        with open(self._path(self._base, ".log"), "r+b") as file:
+            # Drops what a writer that crashed mid-line left behind
+            file.truncate(self._offset)
+            file.seek(self._offset)
+            file.write(line + b"\n")
+            self._offset = file.tell()
+        self._set_generation(generation, self._base)
+        self.loaded = generation
+        return generation
+    
+    def needs_compaction(self) -> bool:
+        """Check whether the log holds enough writes to be compacted into a new base."""
+        return self.loaded - self._base >= self.COMPACT_ENTRIES
+    
+    def publish(self, records: Iterable[Any]) -> int:
+        """
+        Publish ``records`` as a new base, at the next generation.
+        
+        Must be called while holding ``exclusive()``. The files of bases
+        before the previous one are deleted; the previous one is kept for
+        workers still reading it.
+        
+        Args:
+            records: Records of the collection, in slot order; iterated once
+            
+        Returns:
+            The published generation
+        """
+        generation = self.generation + 1
+        write_snapshot(self._path(generation, ".snap"), generation, {self.collection: records})
+        self._path(generation, ".log").touch()
+        previous = self._newest_base()
+        self._set_generation(generation, generation)
+        self.loaded = self._base = generation
+        self._offset = 0
+        
+        for path in self.directory.glob(f"{self.collection}-*.*"):
+            number = path.stem[len(self.collection) + 1:]
+            if number.isdigit() and int(number) < previous:
+                path.unlink(missing_ok=True)
+        return generation
+    
+    def close(self):
+        """Unmap the generation counter."""
+        self._counter.close()
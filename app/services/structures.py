@@ -0,0 +1,479 @@
+"""
+Persistent Data Structures
+
+This module contains the copy-on-write containers that back the in-memory
+database's snapshots. Each container splits its contents into small chunks
+(or shards) and never modifies a shared chunk in place: the first write to
+a chunk after ``copy()`` copies it. ``copy()`` therefore only copies the
+top-level chunk list, and a copy can be changed without affecting the
+original, which lets readers keep using an old version while a writer
+builds the next one.
+
+Chunks a container copied (or created) since its last ``copy()`` are
+private to it and are written in place, so a batch of writes between two
+copies pays for each chunk copy once.
+
+A ``ChunkedList`` can also be created over an external source, such as a
+memory-mapped snapshot, whose chunks are loaded the first time they are
+read.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableMapping, Sequence
+from itertools import accumulate, chain
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class ChunkedList(Sequence):
+    """
+    Copy-on-write list supporting append, pop and item assignment.
+    
+    Every chunk except the last one holds exactly ``CHUNK_SIZE`` items, so
+    positions map to chunks arithmetically. Chunks of a list created by
+    ``lazy`` are None until loaded.
+    """
+    
+    CHUNK_SIZE = 1024
+    
+    def __init__(self, items: Iterable[Any] = ()):
+        """
+        Initialize the list with ``items``.
+        
+        Args:
+            items: Initial contents
+        """
+        items = list(items)
+        size = self.CHUNK_SIZE
+        self._chunks: List[List[Any]] = [items[i:i + size] for i in range(0, len(items), size)]
+        self._len = len(items)
+        # IDs of the chunks only this list references
+        self._owned: Set[int] = {id(chunk) for chunk in self._chunks}
+        # Source of the chunks not loaded yet, see ``lazy``
+        self._source: Optional[Callable[[int, int], List[Any]]] = None
+        self._source_len = 0
+        self._unloaded = 0
+        self._load_lock: Optional[threading.Lock] = None
+    
+    @classmethod
+    def lazy(cls, size: int, source: Callable[[int, int], List[Any]]) -> "ChunkedList":
+        """
+        Create a list of ``size`` items whose chunks are loaded on first access.
+        
+        A loaded chunk is kept by the list that loaded it. Copies share the
+        chunks loaded before they were taken and load the others themselves.
+        
+        Args:
+            size: Number of items
+            source: Function returning the items at positions ``start`` to
+                ``stop`` as a new list
+                
+        Returns:
+            The list
+        """
+        chunked = cls()
+        chunked._chunks = [None] * -(-size // cls.CHUNK_SIZE)
+        chunked._len = chunked._source_len = size
+        chunked._source = source
+        chunked._unloaded = len(chunked._chunks)
+        chunked._load_lock = threading.Lock()
+        return chunked
+    
+    def copy(self) -> "ChunkedList":
+        """Return a copy sharing all chunks with this list."""
+        clone = ChunkedList.__new__(ChunkedList)
+        clone._source = self._source
+        clone._source_len = self._source_len
+        clone._load_lock = self._load_lock
+        if self._load_lock is None:
+            clone._chunks, clone._unloaded = self._chunks.copy(), 0
+        else:
+            with self._load_lock:
+                clone._chunks, clone._unloaded = self._chunks.copy(), self._unloaded
+        clone._len = self._len
+        clone._owned = set()
+        self._owned = set()
+        return clone
+    
+    def _load(self, chunk: int) -> List[Any]:
+        """Get chunk number ``chunk``, loading it from the source if needed."""
+        items = self._chunks[chunk]
+        if items is not None:
+            return items
+        with self._load_lock:
+            items = self._chunks[chunk]
+            if items is None:
+                start = chunk * self.CHUNK_SIZE
+                items = self._source(start, min(start + self.CHUNK_SIZE, self._source_len))
+                self._chunks[chunk] = items
+                self._unloaded -= 1
+        return items
+    
+    def _own(self, chunk: int) -> List[Any]:
+        """Get chunk number ``chunk``, copied first unless this list owns it."""
+        items = self._chunks[chunk]
+        if items is None:
+            # A freshly loaded chunk is referenced by this list only
+            items = self._load(chunk)
+            self._owned.add(id(items))
+        if id(items) not in self._owned:
+            items = items.copy()
+            self._chunks[chunk] = items
+            self._owned.add(id(items))
+        return items
+    
+    def __len__(self) -> int:
+        """Return the number of items."""
+        return self._len
+    
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate the items in order."""
+        if self._unloaded:
+            return chain.from_iterable(map(self._load, range(len(self._chunks))))
+        return chain.from_iterable(self._chunks)
+    
+    def iter_unloaded(self) -> Iterator[Any]:
+        """
+        Iterate the items in order without keeping the chunks it loads.
+        
+        For one-off passes, such as writing a snapshot, over a lazy list
+        whose chunks should stay unloaded.
+        """
+        size = self.CHUNK_SIZE
+        for chunk, items in enumerate(self._chunks):
+            if items is None:
+                start = chunk * size
+                items = self._source(start, min(start + size, self._source_len))
+            yield from items
+    
+    def __getitem__(self, position):
+        """Get the item at ``position`` (slices return a plain list)."""
+        if isinstance(position, slice):
+            return list(self)[position]
+        if position < 0:
+            position += self._len
+        if not 0 <= position < self._len:
+            raise IndexError("ChunkedList index out of range")
+        chunk, offset = divmod(position, self.CHUNK_SIZE)
+        items = self._chunks[chunk]
+        if items is None:
+            items = self._load(chunk)
+        return items[offset]
+    
+    def take(self, positions: Iterable[int]) -> List[Any]:
+        """
+        Get the items at several non-negative positions in one call.
+        
+        Args:
+            positions: Positions to fetch; must be in range
+            
+        Returns:
+            The items, in the order of ``positions``
+        """
+        size = self.CHUNK_SIZE
+        if self._unloaded:
+            load = self._load
+            return [load(position // size)[position % size] for position in positions]
+        chunks = self._chunks
+        return [chunks[position // size][position % size] for position in positions]
+    
+    def __setitem__(self, position: int, value: Any):
+        """Replace the item at ``position``."""
+        if position < 0:
+            position += self._len
+        if not 0 <= position < self._len:
+            raise IndexError("ChunkedList assignment index out of range")
+        chunk, offset = divmod(position, self.CHUNK_SIZE)
+        self._own(chunk)[offset] = value
+    
+    def append(self, value: Any):
+        """Append an item to the end of the list."""
+        if not self._chunks or len(self._load(len(self._chunks) - 1)) == self.CHUNK_SIZE:
+            items: List[Any] = []
+            self._chunks.append(items)
+            self._owned.add(id(items))
+        self._own(len(self._chunks) - 1).append(value)
+        self._len += 1
+    
+    def pop(self) -> Any:
+        """Remove and return the last item."""
+        if not self._len:
+            raise IndexError("pop from empty ChunkedList")
+        if len(self._load(len(self._chunks) - 1)) == 1:
+            value = self._chunks.pop()[0]
+        else:
+            value = self._own(len(self._chunks) - 1).pop()
+        self._len -= 1
+        return value
+
+
+_EMPTY_SHARD: Dict[Any, Any] = {}
+
+
+class ShardedDict(MutableMapping):
+    """
+    Copy-on-write dictionary split into a fixed number of hash shards.
+    
+    Writes copy only the shard holding the key.
+    """
+    
+    SHARDS = 256
+    
+    def __init__(self, items: Iterable[Tuple[Any, Any]] = ()):
+        """
+        Initialize the dictionary with ``items``.
+        
+        Args:
+            items: Initial ``(key, value)`` pairs
+        """
+        shards: List[Dict[Any, Any]] = [{} for _ in range(self.SHARDS)]
+        for key, value in items:
+            shards[hash(key) % self.SHARDS][key] = value
+        # Empty shards all share one dict, which is never written to
+        self._shards = [shard or _EMPTY_SHARD for shard in shards]
+        self._len = sum(len(shard) for shard in self._shards)
+        # IDs of the shards only this dictionary references
+        self._owned: Set[int] = {id(shard) for shard in self._shards if shard is not _EMPTY_SHARD}
+    
+    def copy(self) -> "ShardedDict":
+        """Return a copy sharing all shards with this dictionary."""
+        clone = ShardedDict.__new__(ShardedDict)
+        clone._shards = self._shards.copy()
+        clone._len = self._len
+        clone._owned = set()
+        self._owned = set()
+        return clone
+    
+    def _own(self, number: int) -> Dict[Any, Any]:
+        """Get shard ``number``, copied first unless this dictionary owns it."""
+        shard = self._shards[number]
+        if id(shard) not in self._owned:
+            shard = shard.copy()
+            self._shards[number] = shard
+            self._owned.add(id(shard))
+        return shard
+    
+    def __len__(self) -> int:
+        """Return the number of keys."""
+        return self._len
+    
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate the keys, shard by shard."""
+        return chain.from_iterable(self._shards)
+    
+    def __contains__(self, key: Any) -> bool:
+        """Check whether ``key`` is present."""
+        return key in self._shards[hash(key) % self.SHARDS]
+    
+    def __getitem__(self, key: Any) -> Any:
+        """Get the value for ``key``."""
+        return self._shards[hash(key) % self.SHARDS][key]
+    
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Get the value for ``key``, or ``default`` if missing."""
+        return self._shards[hash(key) % self.SHARDS].get(key, default)
+    
+    def get_many(self, keys: Iterable[Any]) -> List[Any]:
+        """
+        Get the values for several keys in one call.
+        
+        Args:
+            keys: Keys to look up; all must be present
+            
+        Returns:
+            The values, in the order of ``keys``
+            
+        Raises:
+            KeyError: If a key is missing
+        """
+        shards, count = self._shards, self.SHARDS
+        return [shards[hash(key) % count][key] for key in keys]
+    
+    def __setitem__(self, key: Any, value: Any):
+        """Set the value for ``key``."""
+        shard = self._own(hash(key) % self.SHARDS)
+        self._len += key not in shard
+        shard[key] = value
+    
+    def __delitem__(self, key: Any):
+        """Remove ``key``."""
+        number = hash(key) % self.SHARDS
+        if key not in self._shards[number]:
+            raise KeyError(key)
+        shard = self._own(number)
+        del shard[key]
+        if not shard:
+            self._shards[number] = _EMPTY_SHARD
+        self._len -= 1
+
+
+class SortedChunks:
+    """
+    Copy-on-write sorted list.
+    
+    Values are kept in sorted chunks of up to ``2 * LOAD`` items, located by
+    bisecting the chunk maxima, so lookups and position queries are
+    O(log n) and writes copy a single chunk.
+    """
+    
+    LOAD = 512
+    
+    def __init__(self, values: Iterable[Any] = ()):
+        """
+        Initialize the list with ``values``.
+        
+        Args:
+            values: Initial contents, in any order
+            
+        Raises:
+            TypeError: If the values are not mutually comparable
+        """
+        values = sorted(values)
+        load = self.LOAD
+        self._chunks: List[List[Any]] = [values[i:i + load] for i in range(0, len(values), load)]
+        self._maxes: List[Any] = [chunk[-1] for chunk in self._chunks]
+        self._offsets: Optional[List[int]] = None
+        self._len = len(values)
+        # IDs of the chunks only this list references
+        self._owned: Set[int] = {id(chunk) for chunk in self._chunks}
+    
+    def copy(self) -> "SortedChunks":
+        """Return a copy sharing all chunks with this list."""
+        clone = SortedChunks.__new__(SortedChunks)
+        clone._chunks = self._chunks.copy()
+        clone._maxes = self._maxes.copy()
+        clone._offsets = self._offsets
+        clone._len = self._len
+        clone._owned = set()
+        self._owned = set()
+        return clone
+    
+    def _own(self, chunk: int) -> List[Any]:
+        """Get chunk number ``chunk``, copied first unless this list owns it."""
+        values = self._chunks[chunk]
+        if id(values) not in self._owned:
+            values = values.copy()
+            self._chunks[chunk] = values
+            self._owned.add(id(values))
+        return values
+    
+    def __len__(self) -> int:
+        """Return the number of values."""
+        return self._len
+    
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate the values in sorted order."""
+        return chain.from_iterable(self._chunks)
+    
+    def __contains__(self, value: Any) -> bool:
+        """Check whether ``value`` is present in O(log n)."""
+        chunk = bisect_left(self._maxes, value)
+        if chunk == len(self._maxes):
+            return False
+        values = self._chunks[chunk]
+        position = bisect_left(values, value)
+        return values[position] == value
+    
+    def add(self, value: Any):
+        """
+        Insert ``value`` in sorted position.
+        
+        Raises:
+            TypeError: If ``value`` is not comparable with the contents
+        """
+        if not self._chunks:
+            self._chunks.append([value])
+            self._maxes.append(value)
+            self._owned.add(id(self._chunks[-1]))
+        else:
+            chunk = min(bisect_left(self._maxes, value), len(self._maxes) - 1)
+            # Compare before copying, so incomparable values change nothing
+            position = bisect_right(self._chunks[chunk], value)
+            values = self._own(chunk)
+            values.insert(position, value)
+            if len(values) > 2 * self.LOAD:
+                halves = [values[:self.LOAD], values[self.LOAD:]]
+                self._chunks[chunk:chunk + 1] = halves
+                self._maxes[chunk:chunk + 1] = [values[self.LOAD - 1], values[-1]]
+                self._owned.update(id(half) for half in halves)
+            else:
+                self._maxes[chunk] = values[-1]
+        self._offsets = None
+        self._len += 1
+    
+    def discard(self, value: Any) -> bool:
+        """
+        Remove one occurrence of ``value`` if present.
+        
+        Returns:
+            True if a value was removed
+        """
+        chunk = bisect_left(self._maxes, value)
+        if chunk == len(self._maxes):
+            return False
+        values = self._chunks[chunk]
+        position = bisect_left(values, value)
+        if values[position] != value:
+            return False
+        
+        if len(values) > 1:
+            values = self._own(chunk)
+            del values[position]
+            self._maxes[chunk] = values[-1]
+        else:
+            del self._chunks[chunk]
+            del self._maxes[chunk]
+        self._offsets = None
+        self._len -= 1
+        return True
+    
+    def _offset(self, chunk: int) -> int:
+        """Get the position of the first value of ``chunk``."""
+        if self._offsets is None:
+            self._offsets = [0, *accumulate(len(values) for values in self._chunks)]
+        return self._offsets[chunk]
+    
+    def bisect_left(self, value: Any, key: Optional[Callable[[Any], Any]] = None) -> int:
+        """Get the first position where ``value`` could be inserted."""
+        chunk = bisect_left(self._maxes, value, key=key)
+        if chunk == len(self._maxes):
+            return self._len
+        return self._offset(chunk) + bisect_left(self._chunks[chunk], value, key=key)
+    
+    def bisect_right(self, value: Any, key: Optional[Callable[[Any], Any]] = None) -> int:
+        """Get the last position where ``value`` could be inserted."""
+        chunk = bisect_right(self._maxes, value, key=key)
+        if chunk == len(self._maxes):
+            return self._len
+        return self._offset(chunk) + bisect_right(self._chunks[chunk], value, key=key)
+    
+    def islice(self, start: int, stop: int, reverse: bool = False) -> Iterator[Any]:
+        """
+        Iterate the values at positions ``start`` to ``stop``.
+        
+        Args:
+            start: First position (inclusive)
+            stop: Last position (exclusive)
+            reverse: Iterate from ``stop - 1`` down to ``start``
+            
+        Returns:
+            Iterator of values in sorted (or reverse sorted) order
+        """
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return iter(())
+        # Locate the chunks holding the first and last positions
+        self._offset(0)
+        offsets = self._offsets
+        first = bisect_right(offsets, start) - 1
+        last = bisect_right(offsets, stop - 1) - 1
+        
+        chunks = range(last, first - 1, -1) if reverse else range(first, last + 1)
+        return chain.from_iterable(self._slice(chunk, start, stop, reverse) for chunk in chunks)
+    
+    def _slice(self, chunk: int, start: int, stop: int, reverse: bool) -> Iterable[Any]:
+        """Get the values of ``chunk`` at positions ``start`` to ``stop``."""
+        values = self._chunks[chunk]
+        offset = self._offsets[chunk]
+        values = values[max(start - offset, 0):min(stop - offset, len(values))]
+        return reversed(values) if reverse else values
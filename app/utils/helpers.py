@@ -5,9 +5,22 @@ This module contains common utility functions used throughout the application
 including response formatting, error handling, and data transformation helpers.
 """
 
+import base64
 import json
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised without orjson installed
+    orjson = None
+
+
+# Whether ``encode_json`` encodes with orjson (an optional dependency)
+ORJSON_AVAILABLE = orjson is not None
 
 
 def format_timestamp(dt: Optional[datetime] = None) -> str:
@@ -99,6 +112,77 @@ def validate_json_data(data: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def _json_default(value: Any) -> Any:
+    """Convert a value ``encode_json`` does not know to one it does."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    if isinstance(value, Mapping):
+        # Read-only record views and compact records
+        return dict(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(content: Any) -> bytes:
+    """
+    Encode content as compact UTF-8 JSON.
+    
+    Uses orjson when it is installed, and the ``json`` module otherwise.
+    Models are encoded by alias, as FastAPI does for ``response_model``.
+    
+    Args:
+        content: Value to encode
+        
+    Returns:
+        The JSON document
+        
+    Raises:
+        TypeError: If ``content`` holds a value that cannot be encoded
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """
+    Encode pagination state as an opaque, URL-safe cursor string.
+    
+    Args:
+        data: JSON-serializable pagination state
+        
+    Returns:
+        Cursor string
+    """
+    payload = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Dict[str, Any]]:
+    """
+    Decode a cursor created by ``encode_cursor``.
+    
+    Args:
+        cursor: Cursor string
+        
+    Returns:
+        Pagination state if the cursor is valid, None otherwise
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(payload)
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
 def safe_get_nested(data: Dict[str, Any], keys: List[str], default: Any = None) -> Any:
     """
     Safely get nested dictionary value using key path.
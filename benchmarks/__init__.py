@@ -0,0 +1,6 @@
+"""
+Benchmarks Package
+
+This package contains standalone benchmark scripts. They are not part of the
+test suite and are run directly, e.g. ``python -m benchmarks.bench_database``.
+"""
@@ -0,0 +1,78 @@
+"""
+Async Facade Benchmark
+
+Measures how long light requests (a by-ID lookup every millisecond) wait
+for the event loop while heavy ``find`` scans run concurrently, with the
+scans called directly on ``InMemoryDatabase`` from coroutines versus
+awaited on ``AsyncInMemoryDatabase``.
+
+Usage:
+    python -m benchmarks.bench_async [--size 100000] [--seconds 3]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.services.async_database import AsyncInMemoryDatabase
+from benchmarks.bench_database import REGIONS, build_database
+
+
+async def light_requests(db: AsyncInMemoryDatabase, record_id: str, stop: float) -> list:
+    """Look a record up every millisecond; return how late each lookup started, in ms."""
+    delays = []
+    while time.perf_counter() < stop:
+        due = time.perf_counter() + 0.001
+        await asyncio.sleep(0.001)
+        await db.get_by_id("listings", record_id)
+        delays.append((time.perf_counter() - due) * 1e3)
+    return delays
+
+
+async def heavy_requests(db: AsyncInMemoryDatabase, offload: bool, stop: float) -> int:
+    """Run region scans back to back; return how many completed."""
+    done = 0
+    while time.perf_counter() < stop:
+        filters = {"region": REGIONS[done % len(REGIONS)]}
+        if offload:
+            await db.find("listings", filters, view=True)
+        else:
+            db.database.find("listings", filters, view=True)
+            await asyncio.sleep(0)
+        done += 1
+    return done
+
+
+async def run(db: AsyncInMemoryDatabase, offload: bool, seconds: float):
+    """Run light and heavy requests together; return the light delays and heavy count."""
+    record_id = db.database.get_all("listings", view=True)[0]["id"]
+    stop = time.perf_counter() + seconds
+    delays, *scans = await asyncio.gather(
+        light_requests(db, record_id, stop),
+        *(heavy_requests(db, offload, stop) for _ in range(2))
+    )
+    return delays, sum(scans)
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    
+    db = AsyncInMemoryDatabase(build_database(args.size))
+    print(f"records: {args.size}")
+    print(f"{'scans':>10} {'lookups':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'scans/s':>8}")
+    for name, offload in (("inline", False), ("offloaded", True)):
+        delays, scans = asyncio.run(run(db, offload, args.seconds))
+        p99 = statistics.quantiles(delays, n=100, method="inclusive")[98]
+        print(
+            f"{name:>10} {len(delays):>8} {statistics.median(delays):>8.2f} {p99:>8.2f} "
+            f"{max(delays):>8.2f} {scans / args.seconds:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
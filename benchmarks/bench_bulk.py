@@ -0,0 +1,62 @@
+"""
+Bulk Write Benchmark
+
+Compares applying a batch of listing creates, updates and deletes one call
+at a time (one lock acquisition and snapshot per record) with the batch
+methods (one of each per batch).
+
+Usage:
+    python -m benchmarks.bench_bulk [--size 100000] [--batch 10000]
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.bench_database import REGIONS, build_database
+
+
+def timed(func) -> float:
+    """Get the duration of ``func()`` in milliseconds."""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1e3
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+    
+    rng = random.Random(0)
+    new = [{"region": rng.choice(REGIONS), "price_in_cents": rng.randrange(10**8)} for _ in range(args.batch)]
+    
+    print(f"records: {args.size}, batch: {args.batch}")
+    print(f"{'operation':>10} {'single us/op':>13} {'batch us/op':>12}")
+    results = {}
+    for mode in ("single", "batch"):
+        db = build_database(args.size)
+        ids = rng.sample([record["id"] for record in db.get_all("listings", view=True)], args.batch)
+        changes = [(record_id, {"price_in_cents": rng.randrange(10**8)}) for record_id in ids]
+        if mode == "single":
+            results[mode] = [
+                timed(lambda: [db.create("listings", data) for data in new]),
+                timed(lambda: [db.update("listings", record_id, data) for record_id, data in changes]),
+                timed(lambda: [db.delete("listings", record_id) for record_id in ids]),
+            ]
+        else:
+            results[mode] = [
+                timed(lambda: db.create_many("listings", new)),
+                timed(lambda: db.update_many("listings", changes)),
+                timed(lambda: db.delete_many("listings", ids)),
+            ]
+    
+    for position, name in enumerate(("create", "update", "delete")):
+        single, batch = (results[mode][position] * 1e3 / args.batch for mode in ("single", "batch"))
+        print(f"{name:>10} {single:>13.1f} {batch:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Columnar Store Benchmark
+
+Compares multi-predicate queries and aggregates answered from the NumPy
+columnar store with the same queries answered from the indexes and row
+store (a database built with ``columns={}``).
+
+Usage:
+    python -m benchmarks.bench_columnar [--size 200000] [--repeat 10]
+"""
+
+import argparse
+import time
+
+from app.services.columnar import NUMPY_AVAILABLE
+from app.services.database import InMemoryDatabase
+
+from benchmarks.bench_database import REGIONS, build_database
+
+
+def time_query(func, repeat: int) -> float:
+    """
+    Time ``func()``, after one warm-up call that builds any lazy state.
+    
+    Returns:
+        Mean latency in milliseconds
+    """
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1e3 / repeat
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    if not NUMPY_AVAILABLE:
+        raise SystemExit("NumPy is not installed")
+    
+    columnar = build_database(args.size)
+    rows = InMemoryDatabase(columns={})
+    rows.import_data(columnar.export_data())
+    
+    region = {"region": REGIONS[0]}
+    wide = {"price_in_cents": (0, args.size * 80), "gross_yield": (0.05, None)}
+    cases = {
+        "find region+bedrooms": lambda db: db.find("listings", {**region, "bedrooms": 2}),
+        "find_range 2 ranges+eq": lambda db: db.find_range("listings", wide, {"bedrooms": 2}),
+        "mean price by region": lambda db: db.aggregate("listings", "price_in_cents", "mean", region),
+        "sum price in ranges": lambda db: db.aggregate("listings", "price_in_cents", "sum", None, wide),
+    }
+    
+    start = time.perf_counter()
+    columnar.snapshot()._state("listings").columns()
+    print(f"records: {args.size}, column build: {(time.perf_counter() - start) * 1e3:.0f} ms")
+    print(f"{'query':>24} {'rows ms':>9} {'columnar ms':>12}")
+    for name, func in cases.items():
+        row_ms = time_query(lambda: func(rows), args.repeat)
+        column_ms = time_query(lambda: func(columnar), args.repeat)
+        print(f"{name:>24} {row_ms:>9.2f} {column_ms:>12.2f}")
+    
+    columnar.update("listings", "7", {"bedrooms": 4})
+    start = time.perf_counter()
+    columnar.snapshot()._state("listings").columns()
+    print(f"column patch after one update: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
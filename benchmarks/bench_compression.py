@@ -0,0 +1,108 @@
+"""
+Compression Benchmark
+
+Measures listing search pages compressed with each encoding: their size,
+the time to compress one, and requests per second served three ways:
+
+- ``plain``: the page is sent uncompressed;
+- ``per request``: ``CompressionMiddleware`` compresses the page for every
+  request, as a compression middleware in front of any app does;
+- ``precompressed``: the response cache keeps the page compressed and
+  serves the same bytes until the listings are written.
+  
+Apps are called directly as ASGI applications, as in
+``benchmarks.bench_responses``, so the numbers are the CPU cost of the
+request in the app; the bandwidth saved comes on top.
+
+Usage:
+    python -m benchmarks.bench_compression [--sizes 20 100] [--seconds 1]
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.api.cache import CacheRule, ResponseCacheMiddleware
+from app.api.compression import AVAILABLE_ENCODINGS, CompressionMiddleware, ResponseCompression
+from app.services.async_database import AsyncInMemoryDatabase
+from benchmarks.bench_responses import build_app, build_database
+
+
+async def call(app, query: bytes, encoding: str) -> bytes:
+    """Call ``app`` with a GET of ``/listings?{query}`` accepting ``encoding``, and get the response body."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/listings", "raw_path": b"/listings", "root_path": "",
+        "query_string": query, "headers": [(b"accept-encoding", encoding.encode())],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    body = []
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+    
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def measure(app, query: bytes, encoding: str, seconds: float) -> float:
+    """Get the requests per second ``app`` serves for ``query``, after a warm-up."""
+    for _ in range(20):
+        await call(app, query, encoding)
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for _ in range(10):
+            await call(app, query, encoding)
+        count += 10
+    return count / (time.perf_counter() - start)
+
+
+async def run(sizes: list, seconds: float):
+    """Run the benchmark and print a table."""
+    database = build_database(max(sizes) * 2)
+    compression = ResponseCompression(min_size=0)
+    apps = {
+        "plain": build_app(database, "cached"),
+        "per request": CompressionMiddleware(build_app(database, "cached"), compression),
+        "precompressed": ResponseCacheMiddleware(
+            build_app(database, "cached"),
+            database=AsyncInMemoryDatabase(database),
+            rules=[CacheRule("/listings", ttl=60, tags=["listings"])],
+            budget=64 * 1024 * 1024,
+            compression=compression
+        ),
+    }
+    print(f"{'listings':>8} {'encoding':>8} {'page kB':>8} {'compress ms':>12} " + " ".join(
+        f"{mode + ' req/s':>19}" for mode in apps
+    ))
+    for size in sizes:
+        query = f"limit={size}".encode()
+        page = await call(apps["plain"], query, "identity")
+        for encoding in ("identity", *AVAILABLE_ENCODINGS):
+            if encoding == "identity":
+                compressed, elapsed = page, 0.0
+            else:
+                start = time.perf_counter()
+                compressed = compression.compress(page, encoding)
+                elapsed = (time.perf_counter() - start) * 1000
+            rates = [await measure(app, query, encoding, seconds) for app in apps.values()]
+            print(f"{size:>8} {encoding:>8} {len(compressed) / 1000:>8.1f} {elapsed:>12.2f} " + " ".join(
+                f"{rate:>19.0f}" for rate in rates
+            ))
+
+
+def main():
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
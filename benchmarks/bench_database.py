@@ -0,0 +1,99 @@
+"""
+Database Point-Operation Benchmark
+
+Measures ``get_by_id``/``update`` latency on the in-memory database as the
+collection grows, to show that point operations stay flat, and the latency
+of an indexed ``find`` equality filter and a ``find_range`` page query.
+
+Usage:
+    python -m benchmarks.bench_database [--sizes 1000 10000 100000] [--lookups 20000]
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from app.models.schemas import Region
+
+from app.services.database import InMemoryDatabase
+
+
+REGIONS = [region.value for region in Region]
+
+
+def build_database(size: int) -> InMemoryDatabase:
+    """
+    Build a database with ``size`` synthetic listings.
+    
+    Args:
+        size: Number of records to load
+        
+    Returns:
+        Populated database instance
+    """
+    db = InMemoryDatabase()
+    db.import_data({
+        "listings": [
+            {
+                "id": str(i),
+                "price_in_cents": i * 100,
+                "bedrooms": i % 5,
+                "region": REGIONS[i % len(REGIONS)],
+                "post_town": f"Town {i % 1000}",
+                "gross_yield": (i * 7919 % 1000) / 10_000,
+            }
+            for i in range(size)
+        ]
+    })
+    return db
+
+
+def time_per_op(func, ids: List[str]) -> float:
+    """
+    Time ``func(record_id)`` over ``ids``.
+    
+    Returns:
+        Mean latency in microseconds
+    """
+    start = time.perf_counter()
+    for record_id in ids:
+        func(record_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def main():
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 500_000])
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--finds", type=int, default=200)
+    args = parser.parse_args()
+    
+    print(f"{'records':>10} {'get_by_id (us)':>16} {'update (us)':>13} {'find town (us)':>16} {'range page (us)':>17}")
+    for size in args.sizes:
+        db = build_database(size)
+        ids = [str(random.randrange(size)) for _ in range(args.lookups)]
+        
+        get_us = time_per_op(lambda rid: db.get_by_id("listings", rid), ids)
+        update_us = time_per_op(lambda rid: db.update("listings", rid, {"bedrooms": 3}), ids)
+        towns = [f"Town {random.randrange(1000)}" for _ in range(args.finds)]
+        find_us = time_per_op(lambda town: db.find("listings", {"post_town": town, "bedrooms": 1}), towns)
+        
+        # "price between X and X + 1% of the collection, yield >= 5%", first 20 by price
+        span = size
+        lows = [random.randrange(size) * 100 for _ in range(args.finds)]
+        range_us = time_per_op(
+            lambda low: db.find_range(
+                "listings",
+                {"price_in_cents": (low, low + span), "gross_yield": (0.05, None)},
+                order_by="price_in_cents",
+                limit=20
+            ),
+            lows
+        )
+        print(f"{size:>10} {get_us:>16.2f} {update_us:>13.2f} {find_us:>16.2f} {range_us:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Export Benchmark
+
+Compares exporting the listings by building the whole export and encoding
+it as one JSON document (``export_data``) with streaming it as
+newline-delimited JSON (``export_ndjson``): total time, time to the first
+byte, and peak Python heap while exporting.
+
+Usage:
+    python -m benchmarks.bench_export [--size 100000]
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+
+from app.services.async_database import AsyncInMemoryDatabase
+from app.services.database import InMemoryDatabase
+from benchmarks.bench_startup import build_listings
+
+
+async def export_document(db: AsyncInMemoryDatabase) -> tuple:
+    """Get the total bytes and time to the first byte of a whole-document export."""
+    body = json.dumps(await db.export_data()).encode("utf-8")
+    return len(body), time.perf_counter()
+
+
+async def export_stream(db: AsyncInMemoryDatabase) -> tuple:
+    """Get the total bytes and time to the first byte of a streamed export, discarding chunks."""
+    size, first = 0, None
+    async for chunk in db.export_ndjson():
+        first = first or time.perf_counter()
+        size += len(chunk)
+    return size, first
+
+
+def measure(db: AsyncInMemoryDatabase, export) -> tuple:
+    """Get the total time (ms), first-byte time (ms), peak heap (MB) and size (MB) of ``export``."""
+    gc.collect()
+    start = time.perf_counter()
+    size, first = asyncio.run(export(db))
+    total = time.perf_counter() - start
+    
+    # Heap is measured on a separate export, as tracing slows allocations down
+    gc.collect()
+    tracemalloc.start()
+    asyncio.run(export(db))
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return total * 1e3, (first - start) * 1e3, peak, size / 2 ** 20
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    args = parser.parse_args()
+    
+    database = InMemoryDatabase()
+    database.import_data({"listings": build_listings(args.size)})
+    db = AsyncInMemoryDatabase(database)
+    
+    print(f"records: {args.size}")
+    print(f"{'export':>8} {'total ms':>9} {'first byte ms':>14} {'peak heap MB':>13} {'size MB':>8}")
+    for name, export in (("document", export_document), ("ndjson", export_stream)):
+        total, first, peak, size = measure(db, export)
+        print(f"{name:>8} {total:>9.0f} {first:>14.1f} {peak:>13.1f} {size:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Import Benchmark
+
+Compares loading a camelCase listing feed from a file by parsing it whole
+and writing every listing at once with streaming it through the importer
+(``import_listings``), which commits a chunk at a time: total time, the
+longest single write (how long readers' next snapshot and other writers
+wait), and peak Python heap while loading.
+
+Usage:
+    python -m benchmarks.bench_import [--size 100000]
+"""
+
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+from app.data.seed_data import LISTING_SEED_DATA
+from app.services.database import InMemoryDatabase
+from app.services.importer import import_listings
+from app.services.seed import stored_listing
+
+
+class TimedDatabase(InMemoryDatabase):
+    """Database recording the duration of every bulk write."""
+    
+    def __init__(self):
+        """Initialize the database with no writes recorded."""
+        super().__init__()
+        self.writes = []
+    
+    def bulk_write(self, *args, **kwargs):
+        """Apply a batch of writes, recording how long it took."""
+        start = time.perf_counter()
+        try:
+            return super().bulk_write(*args, **kwargs)
+        finally:
+            self.writes.append(time.perf_counter() - start)
+
+
+def write_feed(file, size: int):
+    """Write ``size`` camelCase listings with distinct IDs to ``file`` as newline-delimited JSON."""
+    for i in range(size):
+        listing = LISTING_SEED_DATA[i % len(LISTING_SEED_DATA)]
+        file.write(json.dumps({**listing, "id": i}).encode("utf-8") + b"\n")
+    file.flush()
+
+
+def load_whole(path: str) -> TimedDatabase:
+    """Parse the whole feed, then write it in one batch."""
+    database = TimedDatabase()
+    with open(path, "rb") as file:
+        feed = [json.loads(line) for line in file]
+    database.bulk_write("listings", upsert=[stored_listing(listing) for listing in feed])
+    return database
+
+
+def load_streaming(path: str) -> TimedDatabase:
+    """Stream the feed through the importer."""
+    database = TimedDatabase()
+    with open(path, "rb") as file:
+        import_listings(database, iter(partial(file.read, 65536), b""))
+    return database
+
+
+def measure(load, path: str) -> tuple:
+    """Get the total time (ms), longest write (ms) and peak heap (MB) of ``load(path)``."""
+    gc.collect()
+    start = time.perf_counter()
+    database = load(path)
+    total = time.perf_counter() - start
+    longest = max(database.writes)
+    del database
+    
+    # Heap is measured on a separate load, as tracing slows allocations down
+    gc.collect()
+    tracemalloc.start()
+    load(path)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return total * 1e3, longest * 1e3, peak
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    args = parser.parse_args()
+    
+    print(f"listings: {args.size}")
+    print(f"{'load':>9} {'total ms':>9} {'longest write ms':>17} {'peak heap MB':>13}")
+    with tempfile.NamedTemporaryFile(suffix=".ndjson") as file:
+        write_feed(file, args.size)
+        for name, load in (("whole", load_whole), ("streaming", load_streaming)):
+            total, longest, peak = measure(load, file.name)
+            print(f"{name:>9} {total:>9.0f} {longest:>17.1f} {peak:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
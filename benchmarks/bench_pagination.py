@@ -0,0 +1,60 @@
+"""
+Pagination Benchmark
+
+Compares offset pagination (``skip``/``limit`` over the sorted matches) with
+keyset pagination through ``get_page`` at increasing page depths, and an
+exact filtered count with the cached approximate one.
+
+Usage:
+    python -m benchmarks.bench_pagination [--size 100000] [--limit 100] [--repeat 20]
+"""
+
+import argparse
+import time
+
+from benchmarks.bench_database import REGIONS, build_database
+
+
+def timed(func, repeat: int) -> float:
+    """Get the mean latency of ``func()`` in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1e3 / repeat
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    db = build_database(args.size)
+    limit = args.limit
+    
+    def offset_page(skip: int):
+        records = db.find_range("listings", {}, order_by="price_in_cents", view=True)
+        return records[skip:skip + limit]
+    
+    print(f"records: {args.size}, page size: {limit}")
+    print(f"{'depth':>9} {'skip ms':>9} {'cursor ms':>10}")
+    for depth in (0, args.size // 100, args.size // 10, args.size // 2):
+        skip = depth - depth % limit
+        last = offset_page(skip - 1)[0] if skip else None
+        after = None if last is None else (last["price_in_cents"], last["id"])
+        cursor_ms = timed(lambda: db.get_page("listings", limit, "price_in_cents", after=after, view=True), args.repeat)
+        skip_ms = timed(lambda: offset_page(skip), max(args.repeat // 10, 1))
+        print(f"{skip:>9} {skip_ms:>9.2f} {cursor_ms:>10.3f}")
+    
+    region = {"region": REGIONS[0]}
+    exact_ms = timed(lambda: db.snapshot().count("listings", region, {"gross_yield": (0.05, None)}), args.repeat)
+    cached_ms = timed(
+        lambda: db.count("listings", region, {"gross_yield": (0.05, None)}, approximate=True), args.repeat
+    )
+    print(f"filtered count: exact {exact_ms:.2f} ms, approximate {cached_ms:.4f} ms")
+
+
+if __name__ == "__main__":
+    main()
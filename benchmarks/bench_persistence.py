@@ -0,0 +1,82 @@
+"""
+Persistence Benchmark
+
+Measures single-record write throughput without a write-ahead log, with a
+log that is only flushed, and with a log that every write waits to be
+fsynced (group commit), from one and several writer threads; then the time
+to restart a database from a snapshot plus a log tail.
+
+Usage:
+    python -m benchmarks.bench_persistence [--size 100000] [--writes 2000] [--tail 10000]
+"""
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from app.services.database import InMemoryDatabase
+from app.services.persistence import Persistence
+from benchmarks.bench_database import REGIONS, build_database
+
+
+def write_throughput(db: InMemoryDatabase, writes: int, threads: int) -> float:
+    """Get the creates per second of ``threads`` threads sharing ``writes`` creates."""
+    def work():
+        for number in range(writes // threads):
+            db.create("listings", {"region": REGIONS[number % len(REGIONS)], "price_in_cents": number})
+    
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return writes / (time.perf_counter() - start)
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--tail", type=int, default=10_000)
+    args = parser.parse_args()
+    
+    print(f"writes: {args.writes}")
+    print(f"{'log':>12} {'1 thread/s':>11} {'8 threads/s':>12}")
+    for mode in ("none", "flush", "fsync"):
+        rates = []
+        for threads in (1, 8):
+            with tempfile.TemporaryDirectory() as directory:
+                persistence = None
+                if mode != "none":
+                    persistence = Persistence(directory, fsync=mode == "fsync", checkpoint_interval=3600)
+                db = InMemoryDatabase(persistence=persistence)
+                rates.append(write_throughput(db, args.writes, threads))
+                db.close()
+        print(f"{mode:>12} {rates[0]:>11.0f} {rates[1]:>12.0f}")
+    
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        db = build_database(args.size)
+        start = time.perf_counter()
+        db.attach(Persistence(directory, fsync=False, checkpoint_interval=3600))
+        snapshot_ms = (time.perf_counter() - start) * 1e3
+        for _ in range(args.tail):
+            db.update("listings", str(rng.randrange(args.size)), {"price_in_cents": rng.randrange(10**8)})
+        db.close()
+        
+        start = time.perf_counter()
+        restored = InMemoryDatabase(persistence=Persistence(directory, checkpoint_interval=3600))
+        restart_ms = (time.perf_counter() - start) * 1e3
+        assert restored.count("listings") == args.size
+        restored.close()
+    
+    print(f"records: {args.size}, log tail: {args.tail} updates")
+    print(f"first snapshot: {snapshot_ms:.0f} ms, restart: {restart_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Record Memory Benchmark
+
+Compares the memory a stored listing costs as a plain dictionary (as before
+compact records), as a slotted record without encoded fields, and as a
+``ListingRow``, whose categorical fields and photos are dictionary-encoded:
+bytes of the record object alone, and bytes per listing of the whole
+listings collection state (records, values and indexes) after importing
+the listings, measured with ``tracemalloc``. Every listing is decoded from
+JSON of its own, as when loaded from a feed or snapshot, so listings share
+no values unless the store shares them.
+
+Usage:
+    python -m benchmarks.bench_records [--size 100000]
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+from app.data.seed_data import LISTING_SEED_DATA
+from app.services.database import InMemoryDatabase
+from app.services.records import LISTING_FIELDS, ListingRow, compact_record_type
+from app.services.seed import build_seed_listings
+
+
+def listings(size: int) -> list:
+    """Build ``size`` stored listings with distinct IDs."""
+    seed = build_seed_listings()
+    return [json.dumps({**seed[i % len(seed)], "id": str(i), "listing_id": i}) for i in range(size)]
+
+
+def collection_bytes(records: list, record_types) -> int:
+    """Get the bytes held by a database importing ``records`` (JSON), less those of an empty one."""
+    sizes = []
+    for data in ([], records):
+        gc.collect()
+        tracemalloc.start()
+        database = InMemoryDatabase(record_types=record_types)
+        database.import_data({"users": [], "sessions": [], "listings": [json.loads(record) for record in data]})
+        gc.collect()
+        sizes.append(tracemalloc.get_traced_memory()[0])
+        tracemalloc.stop()
+        del database
+    return sizes[1] - sizes[0]
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    args = parser.parse_args()
+    
+    records = listings(args.size)
+    print(f"listings: {args.size} ({len(LISTING_SEED_DATA)} distinct seed listings)")
+    print(f"{'stored as':>10} {'record bytes':>13} {'collection bytes/listing':>25}")
+    slotted = compact_record_type("SlottedListing", LISTING_FIELDS)
+    for name, record_type in (("dict", None), ("slotted", slotted), ("encoded", ListingRow)):
+        record = json.loads(records[0])
+        size = sys.getsizeof(record if record_type is None else record_type(record))
+        collection = collection_bytes(records, {} if record_type is None else {"listings": record_type})
+        print(f"{name:>10} {size:>13} {collection / args.size:>25.0f}")
+
+
+if __name__ == "__main__":
+    main()
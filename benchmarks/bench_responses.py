@@ -0,0 +1,148 @@
+"""
+Response Benchmark
+
+Compares requests per second of a listing search page returned three ways,
+across page sizes:
+
+- ``validated``: the handler returns a dictionary, which FastAPI validates
+  against ``ListingPage``, converts and encodes with ``JSONResponse`` (as
+  before ``FastJSONResponse``);
+- ``fast class``: the same, with ``FastJSONResponse`` as the response
+  class, which only changes the final encoding;
+- ``trusted``: the handler returns a ``FastJSONResponse`` itself, so the
+  page skips validation and conversion;
+- ``cached``: the page is joined from listings encoded once and kept in the
+  database's cache of serialized listings, as the listing handlers do;
+- ``response cache``: the ``cached`` app behind ``ResponseCacheMiddleware``,
+  which answers repeated searches from stored response bytes until the
+  listings are written.
+  
+Each app is called directly as an ASGI application, without a server or
+HTTP client, so the numbers are the CPU cost of the request in the app.
+
+Usage:
+    python -m benchmarks.bench_responses [--sizes 1 20 100] [--seconds 2]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.api.cache import CacheRule, ResponseCacheMiddleware
+from app.api.responses import EncodedJSONResponse, FastJSONResponse, json_array, json_object
+from app.models.schemas import ListingPage
+from app.services.async_database import AsyncInMemoryDatabase
+from app.services.database import InMemoryDatabase
+from app.services.listings import search_encoded_listings, search_listings, to_listing
+from app.services.seed import build_seed_listings
+from app.utils.helpers import ORJSON_AVAILABLE, encode_json
+
+
+def build_database(size: int) -> InMemoryDatabase:
+    """Build a database of ``size`` listings copied from the seed listings."""
+    seed = build_seed_listings()
+    database = InMemoryDatabase()
+    database.import_data({
+        "listings": [
+            {**seed[i % len(seed)], "id": str(i), "listing_id": i} for i in range(size)
+        ]
+    })
+    return database
+
+
+def build_app(database: InMemoryDatabase, mode: str) -> FastAPI:
+    """Build an app serving one listing search route the way ``mode`` names."""
+    if mode == "response cache":
+        return ResponseCacheMiddleware(
+            build_app(database, "cached"),
+            database=AsyncInMemoryDatabase(database),
+            rules=[CacheRule("/listings", ttl=60, tags=["listings"])],
+            budget=64 * 1024 * 1024
+        )
+    app = FastAPI(default_response_class=JSONResponse if mode == "validated" else FastJSONResponse)
+    
+    @app.get("/listings", response_model=ListingPage)
+    async def listings(limit: int):
+        if mode == "cached":
+            items, next_cursor = search_encoded_listings(database, {}, {}, "price_in_cents", limit)
+            return EncodedJSONResponse(json_object([
+                ("items", json_array(items)),
+                ("nextCursor", encode_json(next_cursor)),
+                ("approximateTotal", encode_json(database.count("listings"))),
+            ]))
+        records, next_cursor = search_listings(database, {}, {}, "price_in_cents", limit)
+        page = {
+            "items": [to_listing(record) for record in records],
+            "nextCursor": next_cursor,
+            "approximateTotal": database.count("listings"),
+        }
+        return FastJSONResponse(page) if mode == "trusted" else page
+    
+    return app
+
+
+async def call(app: FastAPI, query: bytes) -> bytes:
+    """Call ``app`` with a GET of ``/listings?{query}`` and get the response body."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/listings", "raw_path": b"/listings", "root_path": "",
+        "query_string": query, "headers": [], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    body = []
+    
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+    
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def measure(app: FastAPI, query: bytes, seconds: float) -> float:
+    """Get the requests per second ``app`` serves for ``query``, after a warm-up."""
+    for _ in range(50):
+        await call(app, query)
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for _ in range(20):
+            await call(app, query)
+        count += 20
+    return count / (time.perf_counter() - start)
+
+
+async def run(sizes: list, seconds: float):
+    """Run the benchmark and print a table."""
+    database = build_database(max(sizes) * 2)
+    apps = {mode: build_app(database, mode) for mode in ("validated", "fast class", "trusted", "cached", "response cache")}
+    print(f"encoder: {'orjson' if ORJSON_AVAILABLE else 'json'}")
+    print(f"{'listings':>8} {'page kB':>8} " + " ".join(f"{mode + ' req/s':>16}" for mode in apps) + f" {'speedup':>8}")
+    for size in sizes:
+        query = f"limit={size}".encode()
+        bodies = [json.loads(await call(app, query)) for app in apps.values()]
+        assert all(body == bodies[0] for body in bodies)
+        rates = [await measure(app, query, seconds) for app in apps.values()]
+        page = len(await call(apps["trusted"], query)) / 1000
+        print(
+            f"{size:>8} {page:>8.1f} " + " ".join(f"{rate:>16.0f}" for rate in rates)
+            + f" {rates[-1] / rates[0]:>7.1f}x"
+        )
+
+
+def main():
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 20, 100])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
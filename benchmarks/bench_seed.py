@@ -0,0 +1,74 @@
+"""
+Seed Benchmark
+
+Compares starting the application with the seed listings converted from
+the ``LISTING_SEED_DATA`` literal in every process (as before the seed
+artifact) with mapping the prebuilt artifact: import time of ``app.main``,
+time of ``seed_listings`` and time from interpreter start to the first
+``/api/listings`` response. Every run is a fresh process, with bytecode
+caches warm.
+
+Usage:
+    python -m benchmarks.bench_seed [--runs 7]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+from app.services.seed import write_artifact
+
+# Run in a fresh interpreter; prints the import, seed and first response times in ms
+PROBE = """
+import time
+start = time.perf_counter()
+from app.services import seed
+if {literal}:
+    # Convert the literal in every process, as before the artifact
+    seed._open_artifact = lambda path: None
+    seed.write_artifact = lambda path, records=None: path
+import app.main
+imported = time.perf_counter()
+from app.services.database import InMemoryDatabase
+seeding = time.perf_counter()
+InMemoryDatabase().seed_listings()
+seeded = time.perf_counter() - seeding
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    client.get("/api/listings")
+first = time.perf_counter()
+print((imported - start) * 1e3, seeded * 1e3, (first - start) * 1e3)
+"""
+
+
+def measure(literal: bool, runs: int) -> list:
+    """Get the median import, seed and first-response times (ms) over ``runs`` processes."""
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", PROBE.format(literal=literal)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append([float(value) for value in output.splitlines()[-1].split()])
+    return [statistics.median(column) for column in zip(*results)]
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+    
+    write_artifact()
+    # Warms the bytecode caches of both paths
+    measure(True, 1)
+    
+    print(f"{'seed from':>9} {'import app.main ms':>19} {'seed_listings ms':>17} {'first response ms':>18}")
+    for name, literal in (("literal", True), ("artifact", False)):
+        imported, seeded, first = measure(literal, args.runs)
+        print(f"{name:>9} {imported:>19.1f} {seeded:>17.2f} {first:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
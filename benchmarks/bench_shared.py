@@ -0,0 +1,105 @@
+"""
+Shared Collection Benchmark
+
+Starts several worker processes that each load the same listings, either
+privately (every worker builds its own records) or through a shared
+directory (the first worker publishes them, the others map the published
+file), and reports the memory each worker holds once its first queries
+ran; then the time of a write and of another worker picking it up.
+
+Usage:
+    python -m benchmarks.bench_shared [--size 100000] [--workers 4]
+"""
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+import tracemalloc
+
+from app.services.database import InMemoryDatabase
+from app.services.shared import SharedCollection
+from benchmarks.bench_startup import build_listings
+
+
+def resident_mb() -> float:
+    """Get this process's private (unshared) resident memory in MB."""
+    with open("/proc/self/smaps_rollup") as file:
+        private = sum(
+            int(line.split()[1]) for line in file if line.startswith(("Private_Clean", "Private_Dirty"))
+        )
+    return private / 2 ** 10
+
+
+def worker(size: int, directory, ready, results):
+    """Load the listings privately or through ``directory``, query them and report memory."""
+    tracemalloc.start()
+    database = InMemoryDatabase()
+    if directory is None:
+        database.import_data({"listings": build_listings(size)})
+    else:
+        ready.wait()
+        database.share(SharedCollection(directory, "listings"))
+    database.count("listings", {"region": "London"})
+    database.find_range("listings", {"price_in_cents": (20_000_000, 20_100_000)}, limit=20)
+    results.put((tracemalloc.get_traced_memory()[0] / 2 ** 20, resident_mb()))
+
+
+def run(size: int, workers: int, directory) -> tuple:
+    """Get the mean heap and private memory (MB) of ``workers`` worker processes."""
+    context = multiprocessing.get_context("spawn")
+    ready, results = context.Event(), context.Queue()
+    processes = [
+        context.Process(target=worker, args=(size, directory, ready, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    if directory is not None:
+        publisher = InMemoryDatabase()
+        publisher.import_data({"listings": build_listings(size)})
+        publisher.share(SharedCollection(directory, "listings"))
+        ready.set()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return sum(heap for heap, _ in measured) / workers, sum(rss for _, rss in measured) / workers
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    
+    print(f"records: {args.size}, workers: {args.workers}")
+    print(f"{'listings':>8} {'heap MB/worker':>15} {'private MB/worker':>18}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, shared in (("private", None), ("shared", directory)):
+            heap, private = run(args.size, args.workers, shared)
+            print(f"{name:>8} {heap:>15.0f} {private:>18.0f}")
+        
+        writer, reader = InMemoryDatabase(), InMemoryDatabase()
+        writer.share(SharedCollection(directory, "listings"))
+        reader.share(SharedCollection(directory, "listings"))
+        # The first write to a mapped collection builds its indexes
+        print(f"{'write':>8} {'write ms':>9} {'refresh ms':>11}")
+        for name, record_id in (("first", "12345"), ("next", "12346")):
+            start = time.perf_counter()
+            writer.update("listings", record_id, {"region": "Elsewhere"})
+            written = time.perf_counter()
+            reader.refresh()
+            refreshed = time.perf_counter()
+            assert reader.get_by_id("listings", record_id)["region"] == "Elsewhere"
+            print(f"{name:>8} {(written - start) * 1e3:>9.1f} {(refreshed - written) * 1e3:>11.1f}")
+        
+        start = time.perf_counter()
+        for _ in range(10_000):
+            reader.refresh()
+        check_us = (time.perf_counter() - start) / 10_000 * 1e6
+    print(f"refresh with nothing new: {check_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
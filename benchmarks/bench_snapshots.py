@@ -0,0 +1,65 @@
+"""
+Snapshot Read Benchmark
+
+Measures ``get_by_id`` latency on a reader thread while another thread keeps
+running long scans (``export_data`` and an unindexed ``find``) and a third
+keeps writing. With a shared lock the point reads queue behind the scans;
+with snapshot reads they do not.
+
+Usage:
+    python -m benchmarks.bench_snapshots [--size 200000] [--seconds 3]
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from benchmarks.bench_database import build_database
+
+
+def main():
+    """Run the benchmark and print latency percentiles."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    
+    db = build_database(args.size)
+    stop = threading.Event()
+    
+    def scanner():
+        while not stop.is_set():
+            db.export_data()
+            db.find("listings", {"price_in_cents": -1})
+    
+    def writer():
+        while not stop.is_set():
+            db.update("listings", str(random.randrange(args.size)), {"bedrooms": random.randrange(5)})
+    
+    background = [threading.Thread(target=scanner), threading.Thread(target=writer)]
+    for thread in background:
+        thread.start()
+    
+    latencies = []
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        record_id = str(random.randrange(args.size))
+        start = time.perf_counter()
+        db.get_by_id("listings", record_id)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    
+    stop.set()
+    for thread in background:
+        thread.join()
+    
+    latencies.sort()
+    print(f"records: {args.size}, reads: {len(latencies)}")
+    print(f"get_by_id p50: {statistics.median(latencies):.1f} us")
+    print(f"get_by_id p99: {latencies[int(len(latencies) * 0.99)]:.1f} us")
+    print(f"get_by_id max: {latencies[-1]:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
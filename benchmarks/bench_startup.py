@@ -0,0 +1,97 @@
+"""
+Startup Benchmark
+
+Compares getting a database ready to serve from a JSON export (parse every
+record, then index) with mapping a binary snapshot (index from the mapped
+columns, decode records on first read): time until ready, time of the first
+queries, and Python heap in use once ready.
+
+Usage:
+    python -m benchmarks.bench_startup [--size 100000]
+"""
+
+import argparse
+import gc
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.services.binary_snapshot import SnapshotFile, write_snapshot
+from app.services.database import InMemoryDatabase
+
+
+def build_listings(size: int) -> list:
+    """Get ``size`` listings shaped like the seed data, with distinct IDs and prices."""
+    seed = InMemoryDatabase()
+    seed.seed_listings()
+    templates = seed.get_all("listings")
+    return [
+        {**templates[i % len(templates)], "id": str(i), "price_in_cents": 10_000_000 + i * 7 % 90_000_000}
+        for i in range(size)
+    ]
+
+
+def measure(load) -> tuple:
+    """Get the ready time (ms), first-queries time (ms) and heap in use (MB) of ``load()``."""
+    gc.collect()
+    start = time.perf_counter()
+    db = load()
+    ready = time.perf_counter()
+    db.get_by_id("listings", "12345")
+    db.count("listings", {"region": "London"})
+    db.find_range("listings", {"price_in_cents": (20_000_000, 20_100_000)}, limit=20)
+    queried = time.perf_counter()
+    del db
+    
+    # Heap is measured on a separate load, as tracing slows allocations down
+    gc.collect()
+    tracemalloc.start()
+    db = load()
+    heap = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    return (ready - start) * 1e3, (queried - ready) * 1e3, heap
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    args = parser.parse_args()
+    
+    listings = build_listings(args.size)
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = Path(directory) / "export.json"
+        snap_path = Path(directory) / "export.snap"
+        start = time.perf_counter()
+        json_path.write_text(json.dumps({"listings": listings}))
+        json_write = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        write_snapshot(snap_path, 1, {"listings": listings})
+        snap_write = (time.perf_counter() - start) * 1e3
+        del listings
+        
+        def load_json() -> InMemoryDatabase:
+            db = InMemoryDatabase()
+            db.import_data(json.loads(json_path.read_text()))
+            return db
+        
+        def load_snapshot() -> InMemoryDatabase:
+            db = InMemoryDatabase()
+            db.import_data(SnapshotFile(snap_path).tables)
+            return db
+        
+        print(f"records: {args.size}")
+        print(f"{'format':>8} {'write ms':>9} {'size MB':>8} {'ready ms':>9} {'queries ms':>11} {'heap MB':>8}")
+        for name, path, write, load in (
+            ("json", json_path, json_write, load_json),
+            ("binary", snap_path, snap_write, load_snapshot),
+        ):
+            ready, queries, heap = measure(load)
+            size = path.stat().st_size / 2 ** 20
+            print(f"{name:>8} {write:>9.0f} {size:>8.1f} {ready:>9.0f} {queries:>11.1f} {heap:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Read View Benchmark
+
+Compares the default copying reads with ``view=True`` reads: throughput and
+the memory allocated (``tracemalloc`` peak) for a region ``find`` and a full
+``get_all`` scan.
+
+Usage:
+    python -m benchmarks.bench_views [--size 100000] [--repeat 20]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.bench_database import REGIONS, build_database
+
+
+def measure(func, repeat: int):
+    """
+    Measure ``func()``.
+    
+    Args:
+        func: Callable to measure
+        repeat: Number of timed calls
+        
+    Returns:
+        Tuple of mean latency in milliseconds and peak traced memory in MiB
+    """
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1e3 / repeat, peak / 2**20
+
+
+def main():
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    db = build_database(args.size)
+    region = {"region": REGIONS[0]}
+    cases = {
+        "find region": lambda view: db.find("listings", region, view=view),
+        "get_all + iterate": lambda view: sum(1 for _ in db.get_all("listings", view=view)),
+    }
+    
+    print(f"records: {args.size}")
+    print(f"{'query':>18} {'copy ms':>9} {'view ms':>9} {'copy MiB':>9} {'view MiB':>9}")
+    for name, func in cases.items():
+        copy_ms, copy_mib = measure(lambda: func(False), args.repeat)
+        view_ms, view_mib = measure(lambda: func(True), args.repeat)
+        print(f"{name:>18} {copy_ms:>9.2f} {view_ms:>9.2f} {copy_mib:>9.2f} {view_mib:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
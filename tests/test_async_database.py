@@ -0,0 +1,168 @@
+"""
+Tests for the Async Database Service
+
+This module contains tests for the asyncio facade over the in-memory
+database: offloaded reads and writes, write queueing and yielding scans.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+from app.services.async_database import AsyncInMemoryDatabase
+from app.services.database import InMemoryDatabase
+from app.services.shared import SharedCollection
+
+
+@pytest.fixture
+def async_db(database: InMemoryDatabase) -> AsyncInMemoryDatabase:
+    """
+    Get an asyncio facade over a clean database holding the seed listings.
+    
+    Returns:
+        AsyncInMemoryDatabase: Database facade
+    """
+    database.seed_listings()
+    return AsyncInMemoryDatabase(database)
+
+
+class TestAsyncDatabase:
+    """Test cases for the asyncio database facade."""
+    
+    @pytest.mark.asyncio
+    async def test_mirrors_database(self, async_db: AsyncInMemoryDatabase, database: InMemoryDatabase):
+        """
+        Test that facade reads and writes act on the wrapped database.
+        
+        Args:
+            async_db: Database facade
+            database: Wrapped database
+        """
+        created = await async_db.create("listings", {"region": "Wales", "price_in_cents": 1})
+        updated = await async_db.update("listings", "187", {"region": "Wales"})
+        
+        assert database.get_by_id("listings", created["id"]) == created
+        assert (await async_db.get_by_id("listings", "187"))["region"] == updated["region"] == "Wales"
+        assert await async_db.find("listings", {"region": "Wales"}) == database.find("listings", {"region": "Wales"})
+        assert await async_db.count("listings", {"region": "Wales"}) == 2
+        assert await async_db.count("listings") == len(database.get_all("listings"))
+        assert await async_db.aggregate("listings", "price_in_cents", "min") == 1
+        assert await async_db.run(lambda db, field: db.get_by_id("listings", "187")[field], "region") == "Wales"
+        assert await async_db.delete("listings", created["id"]) is True
+        assert (await async_db.export_data())["listings"] == database.get_all("listings")
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_writes(self, async_db: AsyncInMemoryDatabase, database: InMemoryDatabase):
+        """
+        Test that concurrent writers are queued and every write is applied.
+        
+        Args:
+            async_db: Database facade
+            database: Wrapped database
+        """
+        version = database.snapshot().version
+        
+        await asyncio.gather(*(async_db.create("users", {"username": f"user{n}"}) for n in range(40)))
+        
+        assert len(database.get_all("users")) == 40
+        assert database.snapshot().version == version + 40
+    
+    @pytest.mark.asyncio
+    async def test_scan_yields_to_event_loop(self, async_db: AsyncInMemoryDatabase, monkeypatch: pytest.MonkeyPatch):
+        """
+        Test that scans hand control back to the event loop between batches.
+        
+        Args:
+            async_db: Database facade
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        monkeypatch.setattr(AsyncInMemoryDatabase, "SCAN_BATCH", 5)
+        ticks = []
+        
+        async def ticker():
+            while True:
+                ticks.append(len(ticks))
+                await asyncio.sleep(0)
+        
+        task = asyncio.create_task(ticker())
+        records = [record async for record in async_db.scan("listings", {"region": "London"})]
+        task.cancel()
+        
+        assert [r["id"] for r in records] == [r["id"] for r in await async_db.find("listings", {"region": "London"})]
+        assert len(ticks) >= 4
+    
+    @pytest.mark.asyncio
+    async def test_offloaded_calls_do_not_block(self, async_db: AsyncInMemoryDatabase):
+        """
+        Test that the event loop keeps running while an offloaded call is busy.
+        
+        Args:
+            async_db: Database facade
+        """
+        ticks = []
+        
+        async def ticker():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+        
+        task = asyncio.create_task(ticker())
+        await async_db.run(lambda db: time.sleep(0.2))
+        task.cancel()
+        
+        assert len(ticks) >= 5
+    
+    @pytest.mark.asyncio
+    async def test_export_ndjson(self, async_db: AsyncInMemoryDatabase, monkeypatch: pytest.MonkeyPatch):
+        """
+        Test that an export streams one snapshot in chunks of whole lines.
+        
+        Args:
+            async_db: Database facade
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        monkeypatch.setattr(AsyncInMemoryDatabase, "EXPORT_BATCH", 7)
+        expected = async_db.database.get_all("listings")
+        
+        chunks = async_db.export_ndjson(["listings", "data"])
+        first = await chunks.__anext__()
+        await async_db.create("listings", {"region": "Wales"})
+        chunks = [first] + [chunk async for chunk in chunks]
+        
+        assert all(chunk.endswith(b"\n") for chunk in chunks)
+        assert len(chunks) == -(-(len(expected) + 1) // 7)
+        lines = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+        assert lines == [{"collection": "listings", "record": record} for record in expected] + [
+            {"collection": "data", "value": {}}
+        ]
+        with pytest.raises(KeyError):
+            async_db.export_ndjson(["missing"])
+    
+    @pytest.mark.asyncio
+    async def test_refresh_off_event_loop(self, tmp_path, monkeypatch: pytest.MonkeyPatch):
+        """
+        Test that shared writes of another database are loaded in the executor, and only if new.
+        
+        Args:
+            tmp_path: Temporary directory
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        writer, reader = InMemoryDatabase(), InMemoryDatabase()
+        writer.share(SharedCollection(str(tmp_path)), initialize=writer.seed_listings)
+        reader.share(SharedCollection(str(tmp_path)))
+        async_db = AsyncInMemoryDatabase(reader)
+        offloaded = []
+        offload = async_db._offload
+        
+        async def record(func, *args, **kwargs):
+            offloaded.append(func)
+            return await offload(func, *args, **kwargs)
+        
+        monkeypatch.setattr(async_db, "_offload", record)
+        await async_db.refresh()
+        writer.create("listings", {"region": "Elsewhere"})
+        await async_db.refresh()
+        
+        assert offloaded == [reader.refresh]
+        assert await async_db.count("listings", {"region": "Elsewhere"}) == 1
@@ -0,0 +1,100 @@
+"""
+Tests for the Binary Snapshot Format
+
+This module contains tests for writing snapshot files and serving a database
+from a memory-mapped snapshot: exact round trips, lazy decoding, and indexed
+queries and writes over loaded records.
+"""
+
+from pathlib import Path
+
+from app.services.binary_snapshot import SnapshotFile, write_snapshot
+from app.services.database import InMemoryDatabase
+
+
+RECORDS = [
+    {"id": "a", "price": 5, "yield": 0.5, "tenanted": True, "region": "Wales", "photos": ["x.jpg"]},
+    {"id": "b", "price": None, "yield": 1.5, "tenanted": False, "region": "London", "photos": []},
+    {"id": "c", "price": 2 ** 40, "region": "Wales", "mixed": 1, "nested": {"key": [1, None]}},
+    {"id": "d", "price": -3, "yield": 2.0, "tenanted": None, "mixed": "one", "big": 2 ** 70},
+]
+
+
+def load_database(path: Path) -> InMemoryDatabase:
+    """
+    Build a database over the collections of a snapshot file.
+    
+    Returns:
+        InMemoryDatabase: Database whose listings are decoded lazily
+    """
+    snapshot = SnapshotFile(path)
+    database = InMemoryDatabase()
+    database.import_data({**snapshot.values, **snapshot.tables})
+    return database
+
+
+class TestBinarySnapshot:
+    """Test cases for binary snapshot files."""
+    
+    def test_round_trip(self, tmp_path: Path):
+        """
+        Test that records, values and headers are read back exactly.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        path = tmp_path / "test.snap"
+        write_snapshot(path, 7, {"listings": RECORDS, "users": []}, {"data": {"key": 1}}, {"listings": {}})
+        
+        snapshot = SnapshotFile(path)
+        assert snapshot.version == 7
+        assert snapshot.values == {"data": {"key": 1}}
+        assert snapshot.indexes == {"listings": {}}
+        table = snapshot.tables["listings"]
+        assert len(table) == 4 and len(snapshot.tables["users"]) == 0
+        assert list(table) == RECORDS
+        assert table.rows(1, 3) == RECORDS[1:3]
+        assert [list(record) for record in table] == [list(record) for record in RECORDS]
+        assert table.column("price") == [5, None, 2 ** 40, -3]
+        assert table.column("unknown", 1, 3) == [None, None]
+        assert not path.with_name("test.snap.tmp").exists()
+    
+    def test_database_over_snapshot(self, tmp_path: Path):
+        """
+        Test that a database over a snapshot answers queries before decoding records.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        source = InMemoryDatabase()
+        source.seed_listings()
+        path = tmp_path / "listings.snap"
+        write_snapshot(path, 1, {"listings": source.get_all("listings")})
+        
+        database = load_database(path)
+        records = database.snapshot()._state("listings").records
+        assert records._unloaded == len(records._chunks)
+        assert database.count("listings", {"region": "London"}) == source.count("listings", {"region": "London"})
+        assert database.count("listings", ranges={"price_in_cents": (0, 10 ** 7)}) == source.count(
+            "listings", ranges={"price_in_cents": (0, 10 ** 7)}
+        )
+        assert records._unloaded == len(records._chunks)
+        
+        assert database.get_by_id("listings", "187") == source.get_by_id("listings", "187")
+        assert database.find_range("listings", {"gross_yield": (0.05, None)}, order_by="price_in_cents") == (
+            source.find_range("listings", {"gross_yield": (0.05, None)}, order_by="price_in_cents")
+        )
+        
+        for target in (database, source):
+            target.update("listings", "187", {"region": "Wales"})
+            target.delete("listings", "185")
+        assert database.count("listings", {"region": "Wales"}) == source.count("listings", {"region": "Wales"})
+        assert database.aggregate("listings", "price_in_cents", "sum") == (
+            source.aggregate("listings", "price_in_cents", "sum")
+        )
+        
+        def contents(target: InMemoryDatabase) -> list:
+            records = [{**record, "updated_at": None} for record in target.get_all("listings")]
+            return sorted(records, key=lambda record: record["id"])
+        
+        assert contents(database) == contents(source)
@@ -0,0 +1,189 @@
+"""
+Tests for the Response Cache
+
+This module contains tests for the response cache middleware: route rules,
+the byte-bounded store and its admission policy, invalidation by database
+writes and stale-while-revalidate.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.api.cache import CachedResponse, CacheRule, FrequencySketch, ResponseCache, ResponseCacheMiddleware
+from app.services.async_database import AsyncInMemoryDatabase
+from app.services.database import InMemoryDatabase
+
+
+@pytest.fixture
+def seeded(database: InMemoryDatabase) -> InMemoryDatabase:
+    """
+    Get a clean database holding the seed listings.
+    
+    Returns:
+        InMemoryDatabase: Database instance
+    """
+    database.seed_listings()
+    return database
+
+
+def entry(size: int) -> CachedResponse:
+    """Build a cached response whose body is ``size`` bytes."""
+    return CachedResponse(200, [], b"x" * size, ())
+
+
+class TestCacheRule:
+    """Test cases for cache rules."""
+    
+    def test_match(self):
+        """Test that a rule matches its path only, with its path parameters."""
+        rule = CacheRule("/api/listings/{listing_id}", ttl=1, tags=["listings:{listing_id}", "users"])
+        
+        assert rule.match("/api/listings/187") == {"listing_id": "187"}
+        assert rule.match("/api/listings") is None and rule.match("/api/listings/187/photos") is None
+        assert rule.tags == [("listings", "listing_id"), ("users", None)]
+
+
+class TestResponseCache:
+    """Test cases for the byte-bounded response store."""
+    
+    def test_sketch(self):
+        """Test that the sketch counts keys and halves its counts once its sample is full."""
+        sketch = FrequencySketch(width=64)
+        for _ in range(6):
+            sketch.increment("hot")
+        
+        assert sketch.estimate("hot") >= 6 and sketch.estimate("cold") < 6
+        for _ in range(640):
+            sketch.increment("other")
+        assert sketch.estimate("hot") < 6 and sketch.estimate("other") <= FrequencySketch.LIMIT
+    
+    def test_evicts_least_recently_used(self):
+        """Test that entries are evicted least recently used first to stay within the budget."""
+        cache = ResponseCache(budget=3 * entry(100).size, max_entry=10_000)
+        for key in ("a", "b", "c", "d"):
+            cache.get(key)
+        for key in ("a", "b", "c"):
+            assert cache.put(key, entry(100))
+        cache.get("a")
+        
+        assert cache.put("d", entry(100))
+        assert cache.get("b") is None and cache.get("a") is not None
+        assert len(cache) == 3 and cache.size <= cache.budget
+        assert not cache.put("e", entry(20_000))
+    
+    def test_admission(self):
+        """Test that a new entry does not displace entries requested more often."""
+        cache = ResponseCache(budget=2 * entry(100).size, max_entry=10_000)
+        for key in ("a", "b"):
+            for _ in range(3):
+                cache.get(key)
+            cache.put(key, entry(100))
+        
+        cache.get("once")
+        assert not cache.put("once", entry(100))
+        for _ in range(4):
+            cache.get("popular")
+        assert cache.put("popular", entry(100))
+        assert cache.get("a") is None and cache.get("b") is not None
+
+
+class TestResponseCacheMiddleware:
+    """Test cases for the response cache of the application."""
+    
+    def test_hit_until_written(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that a search is answered from the cache, in any parameter order, until a listing is written.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        first = client.get("/api/listings?limit=3&region=London")
+        second = client.get("/api/listings?region=London&limit=3")
+        
+        assert first.headers["x-cache"] == "MISS" and second.headers["x-cache"] == "HIT"
+        assert second.content == first.content and second.headers["etag"] == first.headers["etag"]
+        assert client.get("/api/listings?region=London&limit=3", headers={"Cache-Control": "no-cache"}).headers[
+            "x-cache"
+        ] == "MISS"
+        
+        listing = first.json()["items"][0]
+        seeded.update("listings", str(listing["id"]), {"bedrooms": 9})
+        third = client.get("/api/listings?region=London&limit=3")
+        assert third.headers["x-cache"] == "MISS" and third.json()["items"][0]["bedrooms"] == 9
+    
+    def test_record_tags(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that a cached listing is only invalidated by writes to that listing.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        client.get("/api/listings/187")
+        seeded.update("listings", "185", {"bedrooms": 9})
+        assert client.get("/api/listings/187").headers["x-cache"] == "HIT"
+        
+        seeded.update("listings", "187", {"bedrooms": 9})
+        response = client.get("/api/listings/187")
+        assert response.headers["x-cache"] == "MISS" and response.json()["bedrooms"] == 9
+        
+        tag = response.headers["etag"]
+        cached = client.get("/api/listings/187", headers={"If-None-Match": tag})
+        assert cached.status_code == 304 and cached.headers["etag"] == tag
+    
+    def test_not_cached(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that errors and routes without a rule, or a rule without TTL, are not cached.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        for _ in range(2):
+            assert client.get("/api/listings/missing").headers["x-cache"] == "MISS"
+            assert "x-cache" not in client.get("/api/listings/changes").headers
+            assert "x-cache" not in client.get("/api/ping").headers
+
+
+class TestStaleWhileRevalidate:
+    """Test cases for serving expired responses while they are recomputed."""
+    
+    @pytest.mark.asyncio
+    async def test_revalidated_in_background(self):
+        """Test that an expired response is served once more while a fresh one is computed."""
+        calls = []
+        
+        async def endpoint(request):
+            calls.append(request.headers.get("if-none-match"))
+            return JSONResponse({"call": len(calls)})
+        
+        database = AsyncInMemoryDatabase(InMemoryDatabase())
+        middleware = ResponseCacheMiddleware(
+            Starlette(routes=[Route("/counter", endpoint)]),
+            database=database,
+            rules=[CacheRule("/counter", ttl=0.05, stale=60, tags=["users"])],
+            budget=1 << 20
+        )
+        transport = httpx.ASGITransport(app=middleware)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.get("/counter")).json() == {"call": 1}
+            await asyncio.sleep(0.06)
+            
+            stale = await client.get("/counter", headers={"If-None-Match": '"x"'})
+            assert stale.headers["x-cache"] == "STALE" and stale.json() == {"call": 1}
+            await asyncio.gather(*middleware._revalidating.values())
+            fresh = await client.get("/counter")
+            assert fresh.headers["x-cache"] == "HIT" and fresh.json() == {"call": 2}
+            assert calls == [None, None]
+            
+            await asyncio.sleep(0.06)
+            database.database.create("users", {"username": "someone"})
+            written = await client.get("/counter")
+            assert written.headers["x-cache"] == "MISS" and written.json() == {"call": 3}
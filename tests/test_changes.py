@@ -0,0 +1,145 @@
+"""
+Tests for the Change Feed
+
+This module contains tests for the database change feed: polling the
+changes since a sequence number, resyncing when they are no longer kept,
+asyncio subscribers and the listing changes endpoint.
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from app.services.changes import ChangeFeed
+from app.services.database import InMemoryDatabase
+
+
+class TestChangesSince:
+    """Test cases for polling the change feed."""
+    
+    def test_deltas_since_seq(self):
+        """Test that only the changes after the given sequence number are returned, in order."""
+        database = InMemoryDatabase()
+        first = database.create("listings", {"region": "Wales"})
+        seq = database.snapshot().version
+        
+        second = database.create("listings", {"region": "Wales"})
+        database.update("listings", first["id"], {"bedrooms": 3})
+        database.delete("listings", second["id"])
+        database.create("users", {"username": "someone"})
+        
+        changes, latest = database.changes_since(seq, "listings")
+        assert latest == database.snapshot().version
+        assert [(change["type"], change["id"]) for change in changes] == [
+            ("put", second["id"]), ("put", first["id"]), ("delete", second["id"])
+        ]
+        assert [change["seq"] for change in changes] == sorted(change["seq"] for change in changes)
+        assert changes[1]["record"]["bedrooms"] == 3
+        with pytest.raises(TypeError):
+            changes[1]["record"]["bedrooms"] = 4
+        assert database.changes_since(latest) == ([], latest)
+        assert len(database.changes_since(seq)[0]) == 4
+    
+    def test_bulk_write_is_one_seq(self):
+        """Test that every record of a bulk write is a change under the same sequence number."""
+        database = InMemoryDatabase()
+        seq = database.snapshot().version
+        
+        database.create_many("listings", [{"bedrooms": n} for n in range(3)])
+        
+        changes, latest = database.changes_since(seq)
+        assert len(changes) == 3 and {change["seq"] for change in changes} == {latest}
+    
+    def test_resync(self, monkeypatch):
+        """
+        Test that callers too far behind, ahead of the feed or past a replacement must resync.
+        
+        Args:
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        monkeypatch.setattr(ChangeFeed, "RETENTION", 3)
+        database = InMemoryDatabase()
+        seq = database.snapshot().version
+        for n in range(2):
+            database.create("listings", {"bedrooms": n})
+        assert len(database.changes_since(seq)[0]) == 2
+        
+        for n in range(2):
+            database.create("listings", {"bedrooms": n})
+        latest = database.snapshot().version
+        assert database.changes_since(seq) == (None, latest)
+        assert database.changes_since(latest + 1) == (None, latest)
+        assert len(database.changes_since(latest - 3)[0]) == 3
+        
+        database.seed_listings()
+        changes, _ = database.changes_since(latest)
+        assert [(change["collection"], change["type"]) for change in changes] == [("listings", "reset")]
+
+
+class TestSubscriptions:
+    """Test cases for asyncio subscribers to the change feed."""
+    
+    @pytest.mark.asyncio
+    async def test_subscriber_gets_changes(self):
+        """Test that a subscriber gets the changes written from another thread, after the backlog."""
+        database = InMemoryDatabase()
+        seq = database.snapshot().version
+        created = database.create("listings", {"bedrooms": 1})
+        
+        subscription = database.subscribe(since=seq, collection="listings")
+        await asyncio.to_thread(database.create, "users", {"username": "someone"})
+        await asyncio.to_thread(database.delete, "listings", created["id"])
+        
+        first = await asyncio.wait_for(subscription.get(), 1)
+        second = await asyncio.wait_for(subscription.get(), 1)
+        assert (first["type"], second["type"]) == ("put", "delete")
+        assert subscription.seq == database.snapshot().version
+        subscription.close()
+        database.create("listings", {"bedrooms": 2})
+        assert [change async for change in subscription] == []
+    
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_dropped(self):
+        """Test that a subscriber whose queue fills up is dropped and told to resync."""
+        database = InMemoryDatabase()
+        slow = database.subscribe(maxsize=2)
+        fast = database.subscribe(maxsize=2)
+        
+        for n in range(3):
+            database.create("listings", {"bedrooms": n})
+            await asyncio.sleep(0)
+            await fast.get()
+        
+        assert slow.dropped and not fast.dropped
+        assert [change["type"] async for change in slow] == ["resync"]
+        assert database.subscribe(since=-1).dropped
+        fast.close()
+
+
+class TestListingChangesEndpoint:
+    """Test cases for the listing changes endpoint."""
+    
+    def test_poll_changes(self, client: TestClient, database: InMemoryDatabase):
+        """
+        Test that polling returns the listing changes and a sequence number to continue from.
+        
+        Args:
+            client: FastAPI test client
+            database: Clean database
+        """
+        database.seed_listings()
+        seq = client.get("/api/listings/changes").json()["seq"]
+        database.update("listings", "187", {"bedrooms": 5})
+        database.delete("listings", "185")
+        
+        response = client.get("/api/listings/changes", params={"since": seq})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert [(change["type"], change["id"]) for change in data["changes"]] == [("put", "187"), ("delete", "185")]
+        assert data["changes"][0]["listing"]["bedrooms"] == 5 and data["changes"][1]["listing"] is None
+        assert client.get("/api/listings/changes", params={"since": data["seq"]}).json()["changes"] == []
+        
+        database.seed_listings()
+        assert client.get("/api/listings/changes", params={"since": data["seq"]}).status_code == 410
+        assert client.get("/api/listings/changes", params={"since": data["seq"] + 10}).status_code == 410
@@ -0,0 +1,204 @@
+"""
+Tests for Response Compression
+
+This module contains tests for the negotiation of response encodings, the
+compression middleware, and the compressed responses kept by the response
+cache.
+"""
+
+import gzip
+
+import brotli
+import httpx
+import pytest
+import zstandard
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app.api.compression import CompressionMiddleware, ResponseCompression
+from app.main import app
+from app.services.database import InMemoryDatabase
+
+
+DECOMPRESS = {
+    "br": brotli.decompress,
+    "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+    "gzip": gzip.decompress,
+}
+
+
+def raw_get(app, path: str, encoding: str) -> httpx.Response:
+    """GET ``path`` from ``app`` accepting ``encoding``, without decoding the body."""
+    client = TestClient(app)
+    with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        response.raw_body = b"".join(response.iter_raw())
+    return response
+
+
+@pytest.fixture
+def seeded(database: InMemoryDatabase) -> InMemoryDatabase:
+    """
+    Get a clean database holding the seed listings.
+    
+    Returns:
+        InMemoryDatabase: Database instance
+    """
+    database.seed_listings()
+    return database
+
+
+class TestNegotiation:
+    """Test cases for the negotiation of response encodings."""
+    
+    @pytest.mark.parametrize("header, encoding", [
+        ("gzip, deflate, br, zstd", "br"),
+        ("gzip;q=0.5, zstd", "zstd"),
+        ("br;q=0, *", "zstd"),
+        ("GZIP", "gzip"),
+        ("identity", None),
+        ("*;q=0", None),
+        ("", None),
+    ])
+    def test_negotiate(self, header: str, encoding: str):
+        """
+        Test that the best offered encoding the client accepts is picked.
+        
+        Args:
+            header: ``Accept-Encoding`` of the request
+            encoding: Encoding expected
+        """
+        compression = ResponseCompression()
+        
+        assert compression.negotiate(Headers({"accept-encoding": header})) == encoding
+    
+    def test_offered_encodings(self):
+        """Test that only the configured encodings are offered."""
+        compression = ResponseCompression(["gzip", "deflate"])
+        
+        assert compression.encodings == ["gzip"]
+        assert compression.negotiate(Headers({"accept-encoding": "br, zstd"})) is None
+
+
+class TestCompressionMiddleware:
+    """Test cases for the compression middleware."""
+    
+    @pytest.fixture
+    def compressing_app(self) -> CompressionMiddleware:
+        """Build an app compressing a large and a small JSON body, a stream and an image."""
+        async def large(request):
+            return JSONResponse({"urls": [f"https://cdn.example.com/photo/{i}" for i in range(200)]})
+        
+        async def small(request):
+            return JSONResponse({"ok": True})
+        
+        async def stream(request):
+            return StreamingResponse((b'{"line": %d}\n' % i for i in range(100)), media_type="application/x-ndjson")
+        
+        async def image(request):
+            return Response(b"\x89PNG" * 1000, media_type="image/png")
+        
+        routes = [Route(f"/{endpoint.__name__}", endpoint) for endpoint in (large, small, stream, image)]
+        return CompressionMiddleware(Starlette(routes=routes), ResponseCompression(min_size=500))
+    
+    @pytest.mark.parametrize("encoding", ["br", "zstd", "gzip"])
+    def test_compressed(self, compressing_app: CompressionMiddleware, encoding: str):
+        """
+        Test that bodies are compressed with the negotiated encoding, streamed ones included.
+        
+        Args:
+            compressing_app: App behind the middleware
+            encoding: Encoding the client accepts
+        """
+        for path in ("/large", "/stream"):
+            plain = TestClient(compressing_app).get(path, headers={"Accept-Encoding": "identity"})
+            response = raw_get(compressing_app, path, encoding)
+            
+            assert response.headers["content-encoding"] == encoding
+            assert response.headers["vary"] == "accept-encoding"
+            assert DECOMPRESS[encoding](response.raw_body) == plain.content
+            assert len(response.raw_body) < len(plain.content)
+            if path == "/large":
+                assert int(response.headers["content-length"]) == len(response.raw_body)
+            else:
+                assert "content-length" not in response.headers
+    
+    def test_not_compressed(self, compressing_app: CompressionMiddleware):
+        """
+        Test that small bodies, other content types and clients accepting no encoding get bodies as they are.
+        
+        Args:
+            compressing_app: App behind the middleware
+        """
+        for path, encoding in (("/small", "br"), ("/image", "br"), ("/large", "identity")):
+            response = raw_get(compressing_app, path, encoding)
+            
+            assert "content-encoding" not in response.headers
+            assert int(response.headers["content-length"]) == len(response.raw_body)
+
+
+class TestCachedCompression:
+    """Test cases for responses kept compressed by the response cache."""
+    
+    def test_compressed_once_per_version(self, seeded: InMemoryDatabase, monkeypatch):
+        """
+        Test that a cached listing page is compressed once per encoding until a listing is written.
+        
+        Args:
+            seeded: Database holding the seed listings
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        calls = []
+        compress = ResponseCompression.compress
+        monkeypatch.setattr(ResponseCompression, "compress", lambda self, data, encoding: (
+            calls.append(encoding) or compress(self, data, encoding)
+        ))
+        plain = TestClient(app).get("/api/listings?limit=50", headers={"Accept-Encoding": "identity"})
+        
+        responses = [raw_get(app, "/api/listings?limit=50", encoding) for encoding in ("br", "br", "gzip", "br")]
+        assert [response.headers["x-cache"] for response in responses] == ["HIT"] * 4
+        assert calls == ["br", "gzip"]
+        for response in responses:
+            encoding = response.headers["content-encoding"]
+            assert DECOMPRESS[encoding](response.raw_body) == plain.content
+            assert int(response.headers["content-length"]) == len(response.raw_body)
+        
+        seeded.update("listings", "187", {"bedrooms": 9})
+        response = raw_get(app, "/api/listings?limit=50", "br")
+        assert response.headers["x-cache"] == "MISS" and calls == ["br", "gzip", "br"]
+        assert b'"bedrooms":9' in DECOMPRESS["br"](response.raw_body)
+    
+    def test_tagged_per_encoding(self, seeded: InMemoryDatabase):
+        """
+        Test that each encoding of a listing page has its own strong tag, and any of them validates the page.
+        
+        Args:
+            seeded: Database holding the seed listings
+        """
+        responses = {
+            encoding: raw_get(app, "/api/listings?limit=50", encoding) for encoding in ("identity", "br", "gzip")
+        }
+        tag = responses["identity"].headers["etag"]
+        assert responses["br"].headers["etag"] == tag[:-1] + '-br"'
+        assert responses["gzip"].headers["etag"] == tag[:-1] + '-gzip"'
+        
+        client = TestClient(app)
+        for response in responses.values():
+            cached = client.get("/api/listings?limit=50", headers={
+                "Accept-Encoding": "zstd", "If-None-Match": response.headers["etag"]
+            })
+            assert cached.status_code == 304 and cached.headers["etag"] == tag[:-1] + '-zstd"'
+        
+        seeded.update("listings", "187", {"bedrooms": 9})
+        response = client.get("/api/listings?limit=50", headers={"If-None-Match": responses["br"].headers["etag"]})
+        assert response.status_code == 200
+    
+    def test_openapi_schema(self):
+        """Test that the OpenAPI schema is cached compressed."""
+        raw_get(app, "/openapi.json", "zstd")
+        response = raw_get(app, "/openapi.json", "zstd")
+        
+        assert response.headers["x-cache"] == "HIT" and response.headers["content-encoding"] == "zstd"
+        assert DECOMPRESS["zstd"](response.raw_body) == TestClient(app).get("/openapi.json").content
@@ -0,0 +1,822 @@
+"""
+Tests for the In-Memory Database Service
+
+This module contains tests for CRUD operations and index maintenance
+in the in-memory database service.
+"""
+
+import pytest
+from fastapi import HTTPException
+from app.api.dependencies import get_pagination_params, next_page_cursor
+from app.services.database import AGGREGATES, InMemoryDatabase
+
+
+class TestPrimaryKeyIndex:
+    """Test cases for the primary-key index."""
+    
+    def test_get_by_id_after_create(self, database: InMemoryDatabase, sample_user_data: dict):
+        """
+        Test that created records can be fetched by ID.
+        
+        Args:
+            database: Clean database instance
+            sample_user_data: Sample user data
+        """
+        created = database.create("users", sample_user_data)
+        
+        fetched = database.get_by_id("users", created["id"])
+        assert fetched == created
+        assert database.get_by_id("users", "missing") is None
+    
+    def test_delete_keeps_other_records_reachable(self, database: InMemoryDatabase):
+        """
+        Test that deleting a record does not break lookups of the others.
+        
+        Args:
+            database: Clean database instance
+        """
+        ids = [database.create("users", {"username": f"user_{i}"})["id"] for i in range(5)]
+        
+        assert database.delete("users", ids[1]) is True
+        assert database.delete("users", ids[1]) is False
+        assert database.get_by_id("users", ids[1]) is None
+        
+        for record_id in ids[:1] + ids[2:]:
+            assert database.get_by_id("users", record_id)["id"] == record_id
+        
+        # Deleting the last slot must also work
+        assert database.delete("users", ids[-1]) is True
+        assert len(database.get_all("users")) == 3
+    
+    def test_update_uses_index(self, database: InMemoryDatabase, sample_user_data: dict):
+        """
+        Test that updates are applied to the right record.
+        
+        Args:
+            database: Clean database instance
+            sample_user_data: Sample user data
+        """
+        first = database.create("users", sample_user_data)
+        second = database.create("users", {"username": "other"})
+        
+        updated = database.update("users", second["id"], {"is_active": False})
+        
+        assert updated["is_active"] is False
+        assert database.get_by_id("users", first["id"])["is_active"] is True
+        assert database.update("users", "missing", {"is_active": False}) is None
+    
+    def test_index_rebuilt_on_bulk_loads(self, database: InMemoryDatabase):
+        """
+        Test that seed, import and reset keep the index consistent.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        assert database.get_by_id("listings", "187")["listing_id"] == 187
+        
+        database.import_data({"users": [{"id": "u1", "username": "imported"}]})
+        assert database.get_by_id("users", "u1")["username"] == "imported"
+        
+        database.reset()
+        assert database.get_by_id("users", "u1") is None
+    
+    def test_unknown_collection_raises(self, database: InMemoryDatabase):
+        """
+        Test that point operations on unknown collections raise KeyError.
+        
+        Args:
+            database: Clean database instance
+        """
+        with pytest.raises(KeyError):
+            database.get_by_id("unknown", "id")
+        with pytest.raises(KeyError):
+            database.delete("unknown", "id")
+
+
+class TestSecondaryIndexes:
+    """Test cases for secondary hash indexes used by find."""
+    
+    @staticmethod
+    def scan(database: InMemoryDatabase, collection: str, filters: dict) -> list:
+        """Reference implementation of find as a full scan."""
+        return [
+            record for record in database.get_all(collection)
+            if all(record.get(key) == value for key, value in filters.items())
+        ]
+    
+    def test_find_matches_scan_on_seed_data(self, database: InMemoryDatabase):
+        """
+        Test that indexed find returns the same records as a full scan.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        
+        for filters in [
+            {"region": "London"},
+            {"region": "London", "bedrooms": 1},
+            {"property_type": "apartment", "is_tenanted": True},
+            {"post_town": "Nowhere"},
+        ]:
+            expected = sorted(r["id"] for r in self.scan(database, "listings", filters))
+            assert sorted(r["id"] for r in database.find("listings", filters)) == expected
+    
+    def test_indexes_follow_writes(self, database: InMemoryDatabase):
+        """
+        Test that create, update and delete keep the indexes consistent.
+        
+        Args:
+            database: Clean database instance
+        """
+        created = database.create("listings", {"region": "Wales", "bedrooms": 2})
+        assert [r["id"] for r in database.find("listings", {"region": "Wales"})] == [created["id"]]
+        
+        database.update("listings", created["id"], {"region": "Scotland"})
+        assert database.find("listings", {"region": "Wales"}) == []
+        assert database.find("listings", {"region": "Scotland", "bedrooms": 2})[0]["id"] == created["id"]
+        
+        database.delete("listings", created["id"])
+        assert database.find("listings", {"region": "Scotland"}) == []
+    
+    def test_indexes_follow_import(self, database: InMemoryDatabase):
+        """
+        Test that imported data is indexed.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.import_data({"listings": [
+            {"id": "a", "region": "London"},
+            {"id": "b", "region": "Wales"},
+        ]})
+        
+        assert [r["id"] for r in database.find("listings", {"region": "Wales"})] == ["b"]
+    
+    def test_create_index(self, database: InMemoryDatabase, sample_user_data: dict):
+        """
+        Test declaring an index on an existing collection.
+        
+        Args:
+            database: Clean database instance
+            sample_user_data: Sample user data
+        """
+        created = database.create("users", sample_user_data)
+        database.create("users", {"username": "other"})
+        
+        database.create_index("users", "username")
+        database.create_index("users", "username")
+        
+        assert database.find("users", {"username": "test_user"}) == [created]
+        with pytest.raises(KeyError):
+            database.create_index("unknown", "field")
+    
+    def test_unhashable_values(self, database: InMemoryDatabase):
+        """
+        Test that unhashable field and filter values still match correctly.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.create_index("users", "tags")
+        tagged = database.create("users", {"tags": ["a", "b"]})
+        database.create("users", {"tags": "a"})
+        
+        assert database.find("users", {"tags": ["a", "b"]}) == [tagged]
+        assert len(database.find("users", {"tags": "a"})) == 1
+
+
+class TestRangeIndexes:
+    """Test cases for sorted range indexes used by find_range."""
+    
+    def test_find_range_matches_scan(self, database: InMemoryDatabase):
+        """
+        Test that range queries return the same records as a full scan.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        listings = database.get_all("listings")
+        
+        results = database.find_range(
+            "listings",
+            {"price_in_cents": (10_000_000, 30_000_000), "gross_yield": (0.05, None)}
+        )
+        
+        expected = {
+            r["id"] for r in listings
+            if 10_000_000 <= r["price_in_cents"] <= 30_000_000 and r["gross_yield"] >= 0.05
+        }
+        assert expected
+        assert {r["id"] for r in results} == expected
+    
+    def test_find_range_in_index_order(self, database: InMemoryDatabase):
+        """
+        Test that results can be returned ordered by a range index.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        
+        ascending = database.find_range("listings", {}, order_by="price_in_cents")
+        prices = [r["price_in_cents"] for r in ascending]
+        assert prices == sorted(prices)
+        assert len(ascending) == len(database.get_all("listings"))
+        
+        top = database.find_range(
+            "listings", {}, filters={"region": "London"},
+            order_by="gross_yield", descending=True, limit=2
+        )
+        london_yields = sorted(
+            (r["gross_yield"] for r in database.find("listings", {"region": "London"})),
+            reverse=True
+        )
+        assert [r["gross_yield"] for r in top] == london_yields[:2]
+    
+    def test_range_indexes_follow_writes(self, database: InMemoryDatabase):
+        """
+        Test that create, update and delete keep range indexes consistent.
+        
+        Args:
+            database: Clean database instance
+        """
+        cheap = database.create("listings", {"price_in_cents": 100})
+        dear = database.create("listings", {"price_in_cents": 900})
+        database.create("listings", {"price_in_cents": None})
+        
+        assert [r["id"] for r in database.find_range("listings", {"price_in_cents": (None, 500)})] == [cheap["id"]]
+        
+        database.update("listings", dear["id"], {"price_in_cents": 200})
+        database.delete("listings", cheap["id"])
+        
+        results = database.find_range("listings", {"price_in_cents": (None, 500)})
+        assert [r["id"] for r in results] == [dear["id"]]
+    
+    def test_order_by_requires_range_index(self, database: InMemoryDatabase):
+        """
+        Test that ordering by a non-indexed field is rejected.
+        
+        Args:
+            database: Clean database instance
+        """
+        with pytest.raises(ValueError):
+            database.find_range("listings", {}, order_by="description")
+        
+        database.create_range_index("listings", "bathrooms")
+        database.find_range("listings", {}, order_by="bathrooms")
+    
+    def test_query_plans_agree(self, database: InMemoryDatabase):
+        """
+        Test that walking an index and intersecting candidates give the same results.
+        
+        Args:
+            database: Clean database instance
+        """
+        regions = ["London", "Midlands", "Scotland"]
+        database.import_data({"listings": [
+            {
+                "id": str(n),
+                "region": regions[n % 3],
+                "bedrooms": n % 4,
+                "price_in_cents": (n * 7919) % 1000,
+                "gross_yield": (n * 104729) % 97 / 1000,
+            }
+            for n in range(2000)
+        ]})
+        records = database.get_all("listings")
+        
+        queries = [
+            ({"region": "London"}, {"price_in_cents": (100, 400)}),
+            ({"region": "London", "bedrooms": 2}, {"bedrooms": (2, 2), "gross_yield": (0.01, 0.02)}),
+            ({}, {"gross_yield": (0.05, 0.05)}),
+        ]
+        for filters, ranges in queries:
+            expected = sorted(
+                (
+                    r for r in records
+                    if all(r[field] == value for field, value in filters.items())
+                    and all(low <= r[field] <= high for field, (low, high) in ranges.items())
+                ),
+                key=lambda r: (r["price_in_cents"], r["id"])
+            )
+            for limit in (1, 20, None):
+                results = database.find_range(
+                    "listings", ranges, filters=filters, order_by="price_in_cents", limit=limit
+                )
+                assert [r["id"] for r in results] == [r["id"] for r in expected[:limit]]
+    
+    def test_distinct_values_and_counts(self, database: InMemoryDatabase):
+        """
+        Test distinct value iteration and range counts on a range index.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        snapshot = database.snapshot()
+        bedrooms = [r["bedrooms"] for r in database.get_all("listings")]
+        
+        assert list(snapshot.distinct("listings", "bedrooms")) == sorted(set(bedrooms))
+        assert list(snapshot.distinct("listings", "bedrooms", 2, None, descending=True)) == sorted(
+            {b for b in bedrooms if b >= 2}, reverse=True
+        )
+        assert snapshot.count_range("listings", "bedrooms", 2, 3) == sum(2 <= b <= 3 for b in bedrooms)
+        
+        with pytest.raises(ValueError):
+            snapshot.count_range("listings", "description")
+
+
+class TestSnapshots:
+    """Test cases for lock-free snapshot reads."""
+    
+    def test_snapshot_is_point_in_time(self, database: InMemoryDatabase):
+        """
+        Test that a snapshot is unaffected by later writes.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        first = database.get_all("listings")[0]
+        snapshot = database.snapshot()
+        
+        database.update("listings", first["id"], {"region": "Wales", "price_in_cents": 1})
+        database.delete("listings", database.get_all("listings")[1]["id"])
+        database.create("listings", {"region": "London"})
+        
+        assert snapshot.get_by_id("listings", first["id"]) == first
+        assert len(snapshot.get_all("listings")) == len(snapshot.export_data()["listings"])
+        assert snapshot.find("listings", {"id": first["id"], "region": "Wales"}) == []
+        assert snapshot.find_range("listings", {"price_in_cents": (None, 1)}) == []
+        assert database.find_range("listings", {"price_in_cents": (None, 1)})[0]["id"] == first["id"]
+        assert database.snapshot().version > snapshot.version
+    
+    def test_reads_during_writes(self, database: InMemoryDatabase):
+        """
+        Test that concurrent readers always see internally consistent snapshots.
+        
+        Args:
+            database: Clean database instance
+        """
+        import threading
+        
+        errors = []
+        done = threading.Event()
+        
+        def writer():
+            for i in range(300):
+                record = database.create("listings", {"region": "London", "bedrooms": i % 3})
+                if i % 2:
+                    database.delete("listings", record["id"])
+            done.set()
+        
+        def reader():
+            try:
+                while not done.is_set():
+                    snapshot = database.snapshot()
+                    records = snapshot.get_all("listings")
+                    found = snapshot.find("listings", {"region": "London"})
+                    assert len(found) == len(records)
+                    for record in records[-5:]:
+                        assert snapshot.get_by_id("listings", record["id"]) == record
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+        
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert errors == []
+        assert len(database.get_all("listings")) == 150
+
+
+class TestReadViews:
+    """Test cases for zero-copy read views."""
+    
+    def test_views_are_read_only(self, database: InMemoryDatabase):
+        """
+        Test that views match the copies but cannot be modified.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        first = database.get_all("listings")[0]
+        
+        view = database.get_by_id("listings", first["id"], view=True)
+        assert view == first
+        with pytest.raises(TypeError):
+            view["region"] = "Wales"
+        
+        records = database.get_all("listings", view=True)
+        assert len(records) == len(database.get_all("listings"))
+        assert records[0] == first
+        assert list(records) == database.get_all("listings")
+        assert database.find("listings", {"region": first["region"]}, view=True) == database.find(
+            "listings", {"region": first["region"]}
+        )
+        assert database.find_range("listings", {"price_in_cents": (None, None)}, view=True)
+        with pytest.raises(TypeError):
+            database.get_all("data", view=True)["key"] = "value"
+    
+    def test_views_are_unaffected_by_updates(self, database: InMemoryDatabase):
+        """
+        Test that a view keeps showing the record as it was when read.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        first = database.get_all("listings")[0]
+        view = database.get_by_id("listings", first["id"], view=True)
+        
+        database.update("listings", first["id"], {"region": "Wales"})
+        
+        assert view["region"] == first["region"]
+        assert database.get_by_id("listings", first["id"], view=True)["region"] == "Wales"
+
+
+class TestColumnarStore:
+    """Test cases for the columnar store used by find, find_range and aggregate."""
+    
+    @staticmethod
+    def build(columns=None) -> InMemoryDatabase:
+        """Build a database with mixed-type listings, optionally without columns."""
+        db = InMemoryDatabase(columns=columns)
+        db.import_data({
+            "listings": [
+                {
+                    "id": str(i),
+                    "price_in_cents": None if i % 11 == 0 else i * 1000,
+                    "gross_yield": i % 7 / 100,
+                    "bedrooms": i % 4,
+                    "is_tenanted": i % 3 == 0,
+                    "region": ["London", "Wales", None][i % 3],
+                    "post_town": "Leeds" if i % 50 else ["not", "hashable"],
+                }
+                for i in range(300)
+            ]
+        })
+        return db
+    
+    @staticmethod
+    def ids(records: list) -> list:
+        """Get the sorted IDs of records, with generated IDs replaced by a placeholder."""
+        return sorted(r["id"] if r["id"].isdigit() else "created" for r in records)
+    
+    def assert_same_results(self, columnar: InMemoryDatabase, rows: InMemoryDatabase):
+        """Check that a database answers queries like one without columns."""
+        for filters in [{"region": "London"}, {"is_tenanted": True, "bedrooms": 2}, {"region": None}, {"bedrooms": "2"}]:
+            assert self.ids(columnar.find("listings", filters)) == self.ids(rows.find("listings", filters))
+        for ranges, filters in [
+            ({"gross_yield": (0.02, 0.05)}, {"region": "Wales"}),
+            ({"price_in_cents": (None, 150_000)}, {}),
+            ({"region": ("A", "M")}, {"is_tenanted": False}),
+        ]:
+            assert self.ids(columnar.find_range("listings", ranges, filters)) == self.ids(
+                rows.find_range("listings", ranges, filters)
+            )
+            for func in ("count", "sum", "min", "max", "mean"):
+                expected = rows.aggregate("listings", "price_in_cents", func, filters, ranges)
+                assert columnar.aggregate("listings", "price_in_cents", func, filters, ranges) == pytest.approx(expected)
+    
+    def test_matches_row_store(self):
+        """Test that columnar queries return the same results as the row store."""
+        columnar, rows = self.build(), self.build(columns={})
+        self.assert_same_results(columnar, rows)
+    
+    def test_follows_writes(self):
+        """Test that columnar queries see creates, updates and deletes."""
+        columnar, rows = self.build(), self.build(columns={})
+        self.assert_same_results(columnar, rows)
+        
+        for db in (columnar, rows):
+            db.update("listings", "3", {"region": "Wales", "price_in_cents": 5})
+            db.update("listings", "4", {"bedrooms": "many", "region": ["x"]})
+            db.delete("listings", "5")
+            db.create("listings", {"region": "London", "price_in_cents": 2.5, "is_tenanted": True})
+        self.assert_same_results(columnar, rows)
+        assert columnar.aggregate("listings", "price_in_cents", "min", {"region": "London"}) == 2.5
+    
+    def test_aggregate(self, database: InMemoryDatabase):
+        """
+        Test aggregates over the seed listings.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        listings = database.get_all("listings")
+        london = [r["price_in_cents"] for r in listings if r["region"] == "London"]
+        
+        assert database.aggregate("listings", "price_in_cents") == len(listings)
+        assert database.aggregate("listings", "price_in_cents", "sum", {"region": "London"}) == sum(london)
+        assert database.aggregate("listings", "price_in_cents", "max", {"region": "London"}) == max(london)
+        assert database.aggregate("listings", "price_in_cents", "mean", {"region": "Nowhere"}) is None
+        assert database.aggregate("listings", "region", "min") == min(r["region"] for r in listings)
+        with pytest.raises(ValueError):
+            database.aggregate("listings", "price_in_cents", "median")
+    
+    @pytest.mark.parametrize("columns", [None, {}])
+    @pytest.mark.parametrize("func", AGGREGATES)
+    def test_aggregate_groups(self, columns, func: str):
+        """
+        Test grouped aggregates with and without the columnar table.
+        
+        Args:
+            columns: Column fields, None for the defaults
+            func: Aggregate function
+        """
+        database = InMemoryDatabase(columns=columns)
+        database.seed_listings()
+        database.create("listings", {"price_in_cents": 5})
+        expected = {
+            region: database.aggregate("listings", "price_in_cents", func, {"region": region})
+            for region in {record.get("region") for record in database.get_all("listings")}
+        }
+        
+        assert database.aggregate("listings", "price_in_cents", func, group_by="region") == expected
+        assert database.aggregate("listings", "price_in_cents", func, {"region": "London"}, group_by="region") == {
+            "London": expected["London"]
+        }
+
+
+class TestKeysetPagination:
+    """Test cases for cursor pagination and cached counts."""
+    
+    def collect(self, database: InMemoryDatabase, **options) -> list:
+        """Follow page positions from the first page to the last and collect every record."""
+        records, after = [], None
+        while True:
+            page, after = database.get_page("listings", 5, after=after, **options)
+            assert len(page) <= 5
+            records.extend(page)
+            if after is None:
+                return records
+    
+    @pytest.mark.parametrize("order_by", ["price_in_cents", "bathrooms", "id"])
+    @pytest.mark.parametrize("descending", [False, True])
+    def test_pages_match_full_sort(self, database: InMemoryDatabase, order_by: str, descending: bool):
+        """
+        Test that pages seeked through an index or scanned follow the full sort.
+        
+        Args:
+            database: Clean database instance
+            order_by: Field to order by; only ``price_in_cents`` is range-indexed
+            descending: Whether to page from the highest value down
+        """
+        database.seed_listings()
+        expected = sorted(
+            database.find("listings", {"region": "London"}),
+            key=lambda r: (r[order_by], r["id"]),
+            reverse=descending
+        )
+        
+        records = self.collect(database, order_by=order_by, descending=descending, filters={"region": "London"})
+        
+        assert [r["id"] for r in records] == [r["id"] for r in expected]
+    
+    def test_pages_do_not_shift_on_insert(self, database: InMemoryDatabase):
+        """
+        Test that records inserted before the position do not shift later pages.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        first, after = database.get_page("listings", 5, order_by="price_in_cents")
+        expected, _ = database.get_page("listings", 5, order_by="price_in_cents", after=after)
+        
+        database.create("listings", {"price_in_cents": 1})
+        second, _ = database.get_page("listings", 5, order_by="price_in_cents", after=after)
+        
+        assert [r["id"] for r in second] == [r["id"] for r in expected]
+    
+    def test_incomparable_position(self, database: InMemoryDatabase):
+        """
+        Test that a position of the wrong type is rejected.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        for order_by in ("price_in_cents", "bathrooms"):
+            with pytest.raises(ValueError):
+                database.get_page("listings", 5, order_by=order_by, after=("cheap", "1"))
+    
+    def test_pagination_params(self, database: InMemoryDatabase):
+        """
+        Test that the pagination dependency follows cursors and rejects cursors of another order.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        expected = self.collect(database, order_by="price_in_cents", descending=True)
+        
+        records, cursors = [], [None]
+        while True:
+            params = get_pagination_params(limit=5, cursor=cursors[-1], sort="-price_in_cents")
+            page, position = database.get_page(
+                "listings", params["limit"], params["order_by"], params["descending"], params["after"]
+            )
+            records.extend(page)
+            cursor = next_page_cursor(params, position)
+            if cursor is None:
+                break
+            cursors.append(cursor)
+        
+        assert records == expected and len(cursors) > 2
+        assert get_pagination_params(skip=20)["after"] is None
+        for params in (
+            {"cursor": "not-a-cursor"},
+            {"skip": 5, "cursor": cursors[1], "sort": "-price_in_cents"},
+            {"cursor": cursors[1], "sort": "price_in_cents"},
+            {"cursor": cursors[1]},
+            {"sort": "price; drop"},
+        ):
+            with pytest.raises(HTTPException) as error:
+                get_pagination_params(**params)
+            assert error.value.status_code == 400
+    
+    def test_approximate_count(self, database: InMemoryDatabase, monkeypatch: pytest.MonkeyPatch):
+        """
+        Test that approximate counts are reused until they expire and exact ones are not.
+        
+        Args:
+            database: Clean database instance
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        database.seed_listings()
+        london = len(database.find("listings", {"region": "London"}))
+        assert database.count("listings", {"region": "London"}, approximate=True) == london
+        
+        database.create("listings", {"region": "London"})
+        assert database.count("listings", {"region": "London"}, approximate=True) == london
+        assert database.count("listings", {"region": "London"}) == london + 1
+        assert database.count("listings") == len(database.get_all("listings"))
+        
+        database.create("listings", {"region": "London", "price_in_cents": 1})
+        monkeypatch.setattr(InMemoryDatabase, "COUNT_CACHE_TTL", 0.0)
+        assert database.count("listings", {"region": "London"}, approximate=True) == london + 2
+        assert database.count("listings", {"region": "London"}, {"price_in_cents": (None, 1)}) == 1
+
+
+class TestBulkWrites:
+    """Test cases for batched creates, updates and deletes."""
+    
+    def test_batch_is_one_write(self, database: InMemoryDatabase):
+        """
+        Test that a batch publishes one snapshot with a single timestamp.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        version = database.snapshot().version
+        
+        results = database.bulk_write(
+            "listings",
+            create=[{"region": "Wales", "price_in_cents": n} for n in range(3)],
+            update=[("187", {"region": "Wales"}), ("missing", {"region": "Wales"})],
+            delete=["185", "missing"]
+        )
+        
+        assert database.snapshot().version == version + 1
+        assert [r["price_in_cents"] for r in results["created"]] == [0, 1, 2]
+        assert [r is not None for r in results["updated"]] == [True, False]
+        assert results["deleted"] == [True, False]
+        stamps = {r["created_at"] for r in results["created"]} | {results["updated"][0]["updated_at"]}
+        assert len(stamps) == 1
+    
+    def test_indexes_follow_batches(self, database: InMemoryDatabase):
+        """
+        Test that indexes and earlier snapshots stay consistent across batches.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        before = database.snapshot()
+        listings = database.get_all("listings")
+        
+        created = database.create_many("listings", [{"region": "Wales", "price_in_cents": n} for n in range(50)])
+        database.update_many("listings", [(r["id"], {"region": "Scotland"}) for r in created[:20]])
+        database.delete_many("listings", [r["id"] for r in created[20:30]] + [listings[0]["id"]])
+        
+        assert len(database.find("listings", {"region": "Wales"})) == 20
+        assert len(database.find("listings", {"region": "Scotland"})) == 20 + sum(
+            r["region"] == "Scotland" for r in listings[1:]
+        )
+        cheap = database.find_range("listings", {"price_in_cents": (0, 49)})
+        assert sorted(r["price_in_cents"] for r in cheap) == list(range(20)) + list(range(30, 50))
+        assert before.get_all("listings") == listings
+        assert before.find("listings", {"region": "Wales"}) == []
+    
+    def test_empty_batch(self, database: InMemoryDatabase):
+        """
+        Test that a batch without changes publishes nothing.
+        
+        Args:
+            database: Clean database instance
+        """
+        version = database.snapshot().version
+        
+        assert database.delete_many("listings", ["missing"]) == [False]
+        assert database.create_many("listings", []) == []
+        assert database.snapshot().version == version
+        with pytest.raises(KeyError):
+            database.create_many("nonexistent", [{}])
+    
+    def test_upsert(self, database: InMemoryDatabase):
+        """
+        Test that upserts replace records by ID, keeping their creation time.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        existing = database.get_by_id("listings", "187")
+        
+        results = database.bulk_write(
+            "listings",
+            upsert=[{"id": "187", "region": "Wales"}, {"id": "new", "region": "Wales"}]
+        )
+        
+        assert results["upserted"] == [True, False]
+        replaced = database.get_by_id("listings", "187")
+        assert replaced["created_at"] == existing["created_at"]
+        assert "updated_at" in replaced and "price_in_cents" not in replaced
+        assert "created_at" in database.get_by_id("listings", "new")
+        assert {r["id"] for r in database.find("listings", {"region": "Wales"})} >= {"187", "new"}
+        with pytest.raises(ValueError):
+            database.bulk_write("listings", upsert=[{"region": "Wales"}])
+    
+    def test_update_cannot_change_id(self, database: InMemoryDatabase):
+        """
+        Test that an update changing a record's ID is rejected before anything is written.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        version = database.snapshot().version
+        
+        with pytest.raises(ValueError, match="'id'"):
+            database.bulk_write("listings", update=[("185", {"bedrooms": 1}), ("187", {"id": "other"})])
+        
+        assert database.snapshot().version == version
+        assert database.get_by_id("listings", "other") is None
+        assert database.update("listings", "187", {"id": "187", "bedrooms": 1})["bedrooms"] == 1
+
+
+class TestVersions:
+    """Test cases for collection and record versions."""
+    
+    def test_writes_bump_versions(self, database: InMemoryDatabase):
+        """
+        Test that every write bumps the version of its collection and of the records it writes only.
+        
+        Args:
+            database: Clean database instance
+        """
+        database.seed_listings()
+        seeded = database.collection_version("listings")
+        assert database.record_version("listings", "187") == database.record_version("listings", "185") == seeded
+        users = database.collection_version("users")
+        
+        database.update("listings", "187", {"bedrooms": 9})
+        updated = database.collection_version("listings")
+        created = database.bulk_write("listings", create=[{"region": "Wales"}], delete=["185"])["created"][0]
+        
+        assert seeded < updated < database.collection_version("listings")
+        assert database.record_version("listings", "187") == updated
+        assert database.record_version("listings", created["id"]) == database.collection_version("listings")
+        assert database.record_version("listings", "185") is None
+        assert database.record_version("listings", "79") == seeded
+        assert database.collection_version("users") == users
+        
+        database.seed_listings()
+        assert database.record_version("listings", "187") == database.collection_version("listings") > updated
+    
+    def test_snapshots_keep_versions(self, database: InMemoryDatabase):
+        """
+        Test that a snapshot keeps the versions it was taken at.
+        
+        Args:
+            database: Clean database instance
+        """
+        created = database.create("users", {"username": "someone"})
+        before = database.snapshot()
+        
+        database.update("users", created["id"], {"username": "someone else"})
+        
+        assert before.record_version("users", created["id"]) == before.collection_version("users") == before.version
+        assert database.record_version("users", created["id"]) == database.snapshot().version
+        with pytest.raises(KeyError):
+            database.collection_version("nonexistent")
@@ -0,0 +1,61 @@
+"""
+Tests for the Export Endpoint
+
+This module contains tests for streaming collections as newline-delimited
+JSON.
+"""
+
+import json
+from fastapi.testclient import TestClient
+from app.services.database import InMemoryDatabase
+
+
+class TestExport:
+    """Test cases for the export endpoint."""
+    
+    def test_export_collections(self, client: TestClient, database: InMemoryDatabase, sample_user_data: dict):
+        """
+        Test that the export holds every record of the requested collections.
+        
+        Args:
+            client: FastAPI test client
+            database: Clean database instance
+            sample_user_data: Sample user data
+        """
+        database.seed_listings()
+        user = database.create("users", sample_user_data)
+        
+        response = client.get("/api/export", params={"api_key": "export-key", "collection": ["users", "listings"]})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert "content-length" not in response.headers
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0] == {"collection": "users", "record": user}
+        assert [line["record"] for line in lines[1:]] == database.get_all("listings")
+    
+    def test_export_everything(self, client: TestClient, database: InMemoryDatabase):
+        """
+        Test that all collections are exported by default, records or not.
+        
+        Args:
+            client: FastAPI test client
+            database: Clean database instance
+        """
+        response = client.get("/api/export", params={"api_key": "export-key"})
+        
+        assert response.status_code == 200
+        assert [json.loads(line) for line in response.text.splitlines()] == [{"collection": "data", "value": {}}]
+    
+    def test_export_errors(self, client: TestClient, database: InMemoryDatabase):
+        """
+        Test that unknown collections and missing API keys are rejected.
+        
+        Args:
+            client: FastAPI test client
+            database: Clean database instance
+        """
+        assert client.get("/api/export", params={"collection": "users"}).status_code == 401
+        response = client.get("/api/export", params={"api_key": "export-key", "collection": "missing"})
+        assert response.status_code == 404
+        assert response.json()["message"] == "Collection 'missing' not found"
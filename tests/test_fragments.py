@@ -0,0 +1,143 @@
+"""
+Tests for the Serialized Record Cache
+
+This module contains tests for the cache of encoded records: LRU eviction
+within the byte budget, invalidation by writes, and listing responses
+assembled from cached fragments.
+"""
+
+import json
+
+from fastapi.testclient import TestClient
+from app.services.database import InMemoryDatabase
+from app.services.fragments import FragmentCache
+from app.services.listings import encode_listings, search_encoded_listings, search_listings, to_listing
+
+
+class TestFragmentCache:
+    """Test cases for the cache itself."""
+    
+    def test_lru_within_budget(self):
+        """Test that the least recently used entries are evicted to stay within the byte budget."""
+        cache = FragmentCache(budget=10)
+        token = cache.token()
+        cache.put("a", None, b"1234", token)
+        cache.put("b", None, b"1234", token)
+        assert cache.get("a", None) == b"1234"
+        
+        cache.put("c", None, b"1234", token)
+        cache.put("d", None, b"x" * 11, token)
+        
+        assert cache.get("b", None) is None and cache.get("d", None) is None
+        assert cache.get("a", None) == cache.get("c", None) == b"1234"
+        assert cache.size == 8 and len(cache) == 2
+    
+    def test_stale_token(self):
+        """Test that entries built from records read before a write are not stored."""
+        cache = FragmentCache(budget=100)
+        token = cache.token()
+        cache.put("a", "all", b"old", token)
+        cache.put("a", "thumbnails", b"old", token)
+        
+        cache.discard(["a"])
+        cache.put("a", "all", b"old", token)
+        
+        assert cache.get("a", "all") is None and cache.get("a", "thumbnails") is None
+        assert cache.fetch("a", "all", cache.token(), lambda: b"new") == b"new"
+        assert cache.get("a", "all") == b"new" and cache.size == 3
+
+
+class TestRecordInvalidation:
+    """Test cases for the listings cache kept by the database."""
+    
+    def test_writes_drop_entries(self):
+        """Test that updates, deletes and replacements drop the cached encodings of what they wrote."""
+        database = InMemoryDatabase()
+        database.seed_listings()
+        cache = database.fragment_cache("listings")
+        search_encoded_listings(database, {}, {}, limit=100)
+        cached = len(cache)
+        assert cached == database.count("listings")
+        
+        database.update("listings", "187", {"bedrooms": 9})
+        database.delete("listings", "185")
+        assert len(cache) == cached - 2
+        
+        items, _ = search_encoded_listings(database, {}, {}, limit=100)
+        assert [json.loads(item) for item in items] == [
+            to_listing(record) for record in search_listings(database, {}, {}, limit=100)[0]
+        ]
+        assert any(json.loads(item)["bedrooms"] == 9 for item in items)
+        
+        database.seed_listings()
+        assert len(cache) == 0
+        assert InMemoryDatabase(fragment_caches={}).fragment_cache("listings") is None
+    
+    def test_new_version_never_served_old_bytes(self, monkeypatch):
+        """
+        Test that readers interleaved with a write never get old bytes with the new version.
+        
+        Readers run inside the write, once its entries are dropped but before
+        the snapshot is published, and once it is published but before the
+        cache is released.
+        
+        Args:
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        database = InMemoryDatabase()
+        database.seed_listings()
+        cache = database.fragment_cache("listings")
+        old_version = database.collection_version("listings")
+        old_bedrooms = database.get_by_id("listings", "187")["bedrooms"]
+        reads = []
+        
+        def read():
+            version = database.collection_version("listings")
+            token = cache.token()
+            record = database.get_by_id("listings", "187", view=True)
+            reads.append((version, json.loads(encode_listings([record], cache=cache, token=token)[0])["bedrooms"]))
+        
+        read()
+        discard, release = cache.discard, cache.release
+        monkeypatch.setattr(cache, "discard", lambda record_ids: (discard(record_ids), read()))
+        monkeypatch.setattr(cache, "release", lambda: (read(), release()))
+        database.update("listings", "187", {"bedrooms": old_bedrooms + 1})
+        monkeypatch.undo()
+        read()
+        
+        new_version = database.collection_version("listings")
+        assert reads == [
+            (old_version, old_bedrooms), (old_version, old_bedrooms),
+            (new_version, old_bedrooms + 1), (new_version, old_bedrooms + 1),
+        ]
+
+
+class TestCachedResponses:
+    """Test cases for listing responses assembled from cached fragments."""
+    
+    def test_responses_unchanged(self, client: TestClient, database: InMemoryDatabase):
+        """
+        Test that cached listings are served as before, and updated ones after a write.
+        
+        Args:
+            client: FastAPI test client
+            database: Clean database
+        """
+        database.seed_listings()
+        params = {"limit": 5, "photos": "thumbnails"}
+        first = client.get("/api/listings", params=params)
+        assert first.headers["content-type"] == "application/json"
+        assert client.get("/api/listings", params=params).content == first.content
+        listing = first.json()["items"][0]
+        assert client.get(f"/api/listings/{listing['id']}").json()["photos"][0]["originalURL"]
+        
+        stored_id = str(listing["id"])
+        response = client.post(
+            "/api/listings/bulk",
+            json={"update": [{"id": stored_id, "changes": {"bedrooms": 7}}]},
+            params={"api_key": "write-key"}
+        )
+        assert response.status_code == 200
+        
+        assert client.get("/api/listings", params=params).json()["items"][0]["bedrooms"] == 7
+        assert client.get(f"/api/listings/{stored_id}").json()["bedrooms"] == 7
@@ -0,0 +1,99 @@
+"""
+Tests for Listing Import
+
+This module contains tests for the streaming listing importer: parsing
+newline-delimited and JSON array feeds in arbitrary chunks, per-listing
+validation errors, and chunked commits.
+"""
+
+import json
+from app.data.seed_data import LISTING_SEED_DATA
+from app.services.database import InMemoryDatabase
+from app.services.importer import ListingImporter, import_listings
+
+
+def chunked(data: bytes, size: int) -> list:
+    """Split ``data`` into chunks of ``size`` bytes."""
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+class TestListingImporter:
+    """Test cases for parsing and validating listing feeds."""
+    
+    def test_ndjson_with_invalid_listings(self):
+        """Test that invalid lines are reported and the rest of the feed is kept."""
+        lines = [json.dumps(listing) for listing in LISTING_SEED_DATA[:3]]
+        lines.insert(1, "{not json")
+        lines.insert(3, json.dumps({"id": 1, "bedrooms": 2}))
+        importer = ListingImporter(chunk_size=10)
+        
+        batches = importer.feed("\n".join(lines).encode("utf-8")) + importer.close()
+        
+        assert [len(batch) for batch in batches] == [3]
+        assert batches[0][0]["id"] == str(LISTING_SEED_DATA[0]["id"])
+        assert batches[0][0]["post_town"] == LISTING_SEED_DATA[0]["addressDetails"]["city"]
+        report = importer.report
+        assert (report.read, report.failed) == (5, 2)
+        assert [(error["position"], error["id"]) for error in report.errors] == [(2, None), (4, 1)]
+        assert report.errors[0]["error"].startswith("Invalid JSON")
+    
+    def test_array_in_small_chunks(self):
+        """Test that a JSON array is parsed the same whatever its chunking."""
+        feed = json.dumps([*LISTING_SEED_DATA[:3], "listing", 3.5]).encode("utf-8")
+        for size in (1, 7, len(feed)):
+            importer = ListingImporter(chunk_size=2)
+            batches = []
+            for data in chunked(feed, size):
+                batches += importer.feed(data)
+            batches += importer.close()
+            
+            assert [len(batch) for batch in batches] == [2, 1]
+            assert (importer.report.read, importer.report.failed) == (5, 2)
+    
+    def test_malformed_array_ends_feed(self):
+        """Test that malformed JSON in an array ends the import there."""
+        feed = b"[" + json.dumps(LISTING_SEED_DATA[0]).encode("utf-8") + b", {oops}, {}]"
+        importer = ListingImporter()
+        
+        batches = importer.feed(feed) + importer.close()
+        
+        assert [len(batch) for batch in batches] == [1]
+        assert importer.report.errors == [{"position": 2, "id": None, "error": importer.report.errors[0]["error"]}]
+
+
+class TestImportListings:
+    """Test cases for importing listing feeds into a database."""
+    
+    def test_commits_in_chunks(self, database: InMemoryDatabase):
+        """
+        Test that listings are committed per chunk, reporting progress after each.
+        
+        Args:
+            database: Clean database instance
+        """
+        feed = "\n".join(json.dumps(listing) for listing in LISTING_SEED_DATA).encode("utf-8")
+        progress = []
+        
+        report = import_listings(
+            database, chunked(feed, 100), chunk_size=10, progress=lambda report: progress.append(report.imported)
+        )
+        
+        size = len(LISTING_SEED_DATA)
+        assert progress == [*range(10, size, 10), size]
+        assert (report.imported, report.failed) == (size, 0)
+        assert database.count("listings") == size
+    
+    def test_upserts_by_id(self):
+        """Test that importing a listing again replaces it, keeping its creation time."""
+        database = InMemoryDatabase()
+        database.seed_listings()
+        existing = database.get_by_id("listings", str(LISTING_SEED_DATA[0]["id"]))
+        listing = dict(LISTING_SEED_DATA[0], bedrooms=9)
+        
+        report = import_listings(database, [json.dumps(listing).encode("utf-8")])
+        
+        assert report.imported == 1
+        assert database.count("listings") == len(LISTING_SEED_DATA)
+        replaced = database.get_by_id("listings", existing["id"])
+        assert replaced["bedrooms"] == 9
+        assert replaced["created_at"] == existing["created_at"]
@@ -0,0 +1,426 @@
+"""
+Tests for Listings Endpoints
+
+This module contains tests for the listing search, lookup, bulk write and
+import endpoints.
+"""
+
+import json
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import get_settings
+from app.data.seed_data import LISTING_SEED_DATA
+from app.services.database import InMemoryDatabase
+from app.services.listings import search_listings
+
+
+@pytest.fixture
+def seeded(database: InMemoryDatabase) -> InMemoryDatabase:
+    """
+    Get a clean database holding the seed listings.
+    
+    Returns:
+        InMemoryDatabase: Database instance
+    """
+    database.seed_listings()
+    return database
+
+
+def fetch_all(client: TestClient, params: dict) -> list:
+    """Follow cursors from the first page to the last and collect every listing."""
+    items, cursor = [], None
+    while True:
+        response = client.get("/api/listings", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= params.get("limit", 20)
+        items.extend(data["items"])
+        cursor = data["nextCursor"]
+        if cursor is None:
+            return items
+
+
+class TestListingSearch:
+    """Test cases for the listing search endpoint."""
+    
+    def test_filters(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that filters and ranges select the same listings as a scan.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        params = {"region": "London", "min_price_in_cents": 10_000_000, "min_gross_yield": 0.05, "limit": 100}
+        response = client.get("/api/listings", params=params)
+        
+        assert response.status_code == 200
+        expected = {
+            r["listing_id"] for r in seeded.get_all("listings")
+            if r["region"] == "London" and r["price_in_cents"] >= 10_000_000 and r["gross_yield"] >= 0.05
+        }
+        assert expected
+        assert {item["id"] for item in response.json()["items"]} == expected
+        assert response.json()["approximateTotal"] == len(expected)
+    
+    def test_pagination_matches_full_sort(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that following cursors returns every listing once, in multi-key order.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        # Ties on every key are broken by ID, in the direction of the last key
+        listings = sorted(seeded.get_all("listings"), key=lambda r: r["id"], reverse=True)
+        expected = sorted(listings, key=lambda r: (r["bedrooms"], -r["gross_yield"]))
+        
+        items = fetch_all(client, {"sort": "bedrooms,-gross_yield", "limit": 5})
+        
+        assert [item["id"] for item in items] == [r["listing_id"] for r in expected]
+    
+    def test_descending_pagination(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test descending pagination with ties on the sort key.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        items = fetch_all(client, {"sort": "-bedrooms", "limit": 3})
+        
+        assert len(items) == len(seeded.get_all("listings"))
+        assert [item["bedrooms"] for item in items] == sorted((item["bedrooms"] for item in items), reverse=True)
+        assert len({item["id"] for item in items}) == len(items)
+    
+    @pytest.mark.parametrize("tie_sort_limit", [256, 2])
+    @pytest.mark.parametrize("sort", [
+        "bedrooms",
+        "-bedrooms,price_in_cents",
+        "bedrooms,-size_sq_ft,gross_yield",
+        "-gross_yield,-bedrooms,size_sq_ft",
+    ])
+    def test_pagination_with_ties(self, database: InMemoryDatabase, monkeypatch, sort: str, tie_sort_limit: int):
+        """
+        Test that paging through heavily tied sort keys matches a full sort.
+        
+        Args:
+            database: Clean database instance
+            monkeypatch: Pytest monkeypatch fixture
+            sort: Sort specification
+            tie_sort_limit: Largest group of ties sorted in memory
+        """
+        monkeypatch.setattr("app.services.listings.TIE_SORT_LIMIT", tie_sort_limit)
+        database.import_data({"listings": [
+            {
+                "id": f"{i:03}",
+                "region": ["London", "Wales"][i % 2],
+                "bedrooms": i % 3,
+                "size_sq_ft": i % 5 * 100,
+                "gross_yield": i % 4 / 100,
+                "price_in_cents": i * 7 % 11,
+            }
+            for i in range(120)
+        ]})
+        filters, ranges = {"region": "London"}, {"price_in_cents": (2, 9)}
+        
+        keys = [(part.lstrip("-"), part.startswith("-")) for part in sort.split(",")]
+        expected = [
+            r for r in database.get_all("listings")
+            if r["region"] == "London" and 2 <= r["price_in_cents"] <= 9
+        ]
+        expected.sort(key=lambda r: r["id"], reverse=keys[-1][1])
+        expected.sort(key=lambda r: tuple(-r[field] if desc else r[field] for field, desc in keys))
+        
+        ids, cursor = [], None
+        while True:
+            page, cursor = search_listings(database, filters, ranges, sort, limit=7, cursor=cursor)
+            ids.extend(record["id"] for record in page)
+            if cursor is None:
+                break
+        
+        assert ids == [r["id"] for r in expected]
+    
+    def test_listing_shape(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that listings are returned in the ListingRecord shape.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        item = client.get("/api/listings", params={"limit": 1}).json()["items"][0]
+        
+        assert set(item["addressDetails"]) >= {"addressLine1", "city", "postcode", "region"}
+        assert {"priceInCents", "grossYield", "isNewBuild", "photos"} <= set(item)
+    
+    def test_photo_urls(self, client: TestClient, seeded: InMemoryDatabase, monkeypatch):
+        """
+        Test that photo URLs are built from the stored photo IDs and the configured base URL.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        seed_photos = {listing["id"]: listing["photos"] for listing in LISTING_SEED_DATA}
+        stored = seeded.get_all("listings")[0]["photos"][0]
+        
+        items = fetch_all(client, {"limit": 100})
+        assert {item["id"]: item["photos"] for item in items} == seed_photos
+        assert set(stored) == {"id", "mimeType"}
+        
+        monkeypatch.setattr(get_settings(), "photo_base_url", "https://cdn.example.com/")
+        thumbnails = fetch_all(client, {"limit": 100, "photos": "thumbnails"})
+        assert {item["id"]: item["photos"] for item in thumbnails} == {
+            listing_id: [
+                {"thumbnailURL": f"https://cdn.example.com/{photo['originalURL'].rsplit('/', 1)[1]}_thumbnail",
+                 "mimeType": photo["mimeType"]}
+                for photo in photos
+            ]
+            for listing_id, photos in seed_photos.items()
+        }
+    
+    @pytest.mark.parametrize("params", [
+        {"sort": "description"},
+        {"sort": "price_in_cents,price_in_cents"},
+        {"cursor": "not-a-cursor"},
+    ])
+    def test_invalid_requests(self, client: TestClient, seeded: InMemoryDatabase, params: dict):
+        """
+        Test that invalid sorts and cursors are rejected.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+            params: Invalid query parameters
+        """
+        assert client.get("/api/listings", params=params).status_code == 400
+    
+    def test_cursor_bound_to_sort(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that a cursor cannot be reused with a different sort.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        cursor = client.get("/api/listings", params={"limit": 2}).json()["nextCursor"]
+        
+        response = client.get("/api/listings", params={"limit": 2, "cursor": cursor, "sort": "-gross_yield"})
+        
+        assert response.status_code == 400
+
+
+class TestGetListing:
+    """Test cases for the listing lookup endpoint."""
+    
+    def test_get_listing(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test fetching a listing by ID.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        record = seeded.get_all("listings")[0]
+        
+        response = client.get(f"/api/listings/{record['id']}")
+        
+        assert response.status_code == 200
+        assert response.json()["priceInCents"] == record["price_in_cents"]
+        assert client.get("/api/listings/missing").status_code == 404
+
+
+class TestConditionalRequests:
+    """Test cases for ETags and conditional GETs."""
+    
+    def test_search_not_modified(self, client: TestClient, seeded: InMemoryDatabase, monkeypatch):
+        """
+        Test that a search is answered with 304, without searching, until a listing is written.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        first = client.get("/api/listings", params={"limit": 5})
+        tag = first.headers["etag"]
+        assert tag.startswith('"') and tag.endswith('"')
+        
+        monkeypatch.setattr("app.api.routes.listings.search_encoded_listings", None)
+        for header in (tag, f'"other", W/{tag}', "*"):
+            response = client.get("/api/listings", params={"limit": 5}, headers={"If-None-Match": header})
+            assert response.status_code == 304 and response.content == b""
+            assert response.headers["etag"] == tag
+        monkeypatch.undo()
+        
+        seeded.update("listings", "187", {"bedrooms": 4})
+        response = client.get("/api/listings", params={"limit": 5}, headers={"If-None-Match": tag})
+        assert response.status_code == 200 and response.headers["etag"] != tag
+    
+    def test_search_tag_covers_count(self, client: TestClient, seeded: InMemoryDatabase, monkeypatch):
+        """
+        Test that a page whose approximate count changed under the same version is not answered with 304.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        params = {"region": "London", "limit": 5}
+        first = client.get("/api/listings", params=params, headers={"Cache-Control": "no-cache"})
+        total = first.json()["approximateTotal"]
+        
+        count = InMemoryDatabase.count
+        monkeypatch.setattr(InMemoryDatabase, "count", lambda self, *args, **kwargs: count(self, *args, **kwargs) + 1)
+        headers = {"Cache-Control": "no-cache", "If-None-Match": first.headers["etag"]}
+        response = client.get("/api/listings", params=params, headers=headers)
+        assert response.status_code == 200 and response.json()["approximateTotal"] == total + 1
+        assert response.headers["etag"] != first.headers["etag"]
+    
+    def test_listing_not_modified(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that a listing is answered with 304 until it is written, whatever else is written.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        tag = client.get("/api/listings/187").headers["etag"]
+        
+        seeded.update("listings", "185", {"bedrooms": 4})
+        assert client.get("/api/listings/187", headers={"If-None-Match": tag}).status_code == 304
+        
+        seeded.update("listings", "187", {"bedrooms": 4})
+        response = client.get("/api/listings/187", headers={"If-None-Match": tag})
+        assert response.status_code == 200 and response.headers["etag"] != tag
+        assert client.get("/api/listings/missing", headers={"If-None-Match": "*"}).status_code == 404
+
+
+class TestBulkWrite:
+    """Test cases for the bulk listing write endpoint."""
+    
+    def test_bulk_write(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that a bulk write applies every item and reports per-item results.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        body = {
+            "create": [dict(LISTING_SEED_DATA[0], id=900 + n, priceInCents=n) for n in range(3)],
+            "update": [{"id": "187", "changes": {"price_in_cents": 1}}, {"id": "missing", "changes": {}}],
+            "delete": ["185", "missing"],
+        }
+        response = client.post("/api/listings/bulk", json=body, params={"api_key": "write-key"})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["created"]) == 3
+        assert data["updated"] == [True, False]
+        assert data["deleted"] == [True, False]
+        created = seeded.get_by_id("listings", data["created"][0])
+        assert (created["listing_id"], created["post_town"]) == (900, LISTING_SEED_DATA[0]["addressDetails"]["city"])
+        assert seeded.get_by_id("listings", "187")["price_in_cents"] == 1
+        assert seeded.get_by_id("listings", "185") is None
+        
+        # Written listings are served like the seeded ones
+        response = client.get("/api/listings", params={"limit": 100})
+        assert response.status_code == 200
+        assert {900, 901, 902} <= {listing["id"] for listing in response.json()["items"]}
+    
+    @pytest.mark.parametrize("body", [
+        {"update": [{"id": "187"}]},
+        {"create": [{"price_in_cents": 5}]},
+        {"update": [{"id": "187", "changes": {"id": "other"}}]},
+        {"update": [{"id": "187", "changes": {"created_at": "2024-01-01T00:00:00"}}]},
+        {"update": [{"id": "187", "changes": {"bedrooms": None}}]},
+        {"update": [{"id": "187", "changes": {"development_name": None, "bedrooms": 4}}]},
+        {"update": [{"id": "187", "changes": {"region": "Atlantis"}}]},
+    ])
+    def test_invalid_body(self, client: TestClient, seeded: InMemoryDatabase, body: dict):
+        """
+        Test that malformed items are rejected, leaving the listings servable.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+            body: Invalid request body
+        """
+        response = client.post("/api/listings/bulk", json=body, params={"api_key": "write-key"})
+        
+        assert response.status_code == 422
+        assert client.get("/api/listings").status_code == 200
+        assert seeded.get_by_id("listings", "187")["bedrooms"] not in (None, 4)
+    
+    def test_only_sent_fields_applied(self, client: TestClient, seeded: InMemoryDatabase):
+        """
+        Test that an update applies only the fields it sends, clearing ``made_visible_at`` on an explicit null.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+        """
+        before = seeded.get_by_id("listings", "187")
+        body = {"update": [{"id": "187", "changes": {"bedrooms": 7, "made_visible_at": None}}]}
+        response = client.post("/api/listings/bulk", json=body, params={"api_key": "write-key"})
+        
+        assert response.status_code == 200
+        after = seeded.get_by_id("listings", "187")
+        assert (after["bedrooms"], after["made_visible_at"]) == (7, None)
+        unchanged = set(before) - {"bedrooms", "made_visible_at", "updated_at"}
+        assert {field: after[field] for field in unchanged} == {field: before[field] for field in unchanged}
+    
+    @pytest.mark.parametrize("params", [{}, {"api_key": "short"}])
+    def test_requires_api_key(self, client: TestClient, seeded: InMemoryDatabase, params: dict):
+        """
+        Test that a bulk write without a valid API key is rejected and writes nothing.
+        
+        Args:
+            client: FastAPI test client
+            seeded: Database holding the seed listings
+            params: Query parameters lacking a valid key
+        """
+        response = client.post("/api/listings/bulk", json={"delete": ["187"]}, params=params)
+        
+        assert response.status_code == 401
+        assert seeded.get_by_id("listings", "187") is not None
+
+
+class TestImport:
+    """Test cases for the listing import endpoint."""
+    
+    def test_import(self, client: TestClient, database: InMemoryDatabase):
+        """
+        Test that a feed is imported and invalid listings are reported.
+        
+        Args:
+            client: FastAPI test client
+            database: Clean database instance
+        """
+        feed = [dict(LISTING_SEED_DATA[0], bedrooms="many"), *LISTING_SEED_DATA[1:3]]
+        body = "\n".join(json.dumps(listing) for listing in feed)
+        response = client.post("/api/listings/import", content=body, params={"api_key": "write-key"})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["read"], data["imported"], data["failed"]) == (3, 2, 1)
+        assert data["errors"][0]["position"] == 1
+        assert data["errors"][0]["id"] == LISTING_SEED_DATA[0]["id"]
+        assert data["errors"][0]["error"].startswith("bedrooms:")
+        assert database.get_by_id("listings", str(LISTING_SEED_DATA[1]["id"])) is not None
+    
+    def test_requires_api_key(self, client: TestClient, database: InMemoryDatabase):
+        """
+        Test that an import without an API key is rejected and imports nothing.
+        
+        Args:
+            client: FastAPI test client
+            database: Clean database instance
+        """
+        response = client.post("/api/listings/import", content=json.dumps(LISTING_SEED_DATA[0]))
+        
+        assert response.status_code == 401
+        assert database.count("listings") == 0
@@ -0,0 +1,185 @@
+"""
+Tests for Database Persistence
+
+This module contains tests for the write-ahead log and snapshots: restoring
+writes after a restart, checkpoints truncating the log and crash recovery.
+"""
+
+import threading
+from pathlib import Path
+
+import pytest
+from app.services.database import InMemoryDatabase
+from app.services.persistence import Persistence
+
+
+def open_database(directory: Path, **options) -> InMemoryDatabase:
+    """
+    Open a database persisted in ``directory``, without background checkpoints.
+    
+    Returns:
+        InMemoryDatabase: Restored database
+    """
+    persistence = Persistence(str(directory), checkpoint_interval=3600, **options)
+    return InMemoryDatabase(persistence=persistence)
+
+
+class TestPersistence:
+    """Test cases for the write-ahead log and snapshots."""
+    
+    def test_restores_logged_writes(self, tmp_path: Path):
+        """
+        Test that creates, updates, deletes and seeds survive a restart.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        database = open_database(tmp_path)
+        database.seed_listings()
+        created = database.create("listings", {"region": "Wales", "price_in_cents": 1})
+        database.update("listings", "187", {"price_in_cents": 5})
+        database.delete("listings", "185")
+        database.create_index("listings", "country")
+        expected = database.export_data()
+        version = database.snapshot().version
+        database.close()
+        
+        restored = open_database(tmp_path)
+        assert restored.export_data() == expected
+        assert restored.snapshot().version == version
+        assert restored.get_by_id("listings", created["id"])["region"] == "Wales"
+        assert restored.find("listings", {"country": "UK"})
+        
+        # Writes continue the restored version sequence
+        restored.create("listings", {"region": "Wales"})
+        assert restored.snapshot().version == version + 1
+        restored.close()
+    
+    def test_checkpoint_truncates_log(self, tmp_path: Path):
+        """
+        Test that a checkpoint replaces the log written before it.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        database = open_database(tmp_path)
+        database.seed_listings()
+        database.update("listings", "187", {"price_in_cents": 5})
+        database.checkpoint()
+        database.update("listings", "187", {"price_in_cents": 6})
+        expected = database.export_data()
+        database.close()
+        
+        assert len(list(tmp_path.glob("snapshot-*.snap"))) == 1
+        assert len(list(tmp_path.glob("wal-*.log"))) == 1
+        
+        restored = open_database(tmp_path)
+        assert restored.export_data() == expected
+        assert restored.get_by_id("listings", "187")["price_in_cents"] == 6
+        restored.close()
+    
+    def test_restores_import_and_reset(self, tmp_path: Path):
+        """
+        Test that imports and resets are logged as whole-database loads.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        database = open_database(tmp_path)
+        database.import_data({"listings": [{"id": "a", "region": "Wales"}], "data": {"key": 1}})
+        database.create("listings", {"region": "London"})
+        expected = database.export_data()
+        database.close()
+        
+        restored = open_database(tmp_path)
+        assert restored.export_data() == expected
+        restored.reset()
+        restored.close()
+        
+        assert open_database(tmp_path).export_data() == InMemoryDatabase().export_data()
+    
+    def test_ignores_torn_log_tail(self, tmp_path: Path):
+        """
+        Test that a partly written last log entry, left by a crash, is dropped.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        database = open_database(tmp_path)
+        database.seed_listings()
+        expected = database.export_data()
+        database.close()
+        
+        segment = sorted(tmp_path.glob("wal-*.log"))[-1]
+        with open(segment, "a", encoding="utf-8") as file:
+            file.write('{"v":99,"ops":[["del","listi')
+        
+        restored = open_database(tmp_path)
+        assert restored.export_data() == expected
+        restored.close()
+    
+    def test_torn_segment_followed_by_newer_segment(self, tmp_path: Path):
+        """
+        Test that a torn line only ends its own segment, and writes logged after the restart are kept.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        database = open_database(tmp_path)
+        database.create("users", {"username": "first"})
+        database.close()
+        
+        segment = sorted(tmp_path.glob("wal-*.log"))[-1]
+        with open(segment, "a", encoding="utf-8") as file:
+            file.write('{"v":99,"ops":[["del","users')
+        
+        restarted = open_database(tmp_path)
+        restarted.create("users", {"username": "second"})
+        restarted.create("users", {"username": "third"})
+        expected = restarted.export_data()
+        restarted.close()
+        assert not segment.read_text(encoding="utf-8").endswith("users")
+        
+        restored = open_database(tmp_path)
+        assert restored.export_data() == expected
+        assert {user["username"] for user in restored.get_all("users")} == {"first", "second", "third"}
+        restored.close()
+    
+    def test_unserializable_write_is_not_published(self, tmp_path: Path):
+        """
+        Test that a write the log cannot hold is rejected before it is visible.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        database = open_database(tmp_path)
+        version = database.snapshot().version
+        with pytest.raises(TypeError):
+            database.create("listings", {"payload": object()})
+        assert database.snapshot().version == version
+        assert database.count("listings") == 0
+        database.close()
+    
+    def test_concurrent_writers_share_log(self, tmp_path: Path):
+        """
+        Test that concurrent writers are all durable after group commits.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        database = open_database(tmp_path)
+        
+        def write(worker: int):
+            for number in range(25):
+                database.create("users", {"worker": worker, "number": number})
+        
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        database.close()
+        
+        restored = open_database(tmp_path)
+        assert restored.count("users") == 100
+        restored.close()
@@ -0,0 +1,131 @@
+"""
+Tests for Compact Records
+
+This module contains tests for the slotted record type listings are stored
+as: its mapping interface, keys outside the schema, and how the database
+stores and hands out such records.
+"""
+
+import json
+import pickle
+
+import pytest
+
+from app.data.seed_data import LISTING_SEED_DATA
+from app.services.database import InMemoryDatabase
+from app.services.records import ListingRow, PhotoCodec, ValueDictionary, compact_record_type
+from app.services.seed import stored_listing
+
+
+class TestCompactRecord:
+    """Test cases for the compact record type."""
+    
+    def test_mapping_interface(self):
+        """Test that a compact record reads like the dictionary it was built from."""
+        data = {**stored_listing(LISTING_SEED_DATA[0]), "extra": [1]}
+        del data["country"]
+        record = ListingRow(data)
+        
+        assert record == data and data == record
+        assert len(record) == len(data) and set(record) == set(data)
+        assert record["region"] == data["region"] and record["extra"] == [1]
+        assert "country" not in record and record.get("country", "-") == "-"
+        with pytest.raises(KeyError):
+            record["country"]
+        assert dict(record.items()) == data
+        
+        copy = record.copy()
+        assert type(copy) is dict and copy == data
+        assert pickle.loads(pickle.dumps(record)) == record
+    
+    def test_read_only(self):
+        """Test that a compact record cannot be changed through the mapping interface."""
+        record = ListingRow({"id": "1"})
+        
+        with pytest.raises(TypeError):
+            record["id"] = "2"
+        with pytest.raises(AttributeError):
+            record.update({"id": "2"})
+    
+    def test_invalid_fields(self):
+        """Test that fields clashing with the mapping interface are rejected."""
+        with pytest.raises(ValueError, match="items, not a field"):
+            compact_record_type("Row", ["id", "items", "not a field"])
+        with pytest.raises(ValueError, match="region"):
+            compact_record_type("Row", ["id"], {"region": ValueDictionary()})
+
+
+class TestEncoding:
+    """Test cases for dictionary-encoded fields."""
+    
+    def test_value_dictionary(self):
+        """Test that each distinct value gets one code, and unhashable values one per use."""
+        dictionary = ValueDictionary()
+        
+        assert dictionary.encode("London") == dictionary.encode("London") == 1
+        assert dictionary.encode(None) == 0 and dictionary.code("Leeds") is None
+        assert dictionary.encode(["a"]) != dictionary.encode(["a"])
+        assert [dictionary.decode(code) for code in range(len(dictionary))] == [None, "London", ["a"], ["a"]]
+    
+    def test_encoded_fields(self):
+        """Test that encoded fields hold codes and read as their values."""
+        Row = compact_record_type("Row", ["id", "region"], {"region": ValueDictionary()})
+        first, second, missing = Row({"id": "1", "region": "London"}), Row({"id": "2", "region": "London"}), Row({})
+        
+        assert first.code("region") == second.code("region") == Row.dictionary("region").code("London")
+        assert first["region"] == "London" and first.copy() == {"id": "1", "region": "London"}
+        assert missing.code("region") == 0 and "region" not in missing
+        assert Row.dictionary("id") is None
+    
+    def test_photos(self):
+        """Test that stored listing photos are kept as IDs and MIME codes and read back unchanged."""
+        codec = PhotoCodec()
+        photos = [stored_listing(listing)["photos"] for listing in LISTING_SEED_DATA]
+        
+        stored = [codec.encode(listing_photos) for listing_photos in photos]
+        
+        assert [codec.decode(value) for value in stored] == photos
+        assert all(isinstance(value, tuple) for value in stored)
+        assert len(codec.mime_types) == len({photo["mimeType"] for listing in photos for photo in listing}) + 1
+        odd = [{"originalURL": "a", "standardURL": "b", "thumbnailURL": "c", "mimeType": "image/png"}]
+        assert codec.encode(odd) is odd and codec.decode(odd) is odd
+
+
+class TestCompactStorage:
+    """Test cases for collections stored as compact records."""
+    
+    def test_listings_stored_compactly(self):
+        """Test that seeded and written listings are stored compactly and read back as dictionaries."""
+        database = InMemoryDatabase()
+        database.seed_listings()
+        created = database.create("listings", {"region": "Atlantis", "bedrooms": 2})
+        
+        records = database.snapshot()._state("listings").records
+        assert all(type(record) is ListingRow for record in records)
+        assert type(database.get_by_id("listings", created["id"])) is dict
+        assert type(database.find("listings", {"region": "Atlantis"})[0]) is dict
+        assert database.find("listings", {"region": "Atlantis"}, view=True)[0]["bedrooms"] == 2
+        json.dumps(database.export_data())
+        json.dumps(list(database.iter_export(["listings"])))
+    
+    def test_indexes_use_codes(self):
+        """Test that hash indexes over encoded fields answer like indexes over values."""
+        compact, plain = InMemoryDatabase(), InMemoryDatabase(record_types={})
+        for database in (compact, plain):
+            database.seed_listings()
+            database.create("listings", {"bedrooms": 1})
+        
+        index = compact.snapshot()._state("listings").hash_indexes["region"]
+        assert all(type(key) is int for key in index._buckets)
+        for region in ("London", "Scotland", "Atlantis", None):
+            found = [compact.find("listings", {"region": region}), plain.find("listings", {"region": region})]
+            assert len(found[0]) == len(found[1])
+            assert [record.get("listing_id") for record in found[0]] == [record.get("listing_id") for record in found[1]]
+    
+    def test_other_collections_unchanged(self):
+        """Test that collections without a record type keep their records as dictionaries."""
+        database = InMemoryDatabase(record_types={})
+        database.seed_listings()
+        
+        records = database.snapshot()._state("listings").records
+        assert type(records[0]) is dict
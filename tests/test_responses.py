@@ -0,0 +1,91 @@
+"""
+Tests for API Responses
+
+This module contains tests for the fast JSON response class and the
+trusted output of the listing handlers, which skips validation against the
+response model.
+"""
+
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+import pytest
+from fastapi.testclient import TestClient
+from app.api.responses import FastJSONResponse
+from app.models.schemas import ListingRecord, ListingSummary, PingResponse, Region
+from app.services.database import InMemoryDatabase
+from app.services.listings import to_listing
+from app.utils import helpers
+from app.utils.helpers import encode_json
+
+
+class TestDumps:
+    """Test cases for the fast JSON encoder."""
+    
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_encodes_api_values(self, monkeypatch, use_orjson: bool):
+        """
+        Test that models, record views, enums and timestamps are encoded as FastAPI would.
+        
+        Args:
+            monkeypatch: Pytest monkeypatch fixture
+            use_orjson: Whether to encode with orjson or the ``json`` fallback
+        """
+        if not use_orjson:
+            monkeypatch.setattr(helpers, "orjson", None)
+        elif not helpers.ORJSON_AVAILABLE:
+            pytest.skip("orjson is not installed")
+        content = {
+            "ping": PingResponse(message="pong", timestamp="t"),
+            "record": MappingProxyType({"region": Region.LONDON, "name": "Café"}),
+            "at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+            "ids": (1, 2),
+        }
+        
+        assert encode_json(content) == (
+            '{"ping":{"message":"pong","timestamp":"t"},"record":{"region":"London","name":"Café"},'
+            '"at":"2024-01-01T00:00:00+00:00","ids":[1,2]}'
+        ).encode("utf-8")
+        with pytest.raises(TypeError):
+            encode_json({"value": object()})
+    
+    def test_response_class(self):
+        """Test that the response class renders with ``encode_json``."""
+        response = FastJSONResponse({"a": [1, None]}, status_code=201)
+        
+        assert response.body == b'{"a":[1,null]}' and response.status_code == 201
+        assert response.headers["content-type"] == "application/json"
+
+
+class TestTrustedOutput:
+    """Test cases for handlers returning their output unvalidated."""
+    
+    @pytest.mark.parametrize("thumbnails, model", [(False, ListingRecord), (True, ListingSummary)])
+    def test_listings_match_validated_output(self, database: InMemoryDatabase, thumbnails: bool, model):
+        """
+        Test that stored listings are sent exactly as validating them against their model would.
+        
+        Args:
+            database: Clean database
+            thumbnails: Whether only photo thumbnails are given
+            model: Response model of the listings
+        """
+        database.seed_listings()
+        
+        for record in database.get_all("listings"):
+            listing = to_listing(record, thumbnails)
+            validated = model.model_validate(listing).model_dump(mode="json", by_alias=True)
+            assert encode_json(listing) == encode_json(validated)
+    
+    def test_errors_use_fast_responses(self, client: TestClient):
+        """
+        Test that the exception handlers still answer with the error response shape.
+        
+        Args:
+            client: FastAPI test client
+        """
+        response = client.get("/api/listings/missing")
+        
+        assert response.status_code == 404
+        assert response.json()["error_code"] == "HTTP_404"
+        assert response.headers["content-type"] == "application/json"
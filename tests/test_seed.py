@@ -0,0 +1,106 @@
+"""
+Tests for Seed Listings
+
+This module contains tests for the seed listings artifact: building it from
+the seed data, mapping it when up to date, and rebuilding it when not.
+"""
+
+import os
+from pathlib import Path
+
+from app.config.settings import get_settings
+from app.data.seed_data import LISTING_SEED_DATA
+from app.services import seed
+from app.services.binary_snapshot import MappedTable
+from app.services.database import InMemoryDatabase
+
+
+def without_timestamps(records) -> list:
+    """Get ``records`` without their timestamps."""
+    return [{k: v for k, v in record.items() if k not in ("created_at", "updated_at")} for record in records]
+
+
+class TestSeedArtifact:
+    """Test cases for the seed listings artifact."""
+    
+    def test_built_then_mapped(self, tmp_path: Path):
+        """
+        Test that the artifact is built on first load and mapped afterwards.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        path = tmp_path / "listings.snap"
+        
+        built = seed.load_seed_listings(path)
+        mapped = seed.load_seed_listings(path)
+        
+        assert isinstance(built, list) and isinstance(mapped, MappedTable)
+        assert list(mapped) == built
+        assert without_timestamps(built) == [seed.stored_listing(listing) for listing in LISTING_SEED_DATA]
+    
+    def test_rebuilt_when_out_of_date(self, tmp_path: Path, monkeypatch):
+        """
+        Test that an artifact built from other seed data, settings or version is rebuilt, whatever the file times.
+        
+        Args:
+            tmp_path: Temporary directory
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        path = seed.write_artifact(tmp_path / "listings.snap")
+        os.utime(path, (0, 0))
+        assert isinstance(seed.load_seed_listings(path), MappedTable)
+        
+        source = tmp_path / "seed_data.py"
+        source.write_bytes(seed.SEED_DATA_PATH.read_bytes() + b"\n")
+        os.utime(source, (0, 0))
+        monkeypatch.setattr(seed, "SEED_DATA_PATH", source)
+        assert isinstance(seed.load_seed_listings(path), list)
+        assert isinstance(seed.load_seed_listings(path), MappedTable)
+        
+        monkeypatch.setattr(get_settings(), "photo_base_url", "https://photos.example.com/")
+        built = seed.load_seed_listings(path)
+        assert isinstance(built, list) and "originalURL" in built[0]["photos"][0]
+        assert isinstance(seed.load_seed_listings(path), MappedTable)
+        
+        monkeypatch.setattr(seed, "ARTIFACT_VERSION", seed.ARTIFACT_VERSION + 1)
+        assert isinstance(seed.load_seed_listings(path), list)
+        assert isinstance(seed.load_seed_listings(path), MappedTable)
+    
+    def test_default_path(self, tmp_path: Path, monkeypatch):
+        """
+        Test that the artifact is kept in the user cache directory unless its path is configured.
+        
+        Args:
+            tmp_path: Temporary directory
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        monkeypatch.setattr(get_settings(), "seed_artifact_path", None)
+        assert seed.write_artifact() == tmp_path / "cache" / "listings-api" / "listings.snap"
+        
+        monkeypatch.setattr(get_settings(), "seed_artifact_path", str(tmp_path / "seed" / "listings.snap"))
+        assert seed.artifact_path() == tmp_path / "seed" / "listings.snap"
+    
+    def test_unwritable_artifact(self, tmp_path: Path):
+        """
+        Test that listings are still converted when the artifact cannot be written.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        (tmp_path / "file").touch()
+        records = seed.load_seed_listings(tmp_path / "file" / "listings.snap")
+        
+        assert len(records) == len(LISTING_SEED_DATA)
+    
+    def test_seeded_lazily(self):
+        """Test that seeding maps the artifact and decodes listings when first read."""
+        seed.load_seed_listings()
+        database = InMemoryDatabase()
+        database.seed_listings()
+        
+        records = database.snapshot()._state("listings").records
+        assert records._unloaded == len(records._chunks)
+        listing = database.get_by_id("listings", str(LISTING_SEED_DATA[0]["id"]))
+        assert without_timestamps([listing]) == [seed.stored_listing(LISTING_SEED_DATA[0])]
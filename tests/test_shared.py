@@ -0,0 +1,149 @@
+"""
+Tests for Shared Collections
+
+This module contains tests for sharing a collection between databases
+through a shared directory, as the worker processes of one server do:
+initialization by the first database only, and writes published by one
+database and loaded by the others.
+"""
+
+import multiprocessing
+from pathlib import Path
+
+import pytest
+from app.services.database import InMemoryDatabase
+from app.services.shared import SharedCollection
+
+
+def share(directory: Path) -> InMemoryDatabase:
+    """
+    Build a database sharing its listings through ``directory``, seeding them if first.
+    
+    Returns:
+        InMemoryDatabase: Database whose listings are shared
+    """
+    database = InMemoryDatabase()
+    database.share(SharedCollection(str(directory), "listings"), initialize=database.seed_listings)
+    return database
+
+
+def create_listing(directory: str):
+    """Create a listing from a separate process sharing ``directory``."""
+    share(Path(directory)).create("listings", {"region": "Elsewhere"})
+
+
+class TestSharedCollection:
+    """Test cases for collections shared between databases."""
+    
+    def test_first_database_initializes(self, tmp_path: Path):
+        """
+        Test that only the first database seeds, and the others map its records.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        first = share(tmp_path)
+        second = InMemoryDatabase()
+        second.share(SharedCollection(str(tmp_path), "listings"), initialize=lambda: 1 / 0)
+        
+        assert SharedCollection(str(tmp_path), "listings").generation == 1
+        records = second.snapshot()._state("listings").records
+        assert records._unloaded == len(records._chunks)
+        assert second.count("listings") == first.count("listings") > 0
+        assert second.get_by_id("listings", "187") == first.get_by_id("listings", "187")
+    
+    def test_writes_are_published(self, tmp_path: Path):
+        """
+        Test that writes in one database are seen by another after a refresh.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        first, second = share(tmp_path), share(tmp_path)
+        size = first.count("listings")
+        
+        created = first.create("listings", {"region": "Elsewhere"})
+        first.update("listings", "187", {"region": "Elsewhere"})
+        assert second.get_by_id("listings", created["id"]) is None
+        second.refresh()
+        assert second.get_by_id("listings", created["id"]) == created
+        assert second.count("listings", {"region": "Elsewhere"}) == 2
+        
+        # A stale database writes on top of the newest generation
+        first.delete("listings", created["id"])
+        second.delete("listings", "187")
+        first.refresh()
+        for database in (first, second):
+            assert database.count("listings") == size - 1
+            assert database.count("listings", {"region": "Elsewhere"}) == 0
+        assert len(list(tmp_path.glob("listings-*.snap"))) == 1
+    
+    def test_compaction(self, tmp_path: Path, monkeypatch):
+        """
+        Test that the log is compacted into a new base, which stale databases load.
+        
+        Args:
+            tmp_path: Temporary directory
+            monkeypatch: Pytest monkeypatch fixture
+        """
+        monkeypatch.setattr(SharedCollection, "COMPACT_ENTRIES", 2)
+        first, second, third = share(tmp_path), share(tmp_path), share(tmp_path)
+        
+        first.update("listings", "187", {"region": "One"})
+        second.refresh()
+        second.update("listings", "187", {"bedrooms": 9})
+        assert len(list(tmp_path.glob("listings-*.snap"))) == 2
+        for _ in range(2):
+            first.create("listings", {"region": "Elsewhere"})
+        # Bases before the previous one are deleted
+        assert len(list(tmp_path.glob("listings-*.snap"))) == 2
+        
+        for database in (second, third):
+            database.refresh()
+            assert database.count("listings") == first.count("listings")
+            assert database.get_by_id("listings", "187") == first.get_by_id("listings", "187")
+            assert database.get_by_id("listings", "187")["bedrooms"] == 9
+    
+    def test_other_process(self, tmp_path: Path):
+        """
+        Test that a write from another process is loaded by a refresh.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        database = share(tmp_path)
+        process = multiprocessing.get_context("spawn").Process(target=create_listing, args=(str(tmp_path),))
+        process.start()
+        process.join(60)
+        assert process.exitcode == 0
+        
+        database.refresh()
+        assert database.count("listings", {"region": "Elsewhere"}) == 1
+    
+    def test_replacements_are_published(self, tmp_path: Path):
+        """
+        Test that resets, imports, reseeds and indexes reach the other databases.
+        
+        Args:
+            tmp_path: Temporary directory
+        """
+        first, second = share(tmp_path), share(tmp_path)
+        
+        first.reset()
+        second.refresh()
+        assert second.count("listings") == first.count("listings") == 0
+        second.create("listings", {"region": "Elsewhere"})
+        first.refresh()
+        assert first.count("listings") == 1
+        
+        second.seed_listings()
+        first.create_index("listings", "bedrooms")
+        second.refresh()
+        assert second.count("listings") == first.count("listings") > 1
+        assert "bedrooms" in second.snapshot()._state("listings").hash_indexes
+        
+        first.import_data({"listings": [{"id": "1"}]})
+        second.refresh()
+        assert second.get_all("listings") == [{"id": "1"}]
+        with pytest.raises(ValueError):
+            first.import_data({"users": []})
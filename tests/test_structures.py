@@ -0,0 +1,237 @@
+"""
+Tests for the Persistent Data Structures
+
+This module contains tests checking the copy-on-write containers against
+plain Python lists and dictionaries, including isolation between copies.
+"""
+
+import random
+
+import pytest
+from app.services.structures import ChunkedList, ShardedDict, SortedChunks
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    """Use tiny chunks so tests cross chunk boundaries."""
+    monkeypatch.setattr(ChunkedList, "CHUNK_SIZE", 4)
+    monkeypatch.setattr(ShardedDict, "SHARDS", 8)
+    monkeypatch.setattr(SortedChunks, "LOAD", 3)
+
+
+class TestChunkedList:
+    """Test cases for ChunkedList."""
+    
+    def test_matches_list(self):
+        """Test that random operations behave like a list."""
+        rng = random.Random(1)
+        expected = list(range(10))
+        actual = ChunkedList(expected)
+        
+        for step in range(500):
+            operation = rng.choice(["append", "pop", "set"])
+            if operation == "append":
+                expected.append(step)
+                actual.append(step)
+            elif operation == "pop" and expected:
+                assert actual.pop() == expected.pop()
+            elif expected:
+                position = rng.randrange(len(expected))
+                expected[position] = actual[position] = -step
+            assert len(actual) == len(expected)
+        
+        assert list(actual) == expected
+        assert [actual[i] for i in range(len(expected))] == expected
+        assert actual[-1] == expected[-1]
+        with pytest.raises(IndexError):
+            actual[len(expected)]
+    
+    def test_copy_is_isolated(self):
+        """Test that changing a copy leaves the original untouched."""
+        original = ChunkedList(range(10))
+        clone = original.copy()
+        
+        clone[0] = "changed"
+        clone.append(10)
+        clone.pop()
+        clone.pop()
+        
+        assert list(original) == list(range(10))
+        assert list(clone) == ["changed", *range(1, 9)]
+    
+    def test_lazy_chunks(self):
+        """Test that a lazy list loads each chunk once, on first access."""
+        loads = []
+        
+        def source(start, stop):
+            loads.append(start)
+            return list(range(start, stop))
+        
+        lazy = ChunkedList.lazy(10, source)
+        assert len(lazy) == 10 and loads == []
+        assert lazy[5] == 5 and lazy[6] == 6
+        assert loads == [4]
+        assert list(lazy.iter_unloaded()) == list(range(10))
+        assert loads == [4, 0, 8]
+        
+        clone = lazy.copy()
+        clone[0] = "changed"
+        clone.append(10)
+        clone.pop()
+        clone.pop()
+        assert list(clone) == ["changed", *range(1, 9)]
+        assert list(lazy) == list(range(10))
+        assert lazy.take([9, 0]) == [9, 0]
+
+
+class TestShardedDict:
+    """Test cases for ShardedDict."""
+    
+    def test_matches_dict(self):
+        """Test that random operations behave like a dict."""
+        rng = random.Random(2)
+        expected = {}
+        actual = ShardedDict()
+        
+        for step in range(500):
+            key = f"key-{rng.randrange(50)}"
+            if rng.random() < 0.3 and key in expected:
+                del expected[key]
+                del actual[key]
+            else:
+                expected[key] = actual[key] = step
+            assert len(actual) == len(expected)
+        
+        assert dict(actual.items()) == expected
+        assert actual.get("missing") is None
+        assert "missing" not in actual
+    
+    def test_copy_is_isolated(self):
+        """Test that changing a copy leaves the original untouched."""
+        original = ShardedDict((str(i), i) for i in range(20))
+        clone = original.copy()
+        
+        clone["0"] = "changed"
+        del clone["1"]
+        clone["new"] = 1
+        
+        assert dict(original.items()) == {str(i): i for i in range(20)}
+        assert clone["0"] == "changed" and "1" not in clone and len(clone) == 20
+
+
+class TestSortedChunks:
+    """Test cases for SortedChunks."""
+    
+    def test_matches_sorted_list(self):
+        """Test that random operations behave like a sorted list."""
+        rng = random.Random(3)
+        expected = []
+        actual = SortedChunks()
+        
+        for _ in range(500):
+            value = rng.randrange(40)
+            if rng.random() < 0.4:
+                removed = actual.discard(value)
+                assert removed == (value in expected)
+                if removed:
+                    expected.remove(value)
+            else:
+                actual.add(value)
+                expected.append(value)
+                expected.sort()
+            assert len(actual) == len(expected)
+        
+        assert list(actual) == expected
+        for value in range(-1, 42):
+            assert (value in actual) == (value in expected)
+            left, right = actual.bisect_left(value), actual.bisect_right(value)
+            assert expected[left:right] == [value] * expected.count(value)
+            assert list(actual.islice(left, right + 3)) == expected[left:right + 3]
+            assert list(actual.islice(left, right + 3, reverse=True)) == expected[left:right + 3][::-1]
+    
+    def test_copy_is_isolated(self):
+        """Test that changing a copy leaves the original untouched."""
+        original = SortedChunks(range(20))
+        clone = original.copy()
+        
+        clone.add(5)
+        clone.discard(0)
+        
+        assert list(original) == list(range(20))
+        assert list(clone) == sorted([*range(1, 20), 5])
+
+
+class TestVersionChains:
+    """Test cases for batches of writes between copies."""
+    
+    def test_chunked_list(self):
+        """Test that every version of a chain of batched copies keeps its contents."""
+        rng = random.Random(4)
+        current, expected = ChunkedList(range(10)), list(range(10))
+        versions = [(current, expected.copy())]
+        for step in range(60):
+            current = current.copy()
+            for _ in range(rng.randrange(1, 8)):
+                operation = rng.choice(["append", "pop", "set"])
+                if operation == "append":
+                    current.append(step)
+                    expected.append(step)
+                elif operation == "pop" and expected:
+                    assert current.pop() == expected.pop()
+                elif expected:
+                    position = rng.randrange(len(expected))
+                    current[position] = expected[position] = -step
+            versions.append((current, expected.copy()))
+        
+        for version, contents in versions:
+            assert list(version) == contents
+    
+    def test_sharded_dict(self):
+        """Test that every version of a chain of batched copies keeps its contents."""
+        rng = random.Random(5)
+        current, expected = ShardedDict(), {}
+        versions = []
+        for step in range(60):
+            current = current.copy()
+            for _ in range(rng.randrange(1, 8)):
+                key = rng.randrange(30)
+                if key in expected and rng.random() < 0.4:
+                    del current[key]
+                    del expected[key]
+                else:
+                    current[key] = expected[key] = step
+            versions.append((current, expected.copy()))
+        
+        for version, contents in versions:
+            assert dict(version.items()) == contents
+            assert len(version) == len(contents)
+    
+    def test_sorted_chunks(self):
+        """Test that every version of a chain of batched copies keeps its contents."""
+        rng = random.Random(6)
+        current, expected = SortedChunks(), []
+        versions = []
+        for _ in range(60):
+            current = current.copy()
+            for _ in range(rng.randrange(1, 8)):
+                if expected and rng.random() < 0.4:
+                    value = rng.choice(expected)
+                    assert current.discard(value)
+                    expected.remove(value)
+                else:
+                    value = rng.randrange(100)
+                    current.add(value)
+                    expected.append(value)
+            versions.append((current, sorted(expected)))
+        
+        for version, contents in versions:
+            assert list(version) == contents
+    
+    def test_writing_the_original_after_copy(self):
+        """Test that writes to a container after copying it do not leak into the copy."""
+        values = ChunkedList(range(10))
+        clone = values.copy()
+        values[0] = "changed"
+        values.append(10)
+        
+        assert list(clone) == list(range(10))